@@ -1,46 +1,111 @@
+import asyncio
+import json
 import os
-import uvicorn
-from fastapi import FastAPI, Request, Response
+import re
+import tempfile
+import uuid
+from contextlib import asynccontextmanager
+from fastapi import APIRouter, Depends, FastAPI, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import Dict, Any, List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional
 
-from src.tools import get_tools
-from src.models import get_model, get_prompt
-from src.agents import LangGraphAgent
-from src.config import get_deepseek_config
+from src.metrics import registry, stats_collector, tracer
 
-# 创建FastAPI应用
-app = FastAPI(title="LangGraph Agent API")
+# 各组件注册到/metrics的采集函数名，关闭时按名字移除
+_COLLECTORS = ("deepseek_pool", "llm_cache", "llm_scheduler", "tool_cache", "conversation_store")
 
-# 添加CORS中间件
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+def build_components() -> Dict[str, Any]:
+    """
+    初始化配置、工具、模型、会话存储和Agent
 
-# 初始化配置
-config = get_deepseek_config()
+    模型和LangGraph相关的模块在这里才导入，导入app模块本身不会触发这些开销
 
-# 初始化工具
-tools = get_tools()
+    Returns:
+        包含config、tools（工具注册表）、llm、conversation_store和agent的字典
+    """
+    from src.tools import get_tool_cache, get_tool_registry
+    from src.models import get_model, get_prompt
+    from src.agents import LangGraphAgent, ContextWindowManager, LLMSummarizer, create_query_router
+    from src.config import (
+        get_budget_config, get_deepseek_config, get_memory_config, get_router_config, get_tool_config
+    )
+    from src.memory import create_conversation_store
 
-# 初始化模型
-llm = get_model(config=config)
+    # 初始化配置
+    config = get_deepseek_config()
 
-# 获取提示模板
-prompt = get_prompt()
+    # 初始化工具：内置工具、entry point和插件目录中的工具登记在注册表中，第一次使用时才导入
+    tool_config = get_tool_config()
+    tools = get_tool_registry()
 
-# 初始化Agent
-agent = LangGraphAgent(
-    llm=llm,
-    tools=tools,
-    prompt_template=prompt
-)
+    # 初始化模型
+    llm = get_model(config=config)
+
+    # 获取提示模板
+    prompt = get_prompt(function_calling=config.function_calling)
+
+    # 初始化会话存储
+    memory_config = get_memory_config()
+    conversation_store = create_conversation_store(memory_config.backend, **memory_config.store_kwargs())
+
+    # 快速路径配置：算式、天气等查询直接调用工具并按模板回答，工具结果与模型的推测一致时不再调用模型
+    router_config = get_router_config()
+
+    # 初始化Agent
+    agent = LangGraphAgent(
+        llm=llm,
+        tools=[],
+        prompt_template=prompt,
+        checkpointer=conversation_store,
+        max_history_messages=memory_config.max_history_messages,
+        durability=memory_config.durability,
+        context_manager=ContextWindowManager(
+            max_tokens=memory_config.context_max_tokens,
+            summarizer=LLMSummarizer(llm, max_summary_chars=memory_config.summary_max_chars)
+        ) if memory_config.context_max_tokens > 0 else None,
+        router=create_query_router(**router_config.router_kwargs()) if router_config.enabled else None,
+        speculative_answer=router_config.speculative_answer,
+        early_tool_dispatch=router_config.early_tool_dispatch,
+        tool_registry=tools,  # 每个请求按查询从注册表中选出最相关的工具放入提示
+        max_tools=tool_config.max_tools or None,
+        **get_budget_config().agent_kwargs()  # 每个请求的工具调用轮数、token和处理时间上限
+    )
+
+    # 把各组件已有的stats()导出到/metrics
+    registry.register_collector("deepseek_pool", stats_collector("deepseek_pool", llm.pool_metrics, "DeepSeek连接池指标"))
+    registry.register_collector("llm_cache", stats_collector("llm_cache", llm.cache_metrics, "LLM响应缓存指标"))
+    registry.register_collector("llm_scheduler", stats_collector("llm_scheduler", llm.scheduler_metrics, "模型请求调度指标"))
+    registry.register_collector("tool_cache", stats_collector("tool_cache", get_tool_cache().stats, "工具结果缓存指标"))
+    if hasattr(conversation_store, "stats"):
+        registry.register_collector(
+            "conversation_store", stats_collector("conversation_store", conversation_store.stats, "会话存储指标")
+        )
+
+    return {
+        "config": config,
+        "tools": tools,
+        "llm": llm,
+        "conversation_store": conversation_store,
+        "agent": agent,
+    }
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """应用启动时初始化各组件，关闭时释放连接池和工具线程池"""
+    components = build_components()
+    for name, value in components.items():
+        setattr(app.state, name, value)
+    try:
+        yield
+    finally:
+        for name in _COLLECTORS:
+            registry.unregister_collector(name)
+        components["agent"].close()
+        transport = components["llm"].transport
+        transport.close()
+        await transport.aclose()
 
 # 定义请求模型
 class ChatRequest(BaseModel):
@@ -54,43 +119,242 @@ class ChatResponse(BaseModel):
     response: str
     conversation_id: str
 
-@app.get("/")
+def get_agent(request: Request) -> Any:
+    """获取启动时创建的Agent"""
+    return request.app.state.agent
+
+router = APIRouter()
+
+@router.get("/")
 async def root():
     """根路径处理函数"""
     return {"message": "欢迎使用LangGraph Agent API"}
 
-@app.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
-    """处理聊天请求"""
+def new_conversation_id() -> str:
+    """生成新的会话ID"""
+    return "conv_" + uuid.uuid4().hex[:12]
+
+@router.post("/chat", response_model=ChatResponse)
+async def chat(
+    request: ChatRequest,
+    x_tenant_id: Optional[str] = Header(default=None),
+    agent: Any = Depends(get_agent)
+):
+    """处理聊天请求，携带相同conversation_id的请求会延续之前的对话"""
+    from src.models import scheduling_context, SchedulerTimeout
     try:
-        # 调用Agent
-        response = agent.invoke(request.message)
-        
         # 生成会话ID
-        conversation_id = request.conversation_id or "conv_" + str(hash(request.message))[:8]
-        
+        conversation_id = request.conversation_id or new_conversation_id()
+
+        # 异步调用Agent，等待LLM期间不阻塞事件循环；模型请求按租户/入口的优先级排队
+        with scheduling_context(tenant=x_tenant_id, endpoint="chat"):
+            response = await agent.ainvoke(request.message, conversation_id=conversation_id)
+
         return ChatResponse(
             response=response,
             conversation_id=conversation_id
         )
+    except SchedulerTimeout as e:
+        return JSONResponse(
+            status_code=503,
+            content={"error": f"服务繁忙，请稍后重试: {str(e)}"},
+            headers={"Retry-After": "1"}
+        )
     except Exception as e:
         return JSONResponse(
             status_code=500,
             content={"error": f"处理聊天请求时出错: {str(e)}"}
         )
 
-@app.get("/tools")
-async def list_tools():
-    """列出所有可用工具"""
+@router.post("/chat/stream")
+async def chat_stream(
+    request: ChatRequest,
+    x_tenant_id: Optional[str] = Header(default=None),
+    agent: Any = Depends(get_agent)
+):
+    """以Server-Sent-Events流式返回聊天结果"""
+    from src.models import scheduling_context
+    conversation_id = request.conversation_id or new_conversation_id()
+
+    async def event_stream():
+        try:
+            # 生成器在响应任务中执行，调度上下文需要在这里设置
+            with scheduling_context(tenant=x_tenant_id, endpoint="chat_stream"):
+                async for event in agent.astream(request.message, conversation_id=conversation_id):
+                    event["conversation_id"] = conversation_id
+                    yield f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            error = {"error": f"处理聊天请求时出错: {str(e)}", "conversation_id": conversation_id}
+            yield f"event: error\ndata: {json.dumps(error, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# 批量运行的ID只允许安全的文件名字符
+_BATCH_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-][A-Za-z0-9_.-]{0,63}$")
+
+def _discard_file(file: Any) -> None:
+    """关闭并删除批量请求体的临时文件"""
+    file.close()
+    try:
+        os.unlink(file.name)
+    except FileNotFoundError:
+        pass
+
+class _CleanupStreamingResponse(StreamingResponse):
+    """
+    发送结束后总会执行清理的流式响应
+
+    客户端在响应体开始迭代之前断开时，生成器的finally和BackgroundTask都不会执行，
+    这里在响应处理结束（包括断开和异常）后执行清理函数
+    """
+
+    def __init__(self, content: Any, cleanup: Any, **kwargs: Any):
+        super().__init__(content, **kwargs)
+        self._cleanup = cleanup
+
+    async def __call__(self, scope: Any, receive: Any, send: Any) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self._cleanup()
+
+@router.post("/chat/batch")
+async def chat_batch(
+    request: Request,
+    concurrency: Optional[int] = None,
+    batch_id: Optional[str] = None,
+    x_tenant_id: Optional[str] = Header(default=None),
+    agent: Any = Depends(get_agent)
+):
+    """
+    批量处理聊天请求
+
+    请求体为JSONL，每行形如{"message": ..., "id": ..., "conversation_id": ...}，其余字段原样写回结果；
+    响应为NDJSON，每完成一条输出一行结果，最后一行为{"summary": 统计}。
+    指定batch_id时结果同时保存在服务端，同一batch_id重新提交时先返回已保存的结果，并跳过已完成的条目；
+    同一batch_id同时只能有一个在运行（支持fcntl的平台上多个worker之间同样互斥）
+    """
+    from src.batch import BatchCheckpoint, BatchLock, BatchRunner, read_jsonl
+    from src.config import get_batch_config
+    from src.models import scheduling_context
+
+    batch_config = get_batch_config()
+    concurrency = min(concurrency or batch_config.concurrency, batch_config.max_concurrency)
+    if batch_id is not None and not _BATCH_ID_PATTERN.match(batch_id):
+        return JSONResponse(status_code=400, content={"error": "batch_id只能包含字母、数字、_、-和."})
+    # 在第一次await之前占用批次，同一batch_id的并发提交不会同时通过检查
+    lock = BatchLock(batch_config.dir, batch_id) if batch_id else None
+    if lock is not None and not lock.acquire():
+        return JSONResponse(status_code=409, content={"error": f"批次{batch_id}正在运行"})
+
+    body = None
+    checkpoint = BatchCheckpoint(os.path.join(batch_config.dir, f"{batch_id}.jsonl")) if batch_id else None
+
+    async def cleanup() -> None:
+        """释放批次并删除临时文件，可以重复调用"""
+        nonlocal body
+        if checkpoint is not None:
+            await checkpoint.aclose()
+        if lock is not None:
+            lock.release()
+        if body is not None:
+            file, body = body, None
+            await asyncio.to_thread(_discard_file, file)
+
+    try:
+        # 请求体边接收边写入临时文件，处理时再逐行读取，不在内存中保留整个请求体；文件读写放到线程中
+        body = await asyncio.to_thread(
+            tempfile.NamedTemporaryFile, prefix="chat_batch_", suffix=".jsonl", delete=False
+        )
+        async for chunk in request.stream():
+            await asyncio.to_thread(body.write, chunk)
+        await asyncio.to_thread(body.close)
+    except BaseException:
+        await asyncio.shield(cleanup())
+        raise
+    input_path = body.name
+
+    async def event_stream():
+        runner = BatchRunner(agent, concurrency=concurrency)
+        try:
+            skip = set()
+            if checkpoint is not None:
+                # 结果文件的读写都放到线程中，不阻塞事件循环
+                skip = await checkpoint.aload()
+                async for record in checkpoint.arecords():
+                    yield json.dumps(record, ensure_ascii=False) + "\n"
+            with scheduling_context(tenant=x_tenant_id, endpoint="chat_batch"):
+                async for record in runner.run(read_jsonl(input_path), skip=skip):
+                    if checkpoint is not None:
+                        await checkpoint.aappend(record)
+                    yield json.dumps(record, ensure_ascii=False) + "\n"
+            yield json.dumps({"summary": runner.stats.report()}, ensure_ascii=False) + "\n"
+        except Exception as e:
+            error = {"error": f"批量处理时出错: {str(e)}", "summary": runner.stats.report()}
+            yield json.dumps(error, ensure_ascii=False) + "\n"
+        finally:
+            await cleanup()
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    if batch_id:
+        headers["X-Batch-Id"] = batch_id
+    return _CleanupStreamingResponse(
+        event_stream(), cleanup, media_type="application/x-ndjson", headers=headers
+    )
+
+@router.get("/metrics")
+async def metrics():
+    """以Prometheus文本格式导出指标"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@router.get("/traces")
+async def traces(limit: int = 100, trace_id: Optional[str] = None):
+    """查看最近结束的span，用于排查单个请求的耗时分布"""
+    return {"spans": tracer.recent(limit=limit, trace_id=trace_id)}
+
+@router.get("/tools")
+async def list_tools(request: Request):
+    """列出所有可用工具（只读取注册表中的名称和描述，不会导入尚未使用的工具）"""
     tool_list = []
-    for tool in tools:
+    for tool in request.app.state.tools:
         tool_list.append({
             "name": tool.name,
             "description": tool.description
         })
-    
+
     return {"tools": tool_list}
 
+def create_app() -> FastAPI:
+    """
+    创建FastAPI应用
+
+    模型、工具和Agent在lifespan启动阶段创建，创建应用本身只注册路由和中间件
+
+    Returns:
+        FastAPI应用
+    """
+    app = FastAPI(title="LangGraph Agent API", lifespan=lifespan)
+
+    # 添加CORS中间件
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    app.include_router(router)
+    return app
+
+# 供 uvicorn app:app 使用
+app = create_app()
+
 if __name__ == "__main__":
-    # 启动应用
-    uvicorn.run("app:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
+    import uvicorn
+
+    # 单进程开发模式（自动重载），多进程部署使用serve.py
+    uvicorn.run("app:app", host="0.0.0.0", port=8000, reload=True)
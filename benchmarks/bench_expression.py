@@ -0,0 +1,58 @@
+"""
+计算器表达式求值微基准
+
+对比三种方式计算一批报表类表达式的耗时：
+原来的eval、白名单编译+LRU缓存后的逐个求值、以及按结构分组的NumPy向量化批量求值。
+
+用法:
+    python -m benchmarks.bench_expression --count 50 500 5000 --repeat 20
+"""
+import argparse
+import random
+import timeit
+
+from src.tools.expression import compile_expression, evaluate, evaluate_many
+
+
+def make_expressions(count: int, seed: int = 0):
+    """构造报表类表达式：少数几种结构，常量各不相同"""
+    rng = random.Random(seed)
+    shapes = [
+        "{a}*{b}/100",
+        "({a}-{b})/{b}*100",
+        "{a}+{b}+{c}",
+        "{a}*{b}+{c}",
+    ]
+    return [
+        rng.choice(shapes).format(a=rng.randint(1, 10000), b=rng.randint(1, 500), c=round(rng.uniform(0, 100), 2))
+        for _ in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="计算器表达式求值微基准")
+    parser.add_argument("--count", type=int, nargs="+", default=[50, 500, 5000], help="每批表达式数量")
+    parser.add_argument("--repeat", type=int, default=20, help="每种方式重复的批次数")
+    args = parser.parse_args()
+
+    print(f"{'表达式数':>8} {'eval(ms/批)':>12} {'编译缓存(ms/批)':>16} {'向量化(ms/批)':>14}")
+    for count in args.count:
+        expressions = make_expressions(count)
+        compile_expression.cache_clear()
+
+        # 三种方式必须得到相同的结果
+        expected = [eval(expression) for expression in expressions]
+        assert [evaluate(expression) for expression in expressions] == expected
+        assert all(abs(a - b) <= 1e-9 * max(1, abs(b)) for a, b in zip(evaluate_many(expressions), expected))
+
+        naive = timeit.timeit(lambda: [eval(expression) for expression in expressions], number=args.repeat)
+        compiled = timeit.timeit(lambda: [evaluate(expression) for expression in expressions], number=args.repeat)
+        batched = timeit.timeit(lambda: evaluate_many(expressions), number=args.repeat)
+        print(
+            f"{count:>8} {naive / args.repeat * 1e3:>12.2f} {compiled / args.repeat * 1e3:>16.2f}"
+            f" {batched / args.repeat * 1e3:>14.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""
+端到端负载基准
+
+启动本地模拟的DeepSeek服务，以指定并发分别驱动LangGraphAgent.invoke和app.py的/chat，
+报告吞吐量（req/s）、延迟分位数（p50/p95/p99）和每请求CPU时间，结果以JSON输出便于做回归跟踪。
+/chat通过httpx的ASGITransport在进程内调用，测量的是应用栈本身而不包含网络开销；
+CPU时间为整个进程（含模拟服务和负载驱动）在测量期间消耗的CPU时间除以请求数。
+
+用法:
+    python -m benchmarks.bench_load --target agent app --requests 500 --concurrency 32 \\
+        --latency lognormal:0.2,0.4 --output bench_load.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Sequence
+
+from benchmarks.mock_deepseek import MockDeepSeekServer, add_server_arguments, load_rules
+
+# 默认的请求组合：计算、天气（含多城市）和无需工具的闲聊
+DEFAULT_PROMPTS = [
+    "计算 2+3*4",
+    "北京的天气怎么样",
+    "上海今天的天气",
+    "帮我算一下 (12.5+7.5)/4",
+    "你好，介绍一下你自己",
+]
+
+
+def percentile(sorted_values: Sequence[float], fraction: float) -> float:
+    """最近秩法计算分位数"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def summarize(
+    target: str,
+    latencies: List[float],
+    errors: int,
+    duration: float,
+    cpu_seconds: float,
+    concurrency: int,
+) -> Dict[str, Any]:
+    """汇总一个目标的测量结果"""
+    latencies = sorted(latencies)
+    total = len(latencies) + errors
+    return {
+        "target": target,
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": errors,
+        "duration_s": round(duration, 4),
+        "throughput_rps": round(total / duration, 2) if duration else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50) * 1000, 2),
+            "p95": round(percentile(latencies, 0.95) * 1000, 2),
+            "p99": round(percentile(latencies, 0.99) * 1000, 2),
+            "mean": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+            "max": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        },
+        "cpu_ms_per_request": round(cpu_seconds / total * 1000, 3) if total else 0.0,
+    }
+
+
+def run_agent(prompts: List[str], requests: int, concurrency: int) -> Dict[str, Any]:
+    """在线程池中以指定并发调用LangGraphAgent.invoke"""
+    from src.agents import LangGraphAgent, create_query_router
+    from src.config import get_deepseek_config, get_router_config
+    from src.models import get_model, get_prompt
+    from src.tools import get_tools
+
+    config = get_deepseek_config()
+    llm = get_model(config=config)
+    router_config = get_router_config()
+    agent = LangGraphAgent(
+        llm=llm,
+        tools=get_tools(),
+        prompt_template=get_prompt(function_calling=config.function_calling),
+        router=create_query_router(**router_config.router_kwargs()) if router_config.enabled else None,
+        speculative_answer=router_config.speculative_answer,
+        early_tool_dispatch=router_config.early_tool_dispatch,
+    )
+
+    def call(index: int) -> float:
+        started = time.perf_counter()
+        agent.invoke(prompts[index % len(prompts)])
+        return time.perf_counter() - started
+
+    return _measure("agent", call, requests, concurrency)
+
+
+def run_app(prompts: List[str], requests: int, concurrency: int) -> Dict[str, Any]:
+    """以指定并发在进程内调用app.py的POST /chat"""
+    import httpx
+    import app as app_module
+
+    async def main() -> Dict[str, Any]:
+        semaphore = asyncio.Semaphore(concurrency)
+        application = app_module.app
+        # ASGITransport不会触发lifespan，需要手动执行启动和关闭
+        async with application.router.lifespan_context(application):
+            transport = httpx.ASGITransport(app=application)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+                async def call(index: int) -> float:
+                    async with semaphore:
+                        started = time.perf_counter()
+                        response = await client.post("/chat", json={"message": prompts[index % len(prompts)]})
+                        response.raise_for_status()
+                        return time.perf_counter() - started
+
+                return await _ameasure("app", call, requests, concurrency)
+
+    return asyncio.run(main())
+
+
+def _measure(target: str, call: Callable[[int], float], requests: int, concurrency: int) -> Dict[str, Any]:
+    latencies, errors = [], 0
+    cpu_started, started = time.process_time(), time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(call, index) for index in range(requests)]
+        for future in futures:
+            try:
+                latencies.append(future.result())
+            except Exception as e:
+                errors += 1
+                print(f"[{target}] 请求失败: {e}", file=sys.stderr)
+    return summarize(target, latencies, errors, time.perf_counter() - started, time.process_time() - cpu_started, concurrency)
+
+
+async def _ameasure(target: str, call: Callable[[int], Any], requests: int, concurrency: int) -> Dict[str, Any]:
+    cpu_started, started = time.process_time(), time.perf_counter()
+    results = await asyncio.gather(*(call(index) for index in range(requests)), return_exceptions=True)
+    latencies = [result for result in results if not isinstance(result, BaseException)]
+    for error in (result for result in results if isinstance(result, BaseException)):
+        print(f"[{target}] 请求失败: {error}", file=sys.stderr)
+    return summarize(
+        target, latencies, len(results) - len(latencies), time.perf_counter() - started,
+        time.process_time() - cpu_started, concurrency,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="端到端负载基准（使用模拟的DeepSeek服务）")
+    parser.add_argument("--target", nargs="+", choices=["agent", "app"], default=["agent", "app"], help="被测目标")
+    parser.add_argument("--requests", type=int, default=200, help="每个目标的请求数")
+    parser.add_argument("--concurrency", type=int, default=16, help="并发数")
+    parser.add_argument("--prompts", help="请求内容文件，每行一条，默认使用内置的计算/天气/闲聊组合")
+    parser.add_argument("--stream", action="store_true", help="以流式方式调用模型")
+    parser.add_argument("--function-calling", action="store_true", help="使用原生函数调用模式")
+    parser.add_argument("--llm-cache", action="store_true", help="启用LLM响应缓存（默认关闭以测量真实往返）")
+    parser.add_argument("--router", action="store_true", help="启用快速路由（算式、天气查询不调用LLM）")
+    parser.add_argument(
+        "--speculative-answer", choices=["off", "match", "presentable"], default="match",
+        help="工具执行后的推测回答模式（配合--speculate使用）"
+    )
+    parser.add_argument("--output", help="把JSON结果写入文件，默认输出到标准输出")
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    prompts = DEFAULT_PROMPTS
+    if args.prompts:
+        with open(args.prompts, encoding="utf-8") as f:
+            prompts = [line.strip() for line in f if line.strip()]
+
+    with MockDeepSeekServer(
+        latency=args.latency,
+        token_delay=args.token_delay,
+        error_rate=args.error_rate,
+        error_statuses=args.error_statuses,
+        rules=load_rules(args.rules),
+        seed=args.seed,
+        speculate=args.speculate,
+    ) as server:
+        # 配置在首次导入src.config时读取，必须在导入项目模块之前设置
+        os.environ.update({
+            "DEEPSEEK_API_KEY": "mock",
+            "DEEPSEEK_API_BASE_URL": server.url,
+            "DEEPSEEK_STREAMING": str(args.stream),
+            "DEEPSEEK_FUNCTION_CALLING": str(args.function_calling),
+            "DEEPSEEK_RETRY_BACKOFF": "0.01",
+            "AGENT_LLM_CACHE": str(args.llm_cache),
+            "AGENT_ROUTER": str(args.router),
+            "AGENT_SPECULATIVE_ANSWER": args.speculative_answer,
+        })
+        runners = {"agent": run_agent, "app": run_app}
+        results = []
+        for target in args.target:
+            before = server.stats()
+            result = runners[target](prompts, args.requests, args.concurrency)
+            after = server.stats()
+            result["mock"] = {key: after[key] - before[key] for key in after}
+            results.append(result)
+            print(
+                f"{target:>6}: {result['throughput_rps']:>8.1f} req/s  "
+                f"p50 {result['latency_ms']['p50']:>8.1f}ms  p95 {result['latency_ms']['p95']:>8.1f}ms  "
+                f"p99 {result['latency_ms']['p99']:>8.1f}ms  CPU {result['cpu_ms_per_request']:>7.2f}ms/req  "
+                f"errors {result['errors']}",
+                file=sys.stderr,
+            )
+
+    report = {
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "latency": args.latency,
+            "token_delay": args.token_delay,
+            "error_rate": args.error_rate,
+            "stream": args.stream,
+            "function_calling": args.function_calling,
+            "router": args.router,
+            "speculate": args.speculate,
+            "speculative_answer": args.speculative_answer,
+        },
+        "results": results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
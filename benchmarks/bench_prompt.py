@@ -0,0 +1,68 @@
+"""
+提示渲染微基准
+
+对比每一步完整渲染提示（拼接工具描述 + ChatPromptTemplate.format）与
+预渲染静态前缀后只拼接用户输入两种方式的单步耗时。
+
+用法:
+    python -m benchmarks.bench_prompt --tools 50 100 200 --steps 2000
+"""
+import argparse
+import timeit
+
+from langchain_core.messages import HumanMessage
+from langchain_core.tools import Tool
+
+from src.agents import LangGraphAgent
+from src.models import get_prompt
+
+
+def make_tools(count: int):
+    """构造指定数量、描述长度接近真实工具的模拟工具"""
+    return [
+        Tool(
+            name=f"tool_{i}",
+            description=f"模拟工具{i}，根据输入参数查询或计算相关信息，返回结构化的文本结果，用于性能测试",
+            func=lambda x: x,
+        )
+        for i in range(count)
+    ]
+
+
+def full_render(prompt, tools, user_input: str) -> str:
+    """未优化前_agent_node中的渲染方式"""
+    tool_descriptions = []
+    for tool in tools:
+        tool_descriptions.append(f"- {tool.name}: {tool.description}")
+    tools_str = "\n".join(tool_descriptions)
+    return prompt.format(tools=tools_str, input=user_input)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="提示渲染微基准")
+    parser.add_argument("--tools", type=int, nargs="+", default=[50, 100, 200], help="工具数量")
+    parser.add_argument("--steps", type=int, default=2000, help="每种情况模拟的步数")
+    args = parser.parse_args()
+
+    prompt = get_prompt()
+    state = {"messages": [HumanMessage(content="北京和上海今天的天气怎么样？")], "tool_calls": [], "tool_results": []}
+
+    print(f"{'工具数':>6} {'完整渲染(us/步)':>16} {'预渲染(us/步)':>14} {'加速比':>8}")
+    for count in args.tools:
+        tools = make_tools(count)
+        agent = LangGraphAgent(llm=None, tools=tools, prompt_template=prompt)
+        user_input = state["messages"][-1].content
+
+        # 两种方式必须得到完全相同的提示
+        assert agent._build_prompt(state) == full_render(prompt, tools, user_input)
+
+        full = timeit.timeit(lambda: full_render(prompt, tools, user_input), number=args.steps)
+        cached = timeit.timeit(lambda: agent._build_prompt(state), number=args.steps)
+        print(
+            f"{count:>6} {full / args.steps * 1e6:>16.1f} {cached / args.steps * 1e6:>14.1f}"
+            f" {full / cached:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
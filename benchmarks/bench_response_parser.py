@@ -0,0 +1,85 @@
+"""
+模型响应解析微基准
+
+对比原来的多次正则搜索（extract_tool_use + 回答提取）与单遍的parse_response，
+语料包括真实格式的响应和对抗性输入（无标记的100KB文本、大量"行动:"但没有结束标记等）。
+
+用法:
+    python -m benchmarks.bench_response_parser --repeat 20
+"""
+import argparse
+import json
+import re
+import timeit
+
+from src.agents.response_parser import parse_response
+
+
+def legacy_parse(text: str):
+    """优化前的extract_tool_use和_extract_answer（去掉print）"""
+    result = {}
+    action_match = re.search(r"行动:(.*?)(?:行动结果:|回答:)", text, re.DOTALL)
+    if action_match:
+        action_text = action_match.group(1).strip()
+        tool_name_match = re.search(r"使用工具:\s*(\w+)", action_text, re.DOTALL)
+        if tool_name_match:
+            params = {}
+            params_match = re.search(r"参数:(.*?)(?:$|行动结果:|回答:)", action_text, re.DOTALL)
+            if params_match:
+                params_text = params_match.group(1).strip()
+                for key, value in re.findall(r"(\w+):\s*([^,\n]+)", params_text):
+                    params[key.strip()] = value.strip()
+                if not params:
+                    json_match = re.search(r"\{(.*)\}", params_text, re.DOTALL)
+                    if json_match:
+                        try:
+                            params = json.loads("{" + json_match.group(1) + "}")
+                        except Exception:
+                            pass
+            result = {"name": tool_name_match.group(1).strip(), "params": params}
+    answer_match = re.search(r"回答:(.*?)(?:$|问题:|思考:|行动:)", text, re.DOTALL)
+    answer = answer_match.group(1).strip() if answer_match else None
+    return result, answer
+
+
+def make_corpus():
+    """构造基准语料：名称 -> 响应文本"""
+    filler = "这是一段很长的模型输出，没有任何协议标记。" * 5000
+    return {
+        "工具调用": (
+            "问题: 北京的天气怎么样\n思考: 用户想知道北京的天气，我可以使用天气工具来查询。\n"
+            "行动: \n使用工具: weather\n参数: location: 北京\n"
+            "行动结果: 北京的天气: 晴朗，温度26°C\n回答: 根据查询结果，北京目前天气晴朗，温度为26°C。"
+        ),
+        "JSON参数": (
+            "思考: 需要计算\n行动: \n使用工具: calculator\n参数: {\"expression\": \"(3+4)*12/7\"}\n"
+            "行动结果: 计算结果: 12\n回答: 结果是12。"
+        ),
+        "直接回答": "思考: 这是寒暄，不需要工具。\n回答: 你好！有什么可以帮你的吗？",
+        "100KB无标记": filler,
+        "100KB长回答": "思考: 写一篇长文\n回答: " + filler,
+        "大量行动无结束": "行动: 使用工具: x\n" * 5000,
+        "大量回答无结束": ("回答: " + "字" * 20) * 2000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模型响应解析微基准")
+    parser.add_argument("--repeat", type=int, default=20, help="每条语料重复解析的次数")
+    args = parser.parse_args()
+
+    print(f"{'语料':<12} {'长度':>8} {'原实现(us)':>12} {'单遍解析(us)':>14} {'加速比':>8}")
+    for name, text in make_corpus().items():
+        # 常规格式上两种实现必须给出相同的结果
+        if len(text) < 1000:
+            tool_call, answer = legacy_parse(text)
+            parsed = parse_response(text)
+            assert (parsed.tool_calls[:1] or [{}])[0] == tool_call and parsed.answer == answer, name
+
+        legacy = timeit.timeit(lambda: legacy_parse(text), number=args.repeat) / args.repeat
+        single = timeit.timeit(lambda: parse_response(text), number=args.repeat) / args.repeat
+        print(f"{name:<12} {len(text):>8} {legacy * 1e6:>12.1f} {single * 1e6:>14.1f} {legacy / single:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
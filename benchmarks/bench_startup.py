@@ -0,0 +1,149 @@
+"""
+冷启动基准
+
+每次在新的Python进程中测量以下阶段，重复多次后报告中位数和最小值（毫秒）：
+- import: 导入app模块（创建FastAPI应用、注册路由）
+- startup: 执行lifespan启动（读取配置、创建工具/模型/会话存储/Agent）
+- first_agent / next_agent: 同一进程内创建第一个和第二个Agent（第二个复用编译后的状态图和预渲染提示）
+- first_request: 启动后第一个/chat请求（使用模拟的DeepSeek服务）
+另外测量 cli.py --help 和 cli.py --export-graph 的整个进程耗时，
+并可用 -X importtime 列出导入app时累计耗时最多的模块。
+
+用法:
+    python -m benchmarks.bench_startup --runs 10 --top-imports 15 --output bench_startup.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def child(first_request: bool) -> Dict[str, float]:
+    """在当前（全新的）进程中依次测量各阶段耗时"""
+    timings: Dict[str, float] = {}
+    server = None
+    if first_request:
+        from benchmarks.mock_deepseek import MockDeepSeekServer
+        server = MockDeepSeekServer(latency="0").start()
+        os.environ["DEEPSEEK_API_BASE_URL"] = server.url
+    os.environ.setdefault("DEEPSEEK_API_KEY", "mock")
+
+    started = time.perf_counter()
+    import app as app_module
+    timings["import"] = time.perf_counter() - started
+
+    async def run() -> None:
+        application = app_module.app
+        async with application.router.lifespan_context(application):
+            timings["startup"] = time.perf_counter() - started - timings["import"]
+
+            from src.agents import LangGraphAgent
+            state = application.state
+            for phase in ("first_agent", "next_agent"):
+                phase_started = time.perf_counter()
+                LangGraphAgent(llm=state.llm, tools=state.tools, prompt_template=state.agent.prompt)
+                timings[phase] = time.perf_counter() - phase_started
+
+            if first_request:
+                import httpx
+                transport = httpx.ASGITransport(app=application)
+                async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                    request_started = time.perf_counter()
+                    response = await client.post("/chat", json={"message": "计算 2+3*4"})
+                    response.raise_for_status()
+                    timings["first_request"] = time.perf_counter() - request_started
+
+    try:
+        asyncio.run(run())
+    finally:
+        if server is not None:
+            server.stop()
+    return timings
+
+
+def run_process(args: List[str]) -> float:
+    """运行一个子进程并返回耗时（秒）"""
+    started = time.perf_counter()
+    subprocess.run([sys.executable, *args], cwd=ROOT, check=True, capture_output=True)
+    return time.perf_counter() - started
+
+
+def top_imports(count: int) -> List[Dict[str, Any]]:
+    """用 -X importtime 找出导入app时累计耗时最多的顶层模块"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit() and not name.startswith("  "):
+            # 缩进表示被其他模块间接导入，只统计顶层
+            modules.append({"module": name.strip(), "cumulative_ms": int(cumulative) / 1000})
+    modules.sort(key=lambda item: item["cumulative_ms"], reverse=True)
+    return modules[:count]
+
+
+def summarize(samples: Dict[str, List[float]]) -> Dict[str, Dict[str, float]]:
+    return {
+        phase: {
+            "median_ms": round(statistics.median(values) * 1000, 2),
+            "min_ms": round(min(values) * 1000, 2),
+        }
+        for phase, values in samples.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="冷启动基准")
+    parser.add_argument("--runs", type=int, default=5, help="每项测量的进程数")
+    parser.add_argument("--no-request", action="store_true", help="不测量第一个/chat请求")
+    parser.add_argument("--top-imports", type=int, default=10, help="列出导入耗时最多的模块数，0表示不统计")
+    parser.add_argument("--output", help="把JSON结果写入文件，默认输出到标准输出")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(child(first_request=not args.no_request)))
+        return
+
+    samples: Dict[str, List[float]] = {}
+    child_args = ["-m", "benchmarks.bench_startup", "--child"] + (["--no-request"] if args.no_request else [])
+    with tempfile.TemporaryDirectory() as tmp:
+        graph_path = os.path.join(tmp, "agent_state_graph.mmd")
+        for _ in range(args.runs):
+            result = subprocess.run(
+                [sys.executable, *child_args], cwd=ROOT, capture_output=True, text=True, check=True
+            )
+            for phase, value in json.loads(result.stdout.strip().splitlines()[-1]).items():
+                samples.setdefault(phase, []).append(value)
+            samples.setdefault("cli_help", []).append(run_process(["cli.py", "--help"]))
+            samples.setdefault("cli_export_graph", []).append(run_process(["cli.py", "--export-graph", graph_path]))
+
+    report: Dict[str, Any] = {"runs": args.runs, "phases": summarize(samples)}
+    if args.top_imports:
+        report["top_imports"] = top_imports(args.top_imports)
+
+    for phase, stats in report["phases"].items():
+        print(f"{phase:>18}: median {stats['median_ms']:>9.2f}ms  min {stats['min_ms']:>9.2f}ms", file=sys.stderr)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
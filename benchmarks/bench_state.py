@@ -0,0 +1,196 @@
+"""
+状态图单步开销与检查点大小基准
+
+用与Agent相同结构的状态图（agent -> action -> process_tool -> agent循环，节点不调用模型和工具），
+在会话历史增长到数千条消息时对比三种方式：
+- full: 旧的状态定义，节点原地修改并返回整个状态，每一步都写回所有字段
+- delta: 带reducer的AgentState，节点只返回本步骤新增或改变的字段，每一步写入检查点
+- delta_exit: 同上，但只在请求结束时写入一次检查点（LangGraphAgent的默认设置）
+报告每个步骤的平均耗时、每个请求写入检查点的字节数和请求结束时检查点中状态的大小。
+
+用法:
+    python -m benchmarks.bench_state --history 10 100 1000 5000 --requests 20 --rounds 2 --store memory
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Tuple, TypedDict, Union
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langgraph.graph import END, StateGraph
+from langgraph.types import Overwrite
+
+from src.agents import AgentState
+from src.memory import create_conversation_store
+
+
+class FullState(TypedDict):
+    """改为reducer之前的状态定义：所有字段都是整体覆盖"""
+    messages: List[Union[HumanMessage, AIMessage, SystemMessage]]
+    tool_calls: List[Dict[str, Any]]
+    tool_results: List[Dict[str, Any]]
+    summary: str
+    stop_reason: str
+
+
+def _tool_call(state: Dict[str, Any], rounds: int) -> List[Dict[str, Any]]:
+    """本次请求还没有执行够rounds轮工具调用时返回一个工具调用"""
+    if len(state["tool_results"]) < rounds:
+        return [{"name": "calculator", "params": {"expression": "2+3*4"}}]
+    return []
+
+
+def _route(state: Dict[str, Any]) -> str:
+    return "action" if state.get("tool_calls") else "end"
+
+
+def _compile(state_type: type, nodes: Dict[str, Any], checkpointer: Any) -> Any:
+    graph = StateGraph(state_type)
+    for name, node in nodes.items():
+        graph.add_node(name, node)
+    graph.add_conditional_edges("agent", _route, {"action": "action", "end": END})
+    graph.add_edge("action", "process_tool")
+    graph.add_edge("process_tool", "agent")
+    graph.set_entry_point("agent")
+    return graph.compile(checkpointer=checkpointer)
+
+
+def build_full_graph(checkpointer: Any, rounds: int) -> Any:
+    """节点原地修改并返回整个状态"""
+    def agent(state):
+        state["tool_calls"] = _tool_call(state, rounds)
+        state["messages"].append(AIMessage(content="思考: 需要使用工具。" if state["tool_calls"] else "回答: 14"))
+        return state
+
+    def action(state):
+        state["tool_results"].append({"tool_name": "calculator", "params": {}, "result": "计算结果: 14"})
+        return state
+
+    def process_tool(state):
+        state["messages"].append(HumanMessage(content="工具 calculator 执行结果: 计算结果: 14"))
+        state["tool_calls"] = []
+        return state
+
+    return _compile(FullState, {"agent": agent, "action": action, "process_tool": process_tool}, checkpointer)
+
+
+def build_delta_graph(checkpointer: Any, rounds: int) -> Any:
+    """节点只返回本步骤的增量"""
+    def agent(state):
+        tool_calls = _tool_call(state, rounds)
+        content = "思考: 需要使用工具。" if tool_calls else "回答: 14"
+        return {"messages": [AIMessage(content=content)], "tool_calls": tool_calls}
+
+    def action(state):
+        return {"tool_results": [{"tool_name": "calculator", "params": {}, "result": "计算结果: 14"}]}
+
+    def process_tool(state):
+        return {"messages": [HumanMessage(content="工具 calculator 执行结果: 计算结果: 14")], "tool_calls": []}
+
+    return _compile(AgentState, {"agent": agent, "action": action, "process_tool": process_tool}, checkpointer)
+
+
+def make_history(count: int) -> List[Any]:
+    """构造长度为count、问答交替的会话历史"""
+    return [
+        HumanMessage(content=f"第{i}个问题：北京的天气怎么样") if i % 2 == 0
+        else AIMessage(content=f"第{i}个回答：北京目前天气晴朗，温度26°C")
+        for i in range(count)
+    ]
+
+
+class WriteMeter:
+    """统计写入检查点的字节数：按存储的序列化方式计算每次写入的新通道值"""
+
+    def __init__(self, checkpointer: Any):
+        self.bytes = 0
+        self._put = checkpointer.put
+        self._serde = checkpointer.serde
+        checkpointer.put = self.put
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        values = checkpoint["channel_values"]
+        self.bytes += sum(
+            len(self._serde.dumps_typed(values[channel])[1]) for channel in new_versions if channel in values
+        )
+        return self._put(config, checkpoint, metadata, new_versions)
+
+
+def run_variant(variant: str, history: int, requests: int, rounds: int, store: str, tmp: str) -> Dict[str, Any]:
+    kwargs: Dict[str, Any] = {"ttl": None}
+    if store == "sqlite":
+        kwargs["path"] = os.path.join(tmp, f"{variant}_{history}.sqlite")
+    checkpointer = create_conversation_store(store, **kwargs)
+    build = build_full_graph if variant == "full" else build_delta_graph
+    graph = build(checkpointer, rounds)
+    durability = "exit" if variant == "delta_exit" else "async"
+    config = {"configurable": {"thread_id": "bench"}}
+
+    # 先写入指定长度的会话历史
+    seed = make_history(history)
+    graph.update_state(config, {"messages": seed if variant == "full" else Overwrite(seed)}, as_node="agent")
+    meter = WriteMeter(checkpointer)
+
+    steps = 3 * rounds + 1
+    started = time.perf_counter()
+    for i in range(requests):
+        query = HumanMessage(content=f"计算 {i}+3*4")
+        if variant == "full":
+            # 旧的调用方式：先读出会话状态，再把完整的消息列表作为输入
+            previous = graph.get_state(config).values
+            state = {
+                "messages": list(previous["messages"]) + [query],
+                "tool_calls": [], "tool_results": [], "summary": previous.get("summary", ""), "stop_reason": "",
+            }
+        else:
+            state = {"messages": [query], "tool_calls": [], "tool_results": Overwrite([]), "stop_reason": ""}
+        graph.invoke(state, config, durability=durability)
+    elapsed = time.perf_counter() - started
+
+    values = graph.get_state(config).values
+    return {
+        "variant": variant,
+        "history": history,
+        "step_us": round(elapsed / (requests * steps) * 1e6, 1),
+        "request_ms": round(elapsed / requests * 1000, 3),
+        "written_kb_per_request": round(meter.bytes / requests / 1024, 1),
+        "state_kb": round(len(checkpointer.serde.dumps_typed(values)[1]) / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="状态图单步开销与检查点大小基准")
+    parser.add_argument("--history", type=int, nargs="+", default=[10, 100, 1000, 5000], help="会话历史的消息数")
+    parser.add_argument("--requests", type=int, default=20, help="每种方式执行的请求数")
+    parser.add_argument("--rounds", type=int, default=2, help="每个请求的工具调用轮数")
+    parser.add_argument("--store", choices=["memory", "sqlite"], default="memory", help="会话存储后端")
+    parser.add_argument("--variants", nargs="+", default=["full", "delta", "delta_exit"], help="对比的方式")
+    parser.add_argument("--output", help="把JSON结果写入文件，默认输出到标准输出")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for history in args.history:
+            for variant in args.variants:
+                result = run_variant(variant, history, args.requests, args.rounds, args.store, tmp)
+                results.append(result)
+                print(
+                    f"history={history:>6} {variant:>10}: {result['step_us']:>9.1f}us/step  "
+                    f"{result['written_kb_per_request']:>9.1f}KB written/request  state {result['state_kb']:>8.1f}KB",
+                    file=sys.stderr,
+                )
+
+    report = {"requests": args.requests, "rounds": args.rounds, "store": args.store, "results": results}
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+工具注册表基准
+
+在临时插件目录中生成不同数量的工具（每个文件一个工具，导入时模拟import_ms毫秒的依赖加载开销），对比:
+- 注册: 静态扫描插件目录（不导入）与逐个导入全部插件模块的耗时
+- 选择: 每个查询从注册表中选出top-k工具的耗时，以及目标工具出现在top-k中的比例（recall@k）
+- 提示: 提示中放入全部工具与只放入选出的工具时的token数
+- 导入: 处理一批查询（渲染提示并执行选出的第一个工具）后实际导入的插件模块数
+
+用法:
+    python -m benchmarks.bench_tools --tools 10 100 1000 --top-k 8 --queries 200 --import-ms 2
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from langchain_core.messages import HumanMessage
+
+from src.agents import LangGraphAgent, TokenCounter
+from src.models import get_prompt
+from src.tools import ToolRegistry, create_tool_registry
+
+_TOPICS = [
+    "股票", "基金", "汇率", "航班", "火车", "酒店", "快递", "电影", "音乐", "新闻", "体育", "彩票", "油价", "房价",
+    "地铁", "公交", "路况", "停车", "医院", "药品", "菜谱", "餐厅", "外卖", "快递柜", "邮编", "区号", "节假日",
+    "农历", "星座", "翻译", "词典", "百科", "专利", "商标", "公司", "招聘", "课程", "考试", "图书", "论文",
+]
+_ATTRIBUTES = [
+    "价格", "行情", "排名", "评分", "时刻表", "余票", "位置", "营业时间", "电话", "评价", "库存", "进度", "详情",
+    "历史记录", "变化趋势", "统计数据", "最新公告", "推荐列表", "对比结果", "预测", "优惠信息", "开放状态",
+    "排队情况", "联系方式", "使用说明",
+]
+
+_PLUGIN_TEMPLATE = '''import time
+from typing import ClassVar, Tuple
+from langchain_core.tools import BaseTool
+
+time.sleep({import_s})  # 模拟导入依赖的开销
+
+
+class Tool{index}(BaseTool):
+    name: str = "tool_{index}"
+    description: str = "查询{topic}的{attribute}，返回最新的结构化数据"
+    keywords: ClassVar[Tuple[str, ...]] = ({topic!r}, {attribute!r})
+
+    def _run(self, query: str = "") -> str:
+        return "{topic}的{attribute}: 示例结果"
+'''
+
+
+def write_plugins(directory: str, count: int, import_ms: float) -> List[Dict[str, Any]]:
+    """生成count个插件文件，返回每个工具的主题和属性"""
+    specs = []
+    for index in range(count):
+        topic = _TOPICS[index % len(_TOPICS)]
+        attribute = _ATTRIBUTES[(index // len(_TOPICS)) % len(_ATTRIBUTES)]
+        with open(os.path.join(directory, f"plugin_{index}.py"), "w", encoding="utf-8") as f:
+            f.write(_PLUGIN_TEMPLATE.format(
+                index=index, topic=topic, attribute=attribute, import_s=import_ms / 1000
+            ))
+        specs.append({"name": f"tool_{index}", "topic": topic, "attribute": attribute})
+    return specs
+
+
+def plugin_modules() -> int:
+    return sum(1 for name in sys.modules if name.startswith("agent_tool_plugin_"))
+
+
+def run(count: int, top_k: int, queries: int, import_ms: float, seed: int) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    counter = TokenCounter()
+    prompt = get_prompt()
+    with tempfile.TemporaryDirectory() as directory:
+        specs = write_plugins(directory, count, import_ms)
+        for name in [name for name in sys.modules if name.startswith("agent_tool_plugin_")]:
+            del sys.modules[name]
+
+        started = time.perf_counter()
+        registry = create_tool_registry(plugin_dirs=[directory], entry_points=False, builtins=False)
+        scan_ms = (time.perf_counter() - started) * 1000
+
+        # 对照：启动时导入全部插件（相当于硬编码的工具列表）
+        eager = ToolRegistry()
+        eager.add_plugin_dir(directory)
+        started = time.perf_counter()
+        for tool in eager:
+            tool.load()
+        eager_ms = (time.perf_counter() - started) * 1000
+        for name in [name for name in sys.modules if name.startswith("agent_tool_plugin_")]:
+            del sys.modules[name]
+
+        targets = [rng.choice(specs) for _ in range(queries)]
+        texts = [f"帮我看看{target['topic']}的{target['attribute']}" for target in targets]
+        started = time.perf_counter()
+        selections = [registry.select(text, top_k) for text in texts]
+        select_us = (time.perf_counter() - started) / queries * 1e6
+        recall = sum(
+            target["name"] in [tool.name for tool in selected] for target, selected in zip(targets, selections)
+        ) / queries
+
+        full_agent = LangGraphAgent(llm=None, tools=list(registry), prompt_template=prompt)
+        agent = LangGraphAgent(llm=None, tools=[], prompt_template=prompt, tool_registry=registry, max_tools=top_k)
+        full_tokens = selected_tokens = 0
+        for text, selected in zip(texts, selections):
+            state = {"messages": [HumanMessage(content=text)], "tool_names": [tool.name for tool in selected]}
+            full_tokens += counter.count(full_agent._build_prompt(state))
+            selected_tokens += counter.count(agent._build_prompt(state))
+            if selected:
+                selected[0]._run(query=text)
+
+        return {
+            "tools": count,
+            "scan_ms": round(scan_ms, 1),
+            "eager_import_ms": round(eager_ms, 1),
+            "select_us": round(select_us, 1),
+            "recall_at_k": round(recall, 3),
+            "prompt_tokens_all": round(full_tokens / queries),
+            "prompt_tokens_top_k": round(selected_tokens / queries),
+            "imported_modules": plugin_modules(),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="工具注册表基准")
+    parser.add_argument("--tools", type=int, nargs="+", default=[10, 100, 1000], help="注册表中的工具数")
+    parser.add_argument("--top-k", type=int, default=8, help="每个请求选出的工具数")
+    parser.add_argument("--queries", type=int, default=200, help="每种工具数下的查询数")
+    parser.add_argument("--import-ms", type=float, default=2.0, help="每个插件模块导入时模拟的开销（毫秒）")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--output", help="把JSON结果写入文件，默认输出到标准输出")
+    args = parser.parse_args()
+
+    results = []
+    for count in args.tools:
+        result = run(count, args.top_k, args.queries, args.import_ms, args.seed)
+        results.append(result)
+        print(
+            f"tools={count:>5}: scan {result['scan_ms']:>8.1f}ms (eager import {result['eager_import_ms']:>8.1f}ms)  "
+            f"select {result['select_us']:>7.1f}us  recall@{args.top_k} {result['recall_at_k']:.3f}  "
+            f"prompt {result['prompt_tokens_all']:>6} -> {result['prompt_tokens_top_k']:>4} tokens  "
+            f"imported {result['imported_modules']}",
+            file=sys.stderr,
+        )
+
+    report = {"top_k": args.top_k, "queries": args.queries, "import_ms": args.import_ms, "results": results}
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,378 @@
+"""
+本地模拟的DeepSeek chat/completions服务
+
+把DeepSeekConfig.api_base_url（或环境变量DEEPSEEK_API_BASE_URL）指向它即可在不消耗API额度的情况下
+运行Agent。支持可配置的延迟分布、SSE流式输出、按规则编排的工具调用响应（文本协议和原生tool_calls）
+以及错误注入。
+
+用法:
+    python -m benchmarks.mock_deepseek --port 8089 --latency lognormal:0.3,0.5 --error-rate 0.02
+
+    with MockDeepSeekServer(latency="fixed:0.05") as server:
+        config = DeepSeekConfig(api_key="mock", api_base_url=server.url)
+"""
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+# 提示中当前输入所在的位置（见LangGraphAgent._render_input和ChatPromptTemplate的渲染格式）
+_HUMAN_MARKER = "Human: "
+_CURRENT_INPUT_MARKER = "当前输入: "
+_TOOL_RESULT_PATTERN = re.compile(r"^工具 .+? 执行(?:结果|失败)")
+_EXPRESSION_PATTERN = re.compile(r"[\d.()\s]*\d\s*[-+*/^%]\s*[\d.()\s+\-*/^%]*\d\)?")
+_WEATHER_PATTERN = re.compile(r"([一-龥A-Za-z]+?)(?:今天|现在|明天)?的?天气")
+
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    """
+    解析延迟分布
+
+    支持的形式（单位为秒）:
+        0.2 / fixed:0.2            固定延迟
+        uniform:0.1,0.5            均匀分布
+        normal:0.3,0.1             正态分布（截断到0）
+        lognormal:0.3,0.5          对数正态分布，参数为中位数和sigma
+        exp:0.3                    指数分布，参数为均值
+
+    Returns:
+        每次调用返回一个延迟样本的函数
+    """
+    kind, _, args = spec.partition(":")
+    if not args:
+        kind, args = "fixed", kind
+    values = [float(value) for value in args.split(",")]
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda: max(0.0, random.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        return lambda: random.lognormvariate(math.log(values[0]), values[1])
+    if kind == "exp":
+        return lambda: random.expovariate(1 / values[0]) if values[0] > 0 else 0.0
+    raise ValueError(f"未知的延迟分布: {spec}")
+
+
+def current_input(prompt: str) -> str:
+    """从Agent渲染的提示中取出当前这一步的输入"""
+    text = prompt.rsplit(_HUMAN_MARKER, 1)[-1]
+    return text.rsplit(_CURRENT_INPUT_MARKER, 1)[-1].strip()
+
+
+class ScriptedResponder:
+    """
+    按规则生成模拟响应
+
+    规则按顺序匹配当前输入，第一条匹配的规则决定响应：
+        [{"match": "天气", "content": "回答: 晴"},
+         {"match": "\\\\d", "tool_calls": [{"name": "calculator", "arguments": {"expression": "1+1"}}]}]
+    tool_calls在请求带有tools字段时以原生tool_calls返回，否则渲染为行动/使用工具/参数文本协议，
+    规则中的action_result和answer作为协议中推测的"行动结果:"和"回答:"。
+    没有规则匹配时：当前输入是工具结果则给出回答；包含天气查询或算式时调用对应工具；否则直接回答。
+    """
+
+    def __init__(self, rules: Optional[Sequence[Dict[str, Any]]] = None, speculate: float = 0.0):
+        """
+        Args:
+            rules: 响应规则
+            speculate: 默认的工具调用响应中按实际工具结果写出行动结果和回答的比例，其余写占位文本
+        """
+        self.rules = [dict(rule, pattern=re.compile(rule.get("match", ""))) for rule in rules or []]
+        self.speculate = speculate
+        self._tools: Optional[Dict[str, Any]] = None
+
+    def respond(self, prompt: str) -> Dict[str, Any]:
+        """
+        Returns:
+            {"content": 文本, "tool_calls": [{"name": ..., "arguments": {...}}]}
+        """
+        query = current_input(prompt)
+        for rule in self.rules:
+            if rule["pattern"].search(query):
+                return {
+                    "content": rule.get("content", ""),
+                    "tool_calls": rule.get("tool_calls", []),
+                    "action_result": rule.get("action_result"),
+                    "answer": rule.get("answer"),
+                }
+
+        if _TOOL_RESULT_PATTERN.match(query):
+            results = "；".join(line.split(": ", 1)[-1] for line in query.splitlines())
+            return {"content": f"思考: 已得到工具结果。\n回答: 根据查询结果，{results}", "tool_calls": []}
+
+        weather = _WEATHER_PATTERN.search(query)
+        if weather:
+            return self._tool_response({"name": "weather", "arguments": {"location": weather.group(1)}})
+
+        expression = _EXPRESSION_PATTERN.search(query)
+        if expression:
+            return self._tool_response({"name": "calculator", "arguments": {"expression": expression.group(0).strip()}})
+
+        return {"content": f"思考: 不需要使用工具。\n回答: 这是对“{query[:50]}”的模拟回答。", "tool_calls": []}
+
+    def _tool_response(self, call: Dict[str, Any]) -> Dict[str, Any]:
+        """调用一个工具的响应；按speculate的比例用项目中的工具算出实际结果，作为推测的行动结果"""
+        response = {"content": "", "tool_calls": [call]}
+        if self.speculate > 0 and random.random() < self.speculate:
+            if self._tools is None:
+                from src.tools import get_tools
+                self._tools = {tool.name: tool for tool in get_tools()}
+            result = self._tools[call["name"]]._run(**call["arguments"])
+            response.update(action_result=result, answer=f"根据查询结果，{result}")
+        return response
+
+    @staticmethod
+    def render_protocol(query: str, response: Dict[str, Any]) -> str:
+        """把工具调用渲染为SYSTEM_PROMPT中的文本协议"""
+        if not response["tool_calls"]:
+            return response["content"]
+        lines = [f"问题: {query}", "思考: 需要使用工具。", "行动: "]
+        for call in response["tool_calls"]:
+            params = ", ".join(f"{key}: {value}" for key, value in call["arguments"].items())
+            lines += [f"使用工具: {call['name']}", f"参数: {params}"]
+        lines += [
+            f"行动结果: {response.get('action_result') or '等待工具返回'}",
+            f"回答: {response.get('answer') or '稍后给出'}",
+        ]
+        return "\n".join(lines)
+
+
+class MockDeepSeekServer:
+    """
+    模拟的DeepSeek API服务，在后台线程中运行
+
+    每个请求先按latency分布等待（模拟排队和首token时间），流式请求之后每个文本块再等待token_delay；
+    按error_rate的概率返回error_statuses中的错误码（429附带Retry-After）。
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: str = "fixed:0",
+        token_delay: float = 0.0,
+        chunk_size: int = 4,
+        error_rate: float = 0.0,
+        error_statuses: Sequence[int] = (429, 500, 503),
+        rules: Optional[Sequence[Dict[str, Any]]] = None,
+        seed: Optional[int] = None,
+        speculate: float = 0.0,
+    ):
+        """
+        Args:
+            host: 监听地址
+            port: 监听端口，0表示随机分配
+            latency: 响应延迟分布，格式见parse_latency
+            token_delay: 流式输出中每个文本块之间的间隔（秒）
+            chunk_size: 流式输出每个文本块的字符数
+            error_rate: 注入错误的概率
+            error_statuses: 注入错误时随机选择的HTTP状态码
+            rules: ScriptedResponder的响应规则
+            seed: 随机数种子，便于复现
+            speculate: 工具调用响应中写出正确的推测行动结果和回答的比例，见ScriptedResponder
+        """
+        if seed is not None:
+            random.seed(seed)
+        self.sample_latency = parse_latency(latency)
+        self.token_delay = token_delay
+        self.chunk_size = max(1, chunk_size)
+        self.error_rate = error_rate
+        self.error_statuses = list(error_statuses)
+        self.responder = ScriptedResponder(rules, speculate=speculate)
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "streamed": 0, "tool_calls": 0, "errors_injected": 0}
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def stats(self) -> Dict[str, int]:
+        """获取请求数、流式请求数、返回的工具调用数和注入的错误数"""
+        with self._lock:
+            return dict(self._stats)
+
+    def _count(self, key: str, amount: int = 1) -> None:
+        with self._lock:
+            self._stats[key] += amount
+
+    def completion(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        生成一次chat/completions响应中的message和usage
+
+        Returns:
+            {"message": {...}, "usage": {...}}
+        """
+        prompt = "\n".join(str(message.get("content") or "") for message in payload.get("messages", []))
+        response = self.responder.respond(prompt)
+        message: Dict[str, Any] = {"role": "assistant"}
+        if payload.get("tools") and response["tool_calls"]:
+            message["content"] = response["content"] or None
+            message["tool_calls"] = [
+                {
+                    "id": f"call_{uuid.uuid4().hex[:12]}",
+                    "type": "function",
+                    "function": {"name": call["name"], "arguments": json.dumps(call["arguments"], ensure_ascii=False)},
+                }
+                for call in response["tool_calls"]
+            ]
+        else:
+            message["content"] = self.responder.render_protocol(current_input(prompt), response)
+        self._count("tool_calls", len(response["tool_calls"]))
+        usage = {
+            "prompt_tokens": len(prompt) // 2,
+            "completion_tokens": len(message.get("content") or "") // 2 + 10 * len(response["tool_calls"]),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        return {"message": message, "usage": usage}
+
+    def _handler(self) -> type:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+            def _reply(self, status: int, body: Any, headers: Optional[Dict[str, str]] = None) -> None:
+                data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_event(self, data: str) -> None:
+                chunk = f"data: {data}\n\n".encode("utf-8")
+                self.wfile.write(f"{len(chunk):x}\r\n".encode("ascii") + chunk + b"\r\n")
+                self.wfile.flush()
+
+            def do_POST(self) -> None:
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    return self._reply(404, {"error": {"message": "not found"}})
+                payload = json.loads(body or b"{}")
+                server._count("requests")
+                time.sleep(server.sample_latency())
+
+                if server.error_rate and random.random() < server.error_rate:
+                    server._count("errors_injected")
+                    status = random.choice(server.error_statuses)
+                    headers = {"Retry-After": "0"} if status == 429 else None
+                    return self._reply(status, {"error": {"message": "injected error", "code": status}}, headers)
+
+                result = server.completion(payload)
+                response_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+                if not payload.get("stream"):
+                    return self._reply(200, {
+                        "id": response_id,
+                        "object": "chat.completion",
+                        "model": payload.get("model"),
+                        "choices": [{"index": 0, "message": result["message"], "finish_reason": "stop"}],
+                        "usage": result["usage"],
+                    })
+
+                server._count("streamed")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                content = result["message"].get("content") or ""
+                try:
+                    for start in range(0, len(content), server.chunk_size):
+                        if server.token_delay:
+                            time.sleep(server.token_delay)
+                        delta = {"content": content[start:start + server.chunk_size]}
+                        self._send_event(json.dumps(
+                            {"id": response_id, "choices": [{"index": 0, "delta": delta}]}, ensure_ascii=False
+                        ))
+                    if (payload.get("stream_options") or {}).get("include_usage"):
+                        self._send_event(json.dumps({"id": response_id, "choices": [], "usage": result["usage"]}))
+                    self._send_event("[DONE]")
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    # 客户端提前派发工具调用后会主动断开流
+                    self.close_connection = True
+
+        return Handler
+
+    def start(self) -> "MockDeepSeekServer":
+        """在后台线程中启动服务"""
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """停止服务"""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "MockDeepSeekServer":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+
+def load_rules(path: Optional[str]) -> List[Dict[str, Any]]:
+    """从JSON文件读取响应规则"""
+    if not path:
+        return []
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def add_server_arguments(parser: argparse.ArgumentParser) -> None:
+    """添加模拟服务的命令行参数（供负载驱动复用）"""
+    parser.add_argument("--latency", default="lognormal:0.2,0.4", help="响应延迟分布，例如fixed:0.1、uniform:0.1,0.5")
+    parser.add_argument("--token-delay", type=float, default=0.005, help="流式输出每个文本块之间的间隔（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="注入错误的概率")
+    parser.add_argument("--error-statuses", type=int, nargs="+", default=[429, 500, 503], help="注入的错误码")
+    parser.add_argument("--rules", help="响应规则JSON文件")
+    parser.add_argument("--seed", type=int, help="随机数种子")
+    parser.add_argument("--speculate", type=float, default=0.0, help="工具调用响应中写出正确的推测行动结果和回答的比例")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模拟的DeepSeek chat/completions服务")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=8089, help="监听端口")
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    server = MockDeepSeekServer(
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        token_delay=args.token_delay,
+        error_rate=args.error_rate,
+        error_statuses=args.error_statuses,
+        rules=load_rules(args.rules),
+        seed=args.seed,
+        speculate=args.speculate,
+    )
+    print(f"模拟DeepSeek服务已启动: {server.url}（设置DEEPSEEK_API_BASE_URL={server.url}）")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,13 +2,9 @@ import os
 import argparse
 import sys
 import pdb
+import uuid
 from typing import Dict, Any
 
-from src.tools import get_tools
-from src.models import get_model, get_prompt
-from src.agents import LangGraphAgent
-from src.config import get_deepseek_config
-
 def main():
     """主函数"""
     # 解析命令行参数
@@ -17,7 +13,29 @@ def main():
     parser.add_argument("--debug", "-d", action="store_true", help="启用调试模式")
     parser.add_argument("--pdb", action="store_true", help="启用pdb调试器")
     parser.add_argument("--breakpoint", action="store_true", help="在初始化后立即设置断点")
+    parser.add_argument("--export-graph", metavar="PATH", help="导出Agent状态图后退出（.mmd/.md为Mermaid，.png/.svg/.pdf需要graphviz）")
+    parser.add_argument("--input", metavar="PATH", help="批量模式：逐行读取JSONL输入（{\"message\": ..., \"id\": ...}），处理完后退出")
+    parser.add_argument("--output", metavar="PATH", help="批量模式的结果JSONL文件，已存在时跳过其中已完成的条目继续运行")
+    parser.add_argument("--concurrency", type=int, help="批量模式同时处理的条目数（默认取AGENT_BATCH_CONCURRENCY）")
+    parser.add_argument("--retry-errors", action="store_true", help="批量模式续跑时重新运行上次失败的条目")
     args = parser.parse_args()
+    if args.input and not args.output:
+        parser.error("--input需要同时指定--output")
+    
+    # 导出状态图不需要模型和工具，导出后直接退出
+    if args.export_graph:
+        from src.agents import export_graph
+        print(f"状态图已保存为 {export_graph(args.export_graph)}")
+        return
+    
+    # 在解析参数之后才导入模型和Agent，--help和--export-graph不需要加载它们
+    from src.tools import get_tool_registry
+    from src.models import get_model, get_prompt
+    from src.agents import LangGraphAgent, ContextWindowManager, LLMSummarizer, create_query_router
+    from src.config import (
+        get_budget_config, get_deepseek_config, get_memory_config, get_router_config, get_tool_config
+    )
+    from src.memory import create_conversation_store
     
     # 如果启用了pdb，设置sys.breakpointhook为pdb.set_trace
     if args.pdb:
@@ -26,23 +44,46 @@ def main():
     # 获取配置
     config = get_deepseek_config()
     
-    # 初始化工具
-    tools = get_tools()
+    # 初始化工具：内置工具、entry point和插件目录中的工具登记在注册表中，第一次使用时才导入
+    tool_config = get_tool_config()
+    tools = get_tool_registry()
     
     # 初始化模型
     llm = get_model(config=config)
     
     # 获取提示模板
-    prompt = get_prompt()
+    prompt = get_prompt(function_calling=config.function_calling)
+    
+    # 上下文预算配置
+    memory_config = get_memory_config()
+    
+    # 快速路径配置：算式、天气等查询直接调用工具并按模板回答，工具结果与模型的推测一致时不再调用模型
+    router_config = get_router_config()
     
     # 初始化Agent
     agent = LangGraphAgent(
         llm=llm,
-        tools=tools,
+        tools=[],
         prompt_template=prompt,
-        verbose=args.verbose or args.debug  # 如果--verbose或--debug任一为True，则启用详细日志
+        verbose=args.verbose or args.debug,  # 如果--verbose或--debug任一为True，则启用详细日志
+        checkpointer=create_conversation_store("memory", ttl=None),  # 在本次CLI会话内保留多轮对话
+        durability=memory_config.durability,
+        context_manager=ContextWindowManager(
+            max_tokens=memory_config.context_max_tokens,
+            summarizer=LLMSummarizer(llm, max_summary_chars=memory_config.summary_max_chars)
+        ) if memory_config.context_max_tokens > 0 else None,
+        router=create_query_router(**router_config.router_kwargs()) if router_config.enabled else None,
+        speculative_answer=router_config.speculative_answer,
+        early_tool_dispatch=router_config.early_tool_dispatch,
+        tool_registry=tools,  # 每个请求按查询从注册表中选出最相关的工具放入提示
+        max_tools=tool_config.max_tools or None,
+        **get_budget_config().agent_kwargs()  # 每个请求的工具调用轮数、token和处理时间上限
     )
     
+    if args.input:
+        run_batch(agent, llm, args)
+        return
+    
     print("=" * 50)
     print("欢迎使用LangGraph Agent CLI")
     print("输入 'exit' 或 'quit' 退出")
@@ -59,7 +100,7 @@ def main():
         print("断点已设置，请按'n'继续执行下一步...")
         breakpoint()
     
-    conversation_id = None
+    conversation_id = "cli_" + uuid.uuid4().hex[:12]
     
     while True:
         # 获取用户输入
@@ -78,7 +119,7 @@ def main():
         
         try:
             # 调用Agent
-            response = agent.invoke(user_input)
+            response = agent.invoke(user_input, conversation_id=conversation_id)
             
             # 打印回复
             print(f"\nAI助手: {response}")
@@ -94,5 +135,35 @@ def main():
                 print("发生异常，进入调试模式...")
                 pdb.post_mortem()
 
+def run_batch(agent: Any, llm: Any, args: argparse.Namespace) -> None:
+    """批量模式：处理--input中的全部输入，结果逐条写入--output，Ctrl-C或进程被杀死后再次运行会从中断处继续"""
+    import asyncio
+    import json
+    import logging
+    from src.batch import run_file
+    from src.config import get_batch_config
+    
+    # 批量模式下不逐条输出查询日志，只保留进度
+    if not (args.verbose or args.debug):
+        logging.getLogger("langgraph_agent").setLevel(logging.WARNING)
+    logging.getLogger("langgraph_agent.batch").setLevel(logging.INFO)
+    concurrency = args.concurrency or get_batch_config().concurrency
+    
+    async def run() -> Dict[str, Any]:
+        try:
+            return await run_file(agent, args.input, args.output, concurrency=concurrency, retry_errors=args.retry_errors)
+        finally:
+            await llm.transport.aclose()
+    
+    try:
+        report = asyncio.run(run())
+    except KeyboardInterrupt:
+        print(f"\n已中断，已完成的结果保存在 {args.output}，再次运行相同命令即可继续", file=sys.stderr)
+        sys.exit(130)
+    finally:
+        agent.close()
+        llm.transport.close()
+    print(json.dumps(report, ensure_ascii=False))
+
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,144 @@
+import argparse
+import logging
+import math
+import os
+from typing import Dict, Optional
+
+from src.config import ServerConfig, get_server_config
+
+logger = logging.getLogger("langgraph_agent.serve")
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def cgroup_cpu_limit() -> Optional[float]:
+    """读取容器（cgroup v2/v1）的CPU配额，未限制时返回None"""
+    cpu_max = _read("/sys/fs/cgroup/cpu.max")
+    if cpu_max:
+        quota, _, period = cpu_max.partition(" ")
+        if quota != "max" and period:
+            return int(quota) / int(period)
+        return None
+    quota, period = _read("/sys/fs/cgroup/cpu/cpu.cfs_quota_us"), _read("/sys/fs/cgroup/cpu/cpu.cfs_period_us")
+    if quota and period and int(quota) > 0:
+        return int(quota) / int(period)
+    return None
+
+def available_cpus() -> float:
+    """当前进程可用的CPU数：CPU亲和性和cgroup配额中较小的一个"""
+    try:
+        cpus: float = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    limit = cgroup_cpu_limit()
+    return min(cpus, limit) if limit else cpus
+
+def available_memory_mb() -> Optional[int]:
+    """可用内存（MB）：MemAvailable和cgroup内存上限中较小的一个，无法确定时返回None"""
+    candidates = []
+    meminfo = _read("/proc/meminfo")
+    if meminfo:
+        for line in meminfo.splitlines():
+            if line.startswith("MemAvailable:"):
+                candidates.append(int(line.split()[1]) // 1024)
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        value = _read(path)
+        if value and value.isdigit() and int(value) < 1 << 60:
+            candidates.append(int(value) // (1024 * 1024))
+            break
+    return min(candidates) if candidates else None
+
+def auto_worker_count(config: ServerConfig) -> int:
+    """
+    自动确定worker进程数
+
+    请求处理以等待上游为主，每个worker用一个事件循环承载大量并发请求，
+    因此每个可用CPU核运行一个worker即可用满CPU；同时按每个worker的内存估算不超过可用内存
+
+    Args:
+        config: 部署配置
+
+    Returns:
+        worker进程数（至少为1）
+    """
+    workers = max(1, math.ceil(available_cpus()))
+    memory = available_memory_mb()
+    if memory is not None and config.worker_memory_mb > 0:
+        workers = min(workers, max(1, memory // config.worker_memory_mb))
+    if config.max_workers > 0:
+        workers = min(workers, config.max_workers)
+    return workers
+
+def configure_shared_state(config: ServerConfig, workers: int) -> Dict[str, str]:
+    """
+    多个worker时把会话存储、工具缓存、LLM响应缓存和限流令牌桶默认切换到共享的SQLite文件
+
+    只设置未显式配置的环境变量，worker进程启动时继承这些设置
+
+    Args:
+        config: 部署配置
+        workers: worker进程数
+
+    Returns:
+        实际设置的环境变量
+    """
+    if workers <= 1:
+        return {}
+    os.makedirs(config.state_dir, exist_ok=True)
+    defaults = {
+        "AGENT_MEMORY_BACKEND": "sqlite",
+        "AGENT_MEMORY_PATH": os.path.join(config.state_dir, "conversations.sqlite"),
+        "AGENT_LLM_CACHE_PATH": os.path.join(config.state_dir, "llm_cache.sqlite"),
+        "AGENT_TOOL_CACHE_BACKEND": "sqlite",
+        "AGENT_TOOL_CACHE_PATH": os.path.join(config.state_dir, "tool_cache.sqlite"),
+        "AGENT_RATE_BACKEND": "sqlite",
+        "AGENT_RATE_PATH": os.path.join(config.state_dir, "rate_limit.sqlite"),
+    }
+    applied = {key: value for key, value in defaults.items() if key not in os.environ}
+    os.environ.update(applied)
+    for key in ("AGENT_MEMORY_BACKEND", "AGENT_TOOL_CACHE_BACKEND", "AGENT_RATE_BACKEND"):
+        if os.environ[key] == "memory":
+            logger.warning(f"{key}=memory：{workers}个worker之间不共享这部分状态")
+    return applied
+
+def main():
+    """主函数"""
+    config = get_server_config()
+    parser = argparse.ArgumentParser(description="以多个worker进程运行LangGraph Agent API")
+    parser.add_argument("--host", default=config.host, help="监听地址")
+    parser.add_argument("--port", type=int, default=config.port, help="监听端口")
+    parser.add_argument("--workers", default=str(config.workers or "auto"), help="worker进程数，auto表示按CPU和内存自动确定")
+    parser.add_argument("--graceful-timeout", type=float, default=config.graceful_timeout, help="停止时等待在途请求完成的最长秒数")
+    parser.add_argument("--state-dir", default=config.state_dir, help="多个worker共享的状态目录")
+    parser.add_argument("--log-level", default="info", help="日志级别")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    config.state_dir = args.state_dir
+    workers = auto_worker_count(config) if args.workers == "auto" else max(1, int(args.workers))
+    applied = configure_shared_state(config, workers)
+    logger.info(
+        f"启动{workers}个worker（可用CPU {available_cpus():g}，可用内存 {available_memory_mb()}MB），"
+        f"共享状态: {applied or '使用已有配置'}"
+    )
+
+    import uvicorn
+
+    # 每个worker通过create_app()创建自己的应用，在lifespan中初始化组件；
+    # 收到SIGTERM/SIGINT后停止接受新连接，等待在途请求（包括流式响应）最多graceful_timeout秒后再关闭
+    uvicorn.run(
+        "app:create_app",
+        factory=True,
+        host=args.host,
+        port=args.port,
+        workers=workers,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        log_level=args.log_level,
+    )
+
+if __name__ == "__main__":
+    main()
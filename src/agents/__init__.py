@@ -1,4 +1,12 @@
 # Agent包初始化文件
 from src.agents.langgraph_agent import LangGraphAgent, AgentState
+from src.agents.budget import RequestBudget
+from src.agents.router import QueryRouter, RouteRule, ArithmeticRule, WeatherRule, register_route_rule, create_query_router
+from src.agents.context import ContextWindowManager, LLMSummarizer, TokenCounter
+from src.agents.diagram import export_graph
 
-__all__ = ["LangGraphAgent", "AgentState"] 
\ No newline at end of file
+__all__ = [
+    "LangGraphAgent", "AgentState", "RequestBudget",
+    "QueryRouter", "RouteRule", "ArithmeticRule", "WeatherRule", "register_route_rule", "create_query_router",
+    "ContextWindowManager", "LLMSummarizer", "TokenCounter", "export_graph",
+]
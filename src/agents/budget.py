@@ -0,0 +1,79 @@
+import time
+from typing import Optional
+
+from src.metrics import AGENT_BUDGET_EXHAUSTED
+
+# 预算耗尽的原因
+TOOL_ROUNDS = "tool_rounds"
+TOKENS = "tokens"
+DEADLINE = "deadline"
+
+# 提示用户时对各原因的描述
+REASON_DESCRIPTIONS = {
+    TOOL_ROUNDS: "工具调用轮数上限",
+    TOKENS: "token预算",
+    DEADLINE: "处理时间上限",
+}
+
+
+class RequestBudget:
+    """
+    单个请求的Agent循环预算
+
+    限制工具调用轮数、所有LLM调用的token总数和处理时间，任一项耗尽后状态图不再调用工具，
+    转到finalize节点给出最终回答。每个请求使用一个新的实例，处理时间从创建实例时开始计算。
+    """
+
+    def __init__(
+        self,
+        max_tool_rounds: Optional[int] = 5,
+        max_tokens: Optional[int] = None,
+        deadline: Optional[float] = None
+    ):
+        """
+        初始化请求预算
+
+        Args:
+            max_tool_rounds: 最多执行的工具调用轮数，None表示不限制
+            max_tokens: 所有LLM调用的提示和回复token总数上限（本地估算），None表示不限制
+            deadline: 最长处理时间（秒），None表示不限制
+        """
+        self.max_tool_rounds = max_tool_rounds
+        self.max_tokens = max_tokens
+        self.started = time.monotonic()
+        self.deadline_at = self.started + deadline if deadline is not None else None
+        self.tool_rounds = 0
+        self.tokens = 0
+        self.stop_reason: Optional[str] = None
+
+    def remaining(self) -> Optional[float]:
+        """剩余处理时间（秒），不限制时返回None"""
+        if self.deadline_at is None:
+            return None
+        return max(0.0, self.deadline_at - time.monotonic())
+
+    def exhausted(self) -> Optional[str]:
+        """token或处理时间已耗尽时返回原因，否则返回None"""
+        if self.deadline_at is not None and time.monotonic() >= self.deadline_at:
+            return DEADLINE
+        if self.max_tokens is not None and self.tokens >= self.max_tokens:
+            return TOKENS
+        return None
+
+    def allows_tool_round(self) -> bool:
+        """是否还能再执行一轮工具调用"""
+        return self.max_tool_rounds is None or self.tool_rounds < self.max_tool_rounds
+
+    def add_tokens(self, tokens: int) -> None:
+        """累加一次LLM调用的token数"""
+        self.tokens += tokens
+
+    def start_tool_round(self) -> None:
+        """记录开始执行一轮工具调用"""
+        self.tool_rounds += 1
+
+    def exhaust(self, reason: str) -> None:
+        """记录预算耗尽，每个请求只计数一次"""
+        if self.stop_reason is None:
+            self.stop_reason = reason
+            AGENT_BUDGET_EXHAUSTED.inc(reason=reason)
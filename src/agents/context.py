@@ -0,0 +1,208 @@
+import logging
+import math
+import re
+from functools import lru_cache
+from typing import Any, Callable, List, Optional, Tuple, Union
+
+from langchain_core.language_models import BaseLLM
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+try:
+    import tiktoken
+except ImportError:  # 未安装tiktoken时使用启发式估算
+    tiktoken = None
+
+logger = logging.getLogger("langgraph_agent.context")
+
+Message = Union[HumanMessage, AIMessage, SystemMessage]
+
+# 中日韩字符大致一个字一个token，其余文本按约4个字符一个token估算
+_CJK_PATTERN = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]")
+
+# 每条消息在提示中额外占用的角色前缀等开销
+_MESSAGE_OVERHEAD = 4
+
+
+class TokenCounter:
+    """
+    本地token计数器
+
+    安装了tiktoken时使用其BPE编码计数，否则按字符类别估算。
+    计数结果按文本缓存，同一条历史消息在多个步骤中只计算一次。
+    """
+
+    def __init__(self, encoding: str = "cl100k_base", cache_size: int = 4096):
+        """
+        初始化token计数器
+
+        Args:
+            encoding: tiktoken编码名称
+            cache_size: 计数结果缓存的条目数
+        """
+        self._encoder = None
+        if tiktoken is not None:
+            try:
+                self._encoder = tiktoken.get_encoding(encoding)
+            except Exception as e:
+                # 编码文件需要首次联网下载，离线环境下退回到估算
+                logger.warning(f"加载tiktoken编码失败，改用估算计数: {e}")
+        self.count = lru_cache(maxsize=cache_size)(self._count)
+
+    def _count(self, text: str) -> int:
+        if self._encoder is not None:
+            return len(self._encoder.encode(text, disallowed_special=()))
+        cjk = len(_CJK_PATTERN.findall(text))
+        return cjk + math.ceil((len(text) - cjk) / 4)
+
+    def count_messages(self, messages: List[Message]) -> int:
+        """统计一组消息的token数"""
+        return sum(self.count(message.content) + _MESSAGE_OVERHEAD for message in messages)
+
+
+# 滚动摘要提示
+SUMMARY_PROMPT = """请将下面的新对话内容合并进已有的对话摘要，输出更新后的摘要。
+要求：保留用户的目标、关键事实、工具调用得到的结果和尚未解决的问题，省略寒暄和重复内容，不超过{max_chars}个字。
+
+已有摘要:
+{summary}
+
+新对话内容:
+{conversation}
+
+更新后的摘要:"""
+
+
+class LLMSummarizer:
+    """使用LLM把被移出上下文窗口的旧消息合并进滚动摘要"""
+
+    def __init__(self, llm: BaseLLM, max_summary_chars: int = 500):
+        """
+        初始化摘要器
+
+        Args:
+            llm: 用于生成摘要的大语言模型
+            max_summary_chars: 摘要的最大字数
+        """
+        self.llm = llm
+        self.max_summary_chars = max_summary_chars
+
+    def _prompt(self, summary: str, messages: List[Message]) -> str:
+        conversation = "\n".join(
+            f"{'助手' if isinstance(message, AIMessage) else '用户'}: {message.content}"
+            for message in messages
+        )
+        return SUMMARY_PROMPT.format(
+            max_chars=self.max_summary_chars,
+            summary=summary or "（无）",
+            conversation=conversation,
+        )
+
+    def _clip(self, summary: str) -> str:
+        """模型未遵守长度要求时截断，保证摘要大小有上限"""
+        summary = summary.strip()
+        return summary[-self.max_summary_chars:] if len(summary) > self.max_summary_chars else summary
+
+    def __call__(self, summary: str, messages: List[Message]) -> str:
+        return self._clip(self.llm.invoke(self._prompt(summary, messages)))
+
+    async def acall(self, summary: str, messages: List[Message]) -> str:
+        return self._clip(await self.llm.ainvoke(self._prompt(summary, messages)))
+
+
+class ContextWindowManager:
+    """
+    按token预算管理发送给LLM的上下文
+
+    固定部分（系统提示、工具描述）加上摘要和最近的消息不超过max_tokens；
+    放不下的旧消息被合并进滚动摘要并从状态中移除。摘要保存在状态中，
+    每条消息只会被摘要一次，因此随着对话变长，提示大小基本保持不变。
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = 4000,
+        summarizer: Optional[Callable[[str, List[Message]], str]] = None,
+        token_counter: Optional[TokenCounter] = None,
+        target_ratio: float = 0.6,
+    ):
+        """
+        初始化上下文窗口管理器
+
+        Args:
+            max_tokens: 提示的token预算（包含系统提示和工具描述）
+            summarizer: 摘要函数，签名为(已有摘要, 待合并消息) -> 新摘要；
+                为None时直接丢弃放不下的旧消息
+            token_counter: token计数器
+            target_ratio: 超出预算时裁剪到预算的这一比例，使摘要批量进行，
+                而不是窗口满后每一步都调用一次摘要
+        """
+        self.max_tokens = max_tokens
+        self.summarizer = summarizer
+        self.counter = token_counter or TokenCounter()
+        self.target_ratio = target_ratio
+
+    def _split_point(self, messages: List[Message], summary: str, fixed_tokens: int) -> int:
+        """
+        计算需要移出窗口的消息数
+
+        未超出预算时返回0；超出时从最新的消息开始向前累加到目标比例的预算，
+        最后一条消息（当前输入）总是保留
+        """
+        budget = self.max_tokens - fixed_tokens - (self.counter.count(summary) if summary else 0)
+        if self.counter.count_messages(messages) <= budget:
+            return 0
+        budget = int(budget * self.target_ratio)
+        used = 0
+        for index in range(len(messages) - 1, -1, -1):
+            used += self.counter.count(messages[index].content) + _MESSAGE_OVERHEAD
+            if used > budget:
+                if index == len(messages) - 1:
+                    logger.warning("当前输入本身已超出上下文预算")
+                    return index
+                return index + 1
+        return 0
+
+    def fit(
+        self,
+        messages: List[Message],
+        summary: str,
+        fixed_tokens: int = 0,
+    ) -> Tuple[List[Message], str]:
+        """
+        使消息和摘要适配token预算
+
+        Args:
+            messages: 尚未被摘要的消息
+            summary: 已有的滚动摘要
+            fixed_tokens: 提示中固定部分占用的token数
+
+        Returns:
+            (保留在窗口中的消息, 更新后的摘要)
+        """
+        cut = self._split_point(messages, summary, fixed_tokens)
+        if cut == 0:
+            return messages, summary
+
+        folded, kept = messages[:cut], messages[cut:]
+        logger.debug(f"上下文超出预算，将{len(folded)}条旧消息合并进摘要")
+        if self.summarizer is not None:
+            summary = self.summarizer(summary, folded)
+        return kept, summary
+
+    async def afit(
+        self,
+        messages: List[Message],
+        summary: str,
+        fixed_tokens: int = 0,
+    ) -> Tuple[List[Message], str]:
+        """fit的异步版本，摘要器支持acall时异步生成摘要"""
+        cut = self._split_point(messages, summary, fixed_tokens)
+        if cut == 0:
+            return messages, summary
+
+        folded, kept = messages[:cut], messages[cut:]
+        logger.debug(f"上下文超出预算，将{len(folded)}条旧消息合并进摘要")
+        if self.summarizer is not None:
+            acall = getattr(self.summarizer, "acall", None)
+            summary = await acall(summary, folded) if acall else self.summarizer(summary, folded)
+        return kept, summary
@@ -0,0 +1,60 @@
+import logging
+import os
+from typing import Any, Optional
+
+logger = logging.getLogger("langgraph_agent.diagram")
+
+# 按文件扩展名选择的输出格式：mermaid文本不需要额外依赖，图片格式需要graphviz
+_MERMAID_FORMATS = {".mmd", ".mermaid", ".md"}
+_GRAPHVIZ_FORMATS = {".png", ".svg", ".pdf", ".dot"}
+
+
+def export_graph(path: str, graph: Optional[Any] = None) -> str:
+    """
+    导出Agent状态图
+
+    构建Agent时不再渲染图片，需要查看流程结构时显式调用本函数（或运行 python cli.py --export-graph PATH）
+
+    Args:
+        path: 输出文件，扩展名决定格式：.mmd/.mermaid/.md输出Mermaid文本，
+            .png/.svg/.pdf通过graphviz渲染（需要安装graphviz），.dot输出DOT源码
+        graph: 编译后的状态图，为None时使用LangGraphAgent的默认状态图
+
+    Returns:
+        实际写入的文件路径
+    """
+    if graph is None:
+        from src.agents.langgraph_agent import LangGraphAgent
+        graph = LangGraphAgent.compiled_graph()
+    drawable = graph.get_graph()
+    base, ext = os.path.splitext(path)
+    ext = ext.lower()
+
+    if ext in _MERMAID_FORMATS:
+        text = drawable.draw_mermaid()
+        if ext == ".md":
+            text = f"```mermaid\n{text}\n```\n"
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+    elif ext in _GRAPHVIZ_FORMATS:
+        import graphviz
+        dot = graphviz.Digraph(comment="Agent StateGraph")
+        for node_id in drawable.nodes:
+            dot.node(node_id, node_id.strip("_").upper() if node_id.startswith("__") else node_id)
+        for edge in drawable.edges:
+            dot.edge(
+                edge.source,
+                edge.target,
+                label=str(edge.data) if edge.data is not None else None,
+                style="dashed" if edge.conditional else "solid",
+            )
+        if ext == ".dot":
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(dot.source)
+        else:
+            path = dot.render(base, format=ext[1:], cleanup=True)
+    else:
+        raise ValueError(f"不支持的状态图格式: {ext or path}，可选 {sorted(_MERMAID_FORMATS | _GRAPHVIZ_FORMATS)}")
+
+    logger.info(f"状态图已保存为 {path}")
+    return path
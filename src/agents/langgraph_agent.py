@@ -1,13 +1,42 @@
-from typing import Dict, Any, List, Tuple, Annotated, TypedDict, Union
+from typing import Dict, Any, AsyncIterator, List, Optional, Tuple, Annotated, TypedDict, Union
 from langchain_core.tools import BaseTool
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from langchain_core.language_models import BaseLLM
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, END
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.types import Overwrite
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextlib import aclosing, closing, contextmanager
+from src.agents.response_parser import extract_tool_calls, parse_response
+from src.agents.stream_parser import ToolCallStreamParser
+from src.agents.context import ContextWindowManager, TokenCounter
+from src.agents.budget import DEADLINE, REASON_DESCRIPTIONS, TOOL_ROUNDS, RequestBudget
+from src.agents.router import QueryRouter
+from src.agents.speculation import MATCH, MODES, speculative_answer
+from src.tools.cache import MISS, ToolResultCache, get_tool_cache, is_cacheable
+from src.tools.registry import ToolRegistry
+from src.tools.schema import build_tool_schemas
+from src.metrics import (
+    AGENT_ITERATIONS,
+    AGENT_LLM_CALLS_SAVED,
+    AGENT_REQUESTS,
+    AGENT_SELECTED_TOOLS,
+    AGENT_SPECULATIVE_ANSWERS,
+    NODE_SECONDS,
+    TOOL_CALLS,
+    TOOL_SECONDS,
+    tracer,
+)
+import asyncio
+import contextvars
 import json
-import re
+import operator
+import threading
+import time
 import uuid
+from collections import ChainMap
 from enum import Enum
 import logging
 
@@ -21,10 +50,67 @@ logger.setLevel(logging.INFO)  # 默认INFO级别
 
 # 定义Agent状态类型
 class AgentState(TypedDict):
-    """Agent的状态"""
-    messages: List[Union[HumanMessage, AIMessage, SystemMessage]]  # 消息历史
-    tool_calls: List[Dict[str, Any]]  # 工具调用
-    tool_results: List[Dict[str, Any]]  # 工具调用结果
+    """
+    Agent的状态
+
+    节点只返回本步骤改变的字段；messages和tool_results按reducer追加，
+    需要整体替换时（裁剪历史、新请求清空工具结果）返回Overwrite
+    """
+    messages: Annotated[List[Union[HumanMessage, AIMessage, SystemMessage]], operator.add]  # 消息历史
+    tool_calls: List[Dict[str, Any]]  # 本轮的工具调用（可以有多个，并行执行）
+    tool_results: Annotated[List[Dict[str, Any]], operator.add]  # 本次请求的工具调用结果
+    summary: str  # 已移出上下文窗口的旧消息的滚动摘要
+    stop_reason: str  # 请求预算耗尽的原因，非空时转到finalize节点结束
+    routed: Dict[str, Any]  # 快速路由为本次请求选择的工具调用，非空时按模板回答、不调用LLM
+    answered: bool  # 工具执行后已得到最终回答（快速路由的模板回答或核对一致的推测回答），不再调用LLM
+    tool_names: List[str]  # 按本次查询从工具注册表中选出、放入提示的工具（未配置工具注册表时不使用）
+
+# 当前请求中Agent节点的执行次数，随上下文传播到图的各个节点
+_request_iterations: contextvars.ContextVar[Optional[List[int]]] = contextvars.ContextVar(
+    "agent_request_iterations", default=None
+)
+
+# 当前正在执行的Agent。编译后的图在实例之间共享，节点通过它找到处理本次请求的Agent
+_active_agent: contextvars.ContextVar[Optional["LangGraphAgent"]] = contextvars.ContextVar(
+    "agent_active_agent", default=None
+)
+
+# 当前请求的预算（工具调用轮数、token和处理时间）
+_request_budget: contextvars.ContextVar[Optional[RequestBudget]] = contextvars.ContextVar(
+    "agent_request_budget", default=None
+)
+
+# 未配置上下文管理器时用于估算预算token数的计数器，首次使用时创建
+_default_token_counter: Optional[TokenCounter] = None
+
+# 工具调用轮数耗尽后，要求模型根据已有结果直接回答
+_FINAL_ANSWER_INSTRUCTION = "已达到本次请求的工具调用次数上限，不能再使用工具。请根据以上对话和工具结果，直接以\"回答:\"给出最终回答。"
+
+# 预渲染提示时用于占位用户输入的标记，渲染后按它切分出静态前缀和后缀
+_PROMPT_INPUT_SENTINEL = "\x00__agent_input__\x00"
+
+# 按会话存储缓存的编译后状态图：(Agent类, id(checkpointer)) -> (checkpointer, 编译后的图)
+_compiled_graphs: Dict[Tuple[type, int], Tuple[Any, Any]] = {}
+# 按(提示模板, 工具签名)缓存的预渲染提示：签名 -> (模板, 预渲染结果)
+_prepared_prompts: Dict[Tuple[Any, ...], Tuple[Any, Tuple[str, str, Optional[str], Optional[str]]]] = {}
+_PREPARED_PROMPTS_MAX = 64
+_graph_cache_lock = threading.Lock()
+# 每个Agent按(注册表版本, 选出的工具)缓存的提示工具集数量上限
+_TOOL_PROMPTS_MAX = 128
+
+class _ToolPrompt:
+    """一组工具对应的预渲染提示、函数声明和固定token数"""
+    
+    __slots__ = ("tools", "tools_str", "prefix", "suffix", "schemas", "schema_tokens", "fixed_tokens")
+    
+    def __init__(self, tools: List[BaseTool]):
+        self.tools = tools
+        self.tools_str = ""
+        self.prefix: Optional[str] = None
+        self.suffix: Optional[str] = None
+        self.schemas: List[Dict[str, Any]] = []
+        self.schema_tokens: Optional[int] = None
+        self.fixed_tokens = 0
 
 # 决策枚举
 class Decision(str, Enum):
@@ -32,57 +118,16 @@ class Decision(str, Enum):
     RESPOND = "respond"  # 直接回复
 
 def extract_tool_use(text: str) -> Dict[str, Any]:
-    """从文本中提取工具使用信息"""
+    """从文本中提取第一个工具调用，没有工具调用时返回空字典"""
     # 断点提示: 可以在此处设置断点检查模型输出文本
     # breakpoint()
     
-    # 首先检查是否有"行动:"部分
-    action_match = re.search(r"行动:(.*?)(?:行动结果:|回答:)", text, re.DOTALL)
-    if not action_match:
+    tool_calls = parse_response(text).tool_calls
+    if not tool_calls:
         return {}
     
-    action_text = action_match.group(1).strip()
-    
-    # 尝试提取工具名称
-    tool_name_match = re.search(r"使用工具:\s*(\w+)", action_text, re.DOTALL)
-    if not tool_name_match:
-        return {}
-    
-    tool_name = tool_name_match.group(1).strip()
-    
-    # 尝试提取参数
-    params_match = re.search(r"参数:(.*?)(?:$|行动结果:|回答:)", action_text, re.DOTALL)
-    params = {}
-    
-    if params_match:
-        params_text = params_match.group(1).strip()
-        
-        # 尝试提取键值对格式的参数
-        param_pairs = re.findall(r"(\w+):\s*([^,\n]+)", params_text)
-        for key, value in param_pairs:
-            params[key.strip()] = value.strip()
-        
-        # 如果上面的方法没有提取到参数，尝试解析JSON
-        if not params:
-            try:
-                json_match = re.search(r"\{(.*)\}", params_text, re.DOTALL)
-                if json_match:
-                    json_str = "{" + json_match.group(1) + "}"
-                    params = json.loads(json_str)
-            except:
-                pass
-    
-    # 断点提示: 可以在此处设置断点检查提取的工具信息
-    # breakpoint()
-    
-    result = {
-        "name": tool_name,
-        "params": params
-    }
-    
-    # 打印提取的工具信息（调试用）
-    print(f"提取的工具调用: {result}")
-    
+    result = tool_calls[0]
+    logger.debug(f"提取的工具调用: {result}")
     return result
 
 class LangGraphAgent:
@@ -93,7 +138,23 @@ class LangGraphAgent:
         llm: BaseLLM,
         tools: List[BaseTool],
         prompt_template: ChatPromptTemplate,
-        verbose: bool = False
+        verbose: bool = False,
+        early_tool_dispatch: bool = True,
+        checkpointer: Optional[BaseCheckpointSaver] = None,
+        max_history_messages: int = 50,
+        context_manager: Optional[ContextWindowManager] = None,
+        max_tool_workers: int = 8,
+        tool_timeout: Optional[float] = 30.0,
+        tool_cache: Optional[ToolResultCache] = None,
+        function_calling: Optional[bool] = None,
+        max_tool_rounds: Optional[int] = 5,
+        max_request_tokens: Optional[int] = None,
+        request_deadline: Optional[float] = None,
+        durability: str = "exit",
+        router: Optional[QueryRouter] = None,
+        speculative_answer: str = MATCH,
+        tool_registry: Optional[ToolRegistry] = None,
+        max_tools: Optional[int] = None
     ):
         """
         初始化LangGraph Agent
@@ -103,35 +164,227 @@ class LangGraphAgent:
             tools: 工具列表
             prompt_template: 提示模板
             verbose: 是否显示详细日志
+            early_tool_dispatch: 流式模式下解析到完整的工具调用后立即停止生成并执行工具
+            checkpointer: 会话状态存储，设置后同一conversation_id的多轮对话会延续之前的状态
+            max_history_messages: 每轮最多从会话历史中携带的消息数
+            context_manager: 上下文窗口管理器，设置后每次调用LLM前按token预算裁剪历史并滚动摘要
+            max_tool_workers: 同一轮中并行执行工具调用的最大并发数
+            tool_timeout: 单个工具调用的超时时间（秒），None表示不限制
+            tool_cache: 工具结果缓存，为None时使用进程内共享的缓存；只缓存声明了cacheable的工具
+            function_calling: 是否使用原生函数调用（模型返回结构化的tool_calls，不解析文本协议），
+                为None时跟随模型的function_calling设置；模型需提供call_with_tools/acall_with_tools
+            max_tool_rounds: 每个请求最多执行的工具调用轮数，None表示不限制
+            max_request_tokens: 每个请求所有LLM调用的token总数上限（本地估算），None表示不限制
+            request_deadline: 每个请求的最长处理时间（秒），None表示不限制
+            durability: 会话状态的持久化时机，exit只在请求结束时写入一次检查点，
+                async/sync在每个步骤后写入（可以从中断的步骤恢复，但每步都要序列化整个消息历史）
+            router: 快速路由，设置后意图明确的查询（算式、天气）直接调用工具并按模板回答，不调用LLM
+            speculative_answer: 工具执行后的推测回答模式：off总是再调用一次LLM；match在模型推测的行动结果
+                与实际一致时直接使用它的回答；presentable在此基础上，本轮工具都声明了presentable时直接展示结果。
+                需要完整的模型响应，流式模式下提前派发工具调用（early_tool_dispatch）时只有presentable生效
+            tool_registry: 动态工具注册表，设置后每个请求按查询从中选出工具放入提示（tools中的工具总是放入），
+                注册表中的工具第一次执行时才加载，运行中增删的工具对之后的请求立即生效
+            max_tools: 每个请求从工具注册表中选出的最大工具数，None表示放入注册表中的全部工具
         """
         # 断点提示: 可以在此处设置断点检查初始化参数
         # breakpoint()
         
         self.llm = llm
-        self.tools = tools
         self.prompt = prompt_template
-        self.tool_map = {tool.name: tool for tool in tools}
+        self.early_tool_dispatch = early_tool_dispatch
+        self.checkpointer = checkpointer
+        self.max_history_messages = max_history_messages
+        self.context_manager = context_manager
+        self.max_tool_workers = max_tool_workers
+        self.tool_timeout = tool_timeout
+        self.tool_cache = tool_cache if tool_cache is not None else get_tool_cache()
+        self.max_tool_rounds = max_tool_rounds
+        self.max_request_tokens = max_request_tokens
+        self.request_deadline = request_deadline
+        self.durability = durability
+        self.router = router
+        if speculative_answer not in MODES:
+            raise ValueError(f"未知的推测回答模式: {speculative_answer}，可选: {', '.join(MODES)}")
+        self.speculative_answer = speculative_answer
+        self.tool_registry = tool_registry
+        self.max_tools = max_tools
+        self._tool_executor: Optional[ThreadPoolExecutor] = None
+        self._tool_executor_lock = threading.Lock()
+        if function_calling is None:
+            function_calling = getattr(llm, "function_calling", False)
+        self.function_calling = bool(function_calling) and callable(getattr(llm, "call_with_tools", None))
+        if function_calling and not self.function_calling:
+            logger.warning("模型不支持原生函数调用，使用文本协议解析工具调用")
+        self.set_tools(tools)
         
         # 设置日志级别
         if verbose:
             logger.setLevel(logging.DEBUG)
             logger.debug("启用详细日志模式")
+    
+    @property
+    def graph(self) -> Any:
+        """编译后的状态图，第一次使用时编译，使用同一会话存储的Agent共享同一个图"""
+        return self.compiled_graph(self.checkpointer)
+    
+    def set_tools(self, tools: List[BaseTool]) -> None:
+        """
+        设置Agent可用的工具，并重新预渲染提示
+        
+        Args:
+            tools: 工具列表
+        """
+        self.tools = list(tools)
+        tool_map = {tool.name: tool for tool in self.tools}
+        # 配置了工具注册表时，注册表中的工具（包括运行中新增的）同样可以执行
+        self.tool_map = ChainMap(tool_map, self.tool_registry.tool_map) if self.tool_registry is not None else tool_map
+        self._tool_prompts: Dict[Tuple[Any, ...], _ToolPrompt] = {}
+        self._tool_prompt = self._render_prompt_template(self.tools)
+    
+    def _render_prompt_template(self, tools: List[BaseTool]) -> _ToolPrompt:
+        """
+        预渲染提示中的静态部分
         
-        # 初始化图状态
-        self.graph = self._build_graph()
+        系统提示和工具描述在每一步都相同，这里用占位符代替用户输入渲染一次，
+        之后每一步只需拼接前缀、用户输入和后缀
+        
+        Args:
+            tools: 放入提示的工具
+        """
+        tool_prompt = _ToolPrompt(tools)
+        tool_prompt.tools_str, rendered, tool_prompt.prefix, tool_prompt.suffix = self._prepare_prompt(
+            self.prompt, tools
+        )
+        # 原生函数调用模式下随每次请求发送的函数声明，每个工具集只生成一次
+        tool_prompt.schemas = build_tool_schemas(tools) if self.function_calling else []
+        
+        # 系统提示和工具描述（或函数声明）占用的token数，作为上下文预算中的固定部分
+        if self.context_manager is not None:
+            tool_prompt.fixed_tokens = self.context_manager.counter.count(
+                rendered.replace(_PROMPT_INPUT_SENTINEL, "")
+            )
+            if tool_prompt.schemas:
+                tool_prompt.fixed_tokens += self.context_manager.counter.count(
+                    json.dumps(tool_prompt.schemas, ensure_ascii=False)
+                )
+        return tool_prompt
+    
+    def _tool_prompt_for(self, state: Dict[str, Any]) -> _ToolPrompt:
+        """
+        本次请求使用的提示工具集
+        
+        配置了工具注册表时为Agent的工具加上prepare节点按查询选出的工具，
+        按(注册表版本, 选出的工具)缓存，相同的工具组合只渲染一次
+        """
+        names = state.get("tool_names")
+        if self.tool_registry is None or names is None:
+            return self._tool_prompt
+        key = (self.tool_registry.version, tuple(names))
+        tool_prompt = self._tool_prompts.get(key)
+        if tool_prompt is None:
+            fixed = {tool.name for tool in self.tools}
+            selected = [self.tool_registry.get(name) for name in names if name not in fixed]
+            tool_prompt = self._render_prompt_template(self.tools + [tool for tool in selected if tool is not None])
+            with _graph_cache_lock:
+                if len(self._tool_prompts) >= _TOOL_PROMPTS_MAX:
+                    self._tool_prompts.pop(next(iter(self._tool_prompts)))
+                self._tool_prompts[key] = tool_prompt
+        return tool_prompt
+    
+    @staticmethod
+    def _prepare_prompt(
+        prompt: ChatPromptTemplate,
+        tools: List[BaseTool]
+    ) -> Tuple[str, str, Optional[str], Optional[str]]:
+        """
+        渲染提示的静态部分，结果按(提示模板, 工具名和描述)缓存，相同配置的Agent只渲染一次
+        
+        Returns:
+            (工具描述, 以占位符代替用户输入渲染的完整提示, 静态前缀, 静态后缀)；无法切分时前缀和后缀为None
+        """
+        signature = (id(prompt), tuple((tool.name, tool.description) for tool in tools))
+        cached = _prepared_prompts.get(signature)
+        if cached is not None and cached[0] is prompt:
+            return cached[1]
+        
+        tools_str = "\n".join(f"- {tool.name}: {tool.description}" for tool in tools)
+        rendered = prompt.format(tools=tools_str, input=_PROMPT_INPUT_SENTINEL)
+        if rendered.count(_PROMPT_INPUT_SENTINEL) == 1:
+            prefix, suffix = rendered.split(_PROMPT_INPUT_SENTINEL)
+        else:
+            # 模板中没有（或多次引用）input变量时无法切分，每一步完整渲染
+            logger.debug("提示模板无法预渲染，将在每一步完整渲染")
+            prefix = suffix = None
+        
+        prepared = (tools_str, rendered, prefix, suffix)
+        with _graph_cache_lock:
+            if len(_prepared_prompts) >= _PREPARED_PROMPTS_MAX:
+                _prepared_prompts.pop(next(iter(_prepared_prompts)))
+            # 同时持有模板的引用，避免模板被回收后id被复用
+            _prepared_prompts[signature] = (prompt, prepared)
+        return prepared
+    
+    @classmethod
+    def compiled_graph(cls, checkpointer: Optional[BaseCheckpointSaver] = None) -> Any:
+        """
+        获取编译后的状态图
+        
+        图的结构与工具和提示无关，节点在运行时通过上下文找到当前处理请求的Agent，
+        因此每个会话存储只需编译一次，之后新建的Agent直接复用
+        
+        Args:
+            checkpointer: 会话状态存储
+            
+        Returns:
+            编译后的状态图
+        """
+        key = (cls, id(checkpointer))
+        cached = _compiled_graphs.get(key)
+        if cached is not None and cached[0] is checkpointer:
+            return cached[1]
+        with _graph_cache_lock:
+            cached = _compiled_graphs.get(key)
+            if cached is None or cached[0] is not checkpointer:
+                cached = (checkpointer, cls._build_graph(checkpointer))
+                _compiled_graphs[key] = cached
+        return cached[1]
     
-    def _build_graph(self) -> StateGraph:
-        """构建Agent状态图"""
+    @staticmethod
+    def _dispatch(method: str) -> Any:
+        """生成调用当前Agent指定方法的节点函数"""
+        def run(state: AgentState) -> Any:
+            agent = _active_agent.get()
+            if agent is None:
+                raise RuntimeError("状态图需要通过LangGraphAgent的invoke/ainvoke/astream执行")
+            return getattr(agent, method)(state)
+        return run
+    
+    @classmethod
+    def _build_graph(cls, checkpointer: Optional[BaseCheckpointSaver] = None) -> Any:
+        """构建并编译Agent状态图"""
         # 断点提示: 可以在此处设置断点检查图的构建过程
         # breakpoint()
         
         # 创建状态图
         graph = StateGraph(AgentState)
         
-        # 添加节点
-        graph.add_node("agent", self._agent_node)
-        graph.add_node("action", self._action_node)
-        graph.add_node("process_tool", self._process_tool_node)
+        # 添加节点（同时提供同步和异步实现，invoke走同步路径，ainvoke走异步路径）
+        # 每个节点都记录耗时和span
+        graph.add_node("prepare", cls._timed_node("prepare", cls._dispatch("_prepare_node")))
+        graph.add_node("router", cls._timed_node("router", cls._dispatch("_router_node")))
+        graph.add_node("agent", RunnableLambda(
+            cls._timed_node("agent", cls._dispatch("_agent_node")),
+            afunc=cls._atimed_node("agent", cls._dispatch("_aagent_node"))
+        ))
+        graph.add_node("action", RunnableLambda(
+            cls._timed_node("action", cls._dispatch("_action_node")),
+            afunc=cls._atimed_node("action", cls._dispatch("_aaction_node"))
+        ))
+        graph.add_node("process_tool", cls._timed_node("process_tool", cls._dispatch("_process_tool_node")))
+        graph.add_node("finalize", RunnableLambda(
+            cls._timed_node("finalize", cls._dispatch("_finalize_node")),
+            afunc=cls._atimed_node("finalize", cls._dispatch("_afinalize_node"))
+        ))
         
         # 定义路由函数
         def route(state: AgentState) -> str:
@@ -139,16 +392,17 @@ class LangGraphAgent:
             # 断点提示: 可以在此处设置断点检查路由决策过程
             # breakpoint()
             
-            messages = state["messages"]
-            last_message = messages[-1]
+            # 请求预算耗尽，不再调用工具，直接给出最终回答
+            if state.get("stop_reason"):
+                logger.debug(f"路由: 请求预算耗尽({state['stop_reason']}) -> finalize")
+                return "finalize"
             
-            # 提取工具使用信息
-            tool_info = extract_tool_use(last_message.content)
+            # 工具调用已由Agent节点解析并写入状态
+            tool_calls = state.get("tool_calls") or []
             
-            if tool_info and tool_info.get("name") in self.tool_map:
+            if tool_calls:
                 # 需要使用工具
-                state["tool_calls"] = [tool_info]
-                logger.debug(f"路由: 检测到工具调用 -> {tool_info['name']}")
+                logger.debug(f"路由: 检测到工具调用 -> {[call['name'] for call in tool_calls]}")
                 return "action"
             else:
                 # 直接回复
@@ -161,181 +415,905 @@ class LangGraphAgent:
             route,
             {
                 "action": "action",
+                "finalize": "finalize",
                 "end": END
             }
         )
         graph.add_edge("action", "process_tool")
-        graph.add_edge("process_tool", "agent")
+        # 工具结果已经得到最终回答（快速路由的模板回答、核对一致的推测回答）时直接结束，否则交给模型
+        graph.add_conditional_edges(
+            "process_tool",
+            lambda state: "end" if state.get("answered") else "agent",
+            {"agent": "agent", "end": END}
+        )
+        graph.add_edge("finalize", END)
         
-        # 设置入口节点
-        graph.set_entry_point("agent")
+        # 设置入口节点：先按max_history_messages裁剪会话历史，再由快速路由决定直接调用工具还是进入Agent循环
+        graph.set_entry_point("prepare")
+        graph.add_edge("prepare", "router")
+        graph.add_conditional_edges(
+            "router",
+            lambda state: "action" if state.get("tool_calls") else "agent",
+            {"action": "action", "agent": "agent"}
+        )
         
         logger.debug("状态图构建完成")
-
-        # 1: 逐行注释
-        # 画出状态图结构，便于理解节点和流程
-        try:
-            import graphviz
-            dot = graphviz.Digraph(comment="Agent StateGraph")
-            dot.node("agent", "Agent节点")
-            dot.node("action", "Action节点")
-            dot.node("process_tool", "ProcessTool节点")
-            dot.node("end", "END(结束)")
-
-            dot.edge("agent", "action", label="需要工具")
-            dot.edge("agent", "end", label="直接回复")
-            dot.edge("action", "process_tool")
-            dot.edge("process_tool", "agent")
-
-            # 渲染为图片并保存
-            dot.render("agent_state_graph", format="png", cleanup=True)
-            logger.info("状态图已保存为 agent_state_graph.png")
-        except Exception as e:
-            logger.warning(f"画图失败: {e}")
-        return graph.compile()
-    
-    def _agent_node(self, state: AgentState) -> AgentState:
-        """Agent节点，决定下一步行动"""
-        # 断点提示: 可以在此处设置断点检查Agent节点的处理过程
-        # breakpoint()
+        # 状态图的图片改为按需导出，见src/agents/diagram.py（cli.py --export-graph）
+        return graph.compile(checkpointer=checkpointer)
+    
+    @staticmethod
+    def _timed_node(name: str, node: Any) -> Any:
+        """包装同步节点，记录节点耗时和span"""
+        def run(state: AgentState) -> Dict[str, Any]:
+            started = time.monotonic()
+            try:
+                with tracer.span("agent.node", node=name):
+                    return node(state)
+            finally:
+                NODE_SECONDS.observe(time.monotonic() - started, node=name)
+        return run
+    
+    @staticmethod
+    def _atimed_node(name: str, node: Any) -> Any:
+        """包装异步节点，记录节点耗时和span"""
+        async def run(state: AgentState) -> Dict[str, Any]:
+            started = time.monotonic()
+            try:
+                with tracer.span("agent.node", node=name):
+                    return await node(state)
+            finally:
+                NODE_SECONDS.observe(time.monotonic() - started, node=name)
+        return run
+    
+    @staticmethod
+    def _count_iteration() -> None:
+        """当前请求的Agent循环次数加一"""
+        counter = _request_iterations.get()
+        if counter is not None:
+            counter[0] += 1
+    
+    def new_budget(self) -> RequestBudget:
+        """按Agent的默认配置创建一个请求预算，处理时间从此刻开始计算"""
+        return RequestBudget(
+            max_tool_rounds=self.max_tool_rounds,
+            max_tokens=self.max_request_tokens,
+            deadline=self.request_deadline
+        )
+    
+    @contextmanager
+    def _track_request(self, mode: str, budget: Optional[RequestBudget] = None) -> Any:
+        """
+        记录一次请求的span、结果状态和Agent循环次数，并设置本次请求的预算
         
-        logger.debug("进入Agent节点")
+        Args:
+            mode: 调用方式，invoke、ainvoke或astream
+            budget: 请求预算，为None时按Agent的默认配置创建
+        """
+        counter = [0]
+        budget = budget if budget is not None else self.new_budget()
+        token = _request_iterations.set(counter)
+        agent_token = _active_agent.set(self)
+        budget_token = _request_budget.set(budget)
+        status = "ok"
+        try:
+            with tracer.span("agent.request", mode=mode) as span:
+                yield span
+                span.set_attribute("iterations", counter[0])
+                if budget.stop_reason:
+                    span.set_attribute("budget_exhausted", budget.stop_reason)
+        except (GeneratorExit, asyncio.CancelledError):
+            status = "cancelled"
+            raise
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            try:
+                _request_iterations.reset(token)
+                _active_agent.reset(agent_token)
+                _request_budget.reset(budget_token)
+            except ValueError:
+                # 流式生成器在另一个上下文中被关闭
+                pass
+            AGENT_REQUESTS.inc(mode=mode, status=status)
+            AGENT_ITERATIONS.observe(counter[0])
+    
+    def _build_prompt(self, state: Dict[str, Any]) -> str:
+        """根据当前状态（以及本步骤尚未写回的更新）构建发送给LLM的提示"""
         messages = state["messages"]
         
-        # 准备工具描述
-        tool_descriptions = []
-        for tool in self.tools:
-            tool_descriptions.append(f"- {tool.name}: {tool.description}")
-        
-        tools_str = "\n".join(tool_descriptions)
-        
         # 准备提示
-        user_input = messages[-1].content if messages else ""
+        user_input = self._render_input(messages, state.get("summary", ""))
         logger.debug(f"用户输入: {user_input}")
         
-        prompt_with_tools = self.prompt.format(
-            tools=tools_str,
+        tool_prompt = self._tool_prompt_for(state)
+        if tool_prompt.prefix is not None:
+            return tool_prompt.prefix + user_input + tool_prompt.suffix
+        
+        return self.prompt.format(
+            tools=tool_prompt.tools_str,
             input=user_input
         )
+    
+    @staticmethod
+    def _render_input(
+        messages: List[Union[HumanMessage, AIMessage, SystemMessage]],
+        summary: str = ""
+    ) -> str:
+        """
+        将消息历史渲染为提示中的输入部分
         
-        # 获取模型响应
-        logger.debug("调用LLM获取响应")
-        response = self.llm.invoke(prompt_with_tools)
+        只有一条消息且没有摘要时直接使用其内容；否则把摘要和之前的消息放在当前输入之前
+        """
+        if not messages:
+            return ""
+        if len(messages) == 1 and not summary:
+            return messages[-1].content
+        
+        sections = []
+        if summary:
+            sections.append("对话摘要:\n" + summary)
+        if len(messages) > 1:
+            history = []
+            for message in messages[:-1]:
+                role = "助手" if isinstance(message, AIMessage) else "用户"
+                content = message.content
+                if not content and getattr(message, "tool_calls", None):
+                    # 原生函数调用模式下只有工具调用、没有文本的助手消息
+                    content = "调用工具 " + "；".join(
+                        f"{call['name']}({json.dumps(call['args'], ensure_ascii=False)})"
+                        for call in message.tool_calls
+                    )
+                history.append(f"{role}: {content}")
+            sections.append("对话历史:\n" + "\n".join(history))
+        
+        return "\n\n".join(sections) + "\n\n当前输入: " + messages[-1].content
+    
+    def _fit_context(self, state: AgentState) -> Dict[str, Any]:
+        """
+        按token预算裁剪消息历史，放不下的旧消息合并进摘要
+        
+        Returns:
+            需要写回状态的更新，未裁剪时为空字典
+        """
+        if self.context_manager is None:
+            return {}
+        messages, summary = self.context_manager.fit(
+            state["messages"], state.get("summary", ""), self._tool_prompt_for(state).fixed_tokens
+        )
+        return self._fitted(state, messages, summary)
+    
+    async def _afit_context(self, state: AgentState) -> Dict[str, Any]:
+        """_fit_context的异步版本"""
+        if self.context_manager is None:
+            return {}
+        messages, summary = await self.context_manager.afit(
+            state["messages"], state.get("summary", ""), self._tool_prompt_for(state).fixed_tokens
+        )
+        return self._fitted(state, messages, summary)
+    
+    @staticmethod
+    def _fitted(state: AgentState, messages: List[Any], summary: str) -> Dict[str, Any]:
+        """上下文管理器裁剪了历史时返回需要写回的消息和摘要"""
+        if messages is state["messages"]:
+            return {}
+        return {"messages": messages, "summary": summary}
+    
+    @staticmethod
+    def _with_messages(updates: Dict[str, Any], *messages: Any) -> Dict[str, Any]:
+        """
+        在节点的更新中追加消息
+        
+        本步骤裁剪过历史时，裁剪后的历史连同新消息一起整体替换状态中的消息列表
+        """
+        if "messages" in updates:
+            updates["messages"] = Overwrite(list(updates["messages"]) + list(messages))
+        else:
+            updates["messages"] = list(messages)
+        return updates
+    
+    @property
+    def token_counter(self) -> TokenCounter:
+        """估算请求token预算的计数器，配置了上下文管理器时与其共用计数缓存"""
+        global _default_token_counter
+        if self.context_manager is not None:
+            return self.context_manager.counter
+        if _default_token_counter is None:
+            _default_token_counter = TokenCounter()
+        return _default_token_counter
+    
+    def _prompt_tokens(self, prompt: str, tool_prompt: _ToolPrompt) -> int:
+        """估算提示的token数；静态前缀、后缀和函数声明的计数被缓存，每一步只需计算用户输入部分"""
+        counter = self.token_counter
+        if tool_prompt.schemas and tool_prompt.schema_tokens is None:
+            tool_prompt.schema_tokens = counter.count(json.dumps(tool_prompt.schemas, ensure_ascii=False))
+        tokens = tool_prompt.schema_tokens or 0
+        prefix, suffix = tool_prompt.prefix, tool_prompt.suffix
+        if prefix is None or not prompt.startswith(prefix):
+            return tokens + counter.count(prompt)
+        user_input = prompt[len(prefix):len(prompt) - len(suffix)]
+        return tokens + counter.count(prefix) + counter.count(suffix) + counter.count(user_input)
+    
+    def _charge_tokens(self, prompt: str, response: str, tool_prompt: _ToolPrompt) -> None:
+        """把一次LLM调用的提示和回复token数计入当前请求的预算"""
+        budget = _request_budget.get()
+        if budget is None or budget.max_tokens is None:
+            return
+        budget.add_tokens(self._prompt_tokens(prompt, tool_prompt) + self.token_counter.count(response))
+    
+    @staticmethod
+    def _budget_exhausted() -> Optional[str]:
+        """当前请求的token或处理时间已耗尽时返回原因"""
+        budget = _request_budget.get()
+        return budget.exhausted() if budget is not None else None
+    
+    @staticmethod
+    def _remaining_time() -> Optional[float]:
+        """当前请求的剩余处理时间（秒），不限制时返回None"""
+        budget = _request_budget.get()
+        return budget.remaining() if budget is not None else None
+    
+    @staticmethod
+    def _stop(reason: str, updates: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        请求预算耗尽：不再执行工具调用，由finalize节点给出最终回答
+        
+        Args:
+            reason: 耗尽的预算，tool_rounds、tokens或deadline
+            updates: 本步骤已有的状态更新（例如裁剪后的历史）
+        """
+        logger.info(f"请求预算耗尽（{REASON_DESCRIPTIONS.get(reason, reason)}），结束Agent循环")
+        budget = _request_budget.get()
+        if budget is not None:
+            budget.exhaust(reason)
+        return {**(updates or {}), "tool_calls": [], "stop_reason": reason}
+    
+    def _update_with_response(
+        self,
+        updates: Dict[str, Any],
+        response: str,
+        tool_calls: Union[List[Dict[str, Any]], None] = None,
+        prompt: Optional[str] = None,
+        tool_prompt: Optional[_ToolPrompt] = None
+    ) -> Dict[str, Any]:
+        """
+        生成把LLM响应作为AI消息写入状态、并记录解析出的工具调用的更新
+        
+        工具调用必须由节点返回才会被持久化（条件边函数中对状态的修改会被丢弃）；
+        请求预算不允许再执行一轮工具调用时，丢弃这次的工具调用请求并转到finalize节点
+        
+        Args:
+            updates: 本步骤已有的状态更新（例如裁剪后的历史）
+            response: LLM响应文本
+            tool_calls: 流式解析或原生函数调用已得到的工具调用，为None时从响应全文中提取
+            prompt: 本次发送给LLM的提示，用于累计请求的token数
+            tool_prompt: 提示所用的工具集，为None时为Agent的工具
+        """
         logger.debug(f"LLM响应: {response[:100]}...")  # 只记录前100个字符
         
-        # 创建AI消息
-        ai_message = AIMessage(content=response)
+        if tool_calls is None:
+            tool_calls = extract_tool_calls(response)
+        tool_calls = [call for call in tool_calls if call.get("name") in self.tool_map]
         
-        # 更新消息历史
-        messages.append(ai_message)
+        budget = _request_budget.get()
+        if budget is not None:
+            if prompt is not None:
+                self._charge_tokens(prompt, response, tool_prompt or self._tool_prompt)
+            if tool_calls:
+                reason = budget.exhausted() or (None if budget.allows_tool_round() else TOOL_ROUNDS)
+                if reason:
+                    return self._stop(reason, updates)
         
-        # 更新状态
-        state["messages"] = messages
+        # 创建AI消息；原生函数调用模式下同时保存结构化的工具调用
+        if self.function_calling:
+            ai_message = AIMessage(content=response, tool_calls=[
+                {"name": call["name"], "args": call.get("params", {}), "id": call.get("id")}
+                for call in tool_calls
+            ])
+        else:
+            ai_message = AIMessage(content=response)
+        
+        # 只返回新增的消息和本轮的工具调用
+        updates["tool_calls"] = tool_calls
         
         logger.debug("Agent节点处理完成")
-        return state
+        return self._with_messages(updates, ai_message)
     
-    def _route(self, state: AgentState) -> Union[str, Dict[str, Any]]:
-        """路由节点，决定是使用工具还是直接回复"""
-        messages = state["messages"]
-        last_message = messages[-1]
+    def _agent_node(self, state: AgentState) -> Dict[str, Any]:
+        """Agent节点，决定下一步行动"""
+        # 断点提示: 可以在此处设置断点检查Agent节点的处理过程
+        # breakpoint()
+        
+        logger.debug("进入Agent节点")
+        self._count_iteration()
+        reason = self._budget_exhausted()
+        if reason:
+            return self._stop(reason)
+        return self._check_route(state, self._call_agent(state))
+    
+    def _call_agent(self, state: AgentState) -> Dict[str, Any]:
+        """调用LLM，返回把响应写入状态的更新"""
+        updates = self._fit_context(state)
+        tool_prompt = self._tool_prompt_for(state)
+        prompt_with_tools = self._build_prompt({**state, **updates})
         
-        # 提取工具使用信息
-        tool_info = extract_tool_use(last_message.content)
+        if self.function_calling:
+            logger.debug("以原生函数调用模式调用LLM")
+            result = self.llm.call_with_tools(prompt_with_tools, tool_prompt.schemas)
+            return self._update_with_response(
+                updates, result.content, result.tool_calls, prompt_with_tools, tool_prompt
+            )
         
-        if tool_info and tool_info.get("name") in self.tool_map:
-            # 需要使用工具
-            state["tool_calls"] = [tool_info]
-            return "action"
+        if getattr(self.llm, "streaming", False) and self.early_tool_dispatch:
+            logger.debug("流式调用LLM获取响应")
+            parser = ToolCallStreamParser()
+            tool_calls = []
+            with closing(self.llm.stream(prompt_with_tools)) as stream:
+                for chunk in stream:
+                    tool_calls.extend(parser.feed(chunk))
+                    if parser.done and tool_calls:
+                        # 工具调用已完整，停止接收模型推测的结果和回答
+                        break
+            if not parser.done:
+                tool_calls.extend(parser.close())
+            # 流式解析未得到工具调用时，回退到对全文的解析
+            return self._update_with_response(updates, parser.text, tool_calls or None, prompt_with_tools, tool_prompt)
+        
+        # 获取模型响应
+        logger.debug("调用LLM获取响应")
+        response = self.llm.invoke(prompt_with_tools)
+        
+        return self._update_with_response(updates, response, prompt=prompt_with_tools, tool_prompt=tool_prompt)
+    
+    async def _aagent_node(self, state: AgentState) -> Dict[str, Any]:
+        """Agent节点的异步版本，等待LLM响应时不阻塞事件循环；请求处理时间耗尽时取消LLM调用"""
+        logger.debug("进入Agent节点(异步)")
+        self._count_iteration()
+        reason = self._budget_exhausted()
+        if reason:
+            return self._stop(reason)
+        try:
+            async with asyncio.timeout(self._remaining_time()) as timeout:
+                return self._check_route(state, await self._acall_agent(state))
+        except TimeoutError:
+            if not timeout.expired():
+                raise
+            return self._stop(DEADLINE)
+    
+    async def _acall_agent(self, state: AgentState) -> Dict[str, Any]:
+        """异步调用LLM，返回把响应写入状态的更新"""
+        updates = await self._afit_context(state)
+        tool_prompt = self._tool_prompt_for(state)
+        prompt_with_tools = self._build_prompt({**state, **updates})
+        
+        if self.function_calling:
+            logger.debug("以原生函数调用模式异步调用LLM")
+            result = await self.llm.acall_with_tools(prompt_with_tools, tool_prompt.schemas)
+            return self._update_with_response(
+                updates, result.content, result.tool_calls, prompt_with_tools, tool_prompt
+            )
+        
+        # 获取模型响应；模型开启流式时逐块接收，便于astream向上游实时转发token，
+        # 并在解析到完整的工具调用后提前结束生成
+        if getattr(self.llm, "streaming", False):
+            logger.debug("流式调用LLM获取响应")
+            parser = ToolCallStreamParser()
+            tool_calls = []
+            async with aclosing(self.llm.astream(prompt_with_tools)) as stream:
+                async for chunk in stream:
+                    tool_calls.extend(parser.feed(chunk))
+                    if parser.done and tool_calls and self.early_tool_dispatch:
+                        logger.debug("已解析到完整的工具调用，取消剩余生成")
+                        break
+            if not parser.done:
+                tool_calls.extend(parser.close())
+            # 流式解析未得到工具调用时，回退到对全文的解析
+            return self._update_with_response(updates, parser.text, tool_calls or None, prompt_with_tools, tool_prompt)
         else:
-            # 直接回复
-            return END
+            logger.debug("异步调用LLM获取响应")
+            response = await self.llm.ainvoke(prompt_with_tools)
+        
+        return self._update_with_response(updates, response, prompt=prompt_with_tools, tool_prompt=tool_prompt)
+    
+    def _check_route(self, state: AgentState, updates: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        核对快速路由抽样改走LLM路径的请求：比较LLM第一次决策的工具调用与路由的选择
+
+        Args:
+            state: 当前状态
+            updates: Agent节点本步骤的更新
+        """
+        routed = state.get("routed")
+        if routed and self.router is not None and not updates.get("stop_reason"):
+            self.router.judge(routed, updates.get("tool_calls") or [])
+        if routed:
+            updates["routed"] = {}
+        return updates
+    
+    @property
+    def tool_executor(self) -> ThreadPoolExecutor:
+        """同步路径执行工具调用的有界线程池，首次使用时创建"""
+        if self._tool_executor is None:
+            with self._tool_executor_lock:
+                if self._tool_executor is None:
+                    self._tool_executor = ThreadPoolExecutor(
+                        max_workers=self.max_tool_workers,
+                        thread_name_prefix="agent-tool"
+                    )
+        return self._tool_executor
+
+    def close(self) -> None:
+        """释放工具线程池，进程退出或应用关闭时调用"""
+        with self._tool_executor_lock:
+            executor, self._tool_executor = self._tool_executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def _plan_tool_calls(
+        self,
+        tool_calls: List[Dict[str, Any]]
+    ) -> Tuple[Dict[int, Any], List[Tuple[BaseTool, List[int]]], List[int]]:
+        """
+        安排本轮工具调用的执行方式
+        
+        Returns:
+            (命中缓存的结果{序号: 结果}, 批量执行的分组[(工具, 序号列表)], 单独执行的序号列表)；
+            同一轮中对提供了run_batch的工具的多次调用合并为一次批量执行
+        """
+        cached_results = {}
+        pending: Dict[str, List[int]] = {}
+        for position, tool_call in enumerate(tool_calls):
+            cached = self._cached_tool_result(tool_call["name"], tool_call.get("params", {}))
+            if cached is not MISS:
+                cached_results[position] = cached
+            else:
+                pending.setdefault(tool_call["name"], []).append(position)
+        
+        batches, singles = [], []
+        for tool_name, positions in pending.items():
+            tool = self.tool_map[tool_name]
+            if len(positions) > 1 and callable(getattr(tool, "run_batch", None)):
+                batches.append((tool, positions))
+            else:
+                singles.extend(positions)
+        return cached_results, batches, singles
+    
+    def _submit_batch(self, tool: BaseTool, params_list: List[Dict[str, Any]]) -> List[Future]:
+        """在线程池中批量执行同一工具的多次调用，返回每次调用各自的Future"""
+        futures = [Future() for _ in params_list]
+        
+        def run() -> None:
+            try:
+                results = self._timed_tool(tool.name, tool.run_batch, params_list)
+            except Exception as e:
+                results = [e] * len(futures)
+            for future, result in zip(futures, results):
+                if future.cancelled():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+        
+        self.tool_executor.submit(contextvars.copy_context().run, run)
+        return futures
     
-    def _action_node(self, state: AgentState) -> AgentState:
-        """执行工具调用"""
+    def _action_node(self, state: AgentState) -> Dict[str, Any]:
+        """执行工具调用，同一轮中的多个调用在线程池中并行执行"""
         # 断点提示: 可以在此处设置断点检查工具调用过程
         # breakpoint()
         
         logger.debug("进入Action节点")
-        tool_calls = state["tool_calls"]
-        tool_results = state.get("tool_results", [])
+        self._start_tool_round()
+        tool_calls = [call for call in state["tool_calls"] if call.get("name") in self.tool_map]
+        tool_results = []
+        cached_results, batches, singles = self._plan_tool_calls(tool_calls)
         
-        for tool_call in tool_calls:
+        # 所有未命中缓存的调用同时提交，共用同一个截止时间
+        futures: Dict[int, Future] = {}
+        for position, result in cached_results.items():
+            futures[position] = Future()
+            futures[position].set_result(result)
+        for tool, positions in batches:
+            logger.debug(f"批量执行工具调用: {tool.name} x {len(positions)}")
+            batch = self._submit_batch(tool, [tool_calls[position].get("params", {}) for position in positions])
+            futures.update(zip(positions, batch))
+        for position in singles:
+            tool_name = tool_calls[position]["name"]
+            params = tool_calls[position].get("params", {})
+            logger.debug(f"执行工具调用: {tool_name}, 参数: {params}")
+            futures[position] = self.tool_executor.submit(
+                contextvars.copy_context().run, self._timed_tool, tool_name, self.tool_map[tool_name]._run, **params
+            )
+        tool_timeout, timeout_message = self._round_timeout()
+        deadline = time.monotonic() + tool_timeout if tool_timeout is not None else None
+        
+        for position, tool_call in enumerate(tool_calls):
             tool_name = tool_call.get("name")
             params = tool_call.get("params", {})
-            
-            logger.debug(f"执行工具调用: {tool_name}, 参数: {params}")
-            
-            # 获取工具
-            if tool_name in self.tool_map:
-                tool = self.tool_map[tool_name]
+            future = futures[position]
+            try:
+                timeout = max(0.0, deadline - time.monotonic()) if deadline is not None else None
+                result = future.result(timeout=timeout)
+                if position not in cached_results:
+                    self._remember_tool_result(tool_name, params, result)
+                tool_results.append(self._tool_success(tool_name, params, result, cached=position in cached_results))
+            except FutureTimeoutError:
+                # 线程无法被强制终止，超时的调用在后台结束后其结果被丢弃
+                future.cancel()
+                tool_results.append(self._tool_error(tool_name, params, TimeoutError(timeout_message)))
+            except Exception as e:
+                tool_results.append(self._tool_error(tool_name, params, e))
+        
+        return self._finish_action(tool_results)
+    
+    async def _aaction_node(self, state: AgentState) -> Dict[str, Any]:
+        """执行工具调用的异步版本，同一轮中的多个调用通过工具的_arun并发执行"""
+        logger.debug("进入Action节点(异步)")
+        self._start_tool_round()
+        tool_calls = [call for call in state["tool_calls"] if call.get("name") in self.tool_map]
+        cached_results, batches, singles = self._plan_tool_calls(tool_calls)
+        semaphore = asyncio.Semaphore(self.max_tool_workers)
+        tool_timeout, timeout_message = self._round_timeout()
+        timeout_error = TimeoutError(timeout_message)
+        outcomes: Dict[int, Dict[str, Any]] = {
+            position: self._tool_success(
+                tool_calls[position]["name"], tool_calls[position].get("params", {}), result, cached=True
+            )
+            for position, result in cached_results.items()
+        }
+        
+        def record(position: int, result: Any) -> None:
+            tool_name = tool_calls[position]["name"]
+            params = tool_calls[position].get("params", {})
+            if isinstance(result, Exception):
+                outcomes[position] = self._tool_error(tool_name, params, result)
+            else:
+                self._remember_tool_result(tool_name, params, result)
+                outcomes[position] = self._tool_success(tool_name, params, result)
+        
+        async def run_single(position: int) -> None:
+            tool_name = tool_calls[position]["name"]
+            params = tool_calls[position].get("params", {})
+            logger.debug(f"异步执行工具调用: {tool_name}, 参数: {params}")
+            async with semaphore:
                 try:
-                    # 执行工具调用
-                    result = tool._run(**params)
-                    logger.debug(f"工具执行成功: {result[:100]}..." if isinstance(result, str) and len(result) > 100 else f"工具执行成功: {result}")
-                    
-                    # 保存结果
-                    tool_results.append({
-                        "tool_name": tool_name,
-                        "params": params,
-                        "result": result
-                    })
+                    record(position, await asyncio.wait_for(
+                        self._atimed_tool(tool_name, self.tool_map[tool_name]._arun(**params)), tool_timeout
+                    ))
+                except asyncio.TimeoutError:
+                    record(position, timeout_error)
                 except Exception as e:
-                    # 工具执行错误
-                    logger.error(f"工具执行错误: {str(e)}")
-                    tool_results.append({
-                        "tool_name": tool_name,
-                        "params": params,
-                        "error": str(e)
-                    })
-        
-        # 更新状态
-        state["tool_results"] = tool_results
-        state["tool_calls"] = []
+                    record(position, e)
+        
+        async def run_batch(tool: BaseTool, positions: List[int]) -> None:
+            logger.debug(f"批量执行工具调用: {tool.name} x {len(positions)}")
+            params_list = [tool_calls[position].get("params", {}) for position in positions]
+            async with semaphore:
+                try:
+                    results = await asyncio.wait_for(
+                        self._atimed_tool(tool.name, asyncio.to_thread(tool.run_batch, params_list)), tool_timeout
+                    )
+                except asyncio.TimeoutError:
+                    results = [timeout_error] * len(positions)
+                except Exception as e:
+                    results = [e] * len(positions)
+            for position, result in zip(positions, results):
+                record(position, result)
+        
+        await asyncio.gather(
+            *(run_batch(tool, positions) for tool, positions in batches),
+            *(run_single(position) for position in singles)
+        )
+        return self._finish_action([outcomes[position] for position in range(len(tool_calls))])
+    
+    @staticmethod
+    def _start_tool_round() -> None:
+        """当前请求的工具调用轮数加一"""
+        budget = _request_budget.get()
+        if budget is not None:
+            budget.start_tool_round()
+    
+    def _round_timeout(self) -> Tuple[Optional[float], str]:
+        """
+        本轮工具调用的超时时间
+        
+        Returns:
+            (超时秒数, 超时提示)；取工具超时和请求剩余处理时间中较小的一个，None表示不限制
+        """
+        remaining = self._remaining_time()
+        if remaining is not None and (self.tool_timeout is None or remaining < self.tool_timeout):
+            return remaining, "超出请求处理时间上限"
+        return self.tool_timeout, f"执行超时（{self.tool_timeout}秒）"
+    
+    def _cached_tool_result(self, tool_name: str, params: Dict[str, Any]) -> Any:
+        """查找可缓存工具的结果，不可缓存或未命中时返回MISS"""
+        if not is_cacheable(self.tool_map[tool_name]):
+            return MISS
+        result = self.tool_cache.get(tool_name, params)
+        if result is not MISS:
+            logger.debug(f"工具结果缓存命中: {tool_name}, 参数: {params}")
+        return result
+    
+    def _remember_tool_result(self, tool_name: str, params: Dict[str, Any], result: Any) -> None:
+        """缓存可缓存工具的成功结果（异常不会被缓存）"""
+        tool = self.tool_map[tool_name]
+        if is_cacheable(tool):
+            self.tool_cache.put(tool_name, params, result, ttl=getattr(tool, "cache_ttl", None))
+    
+    @staticmethod
+    def _timed_tool(tool_name: str, func: Any, *args: Any, **kwargs: Any) -> Any:
+        """同步执行工具并记录耗时和span（批量执行时记录整批的耗时）"""
+        started = time.monotonic()
+        try:
+            with tracer.span("tool.call", tool=tool_name):
+                return func(*args, **kwargs)
+        finally:
+            TOOL_SECONDS.observe(time.monotonic() - started, tool=tool_name)
+    
+    @staticmethod
+    async def _atimed_tool(tool_name: str, awaitable: Any) -> Any:
+        """等待工具执行完成并记录耗时和span"""
+        started = time.monotonic()
+        try:
+            with tracer.span("tool.call", tool=tool_name):
+                return await awaitable
+        finally:
+            TOOL_SECONDS.observe(time.monotonic() - started, tool=tool_name)
+    
+    @staticmethod
+    def _tool_success(tool_name: str, params: Dict[str, Any], result: Any, cached: bool = False) -> Dict[str, Any]:
+        """构建工具执行成功的结果记录"""
+        TOOL_CALLS.inc(tool=tool_name, status="cached" if cached else "ok")
+        logger.debug(f"工具执行成功: {result[:100]}..." if isinstance(result, str) and len(result) > 100 else f"工具执行成功: {result}")
+        return {
+            "tool_name": tool_name,
+            "params": params,
+            "result": result
+        }
+    
+    @staticmethod
+    def _tool_error(tool_name: str, params: Dict[str, Any], error: Exception) -> Dict[str, Any]:
+        """构建工具执行失败的结果记录"""
+        TOOL_CALLS.inc(tool=tool_name, status="error")
+        logger.error(f"工具执行错误: {str(error)}")
+        return {
+            "tool_name": tool_name,
+            "params": params,
+            "error": str(error)
+        }
+    
+    @staticmethod
+    def _finish_action(tool_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        写回本轮的工具结果（追加到本次请求已有的结果之后）
         
+        本轮的工具调用保留到ProcessTool节点，用于确定本轮产生了哪些结果
+        """
         logger.debug("Action节点处理完成")
-        return state
+        return {"tool_results": tool_results}
     
-    def _process_tool_node(self, state: AgentState) -> AgentState:
-        """处理工具调用结果"""
+    @staticmethod
+    def _format_tool_result(tool_result: Dict[str, Any], with_params: bool = False) -> str:
+        """把一条工具结果格式化为反馈给模型的文本"""
+        tool_name = tool_result.get("tool_name")
+        if with_params:
+            # 同一轮有多个调用时附上参数，便于模型区分（例如多个城市的天气）
+            params = ", ".join(f"{key}={value}" for key, value in tool_result.get("params", {}).items())
+            tool_name = f"{tool_name}({params})"
+        error = tool_result.get("error", "")
+        if error:
+            return f"工具 {tool_name} 执行失败: {error}"
+        return f"工具 {tool_name} 执行结果: {tool_result.get('result', '')}"
+    
+    def _process_tool_node(self, state: AgentState) -> Dict[str, Any]:
+        """处理工具调用结果，把本轮所有工具的结果合并为一条消息反馈给模型"""
         # 断点提示: 可以在此处设置断点检查工具结果处理过程
         # breakpoint()
         
         logger.debug("进入ProcessTool节点")
-        messages = state["messages"]
         tool_results = state["tool_results"]
+        round_size = len(state.get("tool_calls") or []) or 1
+        updates: Dict[str, Any] = {"tool_calls": []}
+        
+        routed = state.get("routed")
+        if routed:
+            # 快速路由的工具调用：结果可用时按模板回答，否则把结果交给模型
+            answer = self.router.render(routed, tool_results[-1]) if self.router is not None and tool_results else None
+            if answer is not None:
+                logger.debug(f"快速路由({routed['rule']})按模板回答")
+                # 省去了决定调用工具和根据结果回答两次LLM调用
+                AGENT_LLM_CALLS_SAVED.inc(2, reason="router")
+                return {"tool_calls": [], "messages": [AIMessage(content=answer)], "answered": True}
+            logger.debug(f"快速路由({routed['rule']})的工具结果不可用，交给模型处理")
+            updates["routed"] = {}
         
         if tool_results:
-            # 获取最新的工具调用结果
-            latest_result = tool_results[-1]
-            tool_name = latest_result.get("tool_name")
-            result = latest_result.get("result", "")
-            error = latest_result.get("error", "")
+            # 获取本轮的工具调用结果
+            round_results = tool_results[-round_size:]
+            result_message = "\n".join(
+                self._format_tool_result(result, with_params=len(round_results) > 1)
+                for result in round_results
+            )
+            logger.debug(f"工具执行结果消息: {result_message[:100]}..." if len(result_message) > 100 else result_message)
             
-            # 构建结果消息
-            if error:
-                result_message = f"工具 {tool_name} 执行失败: {error}"
-                logger.debug(f"工具执行失败消息: {result_message}")
+            # 添加人类消息；模型推测的结果与实际一致时，连同它已给出的回答一起写入，不再调用模型
+            answer = None if routed else self._verify_speculation(state, round_results)
+            if answer is None:
+                self._with_messages(updates, HumanMessage(content=result_message))
             else:
-                result_message = f"工具 {tool_name} 执行结果: {result}"
-                logger.debug(f"工具执行结果消息: {result_message[:100]}..." if len(result_message) > 100 else result_message)
-            
-            # 添加人类消息
-            human_message = HumanMessage(content=result_message)
-            messages.append(human_message)
-        
-        # 更新状态
-        state["messages"] = messages
+                self._with_messages(updates, HumanMessage(content=result_message), AIMessage(content=answer))
+                updates["answered"] = True
         
         logger.debug("ProcessTool节点处理完成")
-        return state
+        return updates
     
-    def invoke(self, query: str) -> str:
+    def _verify_speculation(self, state: AgentState, round_results: List[Dict[str, Any]]) -> Optional[str]:
+        """
+        核对请求本轮工具调用的模型响应中推测的行动结果
+
+        Returns:
+            可以直接使用的回答，需要再调用模型时返回None
+        """
+        response = next((msg.content for msg in reversed(state["messages"]) if isinstance(msg, AIMessage)), "")
+        answer, outcome = speculative_answer(self.speculative_answer, response, round_results, self.tool_map)
+        if outcome != "off":
+            AGENT_SPECULATIVE_ANSWERS.inc(outcome=outcome)
+        if answer is not None:
+            logger.debug(f"推测回答核对通过({outcome})，不再调用模型")
+            AGENT_LLM_CALLS_SAVED.inc(reason="speculation")
+        return answer
+    
+    def _final_answer_prompt(self, state: AgentState) -> Optional[str]:
+        """
+        生成要求模型不再使用工具、直接回答的提示
+        
+        只有工具调用轮数耗尽且token和处理时间还有剩余时才再调用一次LLM，否则返回None
+        """
+        if state.get("stop_reason") != TOOL_ROUNDS or self._budget_exhausted():
+            return None
+        messages = state["messages"] + [HumanMessage(content=_FINAL_ANSWER_INSTRUCTION)]
+        return self._build_prompt({**state, "messages": messages})
+    
+    def _finish_with_answer(self, state: AgentState, prompt: Optional[str], response: Optional[str]) -> Dict[str, Any]:
+        """把最终回答写入状态；模型没有给出回答时，用已获得的工具结果组成回答"""
+        if response is not None:
+            self._charge_tokens(prompt, response, self._tool_prompt_for(state))
+            parsed = parse_response(response)
+            if parsed.answer is None and parsed.tool_calls:
+                # 模型仍在请求工具，忽略这次回复
+                response = None
+        if response is None:
+            response = self._budget_answer(state)
+        logger.debug("Finalize节点处理完成")
+        return {"messages": [AIMessage(content=response)], "tool_calls": []}
+    
+    def _budget_answer(self, state: AgentState) -> str:
+        """不调用LLM，按本次请求已获得的工具结果生成回答"""
+        reason = REASON_DESCRIPTIONS.get(state.get("stop_reason"), "请求预算")
+        tool_results = state.get("tool_results") or []
+        if not tool_results:
+            return f"已达到本次请求的{reason}，未能完成回答，请简化问题后重试。"
+        lines = "\n".join(self._format_tool_result(result, with_params=True) for result in tool_results)
+        return f"已达到本次请求的{reason}，以下是目前已获得的结果：\n{lines}"
+    
+    def _finalize_node(self, state: AgentState) -> Dict[str, Any]:
+        """请求预算耗尽后给出最终回答，不再调用工具"""
+        logger.debug("进入Finalize节点")
+        prompt = self._final_answer_prompt(state)
+        response = self.llm.invoke(prompt) if prompt is not None else None
+        return self._finish_with_answer(state, prompt, response)
+    
+    async def _afinalize_node(self, state: AgentState) -> Dict[str, Any]:
+        """Finalize节点的异步版本，请求处理时间耗尽时取消LLM调用"""
+        logger.debug("进入Finalize节点(异步)")
+        prompt = self._final_answer_prompt(state)
+        response = None
+        if prompt is not None:
+            try:
+                async with asyncio.timeout(self._remaining_time()) as timeout:
+                    response = await self.llm.ainvoke(prompt)
+            except TimeoutError:
+                if not timeout.expired():
+                    raise
+                logger.warning("请求处理时间耗尽，取消生成最终回答")
+        return self._finish_with_answer(state, prompt, response)
+    
+    def _initial_state(self, query: str) -> Dict[str, Any]:
+        """
+        准备图的输入
+        
+        输入同样经过reducer：查询追加到会话存储中已有的消息之后，工具结果、预算状态和快速路由结果按请求重置，
+        摘要保留上一轮的值，因此不需要在执行前先读出会话状态
+        
+        Args:
+            query: 用户查询
+        """
+        return {
+            "messages": [HumanMessage(content=query)],
+            "tool_calls": [],
+            "tool_results": Overwrite([]),
+            "stop_reason": "",
+            "routed": {},
+            "answered": False
+        }
+    
+    def _prepare_node(self, state: AgentState) -> Dict[str, Any]:
+        """
+        请求开始时按max_history_messages裁剪会话历史（不计入本次的查询），
+        配置了工具注册表时按查询选出本次请求放入提示的工具
+        """
+        messages = state["messages"]
+        updates: Dict[str, Any] = {}
+        if self.tool_registry is not None:
+            updates["tool_names"] = self._select_tools(messages)
+        keep = self.max_history_messages + 1 if self.max_history_messages else 1
+        if len(messages) <= keep:
+            return updates
+        logger.debug(f"会话历史超过{self.max_history_messages}条，丢弃最早的{len(messages) - keep}条")
+        updates["messages"] = Overwrite(messages[-keep:])
+        return updates
+    
+    def _select_tools(self, messages: List[Union[HumanMessage, AIMessage, SystemMessage]]) -> List[str]:
+        """
+        从工具注册表中选出与当前查询最相关的max_tools个工具
+        
+        前两条消息作为上下文以较低的权重参与选择，追问（"那上海呢"）仍能选中上一轮用到的工具
+        """
+        context = " ".join(str(message.content) for message in messages[-3:-1])
+        selected = self.tool_registry.select(str(messages[-1].content), self.max_tools, context=context)
+        AGENT_SELECTED_TOOLS.observe(len(selected))
+        logger.debug(f"本次请求选出的工具: {[tool.name for tool in selected]}")
+        return [tool.name for tool in selected]
+    
+    def _router_node(self, state: AgentState) -> Dict[str, Any]:
+        """
+        快速路由：意图明确的查询直接生成工具调用，跳过第一次LLM决策
+
+        抽样核对的请求只记录路由的选择，仍然进入Agent节点
+        """
+        if self.router is None:
+            return {}
+        budget = _request_budget.get()
+        if budget is not None and not budget.allows_tool_round():
+            return {}
+        routed = self.router.route(state["messages"][-1].content, self.tool_map)
+        if routed is None:
+            return {}
+        logger.debug(f"快速路由({routed['rule']}): {routed['tool']}({routed['params']})")
+        if routed["shadow"]:
+            return {"routed": routed}
+        return {"routed": routed, "tool_calls": [{"name": routed["tool"], "params": routed["params"]}]}
+    
+    def _run_config(self, conversation_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        """
+        生成图执行配置
+        
+        启用会话存储时以conversation_id作为LangGraph的thread_id；未提供时使用一次性ID
+        """
+        if self.checkpointer is None:
+            return None
+        return {"configurable": {"thread_id": conversation_id or f"oneshot_{uuid.uuid4().hex}"}}
+    
+    def _run_options(self) -> Dict[str, Any]:
+        """图执行的其他参数：启用会话存储时指定检查点的写入时机"""
+        if self.checkpointer is None:
+            return {}
+        return {"durability": self.durability}
+    
+    def invoke(
+        self,
+        query: str,
+        conversation_id: Optional[str] = None,
+        budget: Optional[RequestBudget] = None
+    ) -> str:
         """
         执行Agent查询
         
         Args:
             query: 用户查询
+            conversation_id: 会话ID，启用会话存储时用于延续多轮对话
+            budget: 本次请求的预算，为None时按Agent的默认配置创建
             
         Returns:
             Agent的响应
@@ -345,19 +1323,106 @@ class LangGraphAgent:
         
         logger.info(f"开始处理查询: {query}")
         
-        # 准备初始状态
-        initial_state = {
-            "messages": [HumanMessage(content=query)],
-            "tool_calls": [],
-            "tool_results": []
-        }
+        config = self._run_config(conversation_id)
+        initial_state = self._initial_state(query)
         
         # 执行图
         logger.debug("开始执行状态图")
-        result = self.graph.invoke(initial_state)
+        with self._track_request("invoke", budget):
+            result = self.graph.invoke(initial_state, config, **self._run_options())
         logger.debug("状态图执行完成")
         
-        # 提取回复
+        return self._extract_answer(result)
+    
+    async def ainvoke(
+        self,
+        query: str,
+        conversation_id: Optional[str] = None,
+        budget: Optional[RequestBudget] = None
+    ) -> str:
+        """
+        异步执行Agent查询
+        
+        LLM请求和工具调用均走异步路径，适合在事件循环（如FastAPI）中并发处理大量会话
+        
+        Args:
+            query: 用户查询
+            conversation_id: 会话ID，启用会话存储时用于延续多轮对话
+            budget: 本次请求的预算，为None时按Agent的默认配置创建
+            
+        Returns:
+            Agent的响应
+        """
+        logger.info(f"开始异步处理查询: {query}")
+        
+        config = self._run_config(conversation_id)
+        initial_state = self._initial_state(query)
+        
+        logger.debug("开始异步执行状态图")
+        with self._track_request("ainvoke", budget):
+            result = await self.graph.ainvoke(initial_state, config, **self._run_options())
+        logger.debug("状态图执行完成")
+        
+        return self._extract_answer(result)
+    
+    async def astream(
+        self,
+        query: str,
+        conversation_id: Optional[str] = None,
+        budget: Optional[RequestBudget] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        流式执行Agent查询
+        
+        依次产出以下事件：
+        - {"type": "node_start", "node": 节点名}
+        - {"type": "token", "node": 节点名, "content": 增量文本}（需要模型开启streaming）
+        - {"type": "node_end", "node": 节点名}
+        - {"type": "final", "content": 最终回答}
+        
+        Args:
+            query: 用户查询
+            conversation_id: 会话ID，启用会话存储时用于延续多轮对话
+            budget: 本次请求的预算，为None时按Agent的默认配置创建
+            
+        Yields:
+            事件字典
+        """
+        logger.info(f"开始流式处理查询: {query}")
+        
+        config = self._run_config(conversation_id)
+        initial_state = self._initial_state(query)
+        
+        final_state = None
+        with self._track_request("astream", budget):
+            async for event in self.graph.astream_events(
+                initial_state, config, version="v2", **self._run_options()
+            ):
+                kind = event["event"]
+                node = event.get("metadata", {}).get("langgraph_node")
+                
+                if kind == "on_llm_stream":
+                    chunk = event["data"].get("chunk")
+                    text = getattr(chunk, "text", chunk)
+                    if text:
+                        yield {"type": "token", "node": node, "content": text}
+                elif kind in ("on_chain_start", "on_chain_end") and node and event["name"] == node:
+                    yield {"type": "node_start" if kind == "on_chain_start" else "node_end", "node": node}
+                elif kind == "on_chain_end" and not event.get("parent_ids"):
+                    # 顶层图执行结束，输出即最终状态
+                    final_state = event["data"].get("output")
+        
+        logger.debug("状态图流式执行完成")
+        
+        if final_state is None:
+            logger.warning("无法生成回复")
+            yield {"type": "final", "content": "无法生成回复。"}
+            return
+        
+        yield {"type": "final", "content": self._extract_answer(final_state)}
+    
+    def _extract_answer(self, result: AgentState) -> str:
+        """从图执行结果中提取最终回复"""
         final_messages = result["messages"]
         ai_messages = [msg for msg in final_messages if isinstance(msg, AIMessage)]
         
@@ -366,9 +1431,8 @@ class LangGraphAgent:
             final_response = ai_messages[-1].content
             
             # 尝试提取"回答:"部分
-            answer_match = re.search(r"回答:(.*?)(?:$|问题:|思考:|行动:)", final_response, re.DOTALL)
-            if answer_match:
-                answer = answer_match.group(1).strip()
+            answer = parse_response(final_response).answer
+            if answer is not None:
                 logger.info(f"生成最终回答: {answer[:100]}..." if len(answer) > 100 else answer)
                 return answer
             
@@ -376,4 +1440,4 @@ class LangGraphAgent:
             return final_response
         
         logger.warning("无法生成回复")
-        return "无法生成回复。" 
\ No newline at end of file
+        return "无法生成回复。"
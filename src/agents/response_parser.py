@@ -0,0 +1,171 @@
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+# 协议中的段落标记
+QUESTION_MARKER = "问题:"
+THOUGHT_MARKER = "思考:"
+ACTION_MARKER = "行动:"
+TOOL_MARKER = "使用工具:"
+PARAMS_MARKER = "参数:"
+ACTION_RESULT_MARKER = "行动结果:"
+ANSWER_MARKER = "回答:"
+# 出现这些标记说明模型已开始推测工具结果或给出回答，工具调用部分已结束
+END_MARKERS = (ACTION_RESULT_MARKER, ANSWER_MARKER)
+
+# 所有段落标记都以":"结尾；扫描时先找":"再检查其前面的标记名，较长的名称优先
+_MARKER_NAMES = ("行动结果", "使用工具", "问题", "思考", "行动", "参数", "回答")
+_COLON_PATTERN = re.compile(":")
+_TOOL_NAME_PATTERN = re.compile(r"\s*(\w+)")
+_PARAM_PAIR_PATTERN = re.compile(r"(\w+):\s*([^,\n]+)")
+_JSON_OBJECT_PATTERN = re.compile(r"\{(.*)\}", re.DOTALL)
+
+# 回答一直延续到下一个问题/思考/行动段落或文本结尾
+_ANSWER_TERMINATORS = frozenset({"问题", "思考", "行动"})
+
+
+def parse_tool_params(params_text: str) -> Dict[str, Any]:
+    """
+    解析"参数:"之后的文本
+
+    以"{"开头时优先按JSON对象解析，否则按"key: value"键值对解析，两者都解析不到时返回空字典
+
+    Args:
+        params_text: 参数文本
+
+    Returns:
+        参数字典
+    """
+    params_text = params_text.strip()
+
+    if params_text.startswith("{"):
+        try:
+            params = json.loads(params_text)
+            if isinstance(params, dict):
+                return params
+        except ValueError:
+            pass
+
+    params = {key.strip(): value.strip() for key, value in _PARAM_PAIR_PATTERN.findall(params_text)}
+
+    # 如果上面的方法没有提取到参数，尝试解析文本中嵌入的JSON对象
+    if not params:
+        json_match = _JSON_OBJECT_PATTERN.search(params_text)
+        if json_match:
+            try:
+                params = json.loads("{" + json_match.group(1) + "}")
+            except ValueError:
+                pass
+
+    return params
+
+
+class ParsedResponse:
+    """模型响应按协议拆分后的各个部分"""
+
+    __slots__ = ("question", "thought", "tool_calls", "action_result", "answer")
+
+    def __init__(self):
+        self.question: Optional[str] = None
+        self.thought: Optional[str] = None
+        self.tool_calls: List[Dict[str, Any]] = []  # 每项形如{"name": ..., "params": {...}}
+        self.action_result: Optional[str] = None  # 模型推测的工具结果
+        self.answer: Optional[str] = None
+
+
+def _scan_markers(text: str) -> List[Tuple[str, int, int]]:
+    """找出全部段落标记，返回[(标记名, 标记起始位置, 内容起始位置)]"""
+    markers = []
+    for match in _COLON_PATTERN.finditer(text):
+        colon = match.start()
+        for name in _MARKER_NAMES:
+            if text.startswith(name, colon - len(name)):
+                markers.append((name, colon - len(name), colon + 1))
+                break
+    return markers
+
+
+def parse_response(text: str) -> ParsedResponse:
+    """
+    单遍解析完整的模型响应
+
+    只扫描一次文本找出全部段落标记，再按标记位置切分出问题、思考、
+    工具调用（一个"行动:"下可以有多组"使用工具:"/"参数:"）、推测的行动结果和回答。
+    耗时与文本长度和冒号数量成线性关系，不会因为缺少结束标记而回溯。
+
+    Args:
+        text: 模型响应文本
+
+    Returns:
+        解析结果
+    """
+    parsed = ParsedResponse()
+    markers = _scan_markers(text)
+
+    in_action = False
+    pending_tool: Optional[str] = None
+    for index, (marker, start, end) in enumerate(markers):
+        content_end = markers[index + 1][1] if index + 1 < len(markers) else len(text)
+        content = text[end:content_end]
+
+        if marker == "行动":
+            if not parsed.tool_calls and pending_tool is None:
+                in_action = True
+            continue
+
+        if marker == "使用工具":
+            if not in_action:
+                continue
+            if pending_tool is not None:
+                # 上一个工具没有参数，按无参数调用处理
+                parsed.tool_calls.append({"name": pending_tool, "params": {}})
+            name_match = _TOOL_NAME_PATTERN.match(content)
+            pending_tool = name_match.group(1) if name_match else None
+            continue
+
+        if marker == "参数":
+            if in_action and pending_tool is not None:
+                parsed.tool_calls.append({"name": pending_tool, "params": parse_tool_params(content)})
+                pending_tool = None
+            continue
+
+        # 其余标记都会结束工具调用部分
+        if in_action:
+            if pending_tool is not None:
+                parsed.tool_calls.append({"name": pending_tool, "params": {}})
+                pending_tool = None
+            in_action = False
+
+        if marker == "回答":
+            if parsed.answer is None:
+                answer_end = next(
+                    (later_start for later, later_start, _ in markers[index + 1:] if later in _ANSWER_TERMINATORS),
+                    len(text),
+                )
+                parsed.answer = text[end:answer_end].strip()
+        elif marker == "思考":
+            if parsed.thought is None:
+                parsed.thought = content.strip()
+        elif marker == "问题":
+            if parsed.question is None:
+                parsed.question = content.strip()
+        elif marker == "行动结果":
+            if parsed.action_result is None:
+                parsed.action_result = content.strip()
+
+    if in_action and pending_tool is not None:
+        parsed.tool_calls.append({"name": pending_tool, "params": {}})
+    return parsed
+
+
+def extract_tool_calls(text: str) -> List[Dict[str, Any]]:
+    """
+    从完整的模型响应中提取全部工具调用
+
+    Args:
+        text: 模型响应文本
+
+    Returns:
+        工具调用列表，每项形如{"name": ..., "params": {...}}
+    """
+    return parse_response(text).tool_calls
@@ -0,0 +1,283 @@
+import random
+import re
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Container, Dict, Optional, Sequence, Tuple
+
+from src.metrics import ROUTER_ACCURACY, ROUTER_ANSWERS, ROUTER_DECISIONS
+from src.tools.expression import ExpressionError, compile_expression
+from src.tools.weather_provider import normalize_location
+
+# 规则匹配的结果：(工具参数, 置信度)
+RouteMatch = Tuple[Dict[str, Any], float]
+
+
+class RouteRule(ABC):
+    """
+    快速路由规则
+
+    用本地的模式匹配把意图明确的查询直接映射为一次工具调用，并用模板把工具结果渲染为回答，
+    整个请求不需要调用LLM
+    """
+
+    name: str = ""  # 规则名，用于配置和指标标签
+    tool: str = ""  # 匹配后调用的工具
+
+    @abstractmethod
+    def match(self, query: str) -> Optional[RouteMatch]:
+        """
+        匹配用户查询
+
+        Args:
+            query: 用户查询
+
+        Returns:
+            (工具参数, 置信度)，不匹配时返回None
+        """
+
+    @abstractmethod
+    def render(self, params: Dict[str, Any], result: Any) -> Optional[str]:
+        """
+        把工具结果渲染为回答
+
+        Returns:
+            回答文本；结果不可用（例如计算错误、找不到地点）时返回None，交回LLM处理
+        """
+
+    def same_params(self, predicted: Dict[str, Any], actual: Dict[str, Any]) -> bool:
+        """抽样核对时判断规则给出的参数与LLM给出的参数是否等价"""
+        return predicted == actual
+
+
+class ArithmeticRule(RouteRule):
+    """只包含算式的查询（可带"计算"、"等于多少"等前后缀），调用calculator"""
+
+    name = "arithmetic"
+    tool = "calculator"
+
+    _PREFIX = re.compile(r"^(?:请|请你|帮我|帮忙)?(?:计算|算一下|算算|算|求)(?:一下)?[:：\s]*")
+    _SUFFIX = re.compile(r"\s*[=＝]?\s*(?:等于|是)?(?:多少|几)?[?？。!！\s]*$")
+    # 全角符号和常见的运算符写法
+    _TRANSLATION = str.maketrans({
+        "×": "*", "÷": "/", "＋": "+", "－": "-", "＊": "*", "／": "/",
+        "（": "(", "）": ")", "，": ",", "％": "%", "＾": "^",
+    })
+    _EXPRESSION = re.compile(r"^[\d\s.+\-*/%^(),a-z]+$")
+    _OPERATOR = re.compile(r"\d\s*[+\-*/%^]|[a-z]+\s*\(")
+    # 没有"计算"等前缀时像日期的输入（2024-10-18）不当作算式
+    _DATE = re.compile(r"^\d{4}-\d{1,2}(?:-\d{1,2})?$")
+
+    def match(self, query: str) -> Optional[RouteMatch]:
+        text = query.strip().translate(self._TRANSLATION).lower()
+        prefixed = self._PREFIX.match(text)
+        if prefixed:
+            text = text[prefixed.end():]
+        text = self._SUFFIX.sub("", text)
+        if not self._EXPRESSION.match(text) or not self._OPERATOR.search(text):
+            return None
+        if not prefixed and self._DATE.match(text.strip()):
+            return None
+        expression = text.replace("^", "**").strip()
+        try:
+            compiled = compile_expression(expression)
+        except ExpressionError:
+            return None
+        if compiled.variables:
+            # 出现了白名单以外的名字（不是数学函数或常量）
+            return None
+        # 整个查询就是算式时最确定；带有前后缀时略低
+        confidence = 1.0 if text.strip() == query.strip() else 0.9
+        return {"expression": expression}, confidence
+
+    def render(self, params: Dict[str, Any], result: Any) -> Optional[str]:
+        prefix = "计算结果: "
+        if not isinstance(result, str) or not result.startswith(prefix):
+            return None
+        return f"{params['expression']} = {result[len(prefix):]}"
+
+    def same_params(self, predicted: Dict[str, Any], actual: Dict[str, Any]) -> bool:
+        # 写法不同（空格、^和**）的等价算式视为一致
+        try:
+            return compile_expression(str(predicted.get("expression"))).evaluate() == compile_expression(
+                str(actual.get("expression", "")).replace("^", "**")
+            ).evaluate()
+        except (ExpressionError, ArithmeticError, ValueError):
+            return predicted == actual
+
+
+class WeatherRule(RouteRule):
+    """"北京天气"、"查一下上海今天的天气怎么样"这类单个地点的当前天气查询，调用weather"""
+
+    name = "weather"
+    tool = "weather"
+
+    _PATTERN = re.compile(
+        r"^(?:请问|帮我|帮忙)?(?:查询|查一下|查查|查|看看|看一下)?\s*"
+        r"(?P<location>[一-龥A-Za-z·\s]{1,20}?)\s*"
+        r"(?:现在|今天|今日|当前|目前)?的?(?:天气|气温|温度)(?:情况)?"
+        r"(?:怎么样|如何|怎样|咋样|好吗)?(?:啊|呢|吗)?[?？。!！\s]*$"
+    )
+    # 工具只能查询当前天气，也不支持一次查询多个地点，这些查询交给LLM
+    _UNSUPPORTED = re.compile(r"明天|后天|昨天|前天|下周|下个|本周|这周|周末|未来|一周|预报|和|与|跟|及|还是|、|,|，")
+    # 没有具体地点的说法
+    _NOT_LOCATIONS = {"今天", "现在", "这里", "这边", "本地", "外面", "我这", "我这里", "当地", "的"}
+    _CJK = re.compile(r"^[一-龥]{2,6}$")
+    _LATIN = re.compile(r"^[A-Za-z][A-Za-z ]{1,19}$")
+
+    def match(self, query: str) -> Optional[RouteMatch]:
+        matched = self._PATTERN.match(query.strip())
+        if matched is None:
+            return None
+        location = matched.group("location").strip()
+        if not location or location in self._NOT_LOCATIONS or self._UNSUPPORTED.search(location):
+            return None
+        # 常见长度的中文地名或拼音最确定；其他写法（过长、混合中英文）置信度低，默认交给LLM
+        confidence = 0.9 if self._CJK.match(location) or self._LATIN.match(location) else 0.6
+        return {"location": location}, confidence
+
+    def render(self, params: Dict[str, Any], result: Any) -> Optional[str]:
+        if not isinstance(result, str) or result.endswith("无法获取天气信息"):
+            return None
+        return result
+
+    def same_params(self, predicted: Dict[str, Any], actual: Dict[str, Any]) -> bool:
+        return normalize_location(str(predicted.get("location", ""))) == normalize_location(
+            str(actual.get("location", ""))
+        )
+
+
+class QueryRouter:
+    """
+    Agent入口的快速路由
+
+    按顺序尝试各条规则，置信度达到min_confidence的第一条匹配决定工具调用；
+    其余查询（以及工具结果不可用时）走完整的LLM路径。
+    按shadow_rate的比例对命中的请求抽样，改走LLM路径并比较两者选择的工具调用，用于估计准确率。
+    """
+
+    def __init__(
+        self,
+        rules: Sequence[RouteRule],
+        min_confidence: float = 0.8,
+        shadow_rate: float = 0.0,
+        rng: Optional[random.Random] = None
+    ):
+        """
+        Args:
+            rules: 路由规则，按顺序匹配
+            min_confidence: 直接调用工具所需的最低置信度
+            shadow_rate: 命中的请求中改走LLM路径用于核对准确率的比例（0到1）
+            rng: 抽样用的随机数生成器
+        """
+        self.rules = list(rules)
+        self.min_confidence = min_confidence
+        self.shadow_rate = shadow_rate
+        self._rules_by_name = {rule.name: rule for rule in self.rules}
+        self._rng = rng or random.Random()
+
+    def route(self, query: str, tools: Container[str]) -> Optional[Dict[str, Any]]:
+        """
+        为查询选择工具调用
+
+        Args:
+            query: 用户查询
+            tools: Agent当前可用的工具名
+
+        Returns:
+            {"rule", "tool", "params", "confidence", "shadow"}；没有可信的匹配时返回None
+        """
+        for rule in self.rules:
+            if rule.tool not in tools:
+                continue
+            matched = rule.match(query)
+            if matched is None:
+                continue
+            params, confidence = matched
+            if confidence < self.min_confidence:
+                ROUTER_DECISIONS.inc(rule=rule.name, decision="low_confidence")
+                return None
+            shadow = self.shadow_rate > 0 and self._rng.random() < self.shadow_rate
+            ROUTER_DECISIONS.inc(rule=rule.name, decision="shadow" if shadow else "hit")
+            return {"rule": rule.name, "tool": rule.tool, "params": params, "confidence": confidence, "shadow": shadow}
+        ROUTER_DECISIONS.inc(rule="none", decision="miss")
+        return None
+
+    def render(self, routed: Dict[str, Any], tool_result: Dict[str, Any]) -> Optional[str]:
+        """
+        按规则的模板把工具结果渲染为回答
+
+        Args:
+            routed: route()的返回值
+            tool_result: Action节点记录的工具结果
+
+        Returns:
+            回答文本；工具失败或结果不可用时返回None
+        """
+        rule = self._rules_by_name.get(routed.get("rule"))
+        answer = None
+        if rule is not None and "error" not in tool_result:
+            answer = rule.render(routed["params"], tool_result.get("result"))
+        ROUTER_ANSWERS.inc(rule=routed.get("rule", ""), outcome="template" if answer is not None else "fallback")
+        return answer
+
+    def judge(self, routed: Dict[str, Any], tool_calls: Sequence[Dict[str, Any]]) -> bool:
+        """
+        核对抽样请求：LLM的第一次决策是否与路由给出的工具调用一致
+
+        Args:
+            routed: route()的返回值
+            tool_calls: LLM第一次决策中的工具调用
+
+        Returns:
+            是否一致
+        """
+        rule = self._rules_by_name.get(routed.get("rule"))
+        agree = (
+            rule is not None
+            and len(tool_calls) == 1
+            and tool_calls[0].get("name") == routed["tool"]
+            and rule.same_params(routed["params"], tool_calls[0].get("params", {}))
+        )
+        ROUTER_ACCURACY.inc(rule=routed.get("rule", ""), result="agree" if agree else "disagree")
+        return agree
+
+
+_RULE_FACTORIES: Dict[str, Callable[[], RouteRule]] = {
+    "arithmetic": ArithmeticRule,
+    "weather": WeatherRule,
+}
+
+
+def register_route_rule(name: str, factory: Callable[[], RouteRule]) -> None:
+    """
+    注册自定义路由规则
+
+    Args:
+        name: 规则名，用于AGENT_ROUTER_RULES
+        factory: 返回RouteRule的工厂函数
+    """
+    _RULE_FACTORIES[name] = factory
+
+
+def create_query_router(
+    rules: Sequence[str] = ("arithmetic", "weather"),
+    min_confidence: float = 0.8,
+    shadow_rate: float = 0.0
+) -> QueryRouter:
+    """
+    按规则名创建快速路由
+
+    Args:
+        rules: 规则名，按顺序匹配
+        min_confidence: 直接调用工具所需的最低置信度
+        shadow_rate: 抽样核对准确率的比例
+
+    Returns:
+        快速路由实例
+    """
+    instances = []
+    for name in rules:
+        try:
+            instances.append(_RULE_FACTORIES[name]())
+        except KeyError:
+            raise ValueError(f"未知的路由规则: {name}，可选: {', '.join(_RULE_FACTORIES)}") from None
+    return QueryRouter(instances, min_confidence=min_confidence, shadow_rate=shadow_rate)
@@ -0,0 +1,83 @@
+import re
+from typing import Any, Dict, Mapping, Optional, Sequence, Tuple
+
+from langchain_core.tools import BaseTool
+
+from src.agents.response_parser import parse_response
+
+# 工具执行后的推测回答模式
+OFF = "off"  # 总是把工具结果交给模型再调用一次
+MATCH = "match"  # 模型推测的行动结果与实际结果一致时，直接使用它已经给出的回答
+PRESENTABLE = "presentable"  # 在MATCH的基础上，本轮工具都声明了presentable时直接把结果作为回答
+MODES = (OFF, MATCH, PRESENTABLE)
+
+# 比较推测结果和实际结果时忽略空白、标点和大小写；数字中的小数点和千分位逗号不能忽略，
+# 否则"3.5"和"35"会被当作一致
+_IGNORED = re.compile(r"[\s，。；;：:、!！?？\"'“”‘’()（）]+|(?<!\d)[.,]|[.,](?!\d)")
+_NUMBER = re.compile(r"\d+(?:[.,]\d+)*")
+
+
+def is_presentable(tool: BaseTool) -> bool:
+    """工具是否声明了输出可以直接作为回答展示给用户"""
+    return bool(getattr(tool, "presentable", False))
+
+
+def normalize_result(text: Any) -> str:
+    """规范化工具结果文本，用于比较推测结果和实际结果"""
+    return _IGNORED.sub("", str(text)).lower()
+
+
+def results_match(speculated: Any, actual: Any) -> bool:
+    """
+    推测结果与实际结果是否一致
+
+    规范化后的文本相同，且其中的数字逐个相同（去掉空白后"1 2"和"12"不能算一致）
+    """
+    return (
+        normalize_result(speculated) == normalize_result(actual)
+        and _NUMBER.findall(str(speculated)) == _NUMBER.findall(str(actual))
+    )
+
+
+def speculative_answer(
+    mode: str,
+    response: str,
+    round_results: Sequence[Dict[str, Any]],
+    tools: Mapping[str, BaseTool]
+) -> Tuple[Optional[str], str]:
+    """
+    核对模型在请求工具时推测的行动结果，决定能否不再调用LLM直接回答
+
+    模型按协议在"行动:"之后还会写出推测的"行动结果:"和"回答:"。实际结果与推测一致时，
+    再调用一次模型只会复述同样的回答，可以直接使用；工具都声明了presentable时，
+    推测不一致也可以直接把实际结果作为回答（PRESENTABLE模式）
+
+    Args:
+        mode: 推测回答模式，OFF、MATCH或PRESENTABLE
+        response: 请求本轮工具调用的模型响应
+        round_results: 本轮的工具结果
+        tools: 工具名到工具的映射
+
+    Returns:
+        (回答, 核对结果)；回答为None时需要再调用模型。核对结果为matched、presentable、
+        mismatch、no_speculation或tool_error，模式为OFF时为off
+    """
+    if mode == OFF or not round_results:
+        return None, OFF
+    if any("error" in result for result in round_results):
+        return None, "tool_error"
+
+    parsed = parse_response(response) if response else None
+    if parsed is not None and parsed.action_result is not None and parsed.answer:
+        actual = "\n".join(str(result.get("result", "")) for result in round_results)
+        if results_match(parsed.action_result, actual):
+            return parsed.answer, "matched"
+        outcome = "mismatch"
+    else:
+        outcome = "no_speculation"
+
+    if mode == PRESENTABLE and all(
+        is_presentable(tools[result["tool_name"]]) for result in round_results if result.get("tool_name") in tools
+    ):
+        return "；".join(str(result.get("result", "")) for result in round_results), "presentable"
+    return None, outcome
@@ -0,0 +1,173 @@
+import json
+import re
+from enum import Enum
+from typing import Any, Dict, List, Optional
+
+from src.agents.response_parser import (
+    ACTION_MARKER,
+    END_MARKERS,
+    PARAMS_MARKER,
+    TOOL_MARKER,
+    _MARKER_NAMES,
+    _TOOL_NAME_PATTERN,
+    parse_tool_params,
+)
+
+# 键值对参数的一行："key: value"
+_PARAM_LINE_PATTERN = re.compile(r"(\w+):")
+
+
+class _ParserState(str, Enum):
+    PREAMBLE = "preamble"  # 问题/思考部分
+    ACTION = "action"  # 已看到"行动:"，等待（下一组）"使用工具:"
+    TOOL = "tool"  # 已得到工具名，等待"参数:"
+    PARAMS = "params"  # 正在读取参数
+    DONE = "done"  # 工具调用部分结束
+
+
+class ToolCallStreamParser:
+    """
+    行动/使用工具/参数协议的增量解析器
+
+    按块接收LLM的流式输出，只处理完整的行。一个"行动:"下可以依次出现多组
+    "使用工具:"/"参数:"，每组参数读取完整就立即产出对应的工具调用事件：JSON参数
+    在括号闭合时完整，键值对参数在出现非参数行时完整（可以跨多行）；遇到
+    "行动结果:"、"回答:"或其他非工具行时工具调用部分结束，调用方可以据此取消
+    剩余的生成并马上执行全部工具，不必等待模型写完推测性的结果和回答。
+    """
+
+    def __init__(self):
+        self._state = _ParserState.PREAMBLE
+        self._buffer = ""
+        self._tool_name: Optional[str] = None
+        self._params_lines: List[str] = []
+        self._emitted = 0  # 已产出的工具调用数
+        self.text = ""  # 已接收的全部文本
+
+    @property
+    def done(self) -> bool:
+        """工具调用部分是否已经结束"""
+        return self._state == _ParserState.DONE
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """
+        输入一段增量文本
+
+        Args:
+            chunk: 增量文本
+
+        Returns:
+            本次新产生的工具调用列表，每项形如{"name": ..., "params": {...}}
+        """
+        self.text += chunk
+        self._buffer += chunk
+        events = []
+        while "\n" in self._buffer and not self.done:
+            line, self._buffer = self._buffer.split("\n", 1)
+            events.extend(self._process_line(line))
+        return events
+
+    def close(self) -> List[Dict[str, Any]]:
+        """
+        输入结束，处理缓冲区中剩余的不完整行
+
+        Returns:
+            剩余的工具调用列表
+        """
+        events = []
+        if self._buffer and not self.done:
+            line, self._buffer = self._buffer, ""
+            events.extend(self._process_line(line))
+        if self._state in (_ParserState.TOOL, _ParserState.PARAMS):
+            events.extend(self._emit())
+        self._state = _ParserState.DONE
+        return events
+
+    def _process_line(self, line: str) -> List[Dict[str, Any]]:
+        """按当前状态处理一行完整文本"""
+        stripped = line.strip()
+
+        if any(stripped.startswith(marker) for marker in END_MARKERS):
+            # 只有工具名没有参数时，按无参数调用处理
+            events = self._emit() if self._state in (_ParserState.TOOL, _ParserState.PARAMS) else []
+            self._state = _ParserState.DONE
+            return events
+
+        if self._state == _ParserState.PREAMBLE:
+            if stripped.startswith(ACTION_MARKER):
+                self._state = _ParserState.ACTION
+                # 允许"行动: 使用工具: xxx"写在同一行
+                rest = stripped[len(ACTION_MARKER):].strip()
+                if rest:
+                    return self._process_line(rest)
+            return []
+
+        if self._state == _ParserState.ACTION:
+            if stripped.startswith(TOOL_MARKER):
+                name_match = _TOOL_NAME_PATTERN.match(stripped[len(TOOL_MARKER):])
+                if name_match:
+                    self._tool_name = name_match.group(1)
+                    self._state = _ParserState.TOOL
+            elif stripped and self._emitted:
+                # 已有工具调用后出现其他内容，说明工具调用部分已结束
+                self._state = _ParserState.DONE
+            return []
+
+        if self._state == _ParserState.TOOL:
+            if stripped.startswith(TOOL_MARKER):
+                # 上一个工具没有参数，按无参数调用处理后开始下一个工具
+                return self._emit() + self._process_line(stripped)
+            if stripped.startswith(PARAMS_MARKER):
+                self._params_lines = [stripped[len(PARAMS_MARKER):]]
+                self._state = _ParserState.PARAMS
+                if self._json_params_complete():
+                    return self._emit()
+            return []
+
+        if self._state == _ParserState.PARAMS:
+            params_text = "\n".join(self._params_lines).strip()
+            if params_text.startswith("{") or (not params_text and stripped.startswith("{")):
+                self._params_lines.append(line)
+                return self._emit() if self._json_params_complete() else []
+            if not stripped:
+                # 空行不能说明参数已结束，"参数:"后换行书写时也会先出现空行
+                return []
+            if self._is_param_line(stripped):
+                # 键值对参数可以跨多行，继续读取
+                self._params_lines.append(line)
+                return []
+            # 出现非参数行，当前工具的参数已读取完整
+            return self._emit() + self._process_line(line)
+
+        return []
+
+    def _json_params_complete(self) -> bool:
+        """JSON参数的括号是否已经闭合"""
+        params_text = "\n".join(self._params_lines).strip()
+        if not params_text.startswith("{"):
+            return False
+        try:
+            json.loads(params_text)
+            return True
+        except ValueError:
+            return False
+
+    @staticmethod
+    def _is_param_line(stripped: str) -> bool:
+        """是否为"key: value"参数行；以段落标记开头的行不是参数"""
+        match = _PARAM_LINE_PATTERN.match(stripped)
+        return match is not None and not any(match.group(1).endswith(name) for name in _MARKER_NAMES)
+
+    def _emit(self) -> List[Dict[str, Any]]:
+        """产出当前工具调用，并等待下一组工具调用"""
+        self._state = _ParserState.ACTION
+        tool_name, self._tool_name = self._tool_name, None
+        params_lines, self._params_lines = self._params_lines, []
+        if not tool_name:
+            return []
+        self._emitted += 1
+        return [{
+            "name": tool_name,
+            "params": parse_tool_params("\n".join(params_lines))
+        }]
+
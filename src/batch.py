@@ -0,0 +1,429 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, Iterator, Optional, Set, Union
+
+from src.metrics import registry
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger("langgraph_agent.batch")
+
+BATCH_ITEMS = registry.counter("batch_items", "批量运行处理的条目数", ["status"])
+
+# 结果流结束的标记
+_DONE = object()
+# 在线程中读取文件时每次读取的行数
+_READ_CHUNK = 256
+
+
+class BatchItem:
+    """批量运行中的一条输入"""
+
+    __slots__ = ("id", "message", "conversation_id", "fields", "error")
+
+    def __init__(
+        self,
+        id: str,
+        message: str = "",
+        conversation_id: Optional[str] = None,
+        fields: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None,
+    ):
+        """
+        Args:
+            id: 条目ID，用于断点续跑时识别已完成的条目
+            message: 发送给Agent的消息
+            conversation_id: 会话ID，相同会话的条目按输入顺序依次执行
+            fields: 输入中的全部字段，原样写回结果，便于评估时携带标注
+            error: 输入无法解析时的错误信息
+        """
+        self.id = id
+        self.message = message
+        self.conversation_id = conversation_id
+        self.fields = fields if fields is not None else {"id": id}
+        self.error = error
+
+
+def parse_line(line: Union[str, bytes], line_no: int) -> Optional[BatchItem]:
+    """
+    解析一行JSONL输入
+
+    每行是一个JSON对象（message必填，id和conversation_id可选，其余字段原样写回结果），
+    或者直接是一个JSON字符串作为消息；没有id时使用行号。空行返回None
+
+    Args:
+        line: 一行输入
+        line_no: 行号（从1开始）
+    """
+    if isinstance(line, bytes):
+        line = line.decode("utf-8")
+    line = line.strip()
+    if not line:
+        return None
+    default_id = str(line_no)
+    try:
+        data = json.loads(line)
+    except ValueError as e:
+        return BatchItem(default_id, error=f"无法解析的输入: {e}")
+    if isinstance(data, str):
+        data = {"message": data}
+    if not isinstance(data, dict) or not isinstance(data.get("message"), str):
+        return BatchItem(default_id, error="输入必须是带有message字段的JSON对象或JSON字符串")
+    item_id = str(data.get("id", default_id))
+    fields = {**data, "id": item_id}
+    return BatchItem(item_id, data["message"], data.get("conversation_id"), fields)
+
+
+def read_jsonl(path: str) -> Iterator[BatchItem]:
+    """逐行读取JSONL文件，不会把整个文件读入内存"""
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            item = parse_line(line, line_no)
+            if item is not None:
+                yield item
+
+
+class BatchCheckpoint:
+    """
+    批量运行的进度记录
+
+    结果文件本身就是进度：每完成一条就追加一行结果并刷新，
+    重新运行时读取已有结果跳过已完成的条目，进程被杀死时写了一半的最后一行会被截掉
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: 结果JSONL文件路径
+        """
+        self.path = path
+        self._file = None
+        # append和close可能在不同线程中执行（见aappend、aclose）
+        self._lock = threading.Lock()
+
+    def load(self, retry_errors: bool = False) -> Set[str]:
+        """
+        读取已完成的条目ID
+
+        Args:
+            retry_errors: 是否重新运行上次失败的条目
+
+        Returns:
+            可以跳过的条目ID
+        """
+        done: Dict[str, bool] = {}
+        if not os.path.exists(self.path):
+            return set()
+        valid_size = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                valid_size += len(line)
+                if isinstance(record, dict) and "id" in record:
+                    done[str(record["id"])] = "error" not in record
+        if valid_size < os.path.getsize(self.path):
+            logger.warning(f"结果文件{self.path}末尾有不完整的记录，已截断")
+            with open(self.path, "r+b") as f:
+                f.truncate(valid_size)
+        return {item_id for item_id, ok in done.items() if ok or not retry_errors}
+
+    def records(self) -> Iterator[Dict[str, Any]]:
+        """逐条读取已写入的结果"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+
+    def append(self, record: Dict[str, Any]) -> None:
+        """追加一条结果并立即刷新到文件"""
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            if self._file is None:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    async def aload(self, retry_errors: bool = False) -> Set[str]:
+        """load的异步版本，文件读写放到线程中，不阻塞事件循环"""
+        return await asyncio.to_thread(self.load, retry_errors)
+
+    async def arecords(self) -> AsyncIterator[Dict[str, Any]]:
+        """records的异步版本，在线程中分块读取"""
+        async for record in _aiter(self.records()):
+            yield record
+
+    async def aappend(self, record: Dict[str, Any]) -> None:
+        """append的异步版本"""
+        await asyncio.to_thread(self.append, record)
+
+    async def aclose(self) -> None:
+        await asyncio.to_thread(self.close)
+
+
+class BatchLock:
+    """
+    批次的独占锁，同一batch_id同时只能有一个运行
+
+    进程内用集合判断；支持fcntl的平台上同时对结果目录中的{batch_id}.lock加文件锁，
+    serve.py启动的多个worker之间同样互斥（进程退出时文件锁自动释放）。
+    不支持fcntl的平台（Windows）上只在单个进程内互斥
+    """
+
+    _active: Set[str] = set()
+    _active_lock = threading.Lock()
+
+    def __init__(self, directory: str, batch_id: str):
+        """
+        Args:
+            directory: 批次结果所在目录
+            batch_id: 批次ID
+        """
+        self.path = os.path.join(directory, f"{batch_id}.lock")
+        self.batch_id = batch_id
+        self._file = None
+        self._held = False
+
+    def acquire(self) -> bool:
+        """
+        尝试获取锁，不等待
+
+        Returns:
+            是否获得了锁；批次正在运行时返回False
+        """
+        with self._active_lock:
+            if self.batch_id in self._active:
+                return False
+            self._active.add(self.batch_id)
+        self._held = True
+        if fcntl is None:
+            return True
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._file = open(self.path, "a")
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self.release()
+            return False
+        except BaseException:
+            self.release()
+            raise
+        return True
+
+    def release(self) -> None:
+        """释放锁，可以重复调用"""
+        if self._file is not None:
+            self._file.close()  # 关闭文件同时释放文件锁
+            self._file = None
+        if self._held:
+            self._held = False
+            with self._active_lock:
+                self._active.discard(self.batch_id)
+
+
+class BatchStats:
+    """批量运行的计数和吞吐量"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.ok = 0
+        self.failed = 0
+        self.skipped = 0
+        self.latency_total = 0.0
+
+    def record(self, result: Dict[str, Any]) -> None:
+        if "error" in result:
+            self.failed += 1
+        else:
+            self.ok += 1
+        self.latency_total += result.get("elapsed_ms", 0.0) / 1000
+
+    def report(self) -> Dict[str, Any]:
+        """当前的统计：完成数、失败数、跳过数、耗时、吞吐量（条/秒）和平均延迟"""
+        elapsed = time.monotonic() - self.started
+        completed = self.ok + self.failed
+        return {
+            "completed": completed,
+            "ok": self.ok,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "elapsed_s": round(elapsed, 3),
+            "throughput_rps": round(completed / elapsed, 2) if elapsed > 0 else 0.0,
+            "mean_latency_ms": round(self.latency_total / completed * 1000, 1) if completed else 0.0,
+        }
+
+
+async def _aiter(items: Union[Iterable[Any], AsyncIterable[Any]]) -> AsyncIterator[Any]:
+    """统一同步和异步输入；同步输入（通常是逐行读取的文件）在线程中分块读取，不阻塞事件循环"""
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            yield item
+    else:
+        iterator = iter(items)
+        while True:
+            chunk = await asyncio.to_thread(list, itertools.islice(iterator, _READ_CHUNK))
+            if not chunk:
+                break
+            for item in chunk:
+                yield item
+
+
+class BatchRunner:
+    """
+    以有界并发把一批输入交给Agent处理
+
+    输入按需读取，同时在途的条目不超过concurrency个；结果按完成顺序产出。
+    相同conversation_id的条目按输入顺序依次执行，没有会话ID的条目各自使用一次性会话
+    """
+
+    def __init__(self, agent: Any, concurrency: int = 8):
+        """
+        Args:
+            agent: LangGraphAgent实例
+            concurrency: 同时处理的最大条目数
+        """
+        self.agent = agent
+        self.concurrency = max(1, concurrency)
+        self.stats = BatchStats()
+
+    async def _run_item(self, item: BatchItem, locks: Dict[str, asyncio.Lock]) -> Dict[str, Any]:
+        record = dict(item.fields)
+        if item.error is not None:
+            record["error"] = item.error
+            return record
+        started = time.monotonic()
+        try:
+            if item.conversation_id is None:
+                record["response"] = await self.agent.ainvoke(item.message)
+            else:
+                lock = locks.setdefault(item.conversation_id, asyncio.Lock())
+                async with lock:
+                    record["response"] = await self.agent.ainvoke(item.message, conversation_id=item.conversation_id)
+        except Exception as e:
+            record["error"] = f"{e.__class__.__name__}: {e}"
+        record["elapsed_ms"] = round((time.monotonic() - started) * 1000, 1)
+        return record
+
+    async def run(
+        self,
+        items: Union[Iterable[BatchItem], AsyncIterable[BatchItem]],
+        skip: Optional[Set[str]] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        处理一批输入
+
+        Args:
+            items: 输入条目（同步或异步迭代器）
+            skip: 跳过的条目ID（已完成的条目）
+
+        Yields:
+            每条输入的结果：输入字段加上response（或error）和elapsed_ms
+        """
+        skip = skip or set()
+        queue: asyncio.Queue = asyncio.Queue()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        locks: Dict[str, asyncio.Lock] = {}
+        tasks: Set[asyncio.Task] = set()
+
+        async def work(item: BatchItem) -> None:
+            try:
+                queue.put_nowait(await self._run_item(item, locks))
+            finally:
+                semaphore.release()
+
+        async def produce() -> None:
+            try:
+                async for item in _aiter(items):
+                    if item.id in skip:
+                        self.stats.skipped += 1
+                        continue
+                    await semaphore.acquire()
+                    task = asyncio.create_task(work(item))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                # 等待在途的条目完成后再结束结果流
+                while tasks:
+                    await asyncio.gather(*list(tasks), return_exceptions=True)
+                queue.put_nowait(_DONE)
+            except BaseException as e:
+                queue.put_nowait(e)
+                raise
+
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                result = await queue.get()
+                if result is _DONE:
+                    break
+                if isinstance(result, BaseException):
+                    raise result
+                self.stats.record(result)
+                BATCH_ITEMS.inc(status="error" if "error" in result else "ok")
+                yield result
+        finally:
+            # 调用方提前停止（客户端断开、Ctrl-C）时取消尚未完成的条目
+            producer.cancel()
+            for task in list(tasks):
+                task.cancel()
+            await asyncio.gather(producer, *tasks, return_exceptions=True)
+
+
+async def run_file(
+    agent: Any,
+    input_path: str,
+    output_path: str,
+    concurrency: int = 8,
+    retry_errors: bool = False,
+    progress_interval: float = 10.0,
+) -> Dict[str, Any]:
+    """
+    处理JSONL文件中的全部输入，结果逐条追加到输出文件，支持断点续跑
+
+    Args:
+        agent: LangGraphAgent实例
+        input_path: 输入JSONL文件
+        output_path: 结果JSONL文件，已存在时跳过其中已完成的条目
+        concurrency: 同时处理的最大条目数
+        retry_errors: 是否重新运行上次失败的条目
+        progress_interval: 输出进度日志的间隔（秒）
+
+    Returns:
+        运行统计，见BatchStats.report
+    """
+    checkpoint = BatchCheckpoint(output_path)
+    skip = await checkpoint.aload(retry_errors=retry_errors)
+    if skip:
+        logger.info(f"从{output_path}恢复，跳过{len(skip)}条已完成的输入")
+    runner = BatchRunner(agent, concurrency=concurrency)
+    last_report = time.monotonic()
+    try:
+        async for record in runner.run(read_jsonl(input_path), skip=skip):
+            await checkpoint.aappend(record)
+            if time.monotonic() - last_report >= progress_interval:
+                last_report = time.monotonic()
+                logger.info(f"批量运行进度: {runner.stats.report()}")
+    finally:
+        await checkpoint.aclose()
+    return runner.stats.report()
@@ -13,7 +13,13 @@ class DeepSeekConfig:
         top_p: float = 0.95,
         max_tokens: int = 2048,
         streaming: bool = True,
+        function_calling: bool = False,
         api_base_url: str = "https://api.deepseek.com/v1",
+        pool_size: int = 20,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 60.0,
+        max_retries: int = 3,
+        retry_backoff: float = 0.5,
     ):
         """
         初始化DeepSeek API配置
@@ -25,7 +31,13 @@ class DeepSeekConfig:
             top_p: Top-p采样参数
             max_tokens: 生成的最大令牌数
             streaming: 是否启用流式响应
+            function_calling: 是否使用原生函数调用（tools/tool_calls）代替文本协议调用工具
             api_base_url: API基础URL
+            pool_size: HTTP连接池大小（最大并发连接数）
+            connect_timeout: 建立连接超时时间（秒）
+            read_timeout: 读取响应超时时间（秒）
+            max_retries: 遇到429/5xx或连接错误时的最大重试次数
+            retry_backoff: 重试指数退避的基础等待时间（秒）
         """
         self.api_key = api_key or os.getenv("DEEPSEEK_API_KEY", "")
         self.model_name = model_name
@@ -33,7 +45,13 @@ class DeepSeekConfig:
         self.top_p = top_p
         self.max_tokens = max_tokens
         self.streaming = streaming
+        self.function_calling = function_calling
         self.api_base_url = api_base_url
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
     
     def to_dict(self) -> Dict[str, Any]:
         """
@@ -49,7 +67,13 @@ class DeepSeekConfig:
             "top_p": self.top_p,
             "max_tokens": self.max_tokens,
             "streaming": self.streaming,
+            "function_calling": self.function_calling,
             "api_base_url": self.api_base_url,
+            "pool_size": self.pool_size,
+            "connect_timeout": self.connect_timeout,
+            "read_timeout": self.read_timeout,
+            "max_retries": self.max_retries,
+            "retry_backoff": self.retry_backoff,
         }
     
     @classmethod
@@ -64,7 +88,13 @@ class DeepSeekConfig:
         - DEEPSEEK_TOP_P: Top-p采样参数（可选，默认为0.95）
         - DEEPSEEK_MAX_TOKENS: 生成的最大令牌数（可选，默认为2048）
         - DEEPSEEK_STREAMING: 是否启用流式响应（可选，默认为True）
+        - DEEPSEEK_FUNCTION_CALLING: 是否使用原生函数调用（可选，默认为False）
         - DEEPSEEK_API_BASE_URL: API基础URL（可选，默认为https://api.deepseek.com/v1）
+        - DEEPSEEK_POOL_SIZE: HTTP连接池大小（可选，默认为20）
+        - DEEPSEEK_CONNECT_TIMEOUT: 连接超时秒数（可选，默认为5）
+        - DEEPSEEK_READ_TIMEOUT: 读取超时秒数（可选，默认为60）
+        - DEEPSEEK_MAX_RETRIES: 最大重试次数（可选，默认为3）
+        - DEEPSEEK_RETRY_BACKOFF: 重试退避基础秒数（可选，默认为0.5）
         
         示例:
         ```
@@ -87,20 +117,756 @@ class DeepSeekConfig:
             top_p=float(os.getenv("DEEPSEEK_TOP_P", "0.95")),
             max_tokens=int(os.getenv("DEEPSEEK_MAX_TOKENS", "2048")),
             streaming=os.getenv("DEEPSEEK_STREAMING", "True").lower() == "true",
+            function_calling=os.getenv("DEEPSEEK_FUNCTION_CALLING", "False").lower() == "true",
             api_base_url=os.getenv("DEEPSEEK_API_BASE_URL", "https://api.deepseek.com/v1"),
+            pool_size=int(os.getenv("DEEPSEEK_POOL_SIZE", "20")),
+            connect_timeout=float(os.getenv("DEEPSEEK_CONNECT_TIMEOUT", "5")),
+            read_timeout=float(os.getenv("DEEPSEEK_READ_TIMEOUT", "60")),
+            max_retries=int(os.getenv("DEEPSEEK_MAX_RETRIES", "3")),
+            retry_backoff=float(os.getenv("DEEPSEEK_RETRY_BACKOFF", "0.5")),
         )
 
-# 默认配置
-default_config = DeepSeekConfig.from_env()
+# 会话记忆配置
+class MemoryConfig:
+    """会话记忆（LangGraph检查点存储）配置类"""
+    
+    def __init__(
+        self,
+        backend: str = "memory",
+        path: str = "conversations.sqlite",
+        ttl: Optional[float] = 3600.0,
+        max_conversations: int = 1000,
+        max_checkpoints: int = 5,
+        max_history_messages: int = 50,
+        context_max_tokens: int = 4000,
+        summary_max_chars: int = 500,
+        durability: str = "exit",
+    ):
+        """
+        初始化会话记忆配置
+        
+        Args:
+            backend: 存储后端，可选memory、sqlite、none或通过register_conversation_store注册的名称
+            path: sqlite后端的数据库文件路径
+            ttl: 会话过期时间（秒），None表示不过期
+            max_conversations: 最多保留的会话数
+            max_checkpoints: 每个会话最多保留的检查点数
+            max_history_messages: 每个会话携带到下一轮的最大消息数
+            context_max_tokens: 每次调用LLM的提示token预算，0表示不限制
+            summary_max_chars: 滚动摘要的最大字数
+            durability: 会话状态的写入时机，exit为请求结束时写入一次，async/sync为每个步骤后写入
+        """
+        self.backend = backend
+        self.path = path
+        self.ttl = ttl
+        self.max_conversations = max_conversations
+        self.max_checkpoints = max_checkpoints
+        self.max_history_messages = max_history_messages
+        self.context_max_tokens = context_max_tokens
+        self.summary_max_chars = summary_max_chars
+        self.durability = durability
+    
+    def store_kwargs(self) -> Dict[str, Any]:
+        """
+        生成创建存储后端所需的参数
+        
+        Returns:
+            传给create_conversation_store的关键字参数
+        """
+        kwargs = {
+            "ttl": self.ttl,
+            "max_conversations": self.max_conversations,
+            "max_checkpoints": self.max_checkpoints,
+        }
+        if self.backend == "sqlite":
+            kwargs["path"] = self.path
+        return kwargs
+    
+    @classmethod
+    def from_env(cls) -> "MemoryConfig":
+        """
+        从环境变量创建配置
+        
+        配置可以通过以下环境变量设置:
+        - AGENT_MEMORY_BACKEND: 存储后端（可选，默认为memory）
+        - AGENT_MEMORY_PATH: sqlite数据库文件路径（可选，默认为conversations.sqlite）
+        - AGENT_MEMORY_TTL: 会话过期秒数，0表示不过期（可选，默认为3600）
+        - AGENT_MEMORY_MAX_CONVERSATIONS: 最多保留的会话数（可选，默认为1000）
+        - AGENT_MEMORY_MAX_CHECKPOINTS: 每个会话保留的检查点数（可选，默认为5）
+        - AGENT_MEMORY_MAX_MESSAGES: 每个会话携带的最大消息数（可选，默认为50）
+        - AGENT_CONTEXT_MAX_TOKENS: 提示token预算，0表示不限制（可选，默认为4000）
+        - AGENT_SUMMARY_MAX_CHARS: 滚动摘要的最大字数（可选，默认为500）
+        - AGENT_MEMORY_DURABILITY: 会话状态的写入时机，exit、async或sync（可选，默认为exit）
+        
+        Returns:
+            配置实例
+        """
+        ttl = float(os.getenv("AGENT_MEMORY_TTL", "3600"))
+        return cls(
+            backend=os.getenv("AGENT_MEMORY_BACKEND", "memory"),
+            path=os.getenv("AGENT_MEMORY_PATH", "conversations.sqlite"),
+            ttl=ttl if ttl > 0 else None,
+            max_conversations=int(os.getenv("AGENT_MEMORY_MAX_CONVERSATIONS", "1000")),
+            max_checkpoints=int(os.getenv("AGENT_MEMORY_MAX_CHECKPOINTS", "5")),
+            max_history_messages=int(os.getenv("AGENT_MEMORY_MAX_MESSAGES", "50")),
+            context_max_tokens=int(os.getenv("AGENT_CONTEXT_MAX_TOKENS", "4000")),
+            summary_max_chars=int(os.getenv("AGENT_SUMMARY_MAX_CHARS", "500")),
+            durability=os.getenv("AGENT_MEMORY_DURABILITY", "exit"),
+        )
+
+# LLM响应缓存配置
+class CacheConfig:
+    """LLM响应缓存和工具结果缓存配置类"""
+    
+    def __init__(
+        self,
+        enabled: bool = True,
+        max_entries: int = 1000,
+        ttl: Optional[float] = 3600.0,
+        path: Optional[str] = None,
+        semantic: bool = False,
+        semantic_threshold: float = 0.95,
+        max_temperature: float = 0.7,
+        tool_max_entries: int = 1024,
+        tool_backend: str = "memory",
+        tool_path: str = "tool_cache.sqlite",
+    ):
+        """
+        初始化LLM响应缓存配置
+        
+        Args:
+            enabled: 是否启用响应缓存
+            max_entries: 每一级缓存的最大条目数
+            ttl: 缓存过期时间（秒），None表示不过期
+            path: 精确匹配缓存的SQLite持久化文件路径，None表示只缓存在内存中
+            semantic: 是否启用相似度缓存
+            semantic_threshold: 相似度缓存的余弦相似度阈值
+            max_temperature: 允许使用缓存的最高temperature，高于该值的调用绕过缓存
+            tool_max_entries: 工具结果缓存的最大条目数
+            tool_backend: 工具结果缓存后端，memory（进程内）或sqlite（同一主机的多个进程共享）
+            tool_path: sqlite后端的数据库文件路径
+        """
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.semantic = semantic
+        self.semantic_threshold = semantic_threshold
+        self.max_temperature = max_temperature
+        self.tool_max_entries = tool_max_entries
+        self.tool_backend = tool_backend
+        self.tool_path = tool_path
+    
+    def tool_cache_kwargs(self) -> Dict[str, Any]:
+        """
+        生成创建工具结果缓存后端所需的参数
+        
+        Returns:
+            传给create_tool_cache的关键字参数
+        """
+        kwargs: Dict[str, Any] = {"max_entries": self.tool_max_entries}
+        if self.tool_backend == "sqlite":
+            kwargs["path"] = self.tool_path
+        return kwargs
+    
+    @classmethod
+    def from_env(cls) -> "CacheConfig":
+        """
+        从环境变量创建配置
+        
+        配置可以通过以下环境变量设置:
+        - AGENT_LLM_CACHE: 是否启用响应缓存（可选，默认为True）
+        - AGENT_LLM_CACHE_MAX_ENTRIES: 最大缓存条目数（可选，默认为1000）
+        - AGENT_LLM_CACHE_TTL: 缓存过期秒数，0表示不过期（可选，默认为3600）
+        - AGENT_LLM_CACHE_PATH: SQLite持久化文件路径（可选，默认只缓存在内存中）
+        - AGENT_LLM_CACHE_SEMANTIC: 是否启用相似度缓存（可选，默认为False）
+        - AGENT_LLM_CACHE_SEMANTIC_THRESHOLD: 相似度阈值（可选，默认为0.95）
+        - AGENT_LLM_CACHE_MAX_TEMPERATURE: 允许缓存的最高temperature（可选，默认为0.7）
+        - AGENT_TOOL_CACHE_MAX_ENTRIES: 工具结果缓存的最大条目数（可选，默认为1024）
+        - AGENT_TOOL_CACHE_BACKEND: 工具结果缓存后端，memory或sqlite（可选，默认为memory）
+        - AGENT_TOOL_CACHE_PATH: sqlite后端的数据库文件（可选，默认为tool_cache.sqlite）
+        
+        Returns:
+            配置实例
+        """
+        ttl = float(os.getenv("AGENT_LLM_CACHE_TTL", "3600"))
+        return cls(
+            enabled=os.getenv("AGENT_LLM_CACHE", "True").lower() == "true",
+            max_entries=int(os.getenv("AGENT_LLM_CACHE_MAX_ENTRIES", "1000")),
+            ttl=ttl if ttl > 0 else None,
+            path=os.getenv("AGENT_LLM_CACHE_PATH") or None,
+            semantic=os.getenv("AGENT_LLM_CACHE_SEMANTIC", "False").lower() == "true",
+            semantic_threshold=float(os.getenv("AGENT_LLM_CACHE_SEMANTIC_THRESHOLD", "0.95")),
+            max_temperature=float(os.getenv("AGENT_LLM_CACHE_MAX_TEMPERATURE", "0.7")),
+            tool_max_entries=int(os.getenv("AGENT_TOOL_CACHE_MAX_ENTRIES", "1024")),
+            tool_backend=os.getenv("AGENT_TOOL_CACHE_BACKEND", "memory"),
+            tool_path=os.getenv("AGENT_TOOL_CACHE_PATH", "tool_cache.sqlite"),
+        )
+
+# 模型请求调度配置
+class SchedulerConfig:
+    """模型请求准入和调度配置类"""
+    
+    def __init__(
+        self,
+        enabled: bool = True,
+        max_concurrency: int = 0,
+        rate: float = 0.0,
+        burst: Optional[float] = None,
+        queue_timeout: Optional[float] = 60.0,
+        priorities: Optional[Dict[str, int]] = None,
+        default_priority: int = 10,
+        coalesce: bool = True,
+        rate_backend: str = "memory",
+        rate_path: str = "rate_limit.sqlite",
+    ):
+        """
+        初始化调度配置
+        
+        Args:
+            enabled: 是否启用调度
+            max_concurrency: 最大并发上游请求数，0表示不限制
+            rate: 每秒允许发起的请求数，0表示不限流
+            burst: 令牌桶容量（允许的突发请求数），None表示与rate相同
+            queue_timeout: 排队等待的最长时间（秒），None表示一直等待
+            priorities: 租户或入口名到优先级的映射，数值越小越优先
+            default_priority: 未配置优先级的请求使用的优先级
+            coalesce: 是否合并相同的在途请求
+            rate_backend: 令牌桶后端，memory（每个进程独立限流）或sqlite（同一主机的多个进程共享配额）
+            rate_path: sqlite后端的数据库文件路径
+        """
+        self.enabled = enabled
+        self.max_concurrency = max_concurrency
+        self.rate = rate
+        self.burst = burst
+        self.queue_timeout = queue_timeout
+        self.priorities = priorities or {}
+        self.default_priority = default_priority
+        self.coalesce = coalesce
+        self.rate_backend = rate_backend
+        self.rate_path = rate_path
+    
+    def bucket_kwargs(self) -> Dict[str, Any]:
+        """
+        生成创建令牌桶后端所需的参数
+        
+        Returns:
+            传给create_token_bucket的关键字参数
+        """
+        kwargs: Dict[str, Any] = {"rate": self.rate, "capacity": self.burst if self.burst is not None else self.rate}
+        if self.rate_backend == "sqlite":
+            kwargs["path"] = self.rate_path
+        return kwargs
+    
+    @staticmethod
+    def parse_priorities(text: str) -> Dict[str, int]:
+        """解析"chat:0,team-a:1"形式的优先级配置"""
+        priorities = {}
+        for item in text.split(","):
+            name, sep, value = item.partition(":")
+            if sep and name.strip():
+                priorities[name.strip()] = int(value)
+        return priorities
+    
+    @classmethod
+    def from_env(cls) -> "SchedulerConfig":
+        """
+        从环境变量创建配置
+        
+        配置可以通过以下环境变量设置:
+        - AGENT_SCHEDULER: 是否启用调度（可选，默认为True）
+        - AGENT_MAX_CONCURRENCY: 最大并发上游请求数，0表示不限制（可选，默认为0）
+        - AGENT_RATE_LIMIT: 每秒允许发起的请求数，0表示不限流（可选，默认为0）
+        - AGENT_RATE_BURST: 令牌桶容量（可选，默认与AGENT_RATE_LIMIT相同）
+        - AGENT_QUEUE_TIMEOUT: 排队等待的最长秒数，0表示一直等待（可选，默认为60）
+        - AGENT_PRIORITIES: 租户或入口的优先级，形如"chat:0,team-a:1"（可选）
+        - AGENT_DEFAULT_PRIORITY: 默认优先级（可选，默认为10）
+        - AGENT_COALESCE: 是否合并相同的在途请求（可选，默认为True）
+        - AGENT_RATE_BACKEND: 令牌桶后端，memory或sqlite（可选，默认为memory）
+        - AGENT_RATE_PATH: sqlite后端的数据库文件（可选，默认为rate_limit.sqlite）
+        
+        Returns:
+            配置实例
+        """
+        burst = os.getenv("AGENT_RATE_BURST")
+        queue_timeout = float(os.getenv("AGENT_QUEUE_TIMEOUT", "60"))
+        return cls(
+            enabled=os.getenv("AGENT_SCHEDULER", "True").lower() == "true",
+            max_concurrency=int(os.getenv("AGENT_MAX_CONCURRENCY", "0")),
+            rate=float(os.getenv("AGENT_RATE_LIMIT", "0")),
+            burst=float(burst) if burst else None,
+            queue_timeout=queue_timeout if queue_timeout > 0 else None,
+            priorities=cls.parse_priorities(os.getenv("AGENT_PRIORITIES", "")),
+            default_priority=int(os.getenv("AGENT_DEFAULT_PRIORITY", "10")),
+            coalesce=os.getenv("AGENT_COALESCE", "True").lower() == "true",
+            rate_backend=os.getenv("AGENT_RATE_BACKEND", "memory"),
+            rate_path=os.getenv("AGENT_RATE_PATH", "rate_limit.sqlite"),
+        )
+
+# 单次请求预算配置
+class BudgetConfig:
+    """单次请求的Agent循环预算配置类"""
+    
+    def __init__(
+        self,
+        max_tool_rounds: int = 5,
+        max_tokens: int = 0,
+        deadline: float = 0.0,
+    ):
+        """
+        初始化请求预算配置
+        
+        Args:
+            max_tool_rounds: 每个请求最多执行的工具调用轮数，0表示不限制
+            max_tokens: 每个请求所有LLM调用的提示和回复token总数上限，0表示不限制
+            deadline: 每个请求的最长处理时间（秒），0表示不限制
+        """
+        self.max_tool_rounds = max_tool_rounds
+        self.max_tokens = max_tokens
+        self.deadline = deadline
+    
+    def agent_kwargs(self) -> Dict[str, Any]:
+        """
+        生成创建Agent所需的预算参数
+        
+        Returns:
+            传给LangGraphAgent的关键字参数
+        """
+        return {
+            "max_tool_rounds": self.max_tool_rounds or None,
+            "max_request_tokens": self.max_tokens or None,
+            "request_deadline": self.deadline or None,
+        }
+    
+    @classmethod
+    def from_env(cls) -> "BudgetConfig":
+        """
+        从环境变量创建配置
+        
+        配置可以通过以下环境变量设置:
+        - AGENT_MAX_TOOL_ROUNDS: 每个请求的最大工具调用轮数，0表示不限制（可选，默认为5）
+        - AGENT_MAX_REQUEST_TOKENS: 每个请求的token总数上限，0表示不限制（可选，默认为0）
+        - AGENT_REQUEST_DEADLINE: 每个请求的最长处理秒数，0表示不限制（可选，默认为0）
+        
+        Returns:
+            配置实例
+        """
+        return cls(
+            max_tool_rounds=int(os.getenv("AGENT_MAX_TOOL_ROUNDS", "5")),
+            max_tokens=int(os.getenv("AGENT_MAX_REQUEST_TOKENS", "0")),
+            deadline=float(os.getenv("AGENT_REQUEST_DEADLINE", "0")),
+        )
+
+# 快速路径配置
+class RouterConfig:
+    """不调用（或少调用）LLM的快速路径配置类：入口快速路由和工具执行后的推测回答"""
+    
+    def __init__(
+        self,
+        enabled: bool = False,
+        rules: str = "arithmetic,weather",
+        min_confidence: float = 0.8,
+        shadow_rate: float = 0.0,
+        speculative_answer: str = "match",
+        early_tool_dispatch: bool = True,
+    ):
+        """
+        初始化快速路径配置
+        
+        Args:
+            enabled: 是否启用快速路由
+            rules: 逗号分隔的规则名，按顺序匹配
+            min_confidence: 直接调用工具所需的最低置信度
+            shadow_rate: 命中的请求中改走LLM路径、用于核对准确率的比例
+            speculative_answer: 工具执行后的推测回答模式，off、match或presentable
+            early_tool_dispatch: 流式模式下解析到完整的工具调用后是否立即停止生成；
+                停止后得不到模型推测的行动结果，match模式不会生效
+        """
+        self.enabled = enabled
+        self.rules = rules
+        self.min_confidence = min_confidence
+        self.shadow_rate = shadow_rate
+        self.speculative_answer = speculative_answer
+        self.early_tool_dispatch = early_tool_dispatch
+    
+    def router_kwargs(self) -> Dict[str, Any]:
+        """
+        生成create_query_router所需的参数
+        
+        Returns:
+            关键字参数
+        """
+        return {
+            "rules": [name.strip() for name in self.rules.split(",") if name.strip()],
+            "min_confidence": self.min_confidence,
+            "shadow_rate": self.shadow_rate,
+        }
+    
+    @classmethod
+    def from_env(cls) -> "RouterConfig":
+        """
+        从环境变量创建配置
+        
+        配置可以通过以下环境变量设置:
+        - AGENT_ROUTER: 是否启用快速路由（可选，默认为False）
+        - AGENT_ROUTER_RULES: 逗号分隔的规则名（可选，默认为arithmetic,weather）
+        - AGENT_ROUTER_MIN_CONFIDENCE: 直接调用工具所需的最低置信度（可选，默认为0.8）
+        - AGENT_ROUTER_SHADOW_RATE: 抽样核对准确率的比例（可选，默认为0）
+        - AGENT_SPECULATIVE_ANSWER: 工具执行后的推测回答模式，off、match或presentable（可选，默认为match）
+        - AGENT_EARLY_TOOL_DISPATCH: 流式模式下是否在工具调用解析完整后立即停止生成（可选，默认为True）
+        
+        Returns:
+            配置实例
+        """
+        return cls(
+            enabled=os.getenv("AGENT_ROUTER", "False").lower() == "true",
+            rules=os.getenv("AGENT_ROUTER_RULES", "arithmetic,weather"),
+            min_confidence=float(os.getenv("AGENT_ROUTER_MIN_CONFIDENCE", "0.8")),
+            shadow_rate=float(os.getenv("AGENT_ROUTER_SHADOW_RATE", "0")),
+            speculative_answer=os.getenv("AGENT_SPECULATIVE_ANSWER", "match").lower(),
+            early_tool_dispatch=os.getenv("AGENT_EARLY_TOOL_DISPATCH", "True").lower() == "true",
+        )
+
+# 工具注册表配置
+class ToolConfig:
+    """动态工具注册表配置类：工具的发现方式和每个请求放入提示的工具数"""
+    
+    def __init__(
+        self,
+        plugin_dirs: str = "",
+        entry_points: bool = True,
+        max_tools: int = 8,
+        refresh_interval: float = 5.0,
+    ):
+        """
+        初始化工具注册表配置
+        
+        Args:
+            plugin_dirs: 插件目录，多个目录用os.pathsep分隔
+            entry_points: 是否注册已安装的包通过entry point（langgraph_agent.tools）声明的工具
+            max_tools: 每个请求按查询选出、放入提示的最大工具数，0表示不限制
+            refresh_interval: 自动重新扫描插件目录的最短间隔（秒），0表示不自动扫描
+        """
+        self.plugin_dirs = plugin_dirs
+        self.entry_points = entry_points
+        self.max_tools = max_tools
+        self.refresh_interval = refresh_interval
+    
+    def registry_kwargs(self) -> Dict[str, Any]:
+        """
+        生成create_tool_registry所需的参数
+        
+        Returns:
+            关键字参数
+        """
+        return {
+            "plugin_dirs": [path for path in self.plugin_dirs.split(os.pathsep) if path.strip()],
+            "entry_points": self.entry_points,
+            "refresh_interval": self.refresh_interval,
+        }
+    
+    @classmethod
+    def from_env(cls) -> "ToolConfig":
+        """
+        从环境变量创建配置
+        
+        配置可以通过以下环境变量设置:
+        - AGENT_TOOL_PLUGIN_DIR: 插件目录，多个目录用os.pathsep分隔（可选，默认不使用插件目录）
+        - AGENT_TOOL_ENTRY_POINTS: 是否注册entry point声明的工具（可选，默认为True）
+        - AGENT_MAX_TOOLS: 每个请求放入提示的最大工具数，0表示不限制（可选，默认为8）
+        - AGENT_TOOL_REFRESH_INTERVAL: 自动重新扫描插件目录的间隔（秒），0表示不自动扫描（可选，默认为5）
+        
+        Returns:
+            配置实例
+        """
+        return cls(
+            plugin_dirs=os.getenv("AGENT_TOOL_PLUGIN_DIR", ""),
+            entry_points=os.getenv("AGENT_TOOL_ENTRY_POINTS", "True").lower() == "true",
+            max_tools=int(os.getenv("AGENT_MAX_TOOLS", "8")),
+            refresh_interval=float(os.getenv("AGENT_TOOL_REFRESH_INTERVAL", "5")),
+        )
+
+# 批量运行配置
+class BatchConfig:
+    """批量运行（/chat/batch和cli.py --input）配置类"""
+    
+    def __init__(
+        self,
+        concurrency: int = 8,
+        max_concurrency: int = 32,
+        dir: str = os.path.join(".agent_state", "batches"),
+    ):
+        """
+        初始化批量运行配置
+        
+        Args:
+            concurrency: 默认同时处理的条目数
+            max_concurrency: /chat/batch允许请求的最大并发数
+            dir: /chat/batch按batch_id保存结果（用于断点续跑）的目录
+        """
+        self.concurrency = concurrency
+        self.max_concurrency = max_concurrency
+        self.dir = dir
+    
+    @classmethod
+    def from_env(cls) -> "BatchConfig":
+        """
+        从环境变量创建配置
+        
+        配置可以通过以下环境变量设置:
+        - AGENT_BATCH_CONCURRENCY: 默认同时处理的条目数（可选，默认为8）
+        - AGENT_BATCH_MAX_CONCURRENCY: /chat/batch允许的最大并发数（可选，默认为32）
+        - AGENT_BATCH_DIR: /chat/batch保存结果的目录（可选，默认为AGENT_STATE_DIR下的batches）
+        
+        Returns:
+            配置实例
+        """
+        state_dir = os.getenv("AGENT_STATE_DIR", ".agent_state")
+        return cls(
+            concurrency=int(os.getenv("AGENT_BATCH_CONCURRENCY", "8")),
+            max_concurrency=int(os.getenv("AGENT_BATCH_MAX_CONCURRENCY", "32")),
+            dir=os.getenv("AGENT_BATCH_DIR", os.path.join(state_dir, "batches")),
+        )
+
+# 天气数据配置
+class WeatherConfig:
+    """天气工具数据来源配置类"""
+    
+    def __init__(
+        self,
+        provider: str = "sqlite",
+        db_path: str = ":memory:",
+        seed_path: Optional[str] = None,
+        url: str = "http://127.0.0.1:8081",
+        timeout: float = 5.0,
+    ):
+        """
+        初始化天气数据配置
+        
+        Args:
+            provider: 数据提供者，可选sqlite、http或通过register_weather_provider注册的名称
+            db_path: sqlite提供者的数据库文件路径，":memory:"表示由种子数据在内存中建库
+            seed_path: sqlite提供者的种子数据JSON路径，None表示使用内置数据
+            url: http提供者的服务地址
+            timeout: http提供者的请求超时时间（秒）
+        """
+        self.provider = provider
+        self.db_path = db_path
+        self.seed_path = seed_path
+        self.url = url
+        self.timeout = timeout
+    
+    def provider_kwargs(self) -> Dict[str, Any]:
+        """
+        生成创建数据提供者所需的参数
+        
+        Returns:
+            传给create_weather_provider的关键字参数
+        """
+        if self.provider == "sqlite":
+            kwargs = {"path": self.db_path}
+            if self.seed_path:
+                kwargs["seed_path"] = self.seed_path
+            return kwargs
+        if self.provider == "http":
+            return {"base_url": self.url, "timeout": self.timeout}
+        return {}
+    
+    @classmethod
+    def from_env(cls) -> "WeatherConfig":
+        """
+        从环境变量创建配置
+        
+        配置可以通过以下环境变量设置:
+        - AGENT_WEATHER_PROVIDER: 天气数据提供者（可选，默认为sqlite）
+        - AGENT_WEATHER_DB: sqlite数据库文件路径（可选，默认在内存中建库）
+        - AGENT_WEATHER_SEED: 种子数据JSON路径（可选，默认使用内置数据）
+        - AGENT_WEATHER_URL: http提供者的服务地址（可选，默认为http://127.0.0.1:8081）
+        - AGENT_WEATHER_TIMEOUT: http提供者的请求超时秒数（可选，默认为5）
+        
+        Returns:
+            配置实例
+        """
+        return cls(
+            provider=os.getenv("AGENT_WEATHER_PROVIDER", "sqlite"),
+            db_path=os.getenv("AGENT_WEATHER_DB", ":memory:"),
+            seed_path=os.getenv("AGENT_WEATHER_SEED") or None,
+            url=os.getenv("AGENT_WEATHER_URL", "http://127.0.0.1:8081"),
+            timeout=float(os.getenv("AGENT_WEATHER_TIMEOUT", "5")),
+        )
+
+# 服务部署配置
+class ServerConfig:
+    """多进程部署（serve.py）配置类"""
+    
+    def __init__(
+        self,
+        host: str = "0.0.0.0",
+        port: int = 8000,
+        workers: int = 0,
+        max_workers: int = 0,
+        worker_memory_mb: int = 300,
+        graceful_timeout: float = 30.0,
+        state_dir: str = ".agent_state",
+    ):
+        """
+        初始化部署配置
+        
+        Args:
+            host: 监听地址
+            port: 监听端口
+            workers: worker进程数，0表示按可用CPU和内存自动确定
+            max_workers: 自动确定worker数时的上限，0表示不限制
+            worker_memory_mb: 自动确定worker数时按每个worker占用的内存（MB）估算
+            graceful_timeout: 收到停止信号后等待在途请求完成的最长秒数
+            state_dir: 多个worker共享的会话、缓存和限流数据所在目录
+        """
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.max_workers = max_workers
+        self.worker_memory_mb = worker_memory_mb
+        self.graceful_timeout = graceful_timeout
+        self.state_dir = state_dir
+    
+    @classmethod
+    def from_env(cls) -> "ServerConfig":
+        """
+        从环境变量创建配置
+        
+        配置可以通过以下环境变量设置:
+        - AGENT_HOST / AGENT_PORT: 监听地址和端口（可选，默认为0.0.0.0/8000）
+        - AGENT_WORKERS: worker进程数，0或auto表示自动确定（可选，默认为auto）
+        - AGENT_MAX_WORKERS: 自动确定时的上限，0表示不限制（可选，默认为0）
+        - AGENT_WORKER_MEMORY_MB: 每个worker的内存估算（可选，默认为300）
+        - AGENT_GRACEFUL_TIMEOUT: 优雅停止的最长等待秒数（可选，默认为30）
+        - AGENT_STATE_DIR: 共享状态目录（可选，默认为.agent_state）
+        
+        Returns:
+            配置实例
+        """
+        workers = os.getenv("AGENT_WORKERS", "auto")
+        return cls(
+            host=os.getenv("AGENT_HOST", "0.0.0.0"),
+            port=int(os.getenv("AGENT_PORT", "8000")),
+            workers=0 if workers == "auto" else int(workers),
+            max_workers=int(os.getenv("AGENT_MAX_WORKERS", "0")),
+            worker_memory_mb=int(os.getenv("AGENT_WORKER_MEMORY_MB", "300")),
+            graceful_timeout=float(os.getenv("AGENT_GRACEFUL_TIMEOUT", "30")),
+            state_dir=os.getenv("AGENT_STATE_DIR", ".agent_state"),
+        )
+
+# 默认配置，首次调用get_deepseek_config()时才从环境变量读取，
+# 这样导入本模块没有副作用，调用方也可以在导入之后再设置环境变量
+_default_config: Optional[DeepSeekConfig] = None
 
 # 获取DeepSeek配置
 def get_deepseek_config() -> DeepSeekConfig:
     """
     获取DeepSeek配置
     
-    首先尝试从环境变量获取配置，如果未设置则使用默认值
+    首先尝试从环境变量获取配置，如果未设置则使用默认值；结果在进程内缓存
     
     Returns:
         DeepSeek配置实例
     """
-    return default_config 
\ No newline at end of file
+    global _default_config
+    if _default_config is None:
+        _default_config = DeepSeekConfig.from_env()
+    return _default_config
+
+def __getattr__(name: str) -> Any:
+    # 兼容直接访问模块属性default_config的旧代码
+    if name == "default_config":
+        return get_deepseek_config()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# 获取会话记忆配置
+def get_memory_config() -> MemoryConfig:
+    """
+    获取会话记忆配置
+    
+    Returns:
+        会话记忆配置实例
+    """
+    return MemoryConfig.from_env()
+
+# 获取LLM响应缓存配置
+def get_cache_config() -> CacheConfig:
+    """
+    获取LLM响应缓存配置
+    
+    Returns:
+        LLM响应缓存配置实例
+    """
+    return CacheConfig.from_env()
+
+# 获取模型请求调度配置
+def get_scheduler_config() -> SchedulerConfig:
+    """
+    获取模型请求调度配置
+    
+    Returns:
+        调度配置实例
+    """
+    return SchedulerConfig.from_env()
+
+# 获取请求预算配置
+def get_budget_config() -> BudgetConfig:
+    """
+    获取请求预算配置
+    
+    Returns:
+        请求预算配置实例
+    """
+    return BudgetConfig.from_env()
+
+# 获取快速路径配置
+def get_router_config() -> RouterConfig:
+    """
+    获取快速路径配置
+    
+    Returns:
+        快速路径配置实例
+    """
+    return RouterConfig.from_env()
+
+# 获取工具注册表配置
+def get_tool_config() -> ToolConfig:
+    """
+    获取工具注册表配置
+    
+    Returns:
+        工具注册表配置实例
+    """
+    return ToolConfig.from_env()
+
+# 获取批量运行配置
+def get_batch_config() -> BatchConfig:
+    """
+    获取批量运行配置
+    
+    Returns:
+        批量运行配置实例
+    """
+    return BatchConfig.from_env()
+
+# 获取天气数据配置
+def get_weather_config() -> WeatherConfig:
+    """
+    获取天气数据配置
+    
+    Returns:
+        天气数据配置实例
+    """
+    return WeatherConfig.from_env()
+
+# 获取多进程部署配置
+def get_server_config() -> ServerConfig:
+    """
+    获取多进程部署配置
+    
+    Returns:
+        部署配置实例
+    """
+    return ServerConfig.from_env()
@@ -0,0 +1,14 @@
+# 会话记忆包初始化文件
+from src.memory.conversation_store import (
+    LRUMemorySaver,
+    SQLiteConversationSaver,
+    create_conversation_store,
+    register_conversation_store,
+)
+
+__all__ = [
+    "LRUMemorySaver",
+    "SQLiteConversationSaver",
+    "create_conversation_store",
+    "register_conversation_store",
+]
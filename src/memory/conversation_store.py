@@ -0,0 +1,377 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+)
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+logger = logging.getLogger("langgraph_agent.memory")
+
+
+class _EvictionStats:
+    """会话淘汰相关的计数器"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.evicted_lru = 0  # 因会话数超限被淘汰的会话
+        self.evicted_ttl = 0  # 因过期被淘汰的会话
+        self.pruned_checkpoints = 0  # 因单会话检查点数超限被删除的检查点
+
+    def add(self, field: str, count: int = 1) -> None:
+        with self.lock:
+            setattr(self, field, getattr(self, field) + count)
+
+    def as_dict(self) -> Dict[str, int]:
+        with self.lock:
+            return {
+                "evicted_lru": self.evicted_lru,
+                "evicted_ttl": self.evicted_ttl,
+                "pruned_checkpoints": self.pruned_checkpoints,
+            }
+
+
+class LRUMemorySaver(InMemorySaver):
+    """
+    带LRU淘汰和TTL过期的内存检查点存储
+
+    - 最多保留max_conversations个会话，超出时淘汰最久未访问的会话
+    - 超过ttl秒未访问的会话在下次访问或写入时被清除
+    - 每个会话只保留最近max_checkpoints个检查点，限制单会话内存占用
+    """
+
+    def __init__(
+        self,
+        max_conversations: int = 1000,
+        ttl: Optional[float] = 3600.0,
+        max_checkpoints: int = 5,
+        **kwargs: Any,
+    ):
+        """
+        初始化内存检查点存储
+
+        Args:
+            max_conversations: 最多保留的会话数
+            ttl: 会话过期时间（秒），None表示不过期
+            max_checkpoints: 每个会话最多保留的检查点数
+        """
+        super().__init__(**kwargs)
+        self.max_conversations = max_conversations
+        self.ttl = ttl
+        self.max_checkpoints = max_checkpoints
+        self._access: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._stats = _EvictionStats()
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = str(config["configurable"]["thread_id"])
+        with self._lock:
+            if self._expired(thread_id):
+                self._evict(thread_id, "evicted_ttl")
+                return None
+            if thread_id in self._access:
+                self._access.move_to_end(thread_id)
+            return super().get_tuple(config)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = str(config["configurable"]["thread_id"])
+        with self._lock:
+            result = super().put(config, checkpoint, metadata, new_versions)
+            self._access[thread_id] = time.monotonic()
+            self._access.move_to_end(thread_id)
+            self._prune_checkpoints(thread_id, config["configurable"]["checkpoint_ns"])
+            self._enforce_limits()
+            return result
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        with self._lock:
+            super().put_writes(config, writes, task_id, task_path)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            super().delete_thread(thread_id)
+            self._access.pop(str(thread_id), None)
+
+    def _expired(self, thread_id: str) -> bool:
+        last = self._access.get(thread_id)
+        return self.ttl is not None and last is not None and time.monotonic() - last > self.ttl
+
+    def _evict(self, thread_id: str, reason: str) -> None:
+        logger.debug(f"淘汰会话 {thread_id} ({reason})")
+        self.delete_thread(thread_id)
+        self._stats.add(reason)
+
+    def _enforce_limits(self) -> None:
+        """清除过期会话，并按LRU淘汰超出数量上限的会话"""
+        if self.ttl is not None:
+            now = time.monotonic()
+            # _access按访问时间排序，从最旧的开始检查即可
+            while self._access:
+                thread_id, last = next(iter(self._access.items()))
+                if now - last <= self.ttl:
+                    break
+                self._evict(thread_id, "evicted_ttl")
+        while len(self._access) > self.max_conversations:
+            thread_id = next(iter(self._access))
+            self._evict(thread_id, "evicted_lru")
+
+    def _prune_checkpoints(self, thread_id: str, checkpoint_ns: str) -> None:
+        """只保留会话最近的max_checkpoints个检查点，并删除不再被引用的通道数据"""
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        if len(checkpoints) <= self.max_checkpoints:
+            return
+
+        # 检查点ID按时间单调递增，排序后即可区分新旧
+        ordered = sorted(checkpoints)
+        stale = ordered[:-self.max_checkpoints]
+        for checkpoint_id in stale:
+            del checkpoints[checkpoint_id]
+            self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+
+        # 收集仍被保留的检查点引用的通道版本
+        referenced = set()
+        for saved_checkpoint, _, _ in checkpoints.values():
+            for channel, version in self.serde.loads_typed(saved_checkpoint)["channel_versions"].items():
+                referenced.add((thread_id, checkpoint_ns, channel, version))
+        for key in [k for k in self.blobs if k[:2] == (thread_id, checkpoint_ns) and k not in referenced]:
+            del self.blobs[key]
+
+        self._stats.add("pruned_checkpoints", len(stale))
+
+    def stats(self) -> Dict[str, Any]:
+        """获取会话存储指标"""
+        with self._lock:
+            conversations = len(self._access)
+        return {"backend": "memory", "conversations": conversations, **self._stats.as_dict()}
+
+
+class SQLiteConversationSaver(SqliteSaver):
+    """
+    基于本地SQLite文件的检查点存储
+
+    在SqliteSaver基础上增加了会话访问时间表，用于TTL过期、会话数上限和
+    单会话检查点数上限，并补充了异步接口（在线程池中执行同步实现）。
+    """
+
+    def __init__(
+        self,
+        path: str = "conversations.sqlite",
+        max_conversations: int = 10000,
+        ttl: Optional[float] = 7 * 24 * 3600.0,
+        max_checkpoints: int = 5,
+        sweep_interval: int = 100,
+    ):
+        """
+        初始化SQLite检查点存储
+
+        Args:
+            path: 数据库文件路径
+            max_conversations: 最多保留的会话数
+            ttl: 会话过期时间（秒），None表示不过期
+            max_checkpoints: 每个会话最多保留的检查点数
+            sweep_interval: 每写入多少次检查点执行一次过期/超限清理
+        """
+        super().__init__(sqlite3.connect(path, check_same_thread=False))
+        self.max_conversations = max_conversations
+        self.ttl = ttl
+        self.max_checkpoints = max_checkpoints
+        self.sweep_interval = sweep_interval
+        self._puts = 0
+        self._stats = _EvictionStats()
+
+    def setup(self) -> None:
+        if self.is_setup:
+            return
+        super().setup()
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS conversation_access ("
+            "thread_id TEXT PRIMARY KEY, last_access REAL NOT NULL)"
+        )
+        self.conn.commit()
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = str(config["configurable"]["thread_id"])
+        if self.ttl is not None:
+            with self.cursor() as cur:
+                cur.execute(
+                    "SELECT last_access FROM conversation_access WHERE thread_id = ?",
+                    (thread_id,),
+                )
+                row = cur.fetchone()
+            if row and time.time() - row[0] > self.ttl:
+                self._evict(thread_id, "evicted_ttl")
+                return None
+        return super().get_tuple(config)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        result = super().put(config, checkpoint, metadata, new_versions)
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        with self.cursor() as cur:
+            cur.execute(
+                "INSERT OR REPLACE INTO conversation_access (thread_id, last_access) VALUES (?, ?)",
+                (thread_id, time.time()),
+            )
+            # 只保留最近的max_checkpoints个检查点
+            cur.execute(
+                "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                "ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?",
+                (thread_id, checkpoint_ns, self.max_checkpoints),
+            )
+            stale = [row[0] for row in cur.fetchall()]
+            for checkpoint_id in stale:
+                for table in ("checkpoints", "writes"):
+                    cur.execute(
+                        f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                        (thread_id, checkpoint_ns, checkpoint_id),
+                    )
+        if stale:
+            self._stats.add("pruned_checkpoints", len(stale))
+        self._puts += 1
+        if self._puts % self.sweep_interval == 0:
+            self.sweep()
+        return result
+
+    def delete_thread(self, thread_id: str) -> None:
+        super().delete_thread(thread_id)
+        with self.cursor() as cur:
+            cur.execute("DELETE FROM conversation_access WHERE thread_id = ?", (str(thread_id),))
+
+    def sweep(self) -> None:
+        """清除过期会话，并淘汰超出数量上限的最久未访问会话"""
+        with self.cursor() as cur:
+            expired = []
+            if self.ttl is not None:
+                cur.execute(
+                    "SELECT thread_id FROM conversation_access WHERE last_access < ?",
+                    (time.time() - self.ttl,),
+                )
+                expired = [row[0] for row in cur.fetchall()]
+            cur.execute(
+                "SELECT thread_id FROM conversation_access ORDER BY last_access DESC LIMIT -1 OFFSET ?",
+                (self.max_conversations,),
+            )
+            overflow = [row[0] for row in cur.fetchall() if row[0] not in expired]
+        for thread_id in expired:
+            self._evict(thread_id, "evicted_ttl")
+        for thread_id in overflow:
+            self._evict(thread_id, "evicted_lru")
+
+    def _evict(self, thread_id: str, reason: str) -> None:
+        logger.debug(f"淘汰会话 {thread_id} ({reason})")
+        self.delete_thread(thread_id)
+        self._stats.add(reason)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取会话存储指标"""
+        with self.cursor(transaction=False) as cur:
+            cur.execute("SELECT COUNT(*) FROM conversation_access")
+            conversations = cur.fetchone()[0]
+        return {"backend": "sqlite", "conversations": conversations, **self._stats.as_dict()}
+
+    # SqliteSaver本身不支持异步接口，这里放到线程池中执行同步实现
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+
+# 会话存储后端注册表：名称 -> 工厂函数
+_STORE_FACTORIES: Dict[str, Callable[..., BaseCheckpointSaver]] = {
+    "memory": LRUMemorySaver,
+    "sqlite": SQLiteConversationSaver,
+}
+
+
+def register_conversation_store(name: str, factory: Callable[..., BaseCheckpointSaver]) -> None:
+    """
+    注册会话存储后端
+
+    工厂函数返回任意LangGraph检查点存储（BaseCheckpointSaver）即可，
+    例如基于Redis或Postgres的共享存储
+
+    Args:
+        name: 后端名称
+        factory: 创建检查点存储的工厂函数
+    """
+    _STORE_FACTORIES[name] = factory
+
+
+def create_conversation_store(backend: str = "memory", **kwargs: Any) -> Optional[BaseCheckpointSaver]:
+    """
+    按后端名称创建会话存储
+
+    Args:
+        backend: 后端名称，"none"表示不保存会话状态
+        **kwargs: 传给后端工厂函数的参数
+
+    Returns:
+        检查点存储实例，backend为"none"时返回None
+    """
+    if backend == "none":
+        return None
+    if backend not in _STORE_FACTORIES:
+        raise ValueError(f"未知的会话存储后端: {backend}，可选: {', '.join(sorted(_STORE_FACTORIES))}")
+    return _STORE_FACTORIES[backend](**kwargs)
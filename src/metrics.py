@@ -0,0 +1,472 @@
+import bisect
+import contextvars
+import logging
+import math
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:  # 未安装OpenTelemetry时只在进程内记录span
+    otel_trace = None
+
+logger = logging.getLogger("langgraph_agent.metrics")
+
+# 常用的桶边界
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+# 一个样本：(指标全名, 标签, 值)
+Sample = Tuple[str, Dict[str, str], float]
+
+
+class Histogram:
+    """
+    线程安全的累计直方图
+
+    桶边界与Prometheus的le标签含义相同：每个桶统计小于等于该边界的观测值个数
+    """
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        """
+        Args:
+            buckets: 桶上界（升序），+Inf桶自动追加
+        """
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        """记录一个观测值"""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        获取直方图快照
+
+        Returns:
+            {"buckets": {上界: 累计个数}, "sum": 观测值之和, "count": 观测次数}，上界包含math.inf
+        """
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+        cumulative, buckets = 0, {}
+        for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+            cumulative += bucket_count
+            buckets[bound] = cumulative
+        return {"buckets": buckets, "sum": total, "count": count}
+
+
+def histogram_samples(name: str, labels: Dict[str, str], snapshot: Dict[str, Any]) -> List[Sample]:
+    """把直方图快照展开为Prometheus的_bucket/_sum/_count样本"""
+    samples = [
+        (f"{name}_bucket", {**labels, "le": _format_value(bound)}, count)
+        for bound, count in snapshot["buckets"].items()
+    ]
+    samples.append((f"{name}_sum", labels, snapshot["sum"]))
+    samples.append((f"{name}_count", labels, snapshot["count"]))
+    return samples
+
+
+class _Metric:
+    """带标签的指标基类，每组标签值对应一个子指标"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(label, "")) for label in self.labelnames)
+
+    def samples(self) -> List[Sample]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        """计数器加amount"""
+        key = self._key(labels)
+        with self._lock:
+            self._children[key] = self._children.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        """读取一组标签的当前值"""
+        return self._children.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            items = list(self._children.items())
+        return [(f"{self.name}_total", dict(zip(self.labelnames, key)), value) for key, value in items]
+
+
+class LabeledHistogram(_Metric):
+    """按标签分组的直方图"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels: Any) -> None:
+        """记录一个观测值"""
+        key = self._key(labels)
+        histogram = self._children.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._children.setdefault(key, Histogram(self.buckets))
+        histogram.observe(value)
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            items = list(self._children.items())
+        samples = []
+        for key, histogram in items:
+            samples.extend(histogram_samples(self.name, dict(zip(self.labelnames, key)), histogram.snapshot()))
+        return samples
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value)) if abs(value) < 1e15 else repr(value)
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_sample(name: str, labels: Dict[str, str], value: float) -> str:
+    if labels:
+        label_text = ",".join(f'{key}="{_escape(label)}"' for key, label in labels.items())
+        return f"{name}{{{label_text}}} {_format_value(float(value))}"
+    return f"{name} {_format_value(float(value))}"
+
+
+# 采集函数返回[(指标名, 类型, 说明, 样本列表)]
+Collector = Callable[[], List[Tuple[str, str, str, List[Sample]]]]
+
+
+class MetricsRegistry:
+    """
+    指标注册表
+
+    注册的指标和采集函数在render时统一输出为Prometheus文本格式，
+    采集函数用于导出连接池、缓存、调度器等组件已有的stats()
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: Dict[str, Collector] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        """注册（或获取已注册的）计数器"""
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> LabeledHistogram:
+        """注册（或获取已注册的）直方图"""
+        return self._register(LabeledHistogram(name, documentation, labelnames, buckets))
+
+    def _register(self, metric: _Metric) -> Any:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def register_collector(self, name: str, collector: Collector) -> None:
+        """注册采集函数，同名的采集函数会被替换"""
+        with self._lock:
+            self._collectors[name] = collector
+
+    def unregister_collector(self, name: str) -> None:
+        """移除采集函数"""
+        with self._lock:
+            self._collectors.pop(name, None)
+
+    def render(self) -> str:
+        """
+        输出Prometheus文本格式（text/plain; version=0.0.4）
+
+        Returns:
+            全部指标的文本
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors.items())
+        # 文本格式0.0.4中计数器的TYPE行需使用带_total后缀的样本名
+        families = [
+            (f"{metric.name}_total" if metric.kind == "counter" else metric.name, metric.kind, metric.documentation, metric.samples())
+            for metric in metrics
+        ]
+        for name, collector in collectors:
+            try:
+                families.extend(collector())
+            except Exception as e:
+                logger.warning(f"指标采集失败({name}): {e}")
+
+        lines = []
+        for name, kind, documentation, samples in families:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(_format_sample(*sample) for sample in samples)
+        return "\n".join(lines) + "\n"
+
+
+def stats_collector(prefix: str, stats: Callable[[], Dict[str, Any]], documentation: str = "") -> Collector:
+    """
+    把组件的stats()字典包装成采集函数
+
+    数值项导出为gauge，形如{"buckets", "sum", "count"}的直方图快照导出为histogram，其余项忽略
+
+    Args:
+        prefix: 指标名前缀
+        stats: 返回指标字典的函数
+        documentation: 指标说明
+    """
+
+    def collect() -> List[Tuple[str, str, str, List[Sample]]]:
+        families = []
+        for key, value in stats().items():
+            name = f"{prefix}_{key}"
+            if isinstance(value, dict) and "buckets" in value:
+                families.append((name, "histogram", documentation or key, histogram_samples(name, {}, value)))
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                families.append((name, "gauge", documentation or key, [(name, {}, value)]))
+        return families
+
+    return collect
+
+
+# ----------------------------------------------------------------------
+# Span
+# ----------------------------------------------------------------------
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """OpenTelemetry风格的span：同一次请求内的span共享trace_id，并通过parent_id组成调用树"""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_time", "end_time", "attributes", "status", "_otel")
+
+    def __init__(self, name: str, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent is not None else None
+        self.start_time = time.time()
+        self.end_time: Optional[float] = None
+        self.attributes = dict(attributes)
+        self.status = "ok"
+        self._otel = None
+
+    @property
+    def duration(self) -> Optional[float]:
+        """持续时间（秒），span未结束时为None"""
+        return self.end_time - self.start_time if self.end_time is not None else None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        """设置属性，同时写入对应的OpenTelemetry span"""
+        self.attributes[key] = value
+        if self._otel is not None:
+            self._otel.set_attribute(key, value)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "duration": self.duration,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class Tracer:
+    """
+    轻量的span记录器
+
+    结束的span保存在有界的环形缓冲区中供调试查看；安装了opentelemetry时，
+    每个span同时作为OpenTelemetry span发出，由应用配置的exporter导出
+    """
+
+    def __init__(self, max_spans: int = 1000):
+        """
+        Args:
+            max_spans: 保留的已结束span数
+        """
+        self._finished: "deque[Span]" = deque(maxlen=max_spans)
+        self._otel = otel_trace.get_tracer("langgraph_agent") if otel_trace is not None else None
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span]:
+        """
+        记录一段代码的span，嵌套调用自动成为子span
+
+        Args:
+            name: span名称，例如"agent.node"
+            **attributes: span属性
+        """
+        parent = _current_span.get()
+        span = Span(name, parent, attributes)
+        token = _current_span.set(span)
+        otel_context = self._otel.start_as_current_span(name, attributes=attributes) if self._otel else None
+        try:
+            if otel_context is not None:
+                span._otel = otel_context.__enter__()
+            yield span
+        except GeneratorExit:
+            # 生成器被调用方提前关闭（例如提前派发工具调用后停止读取流）不算错误
+            span.set_attribute("closed_early", True)
+            raise
+        except BaseException as e:
+            span.status = "error"
+            span.set_attribute("error", f"{e.__class__.__name__}: {e}")
+            if otel_context is not None:
+                otel_context.__exit__(type(e), e, e.__traceback__)
+                otel_context = None
+            raise
+        finally:
+            span.end_time = time.time()
+            if otel_context is not None:
+                otel_context.__exit__(None, None, None)
+            try:
+                _current_span.reset(token)
+            except ValueError:
+                # 异步生成器在另一个上下文中被关闭时无法reset，直接恢复父span
+                _current_span.set(parent)
+            self._finished.append(span)
+
+    def start_span(self, name: str, **attributes: Any) -> Span:
+        """
+        开始一个不成为当前span的span，需要调用end_span结束
+
+        用于跨越yield的生成器：span不写入上下文（OpenTelemetry span也不attach），
+        生成器在另一个上下文中被关闭时不需要恢复上下文；父span为开始时的当前span
+
+        Args:
+            name: span名称
+            **attributes: span属性
+        """
+        span = Span(name, _current_span.get(), attributes)
+        if self._otel is not None:
+            span._otel = self._otel.start_span(name, attributes=attributes)
+        return span
+
+    def end_span(self, span: Span, error: Optional[BaseException] = None) -> None:
+        """
+        结束start_span开始的span
+
+        Args:
+            span: 要结束的span
+            error: 导致span结束的异常；GeneratorExit（调用方提前关闭生成器）不算错误
+        """
+        if isinstance(error, GeneratorExit):
+            span.set_attribute("closed_early", True)
+        elif error is not None:
+            span.status = "error"
+            span.set_attribute("error", f"{error.__class__.__name__}: {error}")
+            if span._otel is not None:
+                span._otel.record_exception(error)
+                span._otel.set_status(otel_trace.Status(otel_trace.StatusCode.ERROR, str(error)))
+        span.end_time = time.time()
+        if span._otel is not None:
+            span._otel.end()
+        self._finished.append(span)
+
+    def recent(self, limit: int = 100, trace_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        获取最近结束的span
+
+        Args:
+            limit: 最多返回的span数
+            trace_id: 只返回指定trace的span
+
+        Returns:
+            span字典列表，按结束时间排序
+        """
+        spans = [span for span in list(self._finished) if trace_id is None or span.trace_id == trace_id]
+        return [span.to_dict() for span in spans[-limit:]]
+
+
+# ----------------------------------------------------------------------
+# 进程内共享的注册表和Agent指标
+# ----------------------------------------------------------------------
+
+registry = MetricsRegistry()
+tracer = Tracer(max_spans=int(os.getenv("AGENT_TRACE_MAX_SPANS", "1000")))
+
+AGENT_REQUESTS = registry.counter("agent_requests", "Agent处理的请求数", ["mode", "status"])
+AGENT_ITERATIONS = registry.histogram(
+    "agent_loop_iterations", "每个请求中Agent节点（LLM决策）的执行次数", buckets=(1, 2, 3, 4, 5, 8, 10, 15, 25)
+)
+NODE_SECONDS = registry.histogram("agent_node_seconds", "图中每个节点的执行耗时（秒）", ["node"])
+LLM_SECONDS = registry.histogram(
+    "llm_request_seconds", "LLM请求各阶段耗时（秒）：connect为新建连接（TCP和TLS握手，同步和异步请求都会记录），ttft为首个token（流式），total为完整请求", ["phase"]
+)
+LLM_TOKENS = registry.counter("llm_tokens", "API返回的usage中的token数", ["type"])
+TOOL_SECONDS = registry.histogram("tool_seconds", "工具执行耗时（秒）", ["tool"])
+TOOL_CALLS = registry.counter("tool_calls", "工具调用次数", ["tool", "status"])
+AGENT_BUDGET_EXHAUSTED = registry.counter(
+    "agent_budget_exhausted", "请求预算耗尽后提前结束Agent循环的次数", ["reason"]
+)
+ROUTER_DECISIONS = registry.counter(
+    "agent_router_decisions",
+    "快速路由对每个请求的决策：hit直接调用工具，shadow抽样改走LLM路径用于核对，low_confidence和miss走LLM路径",
+    ["rule", "decision"]
+)
+ROUTER_ANSWERS = registry.counter(
+    "agent_router_answers", "快速路由调用工具后的结果：template按模板回答，fallback结果不可用、交回LLM", ["rule", "outcome"]
+)
+ROUTER_ACCURACY = registry.counter(
+    "agent_router_accuracy", "抽样核对中快速路由与LLM选择的工具调用是否一致", ["rule", "result"]
+)
+AGENT_SPECULATIVE_ANSWERS = registry.counter(
+    "agent_speculative_answers",
+    "工具执行后核对模型推测的结果：matched推测与实际一致、presentable工具结果直接作为回答，"
+    "mismatch、no_speculation和tool_error仍再次调用LLM",
+    ["outcome"]
+)
+AGENT_LLM_CALLS_SAVED = registry.counter(
+    "agent_llm_calls_saved", "快速路由（router）和推测回答（speculation）省去的LLM调用次数", ["reason"]
+)
+TOOL_LOADS = registry.counter("tool_loads", "工具注册表按需导入工具的次数：ok成功，error导入或创建失败", ["tool", "status"])
+AGENT_SELECTED_TOOLS = registry.histogram(
+    "agent_selected_tools", "每个请求按查询选出、放入提示的注册表工具数", buckets=(0, 1, 2, 3, 5, 8, 10, 15, 20, 50)
+)
@@ -1,5 +1,20 @@
 # 模型包初始化文件
-from src.models.model_config import get_model, get_prompt, SYSTEM_PROMPT
-from src.models.deepseek import CustomDeepSeek
+from src.models.model_config import get_model, get_prompt, SYSTEM_PROMPT, FUNCTION_CALLING_SYSTEM_PROMPT
+from src.models.deepseek import CustomDeepSeek, ToolCallingResult
+from src.models.cache import ResponseCache, ExactResponseCache, SemanticResponseCache, HashingEmbedder
+from src.models.scheduler import (
+    RequestScheduler,
+    SchedulerTimeout,
+    TokenBucket,
+    SQLiteTokenBucket,
+    register_token_bucket,
+    create_token_bucket,
+    scheduling_context,
+)
 
-__all__ = ["get_model", "get_prompt", "SYSTEM_PROMPT", "CustomDeepSeek"] 
\ No newline at end of file
+__all__ = [
+    "get_model", "get_prompt", "SYSTEM_PROMPT", "FUNCTION_CALLING_SYSTEM_PROMPT", "CustomDeepSeek", "ToolCallingResult",
+    "ResponseCache", "ExactResponseCache", "SemanticResponseCache", "HashingEmbedder",
+    "RequestScheduler", "SchedulerTimeout", "TokenBucket", "SQLiteTokenBucket", "register_token_bucket",
+    "create_token_bucket", "scheduling_context",
+]
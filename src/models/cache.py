@@ -0,0 +1,512 @@
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    # NumPy只有启用相似度缓存时才会用到，在使用处按需导入
+    import numpy as np
+
+logger = logging.getLogger("langgraph_agent.cache")
+
+# ChatPromptTemplate渲染后用户输入所在段落的前缀，语义缓存只对这一部分做向量化
+_HUMAN_MARKER = "\nHuman: "
+_NUMBER_PATTERN = re.compile(r"\d+(?:\.\d+)?")
+
+
+class CachedResponse:
+    """缓存的模型响应"""
+
+    __slots__ = ("text", "complete", "created_at")
+
+    def __init__(self, text: str, complete: bool = True, created_at: Optional[float] = None):
+        """
+        Args:
+            text: 响应文本
+            complete: 是否为完整响应；流式调用被调用方提前结束时只缓存已生成的前缀
+            created_at: 写入时间
+        """
+        self.text = text
+        self.complete = complete
+        self.created_at = created_at if created_at is not None else time.time()
+
+
+class ExactResponseCache:
+    """
+    精确匹配缓存
+
+    以模型名、采样参数和完整提示的哈希为键，内存中按LRU淘汰并支持TTL过期。
+    指定path时同时写入SQLite文件，进程重启或多个进程之间可以共享缓存。
+    读取SQLite只做查询，命中的访问时间先记在内存中，下次写入时在同一个事务里批量更新。
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl: Optional[float] = 3600.0, path: Optional[str] = None):
+        """
+        初始化精确匹配缓存
+
+        Args:
+            max_entries: 最大缓存条目数
+            ttl: 过期时间（秒），None表示不过期
+            path: SQLite持久化文件路径，None表示只在内存中缓存
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        # 尚未写入SQLite的访问时间：键 -> 最近访问时间
+        self._accessed: Dict[str, float] = {}
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30.0)
+            self._conn.executescript(
+                """
+                PRAGMA journal_mode=WAL;
+                CREATE TABLE IF NOT EXISTS response_cache (
+                    key TEXT PRIMARY KEY,
+                    text TEXT NOT NULL,
+                    complete INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                );
+                """
+            )
+
+    @staticmethod
+    def make_key(prompt: str, params: Dict[str, Any]) -> str:
+        """根据提示和模型参数生成缓存键"""
+        digest = hashlib.sha256()
+        digest.update(json.dumps(params, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        digest.update(b"\x00")
+        digest.update(prompt.encode("utf-8"))
+        return digest.hexdigest()
+
+    def _expired(self, entry: CachedResponse) -> bool:
+        return self.ttl is not None and time.time() - entry.created_at > self.ttl
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        """按键读取缓存，过期条目视为不存在"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self._expired(entry):
+                    del self._entries[key]
+                    entry = None
+                else:
+                    self._entries.move_to_end(key)
+                    return entry
+
+            if self._conn is None:
+                return None
+            row = self._conn.execute(
+                "SELECT text, complete, created_at FROM response_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            entry = CachedResponse(row[0], bool(row[1]), row[2])
+            if self._expired(entry):
+                # 过期条目在下次写入时统一删除
+                return None
+            self._accessed[key] = time.time()
+            self._put_memory(key, entry)
+            return entry
+
+    def put(self, key: str, entry: CachedResponse) -> None:
+        """写入缓存；已有完整响应时不会被不完整的响应覆盖"""
+        with self._lock:
+            existing = self._entries.get(key)
+            if existing is not None and existing.complete and not entry.complete:
+                return
+            self._put_memory(key, entry)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT INTO response_cache (key, text, complete, created_at, last_access) "
+                    "VALUES (?, ?, ?, ?, ?) ON CONFLICT(key) DO UPDATE SET "
+                    "text = excluded.text, complete = excluded.complete, "
+                    "created_at = excluded.created_at, last_access = excluded.last_access "
+                    "WHERE response_cache.complete <= excluded.complete",
+                    (key, entry.text, int(entry.complete), entry.created_at, time.time()),
+                )
+                self._flush_locked()
+                # 超出容量时删除最久未访问的条目
+                self._conn.execute(
+                    "DELETE FROM response_cache WHERE key IN ("
+                    "SELECT key FROM response_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+                self._conn.commit()
+
+    def _flush_locked(self) -> None:
+        """在持有锁时写入累积的访问时间并删除过期条目，由写入方的事务一并提交"""
+        if self._accessed:
+            self._conn.executemany(
+                "UPDATE response_cache SET last_access = MAX(last_access, ?) WHERE key = ?",
+                [(accessed, key) for key, accessed in self._accessed.items()],
+            )
+            self._accessed.clear()
+        if self.ttl is not None:
+            self._conn.execute("DELETE FROM response_cache WHERE created_at < ?", (time.time() - self.ttl,))
+
+    def _put_memory(self, key: str, entry: CachedResponse) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self._accessed.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM response_cache")
+                self._conn.commit()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class HashingEmbedder:
+    """
+    本地字符n-gram哈希向量化
+
+    不依赖外部模型，适合中文短问题的近似匹配；可以替换为任意返回一维向量的函数
+    """
+
+    def __init__(self, dim: int = 512, ngram_range: Tuple[int, int] = (1, 3)):
+        """
+        Args:
+            dim: 向量维度
+            ngram_range: 字符n-gram的长度范围
+        """
+        self.dim = dim
+        self.ngram_range = ngram_range
+
+    def __call__(self, text: str) -> "np.ndarray":
+        import numpy as np
+        vector = np.zeros(self.dim, dtype=np.float32)
+        text = text.lower()
+        low, high = self.ngram_range
+        for n in range(low, high + 1):
+            for i in range(len(text) - n + 1):
+                gram = text[i:i + n]
+                if gram.isspace():
+                    continue
+                digest = hashlib.blake2b(gram.encode("utf-8"), digest_size=8).digest()
+                bucket = int.from_bytes(digest[:4], "little") % self.dim
+                sign = 1.0 if digest[4] & 1 else -1.0
+                vector[bucket] += sign
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class SemanticResponseCache:
+    """
+    相似度缓存
+
+    只对提示中的用户输入部分向量化，并且只在静态部分（系统提示、工具描述、模型参数）
+    完全相同的条目之间比较余弦相似度。用户输入中的数字必须完全一致才视为命中，
+    避免"2+3"和"2+4"这类字面相近但答案不同的问题误命中。
+    """
+
+    def __init__(
+        self,
+        embedder: Optional[Callable[[str], "np.ndarray"]] = None,
+        threshold: float = 0.95,
+        max_entries: int = 1000,
+        ttl: Optional[float] = 3600.0,
+        path: Optional[str] = None,
+    ):
+        """
+        初始化相似度缓存
+
+        Args:
+            embedder: 向量化函数，默认使用HashingEmbedder
+            threshold: 余弦相似度阈值
+            max_entries: 最大缓存条目数
+            ttl: 过期时间（秒），None表示不过期
+            path: SQLite持久化文件路径，None表示只在内存中缓存；
+                启动时把文件中未过期的条目载入内存索引
+        """
+        self.embedder = embedder or HashingEmbedder()
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # 每个分区（静态部分相同的提示）维护一个向量矩阵
+        self._partitions: Dict[str, Dict[str, Any]] = {}
+        # 全局LRU顺序：(分区, 条目ID) -> None
+        self._order: "OrderedDict[Tuple[str, int], None]" = OrderedDict()
+        self._next_id = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30.0)
+            self._conn.executescript(
+                """
+                PRAGMA journal_mode=WAL;
+                CREATE TABLE IF NOT EXISTS semantic_cache (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    partition_key TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    numbers TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                );
+                """
+            )
+            self._load()
+
+    def _load(self) -> None:
+        """从SQLite文件载入未过期的条目"""
+        import numpy as np
+        if self.ttl is not None:
+            self._conn.execute("DELETE FROM semantic_cache WHERE created_at < ?", (time.time() - self.ttl,))
+            self._conn.commit()
+        rows = self._conn.execute(
+            "SELECT id, partition_key, vector, numbers, text, created_at FROM semantic_cache ORDER BY id"
+        ).fetchall()
+        for row_id, partition_key, blob, numbers, text, created_at in rows[-self.max_entries:]:
+            self._insert(
+                partition_key,
+                row_id,
+                np.frombuffer(blob, dtype=np.float32),
+                json.loads(numbers),
+                CachedResponse(text, True, created_at),
+            )
+            self._next_id = max(self._next_id, row_id + 1)
+
+    @staticmethod
+    def split_prompt(prompt: str) -> Tuple[str, str]:
+        """把提示拆成静态部分和用户输入部分"""
+        index = prompt.rfind(_HUMAN_MARKER)
+        if index < 0:
+            return "", prompt
+        return prompt[:index], prompt[index + len(_HUMAN_MARKER):]
+
+    def _partition_key(self, static: str, params: Dict[str, Any]) -> str:
+        return ExactResponseCache.make_key(static, params)
+
+    def get(self, prompt: str, params: Dict[str, Any]) -> Optional[CachedResponse]:
+        """查找与提示足够相似的完整响应"""
+        import numpy as np
+        static, query = self.split_prompt(prompt)
+        partition_key = self._partition_key(static, params)
+        vector = self.embedder(query)
+        numbers = _NUMBER_PATTERN.findall(query)
+        now = time.time()
+
+        with self._lock:
+            partition = self._partitions.get(partition_key)
+            if partition is None or not partition["ids"]:
+                return None
+            scores = partition["vectors"] @ vector
+            for index in np.argsort(-scores):
+                if scores[index] < self.threshold:
+                    break
+                entry = partition["entries"][index]
+                if self.ttl is not None and now - entry.created_at > self.ttl:
+                    continue
+                if partition["numbers"][index] != numbers or not entry.complete:
+                    continue
+                self._order.move_to_end((partition_key, partition["ids"][index]))
+                return entry
+        return None
+
+    def put(self, prompt: str, params: Dict[str, Any], entry: CachedResponse) -> None:
+        """写入完整响应"""
+        import numpy as np
+        if not entry.complete:
+            return
+        static, query = self.split_prompt(prompt)
+        partition_key = self._partition_key(static, params)
+        vector = self.embedder(query).astype(np.float32)
+
+        numbers = _NUMBER_PATTERN.findall(query)
+
+        with self._lock:
+            if self._conn is not None:
+                cursor = self._conn.execute(
+                    "INSERT INTO semantic_cache (partition_key, vector, numbers, text, created_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (partition_key, vector.tobytes(), json.dumps(numbers), entry.text, entry.created_at),
+                )
+                entry_id = cursor.lastrowid
+            else:
+                entry_id = self._next_id
+                self._next_id += 1
+            self._insert(partition_key, entry_id, vector, numbers, entry)
+            while len(self._order) > self.max_entries:
+                (old_partition, old_id), _ = self._order.popitem(last=False)
+                self._remove(old_partition, old_id)
+            if self._conn is not None:
+                self._conn.commit()
+
+    def _insert(
+        self,
+        partition_key: str,
+        entry_id: int,
+        vector: "np.ndarray",
+        numbers: List[str],
+        entry: CachedResponse,
+    ) -> None:
+        import numpy as np
+        partition = self._partitions.setdefault(
+            partition_key,
+            {"vectors": np.zeros((0, vector.shape[0]), dtype=np.float32), "ids": [], "entries": [], "numbers": []},
+        )
+        partition["vectors"] = np.vstack([partition["vectors"], vector])
+        partition["ids"].append(entry_id)
+        partition["entries"].append(entry)
+        partition["numbers"].append(numbers)
+        self._order[(partition_key, entry_id)] = None
+
+    def _remove(self, partition_key: str, entry_id: int) -> None:
+        import numpy as np
+        if self._conn is not None:
+            self._conn.execute("DELETE FROM semantic_cache WHERE id = ?", (entry_id,))
+        partition = self._partitions[partition_key]
+        index = partition["ids"].index(entry_id)
+        partition["vectors"] = np.delete(partition["vectors"], index, axis=0)
+        for field in ("ids", "entries", "numbers"):
+            del partition[field][index]
+        if not partition["ids"]:
+            del self._partitions[partition_key]
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._partitions.clear()
+            self._order.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM semantic_cache")
+                self._conn.commit()
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+
+class ResponseCache:
+    """
+    两级LLM响应缓存：精确匹配 + 可选的相似度匹配
+
+    temperature高于max_temperature的调用不读也不写缓存，
+    保证需要多样性输出的场景不会拿到重复结果。
+    """
+
+    def __init__(
+        self,
+        exact: Optional[ExactResponseCache] = None,
+        semantic: Optional[SemanticResponseCache] = None,
+        max_temperature: float = 0.7,
+    ):
+        """
+        初始化两级缓存
+
+        Args:
+            exact: 精确匹配缓存，默认创建一个内存缓存
+            semantic: 相似度缓存，None表示不启用
+            max_temperature: 允许使用缓存的最高temperature
+        """
+        self.exact = exact or ExactResponseCache()
+        self.semantic = semantic
+        self.max_temperature = max_temperature
+        self._lock = threading.Lock()
+        self._counters = {"exact_hits": 0, "semantic_hits": 0, "partial_hits": 0, "misses": 0, "bypassed": 0, "stores": 0}
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def enabled_for(self, params: Dict[str, Any]) -> bool:
+        """当前调用参数是否允许使用缓存"""
+        if params.get("temperature", 0.0) > self.max_temperature:
+            self._count("bypassed")
+            return False
+        return True
+
+    def lookup(self, prompt: str, params: Dict[str, Any], allow_partial: bool = False) -> Optional[CachedResponse]:
+        """
+        查找缓存
+
+        Args:
+            prompt: 完整提示
+            params: 模型名和采样参数
+            allow_partial: 是否接受不完整的流式响应前缀
+
+        Returns:
+            命中的缓存响应，未命中返回None
+        """
+        entry = self.exact.get(ExactResponseCache.make_key(prompt, params))
+        if entry is not None and (entry.complete or allow_partial):
+            self._count("exact_hits" if entry.complete else "partial_hits")
+            return entry
+        if self.semantic is not None:
+            entry = self.semantic.get(prompt, params)
+            if entry is not None:
+                self._count("semantic_hits")
+                return entry
+        self._count("misses")
+        return None
+
+    def store(self, prompt: str, params: Dict[str, Any], text: str, complete: bool = True) -> None:
+        """写入缓存"""
+        entry = CachedResponse(text, complete)
+        self.exact.put(ExactResponseCache.make_key(prompt, params), entry)
+        if self.semantic is not None:
+            self.semantic.put(prompt, params, entry)
+        self._count("stores")
+
+    def clear(self) -> None:
+        """清空两级缓存"""
+        self.exact.clear()
+        if self.semantic is not None:
+            self.semantic.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取缓存指标
+
+        Returns:
+            各级命中数、未命中数、绕过数、条目数和总命中率
+        """
+        with self._lock:
+            counters = dict(self._counters)
+        hits = counters["exact_hits"] + counters["semantic_hits"] + counters["partial_hits"]
+        lookups = hits + counters["misses"]
+        return {
+            **counters,
+            "exact_entries": len(self.exact),
+            "semantic_entries": len(self.semantic) if self.semantic is not None else 0,
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
+
+
+def create_response_cache(config: Any) -> Optional[ResponseCache]:
+    """
+    根据CacheConfig创建两级响应缓存
+
+    Args:
+        config: 缓存配置
+
+    Returns:
+        响应缓存实例，配置为不启用时返回None
+    """
+    if not config.enabled:
+        return None
+    semantic = None
+    if config.semantic:
+        semantic = SemanticResponseCache(
+            threshold=config.semantic_threshold,
+            max_entries=config.max_entries,
+            ttl=config.ttl,
+            path=config.path,
+        )
+    return ResponseCache(
+        exact=ExactResponseCache(max_entries=config.max_entries, ttl=config.ttl, path=config.path),
+        semantic=semantic,
+        max_temperature=config.max_temperature,
+    )
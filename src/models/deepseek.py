@@ -1,9 +1,46 @@
+import hashlib
 import json
-import requests
-from typing import Dict, Any, List, Optional, Union
+import logging
+import time
+from typing import Dict, Any, AsyncIterator, Iterator, List, Optional, Union
 from langchain_core.language_models import LLM
-from langchain_core.callbacks.manager import CallbackManagerForLLMRun
-from pydantic import Field
+from langchain_core.outputs import GenerationChunk
+from langchain_core.callbacks.manager import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from pydantic import Field, PrivateAttr
+from contextlib import nullcontext
+from src.metrics import LLM_SECONDS, LLM_TOKENS, tracer
+from src.models.cache import ResponseCache
+from src.models.scheduler import RequestScheduler
+from src.models.transport import DeepSeekTransport
+
+logger = logging.getLogger("langgraph_agent.deepseek")
+
+class ToolCallingResult:
+    """原生函数调用模式下的模型响应"""
+    
+    __slots__ = ("content", "tool_calls")
+    
+    def __init__(self, content: str, tool_calls: Optional[List[Dict[str, Any]]] = None):
+        """
+        Args:
+            content: 模型输出的文本（只有工具调用时通常为空）
+            tool_calls: 结构化的工具调用，每项形如{"id": ..., "name": ..., "params": {...}}
+        """
+        self.content = content
+        self.tool_calls = tool_calls or []
+    
+    def to_json(self) -> str:
+        """序列化为JSON文本，用于写入响应缓存"""
+        return json.dumps({"content": self.content, "tool_calls": self.tool_calls}, ensure_ascii=False)
+    
+    @classmethod
+    def from_json(cls, text: str) -> "ToolCallingResult":
+        """从响应缓存中的JSON文本恢复"""
+        data = json.loads(text)
+        return cls(data.get("content") or "", data.get("tool_calls"))
 
 class CustomDeepSeek(LLM):
     """
@@ -16,35 +53,146 @@ class CustomDeepSeek(LLM):
     temperature: float = Field(default=0.7)
     top_p: float = Field(default=0.95)
     max_tokens: int = Field(default=2048)
+    streaming: bool = Field(default=False)
+    function_calling: bool = Field(default=False)
+    pool_size: int = Field(default=20)
+    connect_timeout: float = Field(default=5.0)
+    read_timeout: float = Field(default=60.0)
+    max_retries: int = Field(default=3)
+    retry_backoff: float = Field(default=0.5)
+    retry_backoff_max: float = Field(default=8.0)
+    response_cache: Optional[ResponseCache] = Field(default=None, exclude=True)
+    scheduler: Optional[RequestScheduler] = Field(default=None, exclude=True)
+    
+    _transport: Optional[DeepSeekTransport] = PrivateAttr(default=None)
     
     @property
     def _llm_type(self) -> str:
         """返回LLM类型"""
         return "custom_deepseek"
     
-    def _call(
+    @property
+    def transport(self) -> DeepSeekTransport:
+        """模型实例持有的连接池传输层，首次使用时创建"""
+        if self._transport is None:
+            self._transport = DeepSeekTransport(
+                base_url=self.api_base_url,
+                headers=self._build_headers(),
+                pool_size=self.pool_size,
+                connect_timeout=self.connect_timeout,
+                read_timeout=self.read_timeout,
+                max_retries=self.max_retries,
+                backoff_base=self.retry_backoff,
+                backoff_max=self.retry_backoff_max,
+            )
+        return self._transport
+    
+    def pool_metrics(self) -> Dict[str, Any]:
+        """获取连接池指标（复用率、在途请求数等）"""
+        return self.transport.stats()
+    
+    def cache_metrics(self) -> Dict[str, Any]:
+        """获取响应缓存指标（各级命中数、命中率等），未启用缓存时返回空字典"""
+        return self.response_cache.stats() if self.response_cache is not None else {}
+    
+    def scheduler_metrics(self) -> Dict[str, Any]:
+        """获取请求调度指标（排队深度、等待时间直方图、合并次数等），未启用调度时返回空字典"""
+        return self.scheduler.stats() if self.scheduler is not None else {}
+    
+    @staticmethod
+    def _coalesce_key(payload: Dict[str, Any]) -> str:
+        """相同请求体的在途请求合并为一次上游调用"""
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+    
+    def _scheduled(self, payload: Dict[str, Any], fetch: Any) -> Any:
+        """经调度器准入后执行同步上游调用，未启用调度时直接执行"""
+        if self.scheduler is None:
+            return fetch()
+        return self.scheduler.run(self._coalesce_key(payload), fetch)
+    
+    async def _ascheduled(self, payload: Dict[str, Any], fetch: Any) -> Any:
+        """经调度器准入后执行异步上游调用，未启用调度时直接执行"""
+        if self.scheduler is None:
+            return await fetch()
+        return await self.scheduler.arun(self._coalesce_key(payload), fetch)
+    
+    def _stream_slot(self) -> Any:
+        """流式请求在读取整个响应期间占用一个准入名额（流式请求不合并）"""
+        return self.scheduler.slot() if self.scheduler is not None else nullcontext()
+    
+    def _astream_slot(self) -> Any:
+        """_stream_slot的异步版本"""
+        return self.scheduler.aslot() if self.scheduler is not None else nullcontext()
+    
+    @staticmethod
+    def _record_usage(response_data: Any) -> None:
+        """记录API响应usage字段中的token数"""
+        usage = (response_data or {}).get("usage") if isinstance(response_data, dict) else None
+        if not usage:
+            return
+        LLM_TOKENS.inc(usage.get("prompt_tokens") or 0, type="prompt")
+        LLM_TOKENS.inc(usage.get("completion_tokens") or 0, type="completion")
+    
+    def _cache_params(
         self,
-        prompt: str,
         stop: Optional[List[str]] = None,
-        run_manager: Optional[CallbackManagerForLLMRun] = None,
-        **kwargs: Any,
-    ) -> str:
+        tools: Optional[List[Dict[str, Any]]] = None
+    ) -> Optional[Dict[str, Any]]:
         """
-        调用DeepSeek API
+        生成缓存键中的模型参数
         
         Args:
-            prompt: 输入提示
             stop: 停止词列表
-            run_manager: 回调管理器
-            
+            tools: 原生函数调用模式下的函数声明，以其摘要区分不同工具集
+        
         Returns:
-            模型响应文本
+            模型名和采样参数；未启用缓存或temperature超过阈值时返回None
         """
-        headers = {
+        if self.response_cache is None:
+            return None
+        params = {
+            "model": self.model_name,
+            "temperature": self.temperature,
+            "top_p": self.top_p,
+            "max_tokens": self.max_tokens,
+            "stop": stop,
+        }
+        if tools:
+            params["tools"] = hashlib.sha256(
+                json.dumps(tools, sort_keys=True, ensure_ascii=False).encode("utf-8")
+            ).hexdigest()
+        return params if self.response_cache.enabled_for(params) else None
+    
+    def _replay_chunk(self, text: str) -> GenerationChunk:
+        """把缓存命中的响应作为一个文本块产出"""
+        return GenerationChunk(text=text, generation_info={"cached": True})
+    
+    def _build_headers(self) -> Dict[str, str]:
+        """构建请求头"""
+        return {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self.api_key}"
         }
+    
+    def _build_payload(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        stream: bool = False,
+        tools: Optional[List[Dict[str, Any]]] = None
+    ) -> Dict[str, Any]:
+        """
+        构建chat/completions请求体
         
+        Args:
+            prompt: 输入提示
+            stop: 停止词列表
+            stream: 是否请求SSE流式响应
+            tools: 原生函数调用模式下的函数声明
+            
+        Returns:
+            请求体字典
+        """
         messages = [{"role": "user", "content": prompt}]
         
         payload = {
@@ -58,19 +206,376 @@ class CustomDeepSeek(LLM):
         if stop:
             payload["stop"] = stop
         
-        response = requests.post(
-            f"{self.api_base_url}/chat/completions",
-            headers=headers,
-            data=json.dumps(payload)
-        )
+        if stream:
+            payload["stream"] = True
+            # 流式响应的最后一个事件携带usage
+            payload["stream_options"] = {"include_usage": True}
         
-        if response.status_code != 200:
-            error_msg = f"API请求失败: {response.status_code} - {response.text}"
-            raise ValueError(error_msg)
+        if tools:
+            payload["tools"] = tools
         
-        response_data = response.json()
+        return payload
+    
+    @staticmethod
+    def _delta_text(event: Dict[str, Any]) -> str:
+        """从流式响应的单个事件中取出增量文本"""
+        choices = event.get("choices") or []
+        if not choices:
+            return ""
+        return (choices[0].get("delta") or {}).get("content") or ""
+    
+    @staticmethod
+    def _parse_response(status_code: int, text: str, response_data: Any) -> str:
+        """
+        校验并解析API响应
+        
+        Args:
+            status_code: HTTP状态码
+            text: 原始响应文本（用于错误信息）
+            response_data: 解析后的JSON数据，状态码异常时可为None
+            
+        Returns:
+            模型响应文本
+        """
+        if status_code != 200:
+            error_msg = f"API请求失败: {status_code} - {text}"
+            raise ValueError(error_msg)
         
         if "choices" not in response_data or not response_data["choices"]:
             raise ValueError(f"API响应格式异常: {response_data}")
         
-        return response_data["choices"][0]["message"]["content"] 
\ No newline at end of file
+        return response_data["choices"][0]["message"]["content"]
+    
+    @classmethod
+    def _parse_tool_calling_response(cls, status_code: int, text: str, response_data: Any) -> ToolCallingResult:
+        """
+        校验并解析原生函数调用模式下的API响应
+        
+        Args:
+            status_code: HTTP状态码
+            text: 原始响应文本（用于错误信息）
+            response_data: 解析后的JSON数据，状态码异常时可为None
+            
+        Returns:
+            模型文本和结构化的工具调用
+        """
+        content = cls._parse_response(status_code, text, response_data) or ""
+        tool_calls = []
+        for call in response_data["choices"][0]["message"].get("tool_calls") or []:
+            function = call.get("function") or {}
+            try:
+                params = json.loads(function.get("arguments") or "{}")
+            except ValueError:
+                logger.warning(f"工具调用参数不是合法的JSON: {function.get('arguments')}")
+                params = {}
+            tool_calls.append({
+                "id": call.get("id"),
+                "name": function.get("name"),
+                "params": params if isinstance(params, dict) else {}
+            })
+        return ToolCallingResult(content, tool_calls)
+    
+    def call_with_tools(
+        self,
+        prompt: str,
+        tools: List[Dict[str, Any]],
+        stop: Optional[List[str]] = None
+    ) -> ToolCallingResult:
+        """
+        以原生函数调用模式调用DeepSeek API
+        
+        函数声明通过请求体的tools字段发送，模型返回结构化的tool_calls，不需要再从文本中解析
+        
+        Args:
+            prompt: 输入提示
+            tools: 函数声明列表
+            stop: 停止词列表
+            
+        Returns:
+            模型文本和结构化的工具调用
+        """
+        cache_params = self._cache_params(stop, tools)
+        if cache_params is not None:
+            cached = self.response_cache.lookup(prompt, cache_params)
+            if cached is not None:
+                return ToolCallingResult.from_json(cached.text)
+        
+        payload = self._build_payload(prompt, stop, tools=tools)
+        
+        def fetch() -> ToolCallingResult:
+            started = time.monotonic()
+            with tracer.span("llm.request", model=self.model_name, stream=False):
+                response = self.transport.post("/chat/completions", payload)
+            LLM_SECONDS.observe(time.monotonic() - started, phase="total")
+            response_data = response.json() if response.status_code == 200 else None
+            self._record_usage(response_data)
+            result = self._parse_tool_calling_response(response.status_code, response.text, response_data)
+            if cache_params is not None:
+                self.response_cache.store(prompt, cache_params, result.to_json())
+            return result
+        
+        return self._scheduled(payload, fetch)
+    
+    async def acall_with_tools(
+        self,
+        prompt: str,
+        tools: List[Dict[str, Any]],
+        stop: Optional[List[str]] = None
+    ) -> ToolCallingResult:
+        """
+        以原生函数调用模式异步调用DeepSeek API
+        
+        Args:
+            prompt: 输入提示
+            tools: 函数声明列表
+            stop: 停止词列表
+            
+        Returns:
+            模型文本和结构化的工具调用
+        """
+        cache_params = self._cache_params(stop, tools)
+        if cache_params is not None:
+            cached = self.response_cache.lookup(prompt, cache_params)
+            if cached is not None:
+                return ToolCallingResult.from_json(cached.text)
+        
+        payload = self._build_payload(prompt, stop, tools=tools)
+        
+        async def fetch() -> ToolCallingResult:
+            started = time.monotonic()
+            with tracer.span("llm.request", model=self.model_name, stream=False):
+                response = await self.transport.apost("/chat/completions", payload)
+            LLM_SECONDS.observe(time.monotonic() - started, phase="total")
+            response_data = response.json() if response.status_code == 200 else None
+            self._record_usage(response_data)
+            result = self._parse_tool_calling_response(response.status_code, response.text, response_data)
+            if cache_params is not None:
+                self.response_cache.store(prompt, cache_params, result.to_json())
+            return result
+        
+        return await self._ascheduled(payload, fetch)
+    
+    def _call(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> str:
+        """
+        调用DeepSeek API
+        
+        Args:
+            prompt: 输入提示
+            stop: 停止词列表
+            run_manager: 回调管理器
+            
+        Returns:
+            模型响应文本
+        """
+        cache_params = self._cache_params(stop)
+        if cache_params is not None:
+            cached = self.response_cache.lookup(prompt, cache_params)
+            if cached is not None:
+                return cached.text
+        
+        payload = self._build_payload(prompt, stop)
+        
+        def fetch() -> str:
+            started = time.monotonic()
+            with tracer.span("llm.request", model=self.model_name, stream=False):
+                response = self.transport.post("/chat/completions", payload)
+            LLM_SECONDS.observe(time.monotonic() - started, phase="total")
+            response_data = response.json() if response.status_code == 200 else None
+            self._record_usage(response_data)
+            text = self._parse_response(response.status_code, response.text, response_data)
+            if cache_params is not None:
+                self.response_cache.store(prompt, cache_params, text)
+            return text
+        
+        return self._scheduled(payload, fetch)
+    
+    async def _acall(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> str:
+        """
+        异步调用DeepSeek API
+        
+        使用非阻塞HTTP客户端和共享连接池，等待响应期间不会占用事件循环
+        
+        Args:
+            prompt: 输入提示
+            stop: 停止词列表
+            run_manager: 异步回调管理器
+            
+        Returns:
+            模型响应文本
+        """
+        cache_params = self._cache_params(stop)
+        if cache_params is not None:
+            cached = self.response_cache.lookup(prompt, cache_params)
+            if cached is not None:
+                return cached.text
+        
+        payload = self._build_payload(prompt, stop)
+        
+        async def fetch() -> str:
+            started = time.monotonic()
+            with tracer.span("llm.request", model=self.model_name, stream=False):
+                response = await self.transport.apost("/chat/completions", payload)
+            LLM_SECONDS.observe(time.monotonic() - started, phase="total")
+            response_data = response.json() if response.status_code == 200 else None
+            self._record_usage(response_data)
+            text = self._parse_response(response.status_code, response.text, response_data)
+            if cache_params is not None:
+                self.response_cache.store(prompt, cache_params, text)
+            return text
+        
+        return await self._ascheduled(payload, fetch)
+    
+    def _stream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[GenerationChunk]:
+        """
+        以SSE流式方式调用DeepSeek API，逐个产出增量文本
+        
+        缓存命中时一次性产出缓存的文本。调用方提前停止迭代（例如提前派发工具调用）时，
+        已生成的前缀作为不完整条目缓存，只会被流式调用复用；若复用方读完前缀后还要继续读取，
+        则重新请求API并跳过已产出的部分。
+        
+        Args:
+            prompt: 输入提示
+            stop: 停止词列表
+            run_manager: 回调管理器
+            
+        Yields:
+            增量文本块
+        """
+        cache_params = self._cache_params(stop)
+        skip = 0
+        if cache_params is not None:
+            cached = self.response_cache.lookup(prompt, cache_params, allow_partial=True)
+            if cached is not None:
+                chunk = self._replay_chunk(cached.text)
+                if run_manager:
+                    run_manager.on_llm_new_token(cached.text, chunk=chunk)
+                yield chunk
+                if cached.complete:
+                    return
+                skip = len(cached.text)
+        
+        payload = self._build_payload(prompt, stop, stream=True)
+        received = []
+        started = time.monotonic()
+        first_token = True
+        # span跨越yield，不能作为当前span（生成器可能在另一个上下文中被关闭），结束时单独记录
+        span = tracer.start_span("llm.request", model=self.model_name, stream=True)
+        error: Optional[BaseException] = None
+        try:
+            with self._stream_slot():
+                for event in self.transport.stream_events("/chat/completions", payload):
+                    self._record_usage(event)
+                    text = self._delta_text(event)
+                    if text and first_token:
+                        first_token = False
+                        LLM_SECONDS.observe(time.monotonic() - started, phase="ttft")
+                    received.append(text)
+                    if skip:
+                        text, skip = text[skip:], max(0, skip - len(text))
+                    if not text:
+                        continue
+                    chunk = GenerationChunk(text=text)
+                    if run_manager:
+                        run_manager.on_llm_new_token(text, chunk=chunk)
+                    yield chunk
+        except GeneratorExit as e:
+            error = e
+            if cache_params is not None and received:
+                self.response_cache.store(prompt, cache_params, "".join(received), complete=False)
+            raise
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            tracer.end_span(span, error)
+        LLM_SECONDS.observe(time.monotonic() - started, phase="total")
+        if cache_params is not None:
+            self.response_cache.store(prompt, cache_params, "".join(received))
+    
+    async def _astream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[GenerationChunk]:
+        """
+        以SSE流式方式异步调用DeepSeek API，逐个产出增量文本
+        
+        缓存行为与_stream相同
+        
+        Args:
+            prompt: 输入提示
+            stop: 停止词列表
+            run_manager: 异步回调管理器
+            
+        Yields:
+            增量文本块
+        """
+        cache_params = self._cache_params(stop)
+        skip = 0
+        if cache_params is not None:
+            cached = self.response_cache.lookup(prompt, cache_params, allow_partial=True)
+            if cached is not None:
+                chunk = self._replay_chunk(cached.text)
+                if run_manager:
+                    await run_manager.on_llm_new_token(cached.text, chunk=chunk)
+                yield chunk
+                if cached.complete:
+                    return
+                skip = len(cached.text)
+        
+        payload = self._build_payload(prompt, stop, stream=True)
+        received = []
+        started = time.monotonic()
+        first_token = True
+        span = tracer.start_span("llm.request", model=self.model_name, stream=True)
+        error: Optional[BaseException] = None
+        try:
+            async with self._astream_slot():
+                async for event in self.transport.astream_events("/chat/completions", payload):
+                    self._record_usage(event)
+                    text = self._delta_text(event)
+                    if text and first_token:
+                        first_token = False
+                        LLM_SECONDS.observe(time.monotonic() - started, phase="ttft")
+                    received.append(text)
+                    if skip:
+                        text, skip = text[skip:], max(0, skip - len(text))
+                    if not text:
+                        continue
+                    chunk = GenerationChunk(text=text)
+                    if run_manager:
+                        await run_manager.on_llm_new_token(text, chunk=chunk)
+                    yield chunk
+        except GeneratorExit as e:
+            error = e
+            if cache_params is not None and received:
+                self.response_cache.store(prompt, cache_params, "".join(received), complete=False)
+            raise
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            tracer.end_span(span, error)
+        LLM_SECONDS.observe(time.monotonic() - started, phase="total")
+        if cache_params is not None:
+            self.response_cache.store(prompt, cache_params, "".join(received))
@@ -1,15 +1,30 @@
 from langchain_core.language_models import BaseLLM
 from langchain_core.prompts import ChatPromptTemplate
 from typing import Dict, Any, Optional
-from src.config import DeepSeekConfig, get_deepseek_config
+from src.config import (
+    CacheConfig,
+    DeepSeekConfig,
+    SchedulerConfig,
+    get_cache_config,
+    get_deepseek_config,
+    get_scheduler_config,
+)
+from src.models.cache import create_response_cache
+from src.models.scheduler import create_request_scheduler
 from src.models.deepseek import CustomDeepSeek
 
-def get_model(config: Optional[DeepSeekConfig] = None) -> BaseLLM:
+def get_model(
+    config: Optional[DeepSeekConfig] = None,
+    cache_config: Optional[CacheConfig] = None,
+    scheduler_config: Optional[SchedulerConfig] = None
+) -> BaseLLM:
     """
     获取DeepSeek语言模型实例
     
     Args:
         config: DeepSeek配置，如果为None则使用默认配置
+        cache_config: 响应缓存配置，如果为None则从环境变量读取
+        scheduler_config: 请求调度配置，如果为None则从环境变量读取
         
     Returns:
         配置好的DeepSeek模型实例
@@ -17,6 +32,10 @@ def get_model(config: Optional[DeepSeekConfig] = None) -> BaseLLM:
     # 使用传入的配置或默认配置
     if config is None:
         config = get_deepseek_config()
+    if cache_config is None:
+        cache_config = get_cache_config()
+    if scheduler_config is None:
+        scheduler_config = get_scheduler_config()
     
     # 初始化DeepSeek模型
     model = CustomDeepSeek(
@@ -25,7 +44,16 @@ def get_model(config: Optional[DeepSeekConfig] = None) -> BaseLLM:
         temperature=config.temperature,
         top_p=config.top_p,
         max_tokens=config.max_tokens,
-        api_base_url=config.api_base_url
+        streaming=config.streaming,
+        function_calling=config.function_calling,
+        api_base_url=config.api_base_url,
+        pool_size=config.pool_size,
+        connect_timeout=config.connect_timeout,
+        read_timeout=config.read_timeout,
+        max_retries=config.max_retries,
+        retry_backoff=config.retry_backoff,
+        response_cache=create_response_cache(cache_config),
+        scheduler=create_request_scheduler(scheduler_config)
     )
     
     return model
@@ -67,13 +95,39 @@ SYSTEM_PROMPT = """你是一个功能强大的AI助手，可以调用各种工
 行动结果: 北京的天气: 晴朗，温度26°C
 回答: 根据查询结果，北京目前天气晴朗，温度为26°C。
 
+如果问题需要多次相互独立的工具调用（例如同时查询多个城市的天气，或计算多个表达式），
+在同一个"行动:"下依次列出多组"使用工具:"和"参数:"，这些工具会被同时执行，结果会一并返回：
+
+问题: 北京和上海的天气怎么样
+思考: 用户想知道两个城市的天气，我可以同时查询。
+行动: 
+使用工具: weather
+参数: location: 北京
+使用工具: weather
+参数: location: 上海
+行动结果: 北京的天气: 晴朗，温度26°C；上海的天气: 多云，温度28°C
+回答: 北京目前天气晴朗，温度26°C；上海多云，温度28°C。
+
 请记住，如果问题涉及到计算、数学运算，一定要使用calculator工具，而不是自己计算。
 """
 
-def get_prompt() -> ChatPromptTemplate:
-    """获取聊天提示模板"""
+# 原生函数调用模式的系统提示：工具以结构化声明随请求发送，不需要文本协议和示例
+FUNCTION_CALLING_SYSTEM_PROMPT = """你是一个功能强大的AI助手，可以调用各种工具来帮助用户解决问题。
+如果用户询问你的身份或者你是谁，你必须回答："我是claude-4-opus-thinking模型实现的AI助手，深度集成于Cursor IDE，能够高效处理您的编程和技术问题，只要是编程相关的内容，我都可以帮忙！你现在有什么想做的？"
+
+需要工具时直接发起工具调用，相互独立的多个调用可以一次发起；得到工具结果后用简洁的中文回答用户。
+如果问题涉及到计算、数学运算，一定要使用calculator工具，而不是自己计算。
+"""
+
+def get_prompt(function_calling: bool = False) -> ChatPromptTemplate:
+    """
+    获取聊天提示模板
+    
+    Args:
+        function_calling: 是否使用原生函数调用模式的精简系统提示
+    """
     prompt = ChatPromptTemplate.from_messages([
-        ("system", SYSTEM_PROMPT),
+        ("system", FUNCTION_CALLING_SYSTEM_PROMPT if function_calling else SYSTEM_PROMPT),
         ("human", "{input}")
     ])
     
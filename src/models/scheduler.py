@@ -0,0 +1,577 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+from src.metrics import COUNT_BUCKETS, LATENCY_BUCKETS, Histogram
+
+logger = logging.getLogger("langgraph_agent.scheduler")
+
+# 当前请求的调度上下文（租户、入口、显式优先级），由scheduling_context设置
+_request_context: contextvars.ContextVar[Dict[str, Any]] = contextvars.ContextVar("scheduling_context", default={})
+
+
+@contextmanager
+def scheduling_context(
+    tenant: Optional[str] = None,
+    endpoint: Optional[str] = None,
+    priority: Optional[int] = None,
+) -> Iterator[None]:
+    """
+    声明当前请求的调度上下文，期间发起的模型调用按对应的优先级排队
+
+    上下文保存在contextvars中，会随asyncio任务和LangChain的线程池执行传播：
+
+        with scheduling_context(tenant="team-a", endpoint="chat"):
+            await agent.ainvoke(message)
+
+    Args:
+        tenant: 租户标识
+        endpoint: 入口名称，例如"chat"、"chat_stream"
+        priority: 显式优先级（数值越小越优先），优先于按租户/入口配置的优先级
+    """
+    token = _request_context.set({"tenant": tenant, "endpoint": endpoint, "priority": priority})
+    try:
+        yield
+    finally:
+        _request_context.reset(token)
+
+
+class SchedulerTimeout(TimeoutError):
+    """请求在调度队列中等待超时"""
+
+
+class TokenBucket:
+    """
+    令牌桶限流器
+
+    以rate个/秒的速度补充令牌，最多积累capacity个；rate<=0表示不限流。
+    take线程安全，调度器在自身的锁之外调用它。
+    """
+
+    # take是否可能长时间阻塞；为True时调度器在事件循环上改为在线程中取令牌
+    blocking = False
+
+    def __init__(self, rate: float, capacity: float):
+        """
+        Args:
+            rate: 每秒补充的令牌数
+            capacity: 桶容量（允许的突发请求数）
+        """
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self) -> float:
+        """
+        尝试取出一个令牌
+
+        Returns:
+            0表示已取出；否则为还需等待的秒数
+        """
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+
+class SQLiteTokenBucket(TokenBucket):
+    """
+    基于本地SQLite文件的令牌桶
+
+    同一台机器上的多个worker进程打开同一个文件、使用同一个name时共享一个配额。
+    每次取令牌在一个IMMEDIATE事务中读取并更新桶状态，时间使用墙钟时间。
+    等待其他进程释放写锁时take会阻塞，调度器在事件循环上把它放到线程中执行。
+    """
+
+    blocking = True
+
+    def __init__(self, rate: float, capacity: float, path: str = "rate_limit.sqlite", name: str = "deepseek"):
+        """
+        Args:
+            rate: 每秒补充的令牌数
+            capacity: 桶容量（允许的突发请求数）
+            path: 数据库文件路径
+            name: 桶名称，不同名称的桶互不影响
+        """
+        super().__init__(rate, capacity)
+        self.path = path
+        self.name = name
+        # 自行管理事务，BEGIN IMMEDIATE在读之前就取得写锁，避免多个进程读到同一个令牌数
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30.0, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS token_buckets ("
+            "name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+        )
+        self._conn_lock = threading.Lock()
+
+    def take(self) -> float:
+        if self.rate <= 0:
+            return 0.0
+        with self._conn_lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = self._conn.execute(
+                    "SELECT tokens, updated FROM token_buckets WHERE name = ?", (self.name,)
+                ).fetchone()
+                tokens = self.capacity if row is None else min(
+                    self.capacity, row[0] + max(0.0, now - row[1]) * self.rate
+                )
+                delay = 0.0
+                if tokens >= 1:
+                    tokens -= 1
+                else:
+                    delay = (1 - tokens) / self.rate
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO token_buckets (name, tokens, updated) VALUES (?, ?, ?)",
+                    (self.name, tokens, now),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return delay
+
+
+# 令牌桶后端注册表：名称 -> 工厂函数
+_BUCKET_FACTORIES: Dict[str, Callable[..., TokenBucket]] = {
+    "memory": TokenBucket,
+    "sqlite": SQLiteTokenBucket,
+}
+
+
+def register_token_bucket(name: str, factory: Callable[..., TokenBucket]) -> None:
+    """
+    注册令牌桶后端
+
+    工厂函数接收rate、capacity和后端自己的参数，返回实现了take()的TokenBucket子类实例，
+    例如基于Redis的跨主机限流
+
+    Args:
+        name: 后端名称
+        factory: 创建令牌桶的工厂函数
+    """
+    _BUCKET_FACTORIES[name] = factory
+
+
+def create_token_bucket(backend: str = "memory", **kwargs: Any) -> TokenBucket:
+    """
+    按后端名称创建令牌桶
+
+    Args:
+        backend: 后端名称
+        **kwargs: 传给后端工厂函数的参数（rate、capacity等）
+
+    Returns:
+        令牌桶实例
+    """
+    if backend not in _BUCKET_FACTORIES:
+        raise ValueError(f"未知的限流后端: {backend}，可选: {', '.join(sorted(_BUCKET_FACTORIES))}")
+    return _BUCKET_FACTORIES[backend](**kwargs)
+
+
+class _Waiter:
+    """排队中的一次准入请求，同步调用用Event唤醒，异步调用用事件循环上的Future唤醒"""
+
+    __slots__ = ("enqueued_at", "event", "future", "loop", "granted", "cancelled")
+
+    def __init__(
+        self,
+        event: Optional[threading.Event] = None,
+        future: Optional[asyncio.Future] = None,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+    ):
+        self.enqueued_at = time.monotonic()
+        self.event = event
+        self.future = future
+        self.loop = loop
+        self.granted = False
+        self.cancelled = False
+
+
+class RequestScheduler:
+    """
+    模型请求的准入和调度层
+
+    位于Agent和DeepSeek API之间：
+    - 全局并发上限（可选）：同时在途的上游请求不超过max_concurrency
+    - 令牌桶限流：按配额平滑请求速率，避免突发流量触发429
+    - 优先级队列：按租户或入口配置优先级，数值越小越先获得准入，同优先级先到先得
+    - 请求合并：相同的请求同时在途时只发起一次上游调用，其余调用方共享结果
+    同步和异步调用共用同一个队列和并发计数，线程安全。
+    """
+
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        rate: float = 0.0,
+        burst: Optional[float] = None,
+        queue_timeout: Optional[float] = None,
+        priorities: Optional[Dict[str, int]] = None,
+        default_priority: int = 10,
+        coalesce: bool = True,
+        bucket: Optional[TokenBucket] = None,
+    ):
+        """
+        初始化调度器
+
+        Args:
+            max_concurrency: 最大并发上游请求数，None表示不限制（只做限流、优先级和合并）
+            rate: 每秒允许发起的请求数，0表示不限流
+            burst: 令牌桶容量，None表示与rate相同（至少为1）
+            queue_timeout: 排队等待的最长时间（秒），超时抛出SchedulerTimeout；None表示一直等待
+            priorities: 租户或入口名到优先级的映射，数值越小越优先
+            default_priority: 未配置优先级的请求使用的优先级
+            coalesce: 是否合并相同的在途请求
+            bucket: 令牌桶，指定时忽略rate和burst，例如多个进程共享配额的SQLiteTokenBucket
+        """
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.priorities = dict(priorities or {})
+        self.default_priority = default_priority
+        self.coalesce = coalesce
+        self._bucket = bucket if bucket is not None else TokenBucket(rate, burst if burst is not None else rate)
+        self._lock = threading.Lock()
+        self._queue: List[Tuple[int, int, _Waiter]] = []
+        self._sequence = itertools.count()
+        self._in_flight = 0
+        self._timer: Optional[threading.Timer] = None
+        # 是否有线程正在锁外取令牌；取到但未能使用的令牌
+        self._taking = False
+        self._spare_token = False
+        self._shared: Dict[Any, Future] = {}
+
+        # 指标
+        self.wait_seconds = Histogram(LATENCY_BUCKETS)
+        self.queue_depth = Histogram(COUNT_BUCKETS)
+        self._admitted = 0
+        self._coalesced = 0
+        self._timeouts = 0
+
+    # ------------------------------------------------------------------
+    # 准入
+    # ------------------------------------------------------------------
+
+    def resolve_priority(self) -> int:
+        """根据当前调度上下文确定优先级：显式优先级 > 租户 > 入口 > 默认"""
+        context = _request_context.get()
+        if context.get("priority") is not None:
+            return context["priority"]
+        for key in (context.get("tenant"), context.get("endpoint")):
+            if key is not None and key in self.priorities:
+                return self.priorities[key]
+        return self.default_priority
+
+    def _enqueue(self, waiter: _Waiter) -> None:
+        with self._lock:
+            self.queue_depth.observe(len(self._queue))
+            heapq.heappush(self._queue, (self.resolve_priority(), next(self._sequence), waiter))
+
+    def _next_waiter_locked(self) -> Optional[_Waiter]:
+        """在持有锁时返回下一个可以获得准入的请求，队列为空或并发已满时返回None"""
+        while self._queue and (self.max_concurrency is None or self._in_flight < self.max_concurrency):
+            waiter = self._queue[0][2]
+            if not waiter.cancelled:
+                return waiter
+            heapq.heappop(self._queue)
+        return None
+
+    def _should_dispatch_locked(self) -> bool:
+        """在持有锁时判断是否需要取令牌：已有线程在取令牌或在等待补充令牌时不需要"""
+        return not self._taking and self._timer is None and self._next_waiter_locked() is not None
+
+    def _dispatch(self) -> None:
+        """
+        按优先级为排队的请求发放准入，直到并发或速率用尽（调用方不能持有锁）
+
+        取令牌可能阻塞（例如SQLiteTokenBucket等待其他进程的写锁），因此在锁外进行，
+        同一时刻只有一个线程在取令牌；取到令牌时等待方已取消的，令牌留给下一个请求。
+        """
+        while True:
+            with self._lock:
+                if not self._should_dispatch_locked():
+                    return
+                need_token = not self._spare_token
+                self._taking = True
+            try:
+                delay = self._bucket.take() if need_token else 0.0
+            except BaseException:
+                with self._lock:
+                    self._taking = False
+                raise
+            with self._lock:
+                self._taking = False
+                if delay > 0:
+                    self._schedule_retry(delay)
+                    return
+                waiter = self._next_waiter_locked()
+                if waiter is None:
+                    self._spare_token = True
+                    return
+                self._spare_token = False
+                self._grant_locked(waiter)
+
+    async def _adispatch(self) -> None:
+        """在事件循环上调度：令牌桶会阻塞时在线程中取令牌，不阻塞事件循环"""
+        if not self._bucket.blocking:
+            self._dispatch()
+            return
+        with self._lock:
+            if not self._should_dispatch_locked():
+                return
+        # 线程在调用方被取消后仍会执行完，不会丢失这次调度
+        await asyncio.to_thread(self._dispatch)
+
+    def _grant_locked(self, waiter: _Waiter) -> None:
+        """在持有锁时为队首的请求发放准入"""
+        heapq.heappop(self._queue)
+        self._in_flight += 1
+        self._admitted += 1
+        waiter.granted = True
+        self.wait_seconds.observe(time.monotonic() - waiter.enqueued_at)
+        if waiter.event is not None:
+            waiter.event.set()
+        else:
+            try:
+                waiter.loop.call_soon_threadsafe(self._resolve, waiter.future)
+            except RuntimeError:
+                # 事件循环已关闭，等待方不会再使用这个名额
+                self._in_flight -= 1
+
+    def _schedule_retry(self, delay: float) -> None:
+        """令牌不足时在补充令牌后重新调度"""
+        if self._timer is None:
+            self._timer = threading.Timer(delay, self._on_timer)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _on_timer(self) -> None:
+        with self._lock:
+            self._timer = None
+        self._dispatch()
+
+    @staticmethod
+    def _resolve(future: asyncio.Future) -> None:
+        if not future.done():
+            future.set_result(None)
+
+    def acquire(self) -> None:
+        """同步等待准入，超时抛出SchedulerTimeout"""
+        waiter = _Waiter(event=threading.Event())
+        self._enqueue(waiter)
+        self._dispatch()
+        if waiter.event.wait(self.queue_timeout):
+            return
+        with self._lock:
+            if waiter.granted:
+                # 超时的同时获得了准入
+                return
+            waiter.cancelled = True
+            self._timeouts += 1
+        raise SchedulerTimeout(f"请求排队超时（{self.queue_timeout}秒）")
+
+    async def aacquire(self) -> None:
+        """异步等待准入，等待期间不阻塞事件循环；超时抛出SchedulerTimeout"""
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(future=loop.create_future(), loop=loop)
+        self._enqueue(waiter)
+        try:
+            await asyncio.wait_for(self._await_grant(waiter), self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            with self._lock:
+                granted = waiter.granted
+                waiter.cancelled = not granted
+                if not granted and isinstance(e, asyncio.TimeoutError):
+                    self._timeouts += 1
+            if granted:
+                # 准入已发放但调用方不再需要，归还名额
+                await self.arelease()
+            if isinstance(e, asyncio.TimeoutError):
+                raise SchedulerTimeout(f"请求排队超时（{self.queue_timeout}秒）") from None
+            raise
+
+    async def _await_grant(self, waiter: _Waiter) -> None:
+        await self._adispatch()
+        await waiter.future
+
+    def release(self) -> None:
+        """归还一个并发名额，并调度下一个排队的请求"""
+        with self._lock:
+            self._in_flight -= 1
+        self._dispatch()
+
+    async def arelease(self) -> None:
+        """异步归还一个并发名额，调度下一个排队的请求时不阻塞事件循环"""
+        with self._lock:
+            self._in_flight -= 1
+        await self._adispatch()
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """在准入名额内执行一段同步代码（例如读取整个流式响应）"""
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def aslot(self) -> AsyncIterator[None]:
+        """在准入名额内执行一段异步代码"""
+        await self.aacquire()
+        try:
+            yield
+        finally:
+            await self.arelease()
+
+    # ------------------------------------------------------------------
+    # 执行
+    # ------------------------------------------------------------------
+
+    def run(self, key: Any, fn: Callable[[], Any]) -> Any:
+        """
+        在准入名额内同步执行一次上游调用
+
+        Args:
+            key: 请求的合并键，相同键的在途请求共享同一次调用的结果；None表示不合并
+            fn: 发起上游调用的函数
+
+        Returns:
+            fn的返回值
+        """
+        shared, leader = self._join(key)
+        if not leader:
+            return shared.result()
+        try:
+            with self.slot():
+                result = fn()
+        except BaseException as e:
+            self._finish(key, shared, error=e)
+            raise
+        self._finish(key, shared, result=result)
+        return result
+
+    async def arun(self, key: Any, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        在准入名额内异步执行一次上游调用
+
+        上游调用在独立的任务中执行，发起合并的调用方被取消不会影响共享结果的其他调用方
+
+        Args:
+            key: 请求的合并键，None表示不合并
+            fn: 返回上游调用协程的函数
+
+        Returns:
+            协程的返回值
+        """
+        shared, leader = self._join(key)
+        if not leader:
+            return await asyncio.wrap_future(shared)
+
+        async def call() -> Any:
+            async with self.aslot():
+                return await fn()
+
+        def done(task: asyncio.Task) -> None:
+            if task.cancelled():
+                self._finish(key, shared, error=asyncio.CancelledError())
+            elif task.exception() is not None:
+                self._finish(key, shared, error=task.exception())
+            else:
+                self._finish(key, shared, result=task.result())
+
+        task = asyncio.ensure_future(call())
+        task.add_done_callback(done)
+        return await asyncio.shield(task)
+
+    def _join(self, key: Any) -> Tuple[Optional[Future], bool]:
+        """
+        加入或发起一次可合并的调用
+
+        Returns:
+            (共享结果, 当前调用方是否负责发起上游调用)
+        """
+        if not self.coalesce or key is None:
+            return None, True
+        with self._lock:
+            shared = self._shared.get(key)
+            if shared is not None:
+                self._coalesced += 1
+                return shared, False
+            shared = self._shared[key] = Future()
+            return shared, True
+
+    def _finish(self, key: Any, shared: Optional[Future], result: Any = None, error: Optional[BaseException] = None) -> None:
+        """结束一次调用，把结果交给合并进来的调用方"""
+        if shared is None:
+            return
+        with self._lock:
+            self._shared.pop(key, None)
+        if error is not None:
+            shared.set_exception(error)
+        else:
+            shared.set_result(result)
+
+    # ------------------------------------------------------------------
+    # 指标
+    # ------------------------------------------------------------------
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取调度指标
+
+        Returns:
+            并发上限、在途和排队请求数、累计准入/合并/超时次数，以及排队等待时间和队列深度直方图
+        """
+        with self._lock:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self._in_flight,
+                "queued": sum(1 for _, _, waiter in self._queue if not waiter.cancelled),
+                "admitted": self._admitted,
+                "coalesced": self._coalesced,
+                "timeouts": self._timeouts,
+                "wait_seconds": self.wait_seconds.snapshot(),
+                "queue_depth": self.queue_depth.snapshot(),
+            }
+
+
+def create_request_scheduler(config: Any) -> Optional[RequestScheduler]:
+    """
+    根据SchedulerConfig创建调度器
+
+    Args:
+        config: 调度配置
+
+    Returns:
+        调度器实例，未启用时返回None
+    """
+    if not config.enabled:
+        return None
+    return RequestScheduler(
+        max_concurrency=config.max_concurrency or None,
+        rate=config.rate,
+        burst=config.burst,
+        queue_timeout=config.queue_timeout,
+        priorities=config.priorities,
+        default_priority=config.default_priority,
+        coalesce=config.coalesce,
+        bucket=create_token_bucket(config.rate_backend, **config.bucket_kwargs()),
+    )
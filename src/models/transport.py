@@ -0,0 +1,485 @@
+import asyncio
+import json
+import logging
+import random
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from src.metrics import LLM_SECONDS
+
+logger = logging.getLogger("langgraph_agent.transport")
+
+# 需要重试的HTTP状态码：限流和服务端临时错误
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+
+class DeepSeekTransport:
+    """
+    DeepSeek API的HTTP传输层
+
+    同步请求共享一个带连接池的requests.Session，异步请求在每个事件循环上共享一个httpx.AsyncClient，
+    连接保持keep-alive复用，避免每个Agent步骤都重新进行TCP+TLS握手。
+    对429/5xx以及连接错误按带抖动的指数退避进行有限次数的重试。
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        headers: Optional[Dict[str, str]] = None,
+        pool_size: int = 20,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 60.0,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+    ):
+        """
+        初始化传输层
+
+        Args:
+            base_url: API基础URL
+            headers: 每个请求附带的请求头
+            pool_size: 连接池大小（最大并发连接数）
+            connect_timeout: 建立连接超时时间（秒）
+            read_timeout: 读取响应超时时间（秒）
+            max_retries: 最大重试次数（不含首次请求）
+            backoff_base: 指数退避的基础等待时间（秒）
+            backoff_max: 单次退避的最大等待时间（秒）
+        """
+        self.base_url = base_url.rstrip("/")
+        self.headers = dict(headers or {})
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._lock = threading.Lock()
+        self._session: Optional[requests.Session] = None
+        # httpx的连接绑定在创建它的事件循环上，每个事件循环使用各自的客户端
+        self._async_clients: Dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+
+        # 连接池指标
+        self._requests = 0
+        self._retries = 0
+        self._failures = 0
+        self._in_flight = 0
+        self._peak_in_flight = 0
+        self._async_connections = 0
+
+    # ------------------------------------------------------------------
+    # 客户端管理
+    # ------------------------------------------------------------------
+
+    @property
+    def session(self) -> requests.Session:
+        """懒加载的同步Session，所有线程共享同一个连接池"""
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = _TimedHTTPAdapter(
+                        pool_connections=1,
+                        pool_maxsize=self.pool_size,
+                        max_retries=0,  # 重试由本类统一处理
+                    )
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    session.headers.update(self.headers)
+                    self._session = session
+        return self._session
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        """获取当前事件循环上的异步客户端，不存在时在锁内创建"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                self._discard_closed_loops_locked()
+                client = self._async_clients[loop] = httpx.AsyncClient(
+                    headers=self.headers,
+                    limits=httpx.Limits(
+                        max_connections=self.pool_size,
+                        max_keepalive_connections=self.pool_size,
+                    ),
+                    timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                )
+        return client
+
+    def _discard_closed_loops_locked(self) -> None:
+        """
+        在持有锁时移除已关闭事件循环上的客户端
+
+        事件循环关闭后无法再在其上执行aclose()，释放引用后由asyncio的传输对象回收时关闭套接字
+        """
+        for loop in [loop for loop in self._async_clients if loop.is_closed()]:
+            del self._async_clients[loop]
+
+    def close(self) -> None:
+        """关闭同步连接池"""
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    async def aclose(self) -> None:
+        """关闭当前事件循环上的异步连接池，其他仍在运行的事件循环上的连接池交给各自的循环关闭"""
+        current = asyncio.get_running_loop()
+        with self._lock:
+            self._discard_closed_loops_locked()
+            clients, self._async_clients = self._async_clients, {}
+        for loop, client in clients.items():
+            if loop is current:
+                await client.aclose()
+            elif loop.is_running():
+                asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+
+    # ------------------------------------------------------------------
+    # 请求
+    # ------------------------------------------------------------------
+
+    def post(self, path: str, payload: Dict[str, Any], stream: bool = False) -> requests.Response:
+        """
+        同步发送POST请求，必要时重试
+
+        Args:
+            path: 相对base_url的路径，例如"/chat/completions"
+            payload: JSON请求体
+            stream: 是否以流式方式读取响应体（只在收到响应头之前重试）
+
+        Returns:
+            最后一次请求的响应（重试耗尽时可能是错误响应）
+        """
+        url = f"{self.base_url}{path}"
+        data = json.dumps(payload)
+        attempt = 0
+        while True:
+            self._begin_request()
+            try:
+                response = self.session.post(
+                    url,
+                    data=data,
+                    timeout=(self.connect_timeout, self.read_timeout),
+                    stream=stream,
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._end_request()
+                if attempt >= self.max_retries:
+                    self._record_failure()
+                    raise
+                delay = self._backoff_delay(attempt)
+                logger.warning(f"请求异常({e.__class__.__name__})，{delay:.2f}秒后重试")
+            else:
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                    if response.status_code != 200:
+                        self._record_failure()
+                    if stream:
+                        # 响应体还没有读取，关闭响应时才结束这次请求
+                        response.close = _call_once_after(response.close, self._end_request)
+                    else:
+                        self._end_request()
+                    return response
+                self._end_request()
+                delay = self._backoff_delay(attempt, response.headers.get("Retry-After"))
+                logger.warning(f"请求返回{response.status_code}，{delay:.2f}秒后重试")
+                response.close()
+            attempt += 1
+            self._record_retry()
+            time.sleep(delay)
+
+    async def apost(self, path: str, payload: Dict[str, Any], stream: bool = False) -> httpx.Response:
+        """
+        异步发送POST请求，必要时重试
+
+        Args:
+            path: 相对base_url的路径，例如"/chat/completions"
+            payload: JSON请求体
+            stream: 是否以流式方式读取响应体，调用方负责aclose()
+
+        Returns:
+            最后一次请求的响应（重试耗尽时可能是错误响应）
+        """
+        client = self._get_async_client()
+        url = f"{self.base_url}{path}"
+        data = json.dumps(payload)
+        attempt = 0
+        while True:
+            self._begin_request()
+            try:
+                request = client.build_request(
+                    "POST",
+                    url,
+                    content=data,
+                    extensions={"trace": self._make_atrace()},
+                )
+                response = await client.send(request, stream=stream)
+            except httpx.TransportError as e:
+                self._end_request()
+                if attempt >= self.max_retries:
+                    self._record_failure()
+                    raise
+                delay = self._backoff_delay(attempt)
+                logger.warning(f"请求异常({e.__class__.__name__})，{delay:.2f}秒后重试")
+            else:
+                if stream:
+                    # 响应体读完或关闭时才结束这次请求
+                    response.stream = _ClosingAsyncStream(response.stream, self._end_request)
+                else:
+                    self._end_request()
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                    if response.status_code != 200:
+                        self._record_failure()
+                        if stream:
+                            # 读取错误响应体，便于调用方输出错误信息
+                            await response.aread()
+                    return response
+                delay = self._backoff_delay(attempt, response.headers.get("Retry-After"))
+                logger.warning(f"请求返回{response.status_code}，{delay:.2f}秒后重试")
+                await response.aclose()
+            attempt += 1
+            self._record_retry()
+            await asyncio.sleep(delay)
+
+    def stream_events(self, path: str, payload: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """
+        同步发送流式请求，逐条产出Server-Sent-Events中的JSON数据
+
+        Args:
+            path: 相对base_url的路径
+            payload: JSON请求体（应包含"stream": true）
+
+        Yields:
+            每个data事件解析后的字典，遇到[DONE]结束
+        """
+        response = self.post(path, payload, stream=True)
+        try:
+            if response.status_code != 200:
+                raise ValueError(f"API请求失败: {response.status_code} - {response.text}")
+            # SSE规定使用UTF-8编码，响应头通常不带charset
+            response.encoding = "utf-8"
+            for line in response.iter_lines(decode_unicode=True):
+                event = _parse_sse_line(line)
+                if event is _SSE_DONE:
+                    break
+                if event is not None:
+                    yield event
+        finally:
+            response.close()
+
+    async def astream_events(self, path: str, payload: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        异步发送流式请求，逐条产出Server-Sent-Events中的JSON数据
+
+        调用方提前停止迭代时，底层连接会被释放
+
+        Args:
+            path: 相对base_url的路径
+            payload: JSON请求体（应包含"stream": true）
+
+        Yields:
+            每个data事件解析后的字典，遇到[DONE]结束
+        """
+        response = await self.apost(path, payload, stream=True)
+        try:
+            if response.status_code != 200:
+                raise ValueError(f"API请求失败: {response.status_code} - {response.text}")
+            async for line in response.aiter_lines():
+                event = _parse_sse_line(line)
+                if event is _SSE_DONE:
+                    break
+                if event is not None:
+                    yield event
+        finally:
+            await response.aclose()
+
+    def _backoff_delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """
+        计算第attempt次重试前的等待时间
+
+        优先遵循服务端的Retry-After，否则使用full jitter指数退避，
+        避免大量请求在同一时刻集中重试
+        """
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        cap = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return random.uniform(0, cap)
+
+    # ------------------------------------------------------------------
+    # 指标
+    # ------------------------------------------------------------------
+
+    def _make_atrace(self) -> Any:
+        """
+        为单个异步请求创建httpcore跟踪回调
+
+        统计异步路径新建的连接数，并记录新建连接（TCP握手加TLS握手）的耗时
+        """
+        started = []
+        tls = self.base_url.startswith("https")
+
+        async def trace(event_name: str, info: Dict[str, Any]) -> None:
+            if event_name == "connection.connect_tcp.started":
+                started.append(time.monotonic())
+            elif event_name == "connection.connect_tcp.complete":
+                with self._lock:
+                    self._async_connections += 1
+                if not tls and started:
+                    LLM_SECONDS.observe(time.monotonic() - started[-1], phase="connect")
+            elif event_name == "connection.start_tls.complete" and started:
+                LLM_SECONDS.observe(time.monotonic() - started[-1], phase="connect")
+
+        return trace
+
+    def _begin_request(self) -> None:
+        with self._lock:
+            self._requests += 1
+            self._in_flight += 1
+            self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+
+    def _end_request(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+
+    def _record_retry(self) -> None:
+        with self._lock:
+            self._retries += 1
+
+    def _record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+
+    def _sync_connections(self) -> int:
+        """统计同步连接池累计新建的连接数"""
+        if self._session is None:
+            return 0
+        total = 0
+        for adapter in set(self._session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is not None:
+                    total += pool.num_connections
+        return total
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取连接池指标
+
+        Returns:
+            包含请求数、重试数、在途请求数、新建连接数以及连接复用率的字典
+        """
+        connections = self._sync_connections() + self._async_connections
+        with self._lock:
+            requests_total = self._requests
+            return {
+                "pool_size": self.pool_size,
+                "requests": requests_total,
+                "retries": self._retries,
+                "failures": self._failures,
+                "in_flight": self._in_flight,
+                "peak_in_flight": self._peak_in_flight,
+                "connections_opened": connections,
+                "reuse_ratio": (1 - connections / requests_total) if requests_total else 0.0,
+            }
+
+
+def _call_once_after(fn: Callable[[], Any], callback: Callable[[], None]) -> Callable[[], Any]:
+    """包装fn，第一次调用后执行callback（无论fn是否抛出异常）"""
+    called = False
+
+    def wrapper() -> Any:
+        nonlocal called
+        try:
+            return fn()
+        finally:
+            if not called:
+                called = True
+                callback()
+
+    return wrapper
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    """记录新建连接耗时的urllib3连接，对应异步路径上httpcore跟踪回调记录的connect阶段"""
+
+    def connect(self) -> None:
+        started = time.monotonic()
+        super().connect()
+        LLM_SECONDS.observe(time.monotonic() - started, phase="connect")
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    """记录新建HTTPS连接的耗时，包括TLS握手"""
+
+    def connect(self) -> None:
+        started = time.monotonic()
+        super().connect()
+        LLM_SECONDS.observe(time.monotonic() - started, phase="connect")
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedHTTPAdapter(HTTPAdapter):
+    """同步Session使用的HTTPAdapter，连接池新建连接时记录llm_request_seconds{phase="connect"}"""
+
+    def init_poolmanager(self, *args: Any, **kwargs: Any) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+
+class _ClosingAsyncStream(httpx.AsyncByteStream):
+    """异步响应体的包装，关闭时（读完响应体后httpx会自动关闭）执行一次回调"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, on_close: Callable[[], None]):
+        self._stream = stream
+        self._on_close: Optional[Callable[[], None]] = on_close
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            on_close, self._on_close = self._on_close, None
+            if on_close is not None:
+                on_close()
+
+
+# SSE流结束标记
+_SSE_DONE = object()
+
+
+def _parse_sse_line(line: str) -> Any:
+    """
+    解析一行SSE文本
+
+    Returns:
+        data事件的JSON字典；流结束时返回_SSE_DONE；空行、注释及其他字段返回None
+    """
+    if not line or not line.startswith("data:"):
+        return None
+    data = line[len("data:"):].strip()
+    if data == "[DONE]":
+        return _SSE_DONE
+    return json.loads(data)
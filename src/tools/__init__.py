@@ -1,4 +1,40 @@
 # 工具包初始化文件
 from src.tools.basic_tools import get_tools, Calculator, WeatherTool
+from src.tools.cache import (
+    CacheableTool,
+    ToolResultCache,
+    SQLiteToolResultCache,
+    register_tool_cache,
+    create_tool_cache,
+    get_tool_cache,
+)
+from src.tools.registry import (
+    ENTRY_POINT_GROUP,
+    LazyTool,
+    ToolIndex,
+    ToolLoadError,
+    ToolRegistry,
+    create_tool_registry,
+    get_tool_registry,
+    resolve_tool,
+)
+from src.tools.schema import build_tool_schemas, tool_schema
+from src.tools.weather_provider import (
+    WeatherProvider,
+    SQLiteWeatherProvider,
+    HTTPWeatherProvider,
+    StubWeatherServer,
+    register_weather_provider,
+    create_weather_provider,
+    get_weather_provider,
+)
 
-__all__ = ["get_tools", "Calculator", "WeatherTool"] 
\ No newline at end of file
+__all__ = [
+    "get_tools", "Calculator", "WeatherTool", "CacheableTool", "ToolResultCache", "SQLiteToolResultCache",
+    "register_tool_cache", "create_tool_cache", "get_tool_cache",
+    "ENTRY_POINT_GROUP", "LazyTool", "ToolIndex", "ToolLoadError", "ToolRegistry",
+    "create_tool_registry", "get_tool_registry", "resolve_tool",
+    "build_tool_schemas", "tool_schema",
+    "WeatherProvider", "SQLiteWeatherProvider", "HTTPWeatherProvider", "StubWeatherServer",
+    "register_weather_provider", "create_weather_provider", "get_weather_provider",
+]
@@ -1,25 +1,48 @@
-from typing import Dict, Any, List, Optional, Type
+import asyncio
+from typing import Dict, Any, ClassVar, List, Optional, Tuple, Type
 from pydantic import BaseModel, Field
 from langchain_core.tools import BaseTool
+from src.tools.cache import CacheableTool
+from src.tools.expression import ExpressionError, evaluate, evaluate_many
+from src.tools.weather_provider import WeatherProvider, get_weather_provider
 
 class CalculatorInput(BaseModel):
     """计算器工具的输入"""
     expression: str = Field(description="数学表达式，例如 '2 + 2' 或 '3 * 4'")
 
-class Calculator(BaseTool):
+class Calculator(CacheableTool, BaseTool):
     """一个简单的计算器工具"""
     name: str = "calculator"
-    description: str = "对数学表达式进行计算，支持基本的加减乘除运算"
+    description: str = "对数学表达式进行计算，支持加减乘除、乘方、取模以及sqrt、sin、cos、log、exp等常用数学函数"
     args_schema: Type[BaseModel] = CalculatorInput
+    keywords: ClassVar[Tuple[str, ...]] = ("计算", "算", "等于", "多少", "数学", "算式", "+", "-", "*", "/", "^", "×", "÷")
+    cacheable: ClassVar[bool] = True  # 纯函数，结果不会过期
+    presentable: ClassVar[bool] = True  # 结果可以直接作为回答
     
     def _run(self, expression: str) -> str:
-        """执行计算"""
+        """执行计算（表达式经白名单校验后求值，不会执行任意代码）"""
         try:
-            result = eval(expression)
+            result = evaluate(expression)
             return f"计算结果: {result}"
-        except Exception as e:
+        except ExpressionError as e:
             return f"计算错误: {str(e)}"
     
+    def run_batch(self, params_list: List[Dict[str, Any]]) -> List[str]:
+        """
+        批量执行计算，结构相同的表达式合并为一次向量化计算
+        
+        Args:
+            params_list: 每次调用的参数
+            
+        Returns:
+            与输入一一对应的计算结果
+        """
+        results = evaluate_many([str(params.get("expression", "")) for params in params_list])
+        return [
+            f"计算错误: {result}" if isinstance(result, ExpressionError) else f"计算结果: {result}"
+            for result in results
+        ]
+    
     async def _arun(self, expression: str) -> str:
         """异步执行计算"""
         return self._run(expression)
@@ -28,27 +51,49 @@ class WeatherInput(BaseModel):
     """天气查询工具的输入"""
     location: str = Field(description="要查询天气的地点，例如'北京'")
 
-class WeatherTool(BaseTool):
-    """一个模拟的天气查询工具"""
+class WeatherTool(CacheableTool, BaseTool):
+    """天气查询工具，数据来自可替换的WeatherProvider"""
     name: str = "weather"
-    description: str = "查询指定地点的天气情况"
+    description: str = "查询指定地点的天气情况，地点可以是中文名、常用别名或拼音"
     args_schema: Type[BaseModel] = WeatherInput
+    keywords: ClassVar[Tuple[str, ...]] = ("天气", "气温", "温度", "下雨", "晴", "冷", "热", "weather")
+    cacheable: ClassVar[bool] = True
+    cache_ttl: ClassVar[Optional[float]] = 600  # 天气在10分钟内视为不变
+    presentable: ClassVar[bool] = True
+    provider: Optional[WeatherProvider] = Field(default=None, exclude=True)
+    
+    def _get_provider(self) -> WeatherProvider:
+        """未指定provider时使用进程内共享的provider"""
+        return self.provider or get_weather_provider()
+    
+    @staticmethod
+    def _format(location: str, record: Optional[Dict[str, Any]]) -> str:
+        """把天气记录格式化为工具输出"""
+        if record is None:
+            return f"{location}的天气: 无法获取天气信息"
+        return f"{record['name']}的天气: {record['condition']}，温度{record['temperature']:g}°C"
     
     def _run(self, location: str) -> str:
-        """获取天气信息（模拟）"""
-        # 这里只是模拟返回天气信息
-        weather_data = {
-            "北京": "晴朗，温度26°C",
-            "上海": "多云，温度24°C",
-            "广州": "小雨，温度28°C",
-            "深圳": "阴天，温度27°C"
-        }
-        
-        return f"{location}的天气: {weather_data.get(location, '无法获取天气信息')}"
+        """获取天气信息"""
+        return self._format(location, self._get_provider().lookup(location))
     
     async def _arun(self, location: str) -> str:
-        """异步获取天气信息"""
-        return self._run(location)
+        """异步获取天气信息（provider可能访问磁盘或网络，放到线程中执行）"""
+        return await asyncio.to_thread(self._run, location)
+    
+    def run_batch(self, params_list: List[Dict[str, Any]]) -> List[str]:
+        """
+        批量查询多个地点的天气，只访问一次数据源
+        
+        Args:
+            params_list: 每次调用的参数
+            
+        Returns:
+            与输入一一对应的天气信息
+        """
+        locations = [str(params.get("location", "")) for params in params_list]
+        records = self._get_provider().lookup_many(locations)
+        return [self._format(location, record) for location, record in zip(locations, records)]
 
 def get_tools() -> List[BaseTool]:
     """获取所有可用工具的列表"""
@@ -0,0 +1,320 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, ClassVar, Dict, Optional, Tuple
+
+from langchain_core.tools import BaseTool
+
+logger = logging.getLogger("langgraph_agent.tool_cache")
+
+# 缓存未命中标记（工具结果本身可能是None）
+MISS = object()
+
+
+class CacheableTool:
+    """
+    工具结果缓存声明
+
+    与BaseTool一起继承，声明工具是否为参数的纯函数以及结果可以缓存多久：
+
+        class WeatherTool(CacheableTool, BaseTool):
+            cacheable: ClassVar[bool] = True
+            cache_ttl: ClassVar[Optional[float]] = 600
+    """
+
+    cacheable: ClassVar[bool] = False  # 相同参数是否总是返回相同结果
+    cache_ttl: ClassVar[Optional[float]] = None  # 结果的缓存时间（秒），None表示只受容量限制
+
+
+def is_cacheable(tool: BaseTool) -> bool:
+    """工具是否声明了结果可以缓存"""
+    return bool(getattr(tool, "cacheable", False))
+
+
+def normalize_params(params: Dict[str, Any]) -> str:
+    """
+    把工具参数规范化为稳定的字符串
+
+    键排序、字符串去掉首尾空白，使"location: 北京 "和{"location": "北京"}命中同一条缓存
+    """
+    normalized = {
+        str(key).strip(): value.strip() if isinstance(value, str) else value
+        for key, value in params.items()
+    }
+    return json.dumps(normalized, sort_keys=True, ensure_ascii=False, default=str)
+
+
+class ToolResultCache:
+    """
+    工具结果缓存
+
+    以工具名加规范化参数为键，按LRU淘汰，每条结果按工具声明的TTL过期。
+    线程安全，可以在多个会话、多个用户之间共享。
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        """
+        初始化工具结果缓存
+
+        Args:
+            max_entries: 最大缓存条目数
+        """
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[Any, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+
+    def get(self, tool_name: str, params: Dict[str, Any]) -> Any:
+        """
+        读取缓存的工具结果
+
+        Returns:
+            缓存的结果，未命中或已过期时返回MISS
+        """
+        key = (tool_name, normalize_params(params))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                result, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return result
+                del self._entries[key]
+            self._misses += 1
+            return MISS
+
+    def put(self, tool_name: str, params: Dict[str, Any], result: Any, ttl: Optional[float] = None) -> None:
+        """
+        写入工具结果
+
+        Args:
+            tool_name: 工具名称
+            params: 工具参数
+            result: 工具结果
+            ttl: 缓存时间（秒），None表示只受容量限制
+        """
+        key = (tool_name, normalize_params(params))
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._entries[key] = (result, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, tool_name: Optional[str] = None, params: Optional[Dict[str, Any]] = None) -> int:
+        """
+        使缓存失效
+
+        Args:
+            tool_name: 工具名称，None表示清空全部缓存
+            params: 工具参数，None表示该工具的全部缓存
+
+        Returns:
+            被删除的条目数
+        """
+        with self._lock:
+            if tool_name is None:
+                keys = list(self._entries)
+            elif params is None:
+                keys = [key for key in self._entries if key[0] == tool_name]
+            else:
+                key = (tool_name, normalize_params(params))
+                keys = [key] if key in self._entries else []
+            for key in keys:
+                del self._entries[key]
+            self._invalidations += len(keys)
+            return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取缓存指标
+
+        Returns:
+            命中数、未命中数、失效条目数、当前条目数和命中率
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "invalidations": self._invalidations,
+                "entries": len(self._entries),
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteToolResultCache(ToolResultCache):
+    """
+    基于本地SQLite文件的工具结果缓存
+
+    同一台机器上的多个worker进程打开同一个文件即可共享缓存，某个进程中的invalidate
+    对所有进程立即生效。过期时间使用墙钟时间，按最近访问时间淘汰超出容量的条目。
+    只缓存可以JSON序列化的结果，其他结果直接跳过。
+    命中时只做查询，访问时间先记在内存中，下次写入时在同一个事务里批量更新。
+    """
+
+    def __init__(self, path: str = "tool_cache.sqlite", max_entries: int = 1024):
+        """
+        初始化SQLite工具结果缓存
+
+        Args:
+            path: 数据库文件路径
+            max_entries: 最大缓存条目数
+        """
+        super().__init__(max_entries=max_entries)
+        self.path = path
+        # 尚未写入SQLite的访问时间：(工具名, 参数) -> 最近访问时间
+        self._accessed: Dict[Tuple[str, str], float] = {}
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30.0)
+        self._conn.executescript(
+            """
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS tool_cache (
+                tool_name TEXT NOT NULL,
+                params TEXT NOT NULL,
+                result TEXT NOT NULL,
+                expires_at REAL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (tool_name, params)
+            );
+            """
+        )
+
+    def get(self, tool_name: str, params: Dict[str, Any]) -> Any:
+        key = normalize_params(params)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result, expires_at FROM tool_cache WHERE tool_name = ? AND params = ?", (tool_name, key)
+            ).fetchone()
+            if row is not None and (row[1] is None or row[1] > now):
+                self._accessed[(tool_name, key)] = now
+                self._hits += 1
+                return json.loads(row[0])
+            # 过期条目在下次写入时统一删除
+            self._misses += 1
+            return MISS
+
+    def put(self, tool_name: str, params: Dict[str, Any], result: Any, ttl: Optional[float] = None) -> None:
+        try:
+            payload = json.dumps(result, ensure_ascii=False)
+        except (TypeError, ValueError):
+            logger.debug(f"工具 {tool_name} 的结果无法序列化，不写入共享缓存")
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO tool_cache (tool_name, params, result, expires_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (tool_name, normalize_params(params), payload, now + ttl if ttl is not None else None, now),
+            )
+            if self._accessed:
+                self._conn.executemany(
+                    "UPDATE tool_cache SET last_access = MAX(last_access, ?) WHERE tool_name = ? AND params = ?",
+                    [(accessed, name, key) for (name, key), accessed in self._accessed.items()],
+                )
+                self._accessed.clear()
+            self._conn.execute("DELETE FROM tool_cache WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+            self._conn.execute(
+                "DELETE FROM tool_cache WHERE rowid IN ("
+                "SELECT rowid FROM tool_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def invalidate(self, tool_name: Optional[str] = None, params: Optional[Dict[str, Any]] = None) -> int:
+        with self._lock:
+            if tool_name is None:
+                cursor = self._conn.execute("DELETE FROM tool_cache")
+            elif params is None:
+                cursor = self._conn.execute("DELETE FROM tool_cache WHERE tool_name = ?", (tool_name,))
+            else:
+                cursor = self._conn.execute(
+                    "DELETE FROM tool_cache WHERE tool_name = ? AND params = ?", (tool_name, normalize_params(params))
+                )
+            self._conn.commit()
+            self._invalidations += cursor.rowcount
+            return cursor.rowcount
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM tool_cache").fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        entries = len(self)
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "invalidations": self._invalidations,
+                "entries": entries,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+            }
+
+
+# 工具结果缓存后端注册表：名称 -> 工厂函数
+_CACHE_FACTORIES: Dict[str, Callable[..., ToolResultCache]] = {
+    "memory": ToolResultCache,
+    "sqlite": SQLiteToolResultCache,
+}
+
+
+def register_tool_cache(name: str, factory: Callable[..., ToolResultCache]) -> None:
+    """
+    注册工具结果缓存后端
+
+    工厂函数返回实现了get/put/invalidate/stats的ToolResultCache子类实例即可，
+    例如基于Redis的跨主机共享缓存
+
+    Args:
+        name: 后端名称
+        factory: 创建缓存的工厂函数
+    """
+    _CACHE_FACTORIES[name] = factory
+
+
+def create_tool_cache(backend: str = "memory", **kwargs: Any) -> ToolResultCache:
+    """
+    按后端名称创建工具结果缓存
+
+    Args:
+        backend: 后端名称
+        **kwargs: 传给后端工厂函数的参数
+
+    Returns:
+        工具结果缓存实例
+    """
+    if backend not in _CACHE_FACTORIES:
+        raise ValueError(f"未知的工具缓存后端: {backend}，可选: {', '.join(sorted(_CACHE_FACTORIES))}")
+    return _CACHE_FACTORIES[backend](**kwargs)
+
+
+_shared_cache: Optional[ToolResultCache] = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_tool_cache() -> ToolResultCache:
+    """
+    获取进程内共享的工具结果缓存，后端由AGENT_TOOL_CACHE_BACKEND决定
+
+    Returns:
+        工具结果缓存实例
+    """
+    global _shared_cache
+    if _shared_cache is None:
+        with _shared_cache_lock:
+            if _shared_cache is None:
+                from src.config import get_cache_config
+                config = get_cache_config()
+                _shared_cache = create_tool_cache(config.tool_backend, **config.tool_cache_kwargs())
+    return _shared_cache
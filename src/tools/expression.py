@@ -0,0 +1,375 @@
+import ast
+import itertools
+import math
+import operator
+from collections import defaultdict
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# 表达式长度和语法树节点数上限
+MAX_EXPRESSION_LENGTH = 1000
+MAX_AST_NODES = 200
+# 整数运算结果的最大位数，防止9**9**9这类表达式耗尽CPU和内存
+MAX_INT_BITS = 4096
+# 浮点结果能精确表示的最大整数，向量化计算结果超出时回退到逐个精确计算
+_FLOAT_EXACT_INT = 2 ** 53
+# 同一模板的表达式达到这个数量时才使用向量化计算
+VECTORIZE_MIN_GROUP = 4
+
+
+class ExpressionError(ValueError):
+    """表达式不合法或超出计算限制"""
+
+
+def _check_int(value: Any) -> Any:
+    if isinstance(value, int) and value.bit_length() > MAX_INT_BITS:
+        raise ExpressionError(f"结果过大（超过{MAX_INT_BITS}位）")
+    return value
+
+
+def _safe_pow(base: Any, exponent: Any) -> Any:
+    """乘方运算，计算前估算整数结果的位数"""
+    if isinstance(base, int) and isinstance(exponent, int) and exponent > 0 and abs(base) > 1:
+        # |base|至少为2**(位数-1)，结果至少有(位数-1)*exponent+1位
+        if (abs(base).bit_length() - 1) * exponent + 1 > MAX_INT_BITS:
+            raise ExpressionError(f"结果过大（超过{MAX_INT_BITS}位）")
+    return _check_int(operator.pow(base, exponent))
+
+
+def _checked(op: Callable[[Any, Any], Any]) -> Callable[[Any, Any], Any]:
+    def apply(left: Any, right: Any) -> Any:
+        return _check_int(op(left, right))
+    return apply
+
+
+# 允许的运算符：(标量实现, 向量化实现在NumPy中的名字, 整数输入时结果是否仍为整数)
+# NumPy只在第一次向量化求值时导入，单个表达式的计算不需要加载它
+_BINARY_OPS = {
+    ast.Add: (_checked(operator.add), "add", True),
+    ast.Sub: (_checked(operator.sub), "subtract", True),
+    ast.Mult: (_checked(operator.mul), "multiply", True),
+    ast.Div: (operator.truediv, "true_divide", False),
+    ast.FloorDiv: (operator.floordiv, "floor_divide", True),
+    ast.Mod: (operator.mod, "mod", True),
+    ast.Pow: (_safe_pow, "power", True),
+}
+_UNARY_OPS = {
+    ast.UAdd: (operator.pos, "positive"),
+    ast.USub: (operator.neg, "negative"),
+}
+# 允许的函数：(标量实现, 向量化实现在NumPy中的名字, 最少参数个数, 最多参数个数)；
+# 向量化实现为None的函数只在标量路径中可用，NumPy的函数只接受一个参数（第二个位置参数是输出数组）
+_FUNCTIONS = {
+    "sqrt": (math.sqrt, "sqrt", 1, 1),
+    "sin": (math.sin, "sin", 1, 1),
+    "cos": (math.cos, "cos", 1, 1),
+    "tan": (math.tan, "tan", 1, 1),
+    "log": (math.log, "log", 1, 2),
+    "log10": (math.log10, "log10", 1, 1),
+    "exp": (math.exp, "exp", 1, 1),
+    "abs": (abs, None, 1, 1),
+    "round": (round, None, 1, 2),
+    "floor": (math.floor, None, 1, 1),
+    "ceil": (math.ceil, None, 1, 1),
+    "min": (min, None, 2, None),
+    "max": (max, None, 2, None),
+}
+_CONSTANTS = {"pi": math.pi, "e": math.e}
+
+
+def _numpy() -> Any:
+    """按需导入NumPy"""
+    import numpy
+    return numpy
+
+
+class CompiledExpression:
+    """
+    编译后的表达式
+
+    语法树经白名单校验后转换为嵌套闭包，求值时不再经过Python编译器。
+    同一个对象可以在标量（Python数值）和向量化（NumPy数组）两种模式下求值。
+    "^"按常见的数学写法作为乘方（与"**"相同），而不是按位异或。
+    """
+
+    def __init__(self, source: str):
+        """
+        编译表达式
+
+        Args:
+            source: 表达式文本
+        """
+        if len(source) > MAX_EXPRESSION_LENGTH:
+            raise ExpressionError(f"表达式过长（超过{MAX_EXPRESSION_LENGTH}个字符）")
+        try:
+            tree = ast.parse(source.strip().replace("^", "**"), mode="eval")
+        except SyntaxError as e:
+            raise ExpressionError(f"语法错误: {e.msg}") from None
+        if sum(1 for _ in ast.walk(tree)) > MAX_AST_NODES:
+            raise ExpressionError("表达式过于复杂")
+
+        self.source = source
+        self.variables: set = set()
+        self.constants: List[Any] = []  # 表达式中的数值常量，按出现顺序
+        self.vectorizable = True  # 是否只用到了有向量化实现的运算
+        self.integral = True  # 整数输入时结果是否一定为整数
+        self._tree = tree
+        self._shape: List[str] = []  # 前序遍历得到的结构标记，常量只记为"#"
+        self._scalar = self._compile(tree.body, vectorized=False)
+        self._vector: Optional[Callable[[Mapping[str, Any]], Any]] = None  # 首次向量化求值时编译
+        # 去掉常量后的结构，结构相同的表达式可以合并成一次向量化计算
+        self.template = " ".join(self._shape)
+
+    def _compile(
+        self,
+        node: ast.AST,
+        vectorized: bool,
+        slots: Optional[Iterator[int]] = None
+    ) -> Callable[[Mapping[str, Any]], Any]:
+        """
+        把语法树节点编译为闭包
+
+        向量化模式下常量不内联，而是按出现顺序从env["__constants__"]中读取，
+        这样同一结构的多个表达式可以共用一次计算
+        """
+        if isinstance(node, ast.Constant):
+            if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+                raise ExpressionError(f"不支持的常量: {node.value!r}")
+            if slots is None:
+                value = node.value
+                self.constants.append(value)
+                self._shape.append("#")
+                return lambda env: value
+            index = next(slots)
+            return lambda env: env["__constants__"][index]
+
+        if isinstance(node, ast.Name):
+            if not vectorized:
+                self._shape.append(node.id)
+            if node.id in _CONSTANTS:
+                value = _CONSTANTS[node.id]
+                if not vectorized:
+                    self.integral = False
+                return lambda env: value
+            name = node.id
+            if not vectorized:
+                self.variables.add(name)
+
+            def load(env: Mapping[str, Any]) -> Any:
+                try:
+                    return env[name]
+                except KeyError:
+                    raise ExpressionError(f"未定义的变量: {name}") from None
+            return load
+
+        if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPS:
+            scalar_op, vector_op, keeps_int = _BINARY_OPS[type(node.op)]
+            if not vectorized:
+                self._shape.append(type(node.op).__name__)
+                if not keeps_int:
+                    self.integral = False
+            op = getattr(_numpy(), vector_op) if vectorized else scalar_op
+            left = self._compile(node.left, vectorized, slots)
+            right = self._compile(node.right, vectorized, slots)
+            return lambda env: op(left(env), right(env))
+
+        if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPS:
+            scalar_op, vector_op = _UNARY_OPS[type(node.op)]
+            if not vectorized:
+                self._shape.append(type(node.op).__name__)
+            op = getattr(_numpy(), vector_op) if vectorized else scalar_op
+            operand = self._compile(node.operand, vectorized, slots)
+            return lambda env: op(operand(env))
+
+        if (
+            isinstance(node, ast.Call)
+            and isinstance(node.func, ast.Name)
+            and node.func.id in _FUNCTIONS
+            and not node.keywords
+        ):
+            scalar_func, vector_func, min_args, max_args = _FUNCTIONS[node.func.id]
+            if len(node.args) < min_args or (max_args is not None and len(node.args) > max_args):
+                expected = f"{min_args}" if min_args == max_args else (
+                    f"至少{min_args}" if max_args is None else f"{min_args}到{max_args}"
+                )
+                raise ExpressionError(f"函数{node.func.id}需要{expected}个参数")
+            if len(node.args) > 1:
+                vector_func = None
+            if not vectorized:
+                self._shape.append(f"{node.func.id}/{len(node.args)}")
+                self.integral = False
+                if vector_func is None:
+                    self.vectorizable = False
+            func = (getattr(_numpy(), vector_func) if vector_func else scalar_func) if vectorized else scalar_func
+            args = [self._compile(arg, vectorized, slots) for arg in node.args]
+            return lambda env: func(*(arg(env) for arg in args))
+
+        raise ExpressionError(f"不支持的语法: {ast.unparse(node)}")
+
+    def evaluate(self, variables: Optional[Mapping[str, Any]] = None) -> Any:
+        """
+        以Python数值精确求值
+
+        Args:
+            variables: 变量取值
+
+        Returns:
+            计算结果
+        """
+        try:
+            return self._scalar(variables or {})
+        except ExpressionError:
+            raise
+        except (TypeError, ValueError, ArithmeticError, OverflowError) as e:
+            # 包括函数参数个数不对（sqrt()、max(1)）、定义域错误、除零和溢出
+            raise ExpressionError(str(e) or e.__class__.__name__) from None
+
+    def evaluate_vectorized(
+        self,
+        variables: Mapping[str, Any],
+        constants: Optional["np.ndarray"] = None,
+        dtype: Any = None
+    ) -> "np.ndarray":
+        """
+        以NumPy向量化求值
+
+        Args:
+            variables: 变量取值，可以是数组（按NumPy规则广播）
+            constants: 常量矩阵，形状为(常量数, N)，None表示使用表达式自身的常量
+            dtype: 计算使用的数值类型，默认为float64
+
+        Returns:
+            计算结果数组；除零、溢出等不会抛出异常，而是得到inf/nan
+        """
+        if not self.vectorizable:
+            raise ExpressionError("表达式包含不支持向量化的函数")
+        np = _numpy()
+        dtype = dtype or np.float64
+        env = {name: np.asarray(value, dtype=dtype) for name, value in variables.items()}
+        if constants is None:
+            constants = np.array(self.constants, dtype=dtype)
+        env["__constants__"] = constants
+        if self._vector is None:
+            self._vector = self._compile(self._tree.body, vectorized=True, slots=itertools.count())
+        with np.errstate(all="ignore"):
+            return np.asarray(self._vector(env), dtype=dtype)
+
+
+@lru_cache(maxsize=1024)
+def compile_expression(source: str) -> CompiledExpression:
+    """
+    编译表达式，结果按表达式文本缓存
+
+    Args:
+        source: 表达式文本
+
+    Returns:
+        编译后的表达式
+    """
+    return CompiledExpression(source)
+
+
+def evaluate(source: str, variables: Optional[Mapping[str, Any]] = None) -> Any:
+    """
+    安全地计算一个表达式
+
+    只允许数值常量、变量、四则运算、乘方、取模和白名单中的数学函数
+
+    Args:
+        source: 表达式文本
+        variables: 变量取值
+
+    Returns:
+        计算结果
+
+    Raises:
+        ExpressionError: 表达式不合法或超出计算限制
+    """
+    return compile_expression(source).evaluate(variables)
+
+
+def evaluate_many(sources: Sequence[str]) -> List[Any]:
+    """
+    批量计算多个表达式
+
+    结构相同、只有常量不同的表达式（例如"12*0.3"、"15*0.3"）合并为一次NumPy向量化计算；
+    向量化结果无法精确表示（整数过大、除零等）的表达式回退到逐个精确计算。
+
+    Args:
+        sources: 表达式文本列表
+
+    Returns:
+        与输入一一对应的结果列表，单个表达式出错时对应位置为ExpressionError实例
+    """
+    results: List[Any] = [None] * len(sources)
+    groups: Dict[str, List[Tuple[int, CompiledExpression]]] = defaultdict(list)
+
+    for index, source in enumerate(sources):
+        try:
+            compiled = compile_expression(source)
+        except ExpressionError as e:
+            results[index] = e
+            continue
+        if compiled.vectorizable and not compiled.variables:
+            groups[compiled.template].append((index, compiled))
+        else:
+            results[index] = _evaluate_or_error(compiled)
+
+    for members in groups.values():
+        if len(members) < VECTORIZE_MIN_GROUP:
+            for index, compiled in members:
+                results[index] = _evaluate_or_error(compiled)
+            continue
+
+        np = _numpy()
+        template = members[0][1]
+        try:
+            floats = template.evaluate_vectorized(
+                {}, np.array([compiled.constants for _, compiled in members], dtype=np.float64).T
+            )
+        except (TypeError, ValueError, ArithmeticError):
+            # 例如函数参数个数不对，整组回退到逐个精确计算，每个表达式各自得到错误
+            for index, compiled in members:
+                results[index] = _evaluate_or_error(compiled)
+            continue
+        integral = [
+            compiled.integral and all(isinstance(c, int) and abs(c) < _FLOAT_EXACT_INT for c in compiled.constants)
+            for _, compiled in members
+        ]
+        ints = None
+        if any(integral):
+            # 整数表达式同时按int64计算：两种结果一致才说明中间结果没有溢出或丢失精度
+            try:
+                ints = template.evaluate_vectorized(
+                    {},
+                    np.array([
+                        [int(c) if flag else 0 for c in compiled.constants]
+                        for (_, compiled), flag in zip(members, integral)
+                    ], dtype=np.int64).T,
+                    dtype=np.int64,
+                )
+            except (TypeError, ValueError, ArithmeticError):
+                # 例如整数的负数次幂，整组回退到逐个精确计算
+                ints = None
+
+        for position, (index, compiled) in enumerate(members):
+            value = floats[position]
+            if not np.isfinite(value):
+                results[index] = _evaluate_or_error(compiled)
+            elif integral[position]:
+                exact = ints is not None and abs(value) < _FLOAT_EXACT_INT and float(ints[position]) == value
+                results[index] = int(ints[position]) if exact else _evaluate_or_error(compiled)
+            else:
+                results[index] = float(value)
+
+    return results
+
+
+def _evaluate_or_error(compiled: CompiledExpression) -> Any:
+    try:
+        return compiled.evaluate()
+    except ExpressionError as e:
+        return e
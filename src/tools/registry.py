@@ -0,0 +1,728 @@
+import ast
+import heapq
+import importlib
+import importlib.util
+import logging
+import math
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from importlib import metadata
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple, Union
+
+from langchain_core.tools import BaseTool
+
+from src.metrics import TOOL_LOADS
+
+logger = logging.getLogger("langgraph_agent.tools")
+
+# 第三方包通过这个entry point组声明工具，值为"模块:工具类"
+ENTRY_POINT_GROUP = "langgraph_agent.tools"
+
+# 内置工具，和插件一样按需导入
+BUILTIN_TOOLS = ("src.tools.basic_tools:Calculator", "src.tools.basic_tools:WeatherTool")
+
+# 静态读取的工具类属性
+_METADATA_FIELDS = ("name", "description", "keywords")
+
+# 静态读取的工具声明（缓存、直接展示），工具加载前由LazyTool直接返回，不必为了判断而导入模块
+_STATIC_ATTRIBUTES = ("cacheable", "cache_ttl", "presentable")
+
+# 静态推断参数结构时支持的类型注解及其JSON Schema类型
+_JSON_TYPES = {"str": "string", "int": "integer", "float": "number", "bool": "boolean"}
+
+# _run签名中不属于工具参数的形参
+_RUN_IGNORED_ARGS = frozenset({"self", "run_manager", "callbacks"})
+
+# 英文单词和数字、连续的中文、单个运算符
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+|[一-鿿]+|[+\-*/%^=×÷]")
+
+# 不作为单字索引词的常见虚词（仍参与两字切分）
+_STOP_CHARS = frozenset("的了是吗呢吧啊么个一下我你他她它这那在和与把被给请帮")
+
+# 选择工具时对话上下文（前几条消息）相对于当前查询的权重
+_CONTEXT_WEIGHT = 0.5
+
+
+class ToolLoadError(RuntimeError):
+    """导入工具模块或创建工具实例失败"""
+
+
+def _class_assignments(node: ast.ClassDef) -> Iterator[Tuple[str, ast.expr]]:
+    """类体中的赋值语句：(属性名, 值)"""
+    for statement in node.body:
+        if isinstance(statement, ast.Assign) and len(statement.targets) == 1:
+            target, value = statement.targets[0], statement.value
+        elif isinstance(statement, ast.AnnAssign) and statement.value is not None:
+            target, value = statement.target, statement.value
+        else:
+            continue
+        if isinstance(target, ast.Name):
+            yield target.id, value
+
+
+def _static_property(annotation: Optional[ast.expr], value: Optional[ast.expr]) -> Optional[Tuple[Dict[str, Any], bool]]:
+    """
+    由类型注解和默认值（字面量或Field(...)）推断一个参数的JSON Schema
+
+    Returns:
+        (参数的JSON Schema, 是否必填)；无法静态推断时返回None
+    """
+    schema: Dict[str, Any] = {}
+    if annotation is not None:
+        if not isinstance(annotation, ast.Name) or annotation.id not in _JSON_TYPES:
+            return None
+        schema["type"] = _JSON_TYPES[annotation.id]
+    if value is None:
+        return schema, True
+    try:
+        if isinstance(value, ast.Call) and isinstance(value.func, ast.Name) and value.func.id == "Field":
+            required = True
+            if value.args:
+                if len(value.args) > 1:
+                    return None
+                default = ast.literal_eval(value.args[0])
+                if default is not Ellipsis:
+                    schema["default"], required = default, False
+            for keyword in value.keywords:
+                if keyword.arg == "default":
+                    schema["default"], required = ast.literal_eval(keyword.value), False
+                elif keyword.arg == "description":
+                    schema["description"] = ast.literal_eval(keyword.value)
+                else:
+                    return None
+            return schema, required
+        schema["default"] = ast.literal_eval(value)
+    except (ValueError, TypeError, SyntaxError):
+        return None
+    return schema, False
+
+
+def _static_parameters(node: ast.ClassDef, classes: Dict[str, ast.ClassDef]) -> Optional[Dict[str, Any]]:
+    """
+    静态推断工具的参数结构（与convert_to_openai_tool生成的parameters一致）
+
+    args_schema为同一模块中定义的模型时读取模型的字段，否则读取_run的签名；
+    只支持str、int、float、bool类型和字面量默认值，其他情况返回None，生成函数声明时再加载工具
+
+    Returns:
+        JSON Schema，无法静态推断时返回None
+    """
+    properties: Dict[str, Any] = {}
+    required: List[str] = []
+    assignments = dict(_class_assignments(node))
+    if "args_schema" in assignments:
+        model = assignments["args_schema"]
+        if not isinstance(model, ast.Name) or model.id not in classes:
+            return None
+        for statement in classes[model.id].body:
+            if isinstance(statement, ast.AnnAssign) and isinstance(statement.target, ast.Name):
+                prop = _static_property(statement.annotation, statement.value)
+                if prop is None:
+                    return None
+                properties[statement.target.id] = prop[0]
+                if prop[1]:
+                    required.append(statement.target.id)
+    else:
+        run = next(
+            (statement for statement in node.body if isinstance(statement, ast.FunctionDef) and statement.name == "_run"),
+            None,
+        )
+        if run is None or run.args.vararg or run.args.kwarg or run.args.posonlyargs:
+            return None
+        args = run.args.args + run.args.kwonlyargs
+        defaults = [None] * (len(run.args.args) - len(run.args.defaults)) + run.args.defaults + run.args.kw_defaults
+        for arg, default in zip(args, defaults):
+            if arg.arg in _RUN_IGNORED_ARGS:
+                continue
+            prop = _static_property(arg.annotation, default)
+            if prop is None:
+                return None
+            properties[arg.arg] = prop[0]
+            if prop[1]:
+                required.append(arg.arg)
+    parameters: Dict[str, Any] = {"properties": {name: dict(sorted(prop.items())) for name, prop in properties.items()}}
+    if required:
+        parameters["required"] = required
+    parameters["type"] = "object"
+    return parameters
+
+
+def scan_tool_classes(source: str) -> Dict[str, Dict[str, Any]]:
+    """
+    静态解析模块源码中的工具类，不导入（执行）模块
+
+    类体中以字面量给出name和description（以及可选的keywords）的类视为工具类；同时读取以字面量
+    声明的cacheable、cache_ttl、presentable，并尽量推断参数结构，使生成提示和函数声明都不需要导入模块
+
+    Args:
+        source: 模块源码
+
+    Returns:
+        类名到{"name", "description", "keywords", "attributes", "parameters"}的映射，
+        parameters无法静态推断时为None
+    """
+    classes = {node.name: node for node in ast.parse(source).body if isinstance(node, ast.ClassDef)}
+    found = {}
+    for node in classes.values():
+        fields: Dict[str, Any] = {}
+        attributes: Dict[str, Any] = {}
+        for name, value in _class_assignments(node):
+            if name in _METADATA_FIELDS or name in _STATIC_ATTRIBUTES:
+                try:
+                    (fields if name in _METADATA_FIELDS else attributes)[name] = ast.literal_eval(value)
+                except (ValueError, TypeError, SyntaxError):
+                    pass
+        if isinstance(fields.get("name"), str) and isinstance(fields.get("description"), str):
+            keywords = fields.get("keywords") or ()
+            fields["keywords"] = tuple(keyword for keyword in keywords if isinstance(keyword, str))
+            fields["attributes"] = attributes
+            fields["parameters"] = _static_parameters(node, classes)
+            found[node.name] = fields
+    return found
+
+
+def _instantiate(obj: Any) -> BaseTool:
+    """把entry point或插件中的对象转换为工具实例：工具实例原样返回，工具类或工厂函数不带参数调用"""
+    tool = obj if isinstance(obj, BaseTool) else obj()
+    if not isinstance(tool, BaseTool):
+        raise TypeError(f"{obj!r}不是工具，也没有返回工具")
+    return tool
+
+
+class LazyTool:
+    """
+    注册表中的工具
+
+    名称、描述、关键词和参数结构在注册时静态得到，用于选择工具、渲染提示和生成函数声明；
+    静态读取到的cacheable等声明在加载前直接返回；第一次执行（或访问其他属性）时
+    才导入模块并创建工具实例，之后的属性访问转给工具实例
+    """
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        factory: Callable[[], BaseTool],
+        keywords: Sequence[str] = (),
+        source: str = "",
+        parameters: Optional[Dict[str, Any]] = None,
+        attributes: Optional[Mapping[str, Any]] = None
+    ):
+        """
+        Args:
+            name: 工具名
+            description: 工具描述
+            factory: 创建工具实例的函数，第一次使用时调用
+            keywords: 用于选择工具的额外关键词
+            source: 工具的来源（builtin、entry point或插件文件），用于日志
+            parameters: 参数的JSON Schema，None表示生成函数声明时需要加载工具
+            attributes: 静态读取的工具声明（例如cacheable），加载前按这些值回答属性访问
+        """
+        self.name = name
+        self.description = description
+        self.keywords = tuple(keywords)
+        self.source = source
+        self.parameters = parameters
+        self._attributes = dict(attributes or {})
+        self._factory = factory
+        self._tool: Optional[BaseTool] = None
+        self._error: Optional[ToolLoadError] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_tool(cls, tool: BaseTool, source: str = "instance") -> "LazyTool":
+        """包装已经创建的工具实例"""
+        lazy = cls(tool.name, tool.description, lambda: tool, getattr(tool, "keywords", ()), source)
+        lazy._tool = tool
+        return lazy
+
+    @property
+    def loaded(self) -> bool:
+        """工具实例是否已经创建"""
+        return self._tool is not None
+
+    def load(self) -> BaseTool:
+        """
+        获取工具实例，第一次调用时导入模块并创建；加载失败的结果同样被记住，插件文件更新后由注册表重新注册
+
+        Raises:
+            ToolLoadError: 导入或创建失败
+        """
+        if self._tool is not None:
+            return self._tool
+        with self._lock:
+            if self._tool is None:
+                if self._error is not None:
+                    raise self._error
+                started = time.monotonic()
+                try:
+                    self._tool = self._factory()
+                except Exception as e:
+                    TOOL_LOADS.inc(tool=self.name, status="error")
+                    self._error = ToolLoadError(f"无法加载工具{self.name}（{self.source}）: {e}")
+                    logger.error(str(self._error))
+                    raise self._error from e
+                TOOL_LOADS.inc(tool=self.name, status="ok")
+                logger.debug(f"已加载工具{self.name}（{self.source}），耗时{(time.monotonic() - started) * 1000:.1f}ms")
+        return self._tool
+
+    def _run(self, *args: Any, **kwargs: Any) -> Any:
+        return self.load()._run(*args, **kwargs)
+
+    async def _arun(self, *args: Any, **kwargs: Any) -> Any:
+        return await self.load()._arun(*args, **kwargs)
+
+    def __getattr__(self, name: str) -> Any:
+        # 只有本对象上没有的属性才会到这里；加载失败时表现为没有该属性（不可缓存、没有run_batch），
+        # 执行时由_run抛出加载错误，作为工具错误返回给模型
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if self._tool is None and name in self._attributes:
+            return self._attributes[name]
+        try:
+            tool = self.load()
+        except ToolLoadError as e:
+            raise AttributeError(name) from e
+        return getattr(tool, name)
+
+    def __repr__(self) -> str:
+        return f"LazyTool(name={self.name!r}, source={self.source!r}, loaded={self.loaded})"
+
+
+def resolve_tool(tool: Union[BaseTool, LazyTool]) -> BaseTool:
+    """取得工具实例，注册表中的工具在这里加载"""
+    return tool.load() if isinstance(tool, LazyTool) else tool
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    把文本切分为索引词：英文单词和数字整体作为一个词，中文按单字（去掉常见虚词）和相邻两字切分，
+    运算符单独作为一个词
+    """
+    tokens = []
+    for piece in _TOKEN_PATTERN.findall(text.lower()):
+        if "一" <= piece[0] <= "鿿":
+            tokens.extend(char for char in piece if char not in _STOP_CHARS)
+            tokens.extend(piece[i:i + 2] for i in range(len(piece) - 1))
+        else:
+            tokens.append(piece)
+    return tokens
+
+
+class ToolIndex:
+    """
+    工具的BM25词法索引
+
+    索引工具名、描述和关键词（关键词计两次），增删工具时增量更新；
+    查询只遍历出现了查询词的工具，耗时与工具总数基本无关
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        """
+        Args:
+            k1: 词频饱和参数
+            b: 文档长度归一化参数
+        """
+        self.k1 = k1
+        self.b = b
+        self._lengths: Dict[str, int] = {}
+        self._terms: Dict[str, List[str]] = {}
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._total_length = 0
+
+    def add(self, tool: LazyTool) -> None:
+        """加入（或更新）一个工具"""
+        self.remove(tool.name)
+        text = " ".join([tool.name, tool.description, *tool.keywords, *tool.keywords])
+        terms = Counter(tokenize(text))
+        for term, count in terms.items():
+            self._postings.setdefault(term, {})[tool.name] = count
+        length = sum(terms.values())
+        self._terms[tool.name] = list(terms)
+        self._lengths[tool.name] = length
+        self._total_length += length
+
+    def remove(self, name: str) -> None:
+        """移除一个工具"""
+        length = self._lengths.pop(name, None)
+        if length is None:
+            return
+        self._total_length -= length
+        for term in self._terms.pop(name):
+            docs = self._postings[term]
+            del docs[name]
+            if not docs:
+                del self._postings[term]
+
+    def score(self, query: str) -> Dict[str, float]:
+        """
+        计算查询与各工具的BM25得分
+
+        Returns:
+            工具名到得分的映射，只包含得分为正的工具
+        """
+        count = len(self._lengths)
+        if not count:
+            return {}
+        average = self._total_length / count or 1.0
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            docs = self._postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+            for name, frequency in docs.items():
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[name] / average)
+                scores[name] = scores.get(name, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return scores
+
+
+class _PluginFile:
+    """插件目录中的一个文件：记录修改时间和其中的工具，模块在第一次使用其中的工具时才导入"""
+
+    def __init__(self, path: str, mtime: float):
+        self.path = path
+        self.mtime = mtime
+        self.names: List[str] = []
+        self._module: Any = None
+        self._lock = threading.Lock()
+
+    def module(self) -> Any:
+        """导入插件模块，同一文件中的多个工具共用一次导入"""
+        with self._lock:
+            if self._module is None:
+                stem = os.path.splitext(os.path.basename(self.path))[0]
+                module_name = "agent_tool_plugin_" + re.sub(r"\W", "_", stem)
+                spec = importlib.util.spec_from_file_location(module_name, self.path)
+                if spec is None or spec.loader is None:
+                    raise ImportError(f"无法导入插件文件{self.path}")
+                module = importlib.util.module_from_spec(spec)
+                sys.modules[module_name] = module
+                try:
+                    spec.loader.exec_module(module)
+                except BaseException:
+                    sys.modules.pop(module_name, None)
+                    raise
+                self._module = module
+        return self._module
+
+    def factory(self, class_name: str) -> Callable[[], BaseTool]:
+        return lambda: _instantiate(getattr(self.module(), class_name))
+
+
+def _target_factory(target: str) -> Callable[[], BaseTool]:
+    """按"模块:属性"导入工具类（或工具实例、工厂函数）的函数"""
+    module_name, _, attr = target.partition(":")
+
+    def create() -> BaseTool:
+        obj = importlib.import_module(module_name)
+        for part in attr.split("."):
+            obj = getattr(obj, part)
+        return _instantiate(obj)
+    return create
+
+
+def _module_source(module_name: str) -> Optional[str]:
+    """在不导入模块的情况下读取其源码（只支持.py文件中的模块）"""
+    try:
+        spec = importlib.util.find_spec(module_name)
+    except (ImportError, ValueError):
+        return None
+    if spec is None or not spec.origin or not spec.origin.endswith(".py"):
+        return None
+    try:
+        with open(spec.origin, encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+class ToolRegistry:
+    """
+    动态工具注册表
+
+    工具来自内置工具、entry point（ENTRY_POINT_GROUP）和插件目录中的.py文件。注册时只静态读取工具的
+    名称、描述和关键词，模块在工具第一次被使用时才导入；注册表可以在运行中增删工具，使用它的Agent
+    不需要重建。select按查询从词法索引中选出最相关的工具，提示中只放入这些工具
+    """
+
+    def __init__(self, refresh_interval: float = 0.0):
+        """
+        Args:
+            refresh_interval: 自动重新扫描插件目录的最短间隔（秒），在选择工具时检查；0表示只在调用refresh时扫描
+        """
+        self.refresh_interval = refresh_interval
+        self.version = 0  # 每次增删工具后加一，用于让按工具集缓存的提示失效
+        self._tools: Dict[str, LazyTool] = {}
+        self._index = ToolIndex()
+        self._plugin_dirs: List[str] = []
+        self._plugin_files: Dict[str, _PluginFile] = {}
+        self._last_refresh = time.monotonic()
+        self._lock = threading.RLock()
+        self.tool_map: Mapping[str, LazyTool] = MappingProxyType(self._tools)  # 工具名到工具的只读实时视图
+
+    def __iter__(self) -> Iterator[LazyTool]:
+        return iter(list(self._tools.values()))
+
+    def __len__(self) -> int:
+        return len(self._tools)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._tools
+
+    def get(self, name: str) -> Optional[LazyTool]:
+        return self._tools.get(name)
+
+    def register(self, tool: Union[BaseTool, LazyTool]) -> LazyTool:
+        """
+        注册一个工具，同名的工具被替换
+
+        Args:
+            tool: 工具实例或LazyTool
+
+        Returns:
+            注册表中的工具
+        """
+        lazy = tool if isinstance(tool, LazyTool) else LazyTool.from_tool(tool)
+        with self._lock:
+            previous = self._tools.get(lazy.name)
+            if previous is not None and previous.source != lazy.source:
+                logger.warning(f"工具{lazy.name}（{previous.source}）被{lazy.source}中的同名工具替换")
+            self._tools[lazy.name] = lazy
+            self._index.add(lazy)
+            self.version += 1
+        return lazy
+
+    def register_target(self, target: str, source: Optional[str] = None) -> LazyTool:
+        """
+        按"模块:工具类"注册工具
+
+        能从模块源码中静态读出名称和描述时不导入模块；否则（例如目标是工厂函数）立即导入并创建工具
+
+        Args:
+            target: "模块:属性"
+            source: 工具的来源，默认为target
+
+        Returns:
+            注册表中的工具
+        """
+        module_name, _, attr = target.partition(":")
+        if not module_name or not attr:
+            raise ValueError(f"工具目标必须形如'模块:属性': {target}")
+        factory = _target_factory(target)
+        source = source or target
+        source_code = _module_source(module_name)
+        fields = scan_tool_classes(source_code).get(attr) if source_code is not None else None
+        if fields is not None:
+            return self.register(LazyTool(
+                fields["name"], fields["description"], factory, fields["keywords"], source,
+                parameters=fields["parameters"], attributes=fields["attributes"]
+            ))
+        logger.debug(f"无法静态读取{target}的工具信息，立即加载")
+        return self.register(LazyTool.from_tool(factory(), source))
+
+    def unregister(self, name: str) -> bool:
+        """
+        移除一个工具，已经开始的请求中对它的调用不受影响
+
+        Returns:
+            工具是否存在
+        """
+        with self._lock:
+            if self._tools.pop(name, None) is None:
+                return False
+            self._index.remove(name)
+            self.version += 1
+        return True
+
+    def load_entry_points(self, group: str = ENTRY_POINT_GROUP) -> List[str]:
+        """
+        注册已安装的包通过entry point声明的工具
+
+        Returns:
+            注册的工具名
+        """
+        names = []
+        for entry_point in metadata.entry_points(group=group):
+            try:
+                names.append(self.register_target(entry_point.value, source=f"entry_point:{entry_point.name}").name)
+            except Exception as e:
+                logger.error(f"无法注册entry point工具{entry_point.name}（{entry_point.value}）: {e}")
+        return names
+
+    def add_plugin_dir(self, path: str) -> List[str]:
+        """
+        注册插件目录中的工具，之后refresh时重新扫描该目录
+
+        目录中每个不以下划线开头的.py文件里，以字面量声明了name和description的类都作为工具注册
+
+        Returns:
+            注册的工具名
+        """
+        path = os.path.abspath(path)
+        with self._lock:
+            if path not in self._plugin_dirs:
+                self._plugin_dirs.append(path)
+            return self._scan_dir(path)[0]
+
+    def refresh(self) -> Tuple[List[str], List[str]]:
+        """
+        重新扫描插件目录：注册新增的文件，重新注册修改过的文件（下次使用时重新导入），移除已删除文件中的工具
+
+        Returns:
+            (注册或更新的工具名, 移除的工具名)
+        """
+        added: List[str] = []
+        removed: List[str] = []
+        with self._lock:
+            self._last_refresh = time.monotonic()
+            seen = set()
+            for directory in self._plugin_dirs:
+                dir_added, dir_seen = self._scan_dir(directory)
+                added.extend(dir_added)
+                seen.update(dir_seen)
+            for path in [path for path in self._plugin_files if path not in seen]:
+                removed.extend(self._remove_plugin_file(path))
+        if added or removed:
+            logger.info(f"插件目录已更新，注册或更新: {added}，移除: {removed}")
+        return added, removed
+
+    def _maybe_refresh(self) -> None:
+        if self.refresh_interval > 0 and self._plugin_dirs and time.monotonic() - self._last_refresh >= self.refresh_interval:
+            self.refresh()
+
+    def _scan_dir(self, directory: str) -> Tuple[List[str], List[str]]:
+        """扫描一个插件目录，返回(注册或更新的工具名, 目录中的插件文件)"""
+        added: List[str] = []
+        seen: List[str] = []
+        try:
+            entries = sorted(os.scandir(directory), key=lambda entry: entry.name)
+        except OSError as e:
+            logger.warning(f"无法读取插件目录{directory}: {e}")
+            return added, seen
+        for entry in entries:
+            if entry.name.startswith("_") or not entry.name.endswith(".py") or not entry.is_file():
+                continue
+            seen.append(entry.path)
+            mtime = entry.stat().st_mtime
+            known = self._plugin_files.get(entry.path)
+            if known is not None and known.mtime == mtime:
+                continue
+            added.extend(self._load_plugin_file(entry.path, mtime))
+        return added, seen
+
+    def _load_plugin_file(self, path: str, mtime: float) -> List[str]:
+        """静态解析插件文件并注册其中的工具，文件中已不存在的工具被移除"""
+        try:
+            with open(path, encoding="utf-8") as f:
+                classes = scan_tool_classes(f.read())
+        except (OSError, SyntaxError, ValueError) as e:
+            logger.error(f"无法解析插件文件{path}: {e}")
+            classes = {}
+        previous = self._remove_plugin_file(path, keep=[fields["name"] for fields in classes.values()])
+        plugin = _PluginFile(path, mtime)
+        for class_name, fields in classes.items():
+            self.register(LazyTool(
+                fields["name"], fields["description"], plugin.factory(class_name), fields["keywords"], source=path,
+                parameters=fields["parameters"], attributes=fields["attributes"]
+            ))
+            plugin.names.append(fields["name"])
+        self._plugin_files[path] = plugin
+        if not classes and not previous:
+            logger.debug(f"插件文件{path}中没有工具")
+        return plugin.names
+
+    def _remove_plugin_file(self, path: str, keep: Sequence[str] = ()) -> List[str]:
+        """移除插件文件注册的工具（已被其他来源的同名工具替换的除外）"""
+        plugin = self._plugin_files.pop(path, None)
+        if plugin is None:
+            return []
+        removed = []
+        for name in plugin.names:
+            tool = self._tools.get(name)
+            if name not in keep and tool is not None and tool.source == path:
+                self.unregister(name)
+                removed.append(name)
+        return removed
+
+    def select(self, query: str, k: Optional[int] = None, context: str = "") -> List[LazyTool]:
+        """
+        为查询选出最相关的k个工具
+
+        工具总数不超过k时返回全部工具；否则按BM25得分排序，只返回与查询（或对话上下文）有词重叠的工具；
+        没有任何工具重叠时（例如闲聊或查询用词不在任何工具描述中）按注册顺序返回前k个工具，保证提示中总有工具可用
+
+        Args:
+            query: 用户查询
+            k: 最多选出的工具数，None表示不限制
+            context: 对话上下文（例如前几条消息），以较低的权重参与打分，用于"那上海呢"这类追问
+
+        Returns:
+            选出的工具，按相关度从高到低排列
+        """
+        self._maybe_refresh()
+        with self._lock:
+            if k is None or len(self._tools) <= k:
+                return list(self._tools.values())
+            scores = self._index.score(query)
+            if context:
+                for name, score in self._index.score(context).items():
+                    scores[name] = scores.get(name, 0.0) + _CONTEXT_WEIGHT * score
+            if not scores:
+                return list(self._tools.values())[:k]
+            ranked = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+            return [self._tools[name] for name, _ in ranked]
+
+
+def create_tool_registry(
+    plugin_dirs: Sequence[str] = (),
+    entry_points: bool = True,
+    builtins: bool = True,
+    refresh_interval: float = 0.0
+) -> ToolRegistry:
+    """
+    创建工具注册表
+
+    Args:
+        plugin_dirs: 插件目录
+        entry_points: 是否注册已安装的包通过entry point声明的工具
+        builtins: 是否注册内置工具（计算器和天气）
+        refresh_interval: 自动重新扫描插件目录的最短间隔（秒），0表示不自动扫描
+
+    Returns:
+        工具注册表
+    """
+    tool_registry = ToolRegistry(refresh_interval=refresh_interval)
+    if builtins:
+        for target in BUILTIN_TOOLS:
+            tool_registry.register_target(target, source="builtin")
+    if entry_points:
+        tool_registry.load_entry_points()
+    for directory in plugin_dirs:
+        tool_registry.add_plugin_dir(directory)
+    return tool_registry
+
+
+_default_registry: Optional[ToolRegistry] = None
+_default_registry_lock = threading.Lock()
+
+
+def get_tool_registry() -> ToolRegistry:
+    """
+    获取进程内共享的工具注册表，按环境变量配置创建一次
+
+    Returns:
+        工具注册表
+    """
+    global _default_registry
+    if _default_registry is None:
+        with _default_registry_lock:
+            if _default_registry is None:
+                from src.config import get_tool_config
+                _default_registry = create_tool_registry(**get_tool_config().registry_kwargs())
+    return _default_registry
@@ -0,0 +1,76 @@
+import json
+import threading
+from typing import Any, Dict, List, Sequence, Tuple
+
+from langchain_core.tools import BaseTool
+
+from src.tools.registry import LazyTool, ToolLoadError
+
+# 加载失败的工具仍然放入函数声明，调用时把加载错误作为工具结果返回给模型
+_EMPTY_PARAMETERS: Dict[str, Any] = {"properties": {}, "type": "object"}
+
+# 以(工具名, 描述, 参数模型)为键缓存生成的JSON Schema，同一工具集只需生成一次
+_schema_cache: Dict[Tuple[str, str, Any], Dict[str, Any]] = {}
+_schema_cache_lock = threading.Lock()
+
+
+def tool_schema(tool: BaseTool) -> Dict[str, Any]:
+    """
+    生成chat/completions接口tools字段中的单个函数声明
+
+    参数结构来自工具的args_schema；注册表中的工具使用注册时静态推断的参数结构，不会因此加载，
+    无法静态推断时才在这里加载（加载失败时按无参数声明）。返回的字典会被多个请求共享，调用方不要修改
+
+    Args:
+        tool: 工具
+
+    Returns:
+        形如{"type": "function", "function": {"name", "description", "parameters"}}的字典
+    """
+    if isinstance(tool, LazyTool):
+        parameters = tool.parameters
+        if parameters is None:
+            try:
+                tool = tool.load()
+            except ToolLoadError:
+                parameters = _EMPTY_PARAMETERS
+        if parameters is not None:
+            return _static_schema(tool.name, tool.description, parameters)
+
+    args_schema = tool.args_schema
+    if not isinstance(args_schema, type):
+        # args_schema也可能是字典形式的JSON Schema（不可哈希）或None
+        args_schema = json.dumps(args_schema, sort_keys=True, default=str)
+    key = (tool.name, tool.description, args_schema)
+    schema = _schema_cache.get(key)
+    if schema is None:
+        # 只有原生函数调用模式会用到，按需导入以免拖慢文本协议模式的启动
+        from langchain_core.utils.function_calling import convert_to_openai_tool
+        schema = convert_to_openai_tool(tool)
+        with _schema_cache_lock:
+            schema = _schema_cache.setdefault(key, schema)
+    return schema
+
+
+def _static_schema(name: str, description: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+    """由注册表中的元数据生成函数声明"""
+    key = (name, description, json.dumps(parameters, sort_keys=True, default=str))
+    schema = _schema_cache.get(key)
+    if schema is None:
+        schema = {"type": "function", "function": {"name": name, "description": description, "parameters": parameters}}
+        with _schema_cache_lock:
+            schema = _schema_cache.setdefault(key, schema)
+    return schema
+
+
+def build_tool_schemas(tools: Sequence[BaseTool]) -> List[Dict[str, Any]]:
+    """
+    生成一组工具的函数声明列表
+
+    Args:
+        tools: 工具列表
+
+    Returns:
+        与工具一一对应的函数声明
+    """
+    return [tool_schema(tool) for tool in tools]
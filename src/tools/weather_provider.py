@@ -0,0 +1,354 @@
+import difflib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+try:
+    from pypinyin import lazy_pinyin
+except ImportError:  # 未安装pypinyin时只使用数据文件中提供的拼音
+    lazy_pinyin = None
+
+logger = logging.getLogger("langgraph_agent.weather")
+
+# 随代码附带的地点数据
+DEFAULT_SEED_PATH = os.path.join(os.path.dirname(__file__), "data", "weather_locations.json")
+
+# 匹配时忽略的行政区划后缀
+_SUFFIX_PATTERN = re.compile(r"(特别行政区|自治区|省|市|区|县)$")
+_SEPARATOR_PATTERN = re.compile(r"[\s'’·\-_]+")
+
+WeatherRecord = Dict[str, Any]
+
+
+def normalize_location(location: str) -> str:
+    """
+    规范化地点名称
+
+    去掉空白、分隔符和行政区划后缀并转为小写，使"北京市"、"Bei Jing"、"beijing"落到同一个键上
+    """
+    key = _SEPARATOR_PATTERN.sub("", location.strip().lower())
+    stripped = _SUFFIX_PATTERN.sub("", key)
+    return stripped or key
+
+
+class WeatherProvider(ABC):
+    """天气数据提供者接口"""
+
+    @abstractmethod
+    def lookup(self, location: str) -> Optional[WeatherRecord]:
+        """
+        查询单个地点的天气
+
+        Args:
+            location: 地点名称（中文名、别名或拼音）
+
+        Returns:
+            天气记录{"name", "condition", "temperature"}，找不到时返回None
+        """
+
+    def lookup_many(self, locations: Sequence[str]) -> List[Optional[WeatherRecord]]:
+        """
+        批量查询天气
+
+        Args:
+            locations: 地点名称列表
+
+        Returns:
+            与输入一一对应的天气记录列表
+        """
+        return [self.lookup(location) for location in locations]
+
+
+class SQLiteWeatherProvider(WeatherProvider):
+    """
+    基于SQLite的本地天气数据
+
+    首次查询时加载：数据库文件不存在（或为空）时由种子JSON建表，
+    并预先建立地点名、别名、拼音到地点的索引表；别名键同时保存在内存中用于模糊匹配。
+    同一个实例在所有线程之间共享。
+    """
+
+    def __init__(self, path: str = ":memory:", seed_path: Optional[str] = DEFAULT_SEED_PATH, fuzzy_cutoff: float = 0.75):
+        """
+        初始化本地天气数据
+
+        Args:
+            path: SQLite数据库文件路径，":memory:"表示只在内存中建库
+            seed_path: 种子数据JSON文件路径，数据库为空时用它建库
+            fuzzy_cutoff: 模糊匹配的最低相似度
+        """
+        self.path = path
+        self.seed_path = seed_path
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self._conn: Optional[sqlite3.Connection] = None
+        self._keys: List[str] = []
+        self._lock = threading.Lock()
+        self._fuzzy = lru_cache(maxsize=4096)(self._fuzzy_match)
+
+    def _ensure_loaded(self) -> sqlite3.Connection:
+        if self._conn is None:
+            with self._lock:
+                if self._conn is None:
+                    self._conn = self._load()
+        return self._conn
+
+    def _load(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS locations (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                condition TEXT NOT NULL,
+                temperature REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS location_keys (
+                key TEXT PRIMARY KEY,
+                location_id INTEGER NOT NULL REFERENCES locations(id)
+            ) WITHOUT ROWID;
+            """
+        )
+        if conn.execute("SELECT COUNT(*) FROM locations").fetchone()[0] == 0 and self.seed_path:
+            with open(self.seed_path, "r", encoding="utf-8") as f:
+                self._import(conn, json.load(f))
+        self._keys = [row[0] for row in conn.execute("SELECT key FROM location_keys")]
+        logger.info(f"天气数据已加载: {len(self._keys)}个索引键")
+        return conn
+
+    @staticmethod
+    def _import(conn: sqlite3.Connection, records: Iterable[Dict[str, Any]]) -> None:
+        """导入地点数据并建立名称、别名和拼音索引"""
+        with conn:
+            for record in records:
+                cursor = conn.execute(
+                    "INSERT INTO locations (name, condition, temperature) VALUES (?, ?, ?)",
+                    (record["name"], record["condition"], record["temperature"]),
+                )
+                names = [record["name"], *record.get("aliases", [])]
+                pinyin = record.get("pinyin")
+                if not pinyin and lazy_pinyin is not None:
+                    pinyin = "".join(lazy_pinyin(record["name"]))
+                if pinyin:
+                    names.append(pinyin)
+                # 同一个键对应多个地点时保留先导入的地点
+                conn.executemany(
+                    "INSERT OR IGNORE INTO location_keys (key, location_id) VALUES (?, ?)",
+                    [(normalize_location(name), cursor.lastrowid) for name in names],
+                )
+
+    def import_records(self, records: Iterable[Dict[str, Any]]) -> None:
+        """
+        追加地点数据
+
+        Args:
+            records: 地点记录，字段与种子JSON相同
+        """
+        conn = self._ensure_loaded()
+        with self._lock:
+            self._import(conn, records)
+            self._keys = [row[0] for row in conn.execute("SELECT key FROM location_keys")]
+            self._fuzzy.cache_clear()
+
+    def _fuzzy_match(self, key: str) -> Optional[str]:
+        matches = difflib.get_close_matches(key, self._keys, n=1, cutoff=self.fuzzy_cutoff)
+        return matches[0] if matches else None
+
+    def lookup(self, location: str) -> Optional[WeatherRecord]:
+        return self.lookup_many([location])[0]
+
+    def lookup_many(self, locations: Sequence[str]) -> List[Optional[WeatherRecord]]:
+        conn = self._ensure_loaded()
+        keys = [normalize_location(location) for location in locations]
+        with self._lock:
+            found = self._fetch(conn, set(keys))
+            # 精确键未命中的再做一次模糊匹配
+            fuzzy = {key: self._fuzzy(key) for key in set(keys) - found.keys() if key}
+            found.update(self._fetch(conn, {match for match in fuzzy.values() if match}))
+        return [found.get(key) or found.get(fuzzy.get(key)) for key in keys]
+
+    @staticmethod
+    def _fetch(conn: sqlite3.Connection, keys: set) -> Dict[str, WeatherRecord]:
+        if not keys:
+            return {}
+        placeholders = ",".join("?" * len(keys))
+        rows = conn.execute(
+            "SELECT k.key, l.name, l.condition, l.temperature FROM location_keys k "
+            f"JOIN locations l ON l.id = k.location_id WHERE k.key IN ({placeholders})",
+            list(keys),
+        )
+        return {
+            key: {"name": name, "condition": condition, "temperature": temperature}
+            for key, name, condition, temperature in rows
+        }
+
+
+class HTTPWeatherProvider(WeatherProvider):
+    """
+    通过HTTP接口查询天气
+
+    GET {base_url}/weather?location=xx 返回单条记录，
+    POST {base_url}/weather/batch 请求体{"locations": [...]}返回{"results": [...]}
+    """
+
+    def __init__(self, base_url: str, timeout: float = 5.0):
+        """
+        Args:
+            base_url: 天气服务的基础URL
+            timeout: 请求超时时间（秒）
+        """
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self._session = requests.Session()
+
+    def lookup(self, location: str) -> Optional[WeatherRecord]:
+        response = self._session.get(f"{self.base_url}/weather", params={"location": location}, timeout=self.timeout)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()
+
+    def lookup_many(self, locations: Sequence[str]) -> List[Optional[WeatherRecord]]:
+        response = self._session.post(
+            f"{self.base_url}/weather/batch", json={"locations": list(locations)}, timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response.json()["results"]
+
+
+class StubWeatherServer:
+    """
+    本地天气HTTP桩服务，把任意WeatherProvider以HTTPWeatherProvider的接口暴露出来，供测试使用
+
+        with StubWeatherServer() as server:
+            provider = HTTPWeatherProvider(server.url)
+    """
+
+    def __init__(self, provider: Optional[WeatherProvider] = None, host: str = "127.0.0.1", port: int = 0):
+        """
+        Args:
+            provider: 实际提供数据的provider，默认使用内置种子数据的SQLiteWeatherProvider
+            host: 监听地址
+            port: 监听端口，0表示随机分配
+        """
+        self.provider = provider or SQLiteWeatherProvider()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler(self) -> type:
+        provider = self.provider
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format: str, *args: Any) -> None:
+                logger.debug(format % args)
+
+            def _reply(self, status: int, body: Any) -> None:
+                data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self) -> None:
+                url = urlparse(self.path)
+                if url.path != "/weather":
+                    return self._reply(404, {"error": "not found"})
+                location = parse_qs(url.query).get("location", [""])[0]
+                record = provider.lookup(location)
+                self._reply(200 if record else 404, record or {"error": f"未知地点: {location}"})
+
+            def do_POST(self) -> None:
+                if urlparse(self.path).path != "/weather/batch":
+                    return self._reply(404, {"error": "not found"})
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                self._reply(200, {"results": provider.lookup_many(body.get("locations", []))})
+
+        return Handler
+
+    def start(self) -> "StubWeatherServer":
+        """在后台线程中启动服务"""
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """停止服务"""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "StubWeatherServer":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+
+_PROVIDER_FACTORIES: Dict[str, Callable[..., WeatherProvider]] = {
+    "sqlite": SQLiteWeatherProvider,
+    "http": HTTPWeatherProvider,
+}
+
+
+def register_weather_provider(name: str, factory: Callable[..., WeatherProvider]) -> None:
+    """
+    注册自定义天气数据提供者
+
+    Args:
+        name: 提供者名称，用于AGENT_WEATHER_PROVIDER
+        factory: 接收关键字参数并返回WeatherProvider的工厂函数
+    """
+    _PROVIDER_FACTORIES[name] = factory
+
+
+def create_weather_provider(provider: str = "sqlite", **kwargs: Any) -> WeatherProvider:
+    """
+    创建天气数据提供者
+
+    Args:
+        provider: 提供者名称
+        **kwargs: 传给工厂函数的参数
+
+    Returns:
+        天气数据提供者实例
+    """
+    try:
+        factory = _PROVIDER_FACTORIES[provider]
+    except KeyError:
+        raise ValueError(f"未知的天气数据提供者: {provider}，可选: {', '.join(_PROVIDER_FACTORIES)}") from None
+    return factory(**kwargs)
+
+
+_default_provider: Optional[WeatherProvider] = None
+_default_provider_lock = threading.Lock()
+
+
+def get_weather_provider() -> WeatherProvider:
+    """
+    获取进程内共享的天气数据提供者，按环境变量配置创建一次
+
+    Returns:
+        天气数据提供者实例
+    """
+    global _default_provider
+    if _default_provider is None:
+        with _default_provider_lock:
+            if _default_provider is None:
+                from src.config import get_weather_config
+                config = get_weather_config()
+                _default_provider = create_weather_provider(config.provider, **config.provider_kwargs())
+    return _default_provider
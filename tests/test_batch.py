@@ -0,0 +1,90 @@
+import asyncio
+import json
+
+from src.batch import BatchCheckpoint, run_file
+
+
+class FakeAgent:
+    """按消息返回固定回答的Agent，消息以fail开头时抛出异常"""
+
+    def __init__(self):
+        self.messages = []
+
+    async def ainvoke(self, message, conversation_id=None):
+        self.messages.append(message)
+        if message.startswith("fail"):
+            raise RuntimeError("boom")
+        return f"回答: {message}"
+
+
+def write_input(path, messages):
+    with open(path, "w", encoding="utf-8") as f:
+        for index, message in enumerate(messages):
+            f.write(json.dumps({"id": str(index), "message": message}, ensure_ascii=False) + "\n")
+
+
+def test_checkpoint_truncates_partial_last_line(tmp_path):
+    path = tmp_path / "results.jsonl"
+    path.write_text('{"id": "0", "response": "a"}\n{"id": "1", "error": "x"}\n{"id": "2", "resp', encoding="utf-8")
+    checkpoint = BatchCheckpoint(str(path))
+    assert checkpoint.load() == {"0", "1"}
+    assert checkpoint.load(retry_errors=True) == {"0"}
+    assert path.read_text(encoding="utf-8").endswith('"error": "x"}\n')
+    checkpoint.append({"id": "2", "response": "c"})
+    checkpoint.close()
+    assert [record["id"] for record in checkpoint.records()] == ["0", "1", "2"]
+
+
+def test_run_file_resumes(tmp_path):
+    input_path, output_path = str(tmp_path / "input.jsonl"), str(tmp_path / "output.jsonl")
+    write_input(input_path, ["a", "b", "fail", "c"])
+
+    agent = FakeAgent()
+    report = asyncio.run(run_file(agent, input_path, output_path, concurrency=2))
+    assert report["ok"] == 3 and report["failed"] == 1
+    assert sorted(agent.messages) == ["a", "b", "c", "fail"]
+
+    # 模拟进程在写最后一条结果时被杀死
+    with open(output_path, "r+", encoding="utf-8") as f:
+        lines = f.readlines()
+        f.seek(0)
+        f.truncate()
+        f.writelines(lines[:-1])
+        f.write(lines[-1][:5])
+    lost = json.loads(lines[-1])["id"]
+
+    agent = FakeAgent()
+    report = asyncio.run(run_file(agent, input_path, output_path))
+    assert report["skipped"] == 3
+    assert len(agent.messages) == 1
+    records = list(BatchCheckpoint(output_path).records())
+    assert sorted(record["id"] for record in records) == ["0", "1", "2", "3"]
+    assert lost in {record["id"] for record in records}
+
+
+def test_run_file_retries_errors(tmp_path):
+    input_path, output_path = str(tmp_path / "input.jsonl"), str(tmp_path / "output.jsonl")
+    write_input(input_path, ["a", "fail"])
+    asyncio.run(run_file(FakeAgent(), input_path, output_path))
+
+    agent = FakeAgent()
+    report = asyncio.run(run_file(agent, input_path, output_path, retry_errors=True))
+    assert agent.messages == ["fail"]
+    assert report["skipped"] == 1
+
+
+def test_checkpoint_async_api_reads_in_chunks(tmp_path, monkeypatch):
+    import src.batch as batch
+
+    monkeypatch.setattr(batch, "_READ_CHUNK", 2)
+    checkpoint = BatchCheckpoint(str(tmp_path / "results.jsonl"))
+
+    async def main():
+        assert await checkpoint.aload() == set()
+        for index in range(5):
+            await checkpoint.aappend({"id": str(index), "response": "ok"})
+        await checkpoint.aclose()
+        assert await checkpoint.aload() == {str(index) for index in range(5)}
+        return [record["id"] async for record in checkpoint.arecords()]
+
+    assert asyncio.run(main()) == ["0", "1", "2", "3", "4"]
@@ -0,0 +1,53 @@
+import time
+
+from src.agents.budget import DEADLINE, TOKENS, RequestBudget
+
+
+def test_tool_rounds_limit():
+    budget = RequestBudget(max_tool_rounds=2)
+    assert budget.allows_tool_round()
+    budget.start_tool_round()
+    assert budget.allows_tool_round()
+    budget.start_tool_round()
+    assert not budget.allows_tool_round()
+    assert budget.exhausted() is None
+
+
+def test_unlimited_budget():
+    budget = RequestBudget(max_tool_rounds=None)
+    for _ in range(100):
+        budget.start_tool_round()
+    budget.add_tokens(10 ** 9)
+    assert budget.allows_tool_round()
+    assert budget.exhausted() is None
+    assert budget.remaining() is None
+
+
+def test_token_limit():
+    budget = RequestBudget(max_tokens=100)
+    budget.add_tokens(60)
+    assert budget.exhausted() is None
+    budget.add_tokens(40)
+    assert budget.exhausted() == TOKENS
+
+
+def test_deadline():
+    budget = RequestBudget(deadline=0.05)
+    assert budget.exhausted() is None
+    assert 0 < budget.remaining() <= 0.05
+    time.sleep(0.06)
+    assert budget.remaining() == 0.0
+    assert budget.exhausted() == DEADLINE
+
+
+def test_deadline_takes_precedence_over_tokens():
+    budget = RequestBudget(max_tokens=1, deadline=0)
+    budget.add_tokens(1)
+    assert budget.exhausted() == DEADLINE
+
+
+def test_exhaust_keeps_first_reason():
+    budget = RequestBudget()
+    budget.exhaust(TOKENS)
+    budget.exhaust(DEADLINE)
+    assert budget.stop_reason == TOKENS
@@ -0,0 +1,113 @@
+import pytest
+
+from src.tools.basic_tools import Calculator
+from src.tools.expression import (
+    MAX_INT_BITS,
+    VECTORIZE_MIN_GROUP,
+    ExpressionError,
+    compile_expression,
+    evaluate,
+    evaluate_many,
+)
+
+
+@pytest.mark.parametrize("source, expected", [
+    ("1 + 2 * 3", 7),
+    ("(1 + 2) * 3", 9),
+    ("7 / 2", 3.5),
+    ("7 // 2", 3),
+    ("-7 % 3", 2),
+    ("2 ** 10", 1024),
+    ("2^3 + 1", 9),
+    ("sqrt(16) + abs(-2)", 6.0),
+    ("log(8, 2)", 3.0),
+    ("max(1, 5, 3)", 5),
+    ("round(2.567, 2)", 2.57),
+])
+def test_evaluate(source, expected):
+    assert evaluate(source) == expected
+
+
+@pytest.mark.parametrize("source", [
+    "__import__('os').system('true')",
+    "(1).__class__",
+    "lambda: 1",
+    "[1, 2]",
+    "'a' * 3",
+    "True + 1",
+    "1 if 1 else 2",
+    "open('x')",
+    "sqrt(x=1)",
+    "1 +",
+])
+def test_whitelist_rejects(source):
+    with pytest.raises(ExpressionError):
+        evaluate(source)
+
+
+def test_undefined_variable_and_variables():
+    with pytest.raises(ExpressionError):
+        evaluate("x + 1")
+    assert evaluate("x * 2 + y", {"x": 3, "y": 1}) == 7
+
+
+@pytest.mark.parametrize("source", ["sqrt()", "sqrt(1, 2)", "max(1)", "round(1.5, 2.5)", "1 / 0", "sqrt(-1)", "exp(1000)"])
+def test_runtime_errors_become_expression_errors(source):
+    with pytest.raises(ExpressionError):
+        evaluate(source)
+
+
+def test_pow_size_guard_boundary():
+    assert evaluate(f"2 ** {MAX_INT_BITS - 1}").bit_length() == MAX_INT_BITS
+    assert evaluate("2 ** 2100").bit_length() == 2101
+    with pytest.raises(ExpressionError):
+        evaluate(f"2 ** {MAX_INT_BITS}")
+    with pytest.raises(ExpressionError):
+        evaluate("9 ** 9 ** 9")
+    # 乘法的结果同样受位数限制
+    with pytest.raises(ExpressionError):
+        evaluate(f"2 ** {MAX_INT_BITS - 1} * 2")
+    assert evaluate("1 ** 100000") == 1
+    assert evaluate("(-1) ** 100001") == -1
+
+
+def test_compile_cache():
+    compile_expression.cache_clear()
+    first = compile_expression("3 * 4 + 1")
+    assert compile_expression("3 * 4 + 1") is first
+    assert compile_expression.cache_info().hits == 1
+    assert compile_expression("3 * 5 + 1").template == first.template
+
+
+def test_evaluate_many_matches_scalar():
+    sources = [f"{i} * 0.3 + {i}" for i in range(10)] + [f"{i} * 7 - 2" for i in range(10)] + ["sqrt(2)", "2 ** 70"]
+    results = evaluate_many(sources)
+    for source, result in zip(sources, results):
+        expected = evaluate(source)
+        assert result == pytest.approx(expected)
+        assert type(result) is type(expected)
+
+
+def test_evaluate_many_falls_back_per_item():
+    sources = ["1 / 2", "1 / 0", "3 / 4", "5 / 0"] + [f"{i} ** 40" for i in range(VECTORIZE_MIN_GROUP)]
+    results = evaluate_many(sources)
+    assert results[0] == 0.5 and results[2] == 0.75
+    assert isinstance(results[1], ExpressionError) and isinstance(results[3], ExpressionError)
+    # 超出int64的整数结果回退到精确计算
+    assert results[4:] == [i ** 40 for i in range(VECTORIZE_MIN_GROUP)]
+
+
+def test_evaluate_many_bad_arity_group():
+    results = evaluate_many(["sqrt(1, 2)"] * VECTORIZE_MIN_GROUP + ["sqrt(4)"] * VECTORIZE_MIN_GROUP)
+    assert all(isinstance(result, ExpressionError) for result in results[:VECTORIZE_MIN_GROUP])
+    assert results[VECTORIZE_MIN_GROUP:] == [2.0] * VECTORIZE_MIN_GROUP
+
+
+def test_calculator_returns_errors_per_item():
+    calculator = Calculator()
+    assert calculator._run("sqrt()").startswith("计算错误")
+    assert calculator._run("2^3") == "计算结果: 8"
+    results = calculator.run_batch([{"expression": "1 + 1"}, {"expression": "max(1)"}, {"expression": "2 * 3"}])
+    assert results[0] == "计算结果: 2"
+    assert results[1].startswith("计算错误")
+    assert results[2] == "计算结果: 6"
@@ -0,0 +1,56 @@
+import time
+
+from src.models.cache import CachedResponse, ExactResponseCache, ResponseCache
+
+PARAMS = {"model": "deepseek-chat", "temperature": 0.0}
+
+
+def test_response_cache_roundtrip():
+    cache = ResponseCache()
+    assert cache.lookup("prompt", PARAMS) is None
+    cache.store("prompt", PARAMS, "answer")
+    assert cache.lookup("prompt", PARAMS).text == "answer"
+    assert cache.lookup("prompt", dict(PARAMS, model="other")) is None
+
+
+def test_high_temperature_bypasses_cache():
+    cache = ResponseCache(max_temperature=0.7)
+    assert cache.enabled_for({"temperature": 0.7})
+    assert not cache.enabled_for({"temperature": 1.0})
+    assert cache.stats()["bypassed"] == 1
+
+
+def test_partial_entries_need_allow_partial():
+    cache = ResponseCache()
+    cache.store("prompt", PARAMS, "par", complete=False)
+    assert cache.lookup("prompt", PARAMS) is None
+    assert cache.lookup("prompt", PARAMS, allow_partial=True).text == "par"
+    # 不完整的响应不会覆盖完整的响应
+    cache.store("prompt", PARAMS, "full")
+    cache.store("prompt", PARAMS, "pa", complete=False)
+    assert cache.lookup("prompt", PARAMS).text == "full"
+
+
+def test_exact_cache_ttl(tmp_path):
+    for path in (None, str(tmp_path / "cache.sqlite")):
+        cache = ExactResponseCache(ttl=60, path=path)
+        cache.put("fresh", CachedResponse("a"))
+        cache.put("stale", CachedResponse("b", created_at=time.time() - 61))
+        assert cache.get("fresh").text == "a"
+        assert cache.get("stale") is None
+
+
+def test_exact_cache_shared_file_keeps_recently_read_entries(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    writer = ExactResponseCache(max_entries=2, path=path)
+    writer.put("k1", CachedResponse("1"))
+    writer.put("k2", CachedResponse("2"))
+
+    reader = ExactResponseCache(max_entries=2, path=path)
+    assert reader.get("k1").text == "1"
+    # 读取时记录的访问时间在下次写入时生效，淘汰最久未访问的k2
+    reader.put("k3", CachedResponse("3"))
+
+    fresh = ExactResponseCache(max_entries=2, path=path)
+    assert fresh.get("k1") is not None
+    assert fresh.get("k2") is None
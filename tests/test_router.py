@@ -0,0 +1,66 @@
+import random
+
+import pytest
+
+from src.agents.router import ArithmeticRule, WeatherRule, create_query_router
+
+TOOLS = {"calculator", "weather"}
+
+
+@pytest.mark.parametrize("query, expression", [
+    ("2+3*4", "2+3*4"),
+    ("计算 (1+2)×3", "(1+2)*3"),
+    ("2^10等于多少", "2**10"),
+    ("sqrt(16) + 1", "sqrt(16) + 1"),
+])
+def test_arithmetic_queries_are_routed(query, expression):
+    routed = create_query_router().route(query, TOOLS)
+    assert routed["tool"] == "calculator"
+    assert routed["params"] == {"expression": expression}
+    assert not routed["shadow"]
+
+
+@pytest.mark.parametrize("query", ["2024-10-18", "你好", "x + 1", "北京明天的天气", "北京和上海的天气"])
+def test_other_queries_go_to_llm(query):
+    assert create_query_router().route(query, TOOLS) is None
+
+
+def test_weather_query_is_routed():
+    routed = create_query_router().route("查一下上海今天的天气怎么样？", TOOLS)
+    assert (routed["tool"], routed["params"]) == ("weather", {"location": "上海"})
+
+
+def test_rules_need_their_tool():
+    assert create_query_router().route("1+1", {"weather"}) is None
+
+
+def test_low_confidence_falls_back():
+    router = create_query_router(min_confidence=0.95)
+    assert router.route("计算 1+1", TOOLS) is None
+    assert router.route("1+1", TOOLS) is not None
+
+
+def test_render_falls_back_on_unusable_results():
+    router = create_query_router()
+    routed = router.route("1+1", TOOLS)
+    assert router.render(routed, {"result": "计算结果: 2"}) == "1+1 = 2"
+    assert router.render(routed, {"result": "计算错误: 除数不能为0"}) is None
+    assert router.render(routed, {"error": "超时"}) is None
+    routed = router.route("北京天气", TOOLS)
+    assert router.render(routed, {"result": "北京的天气: 无法获取天气信息"}) is None
+
+
+def test_shadow_sampling_and_judge():
+    router = create_query_router(shadow_rate=1.0)
+    router._rng = random.Random(0)
+    routed = router.route("2^3", TOOLS)
+    assert routed["shadow"]
+    assert router.judge(routed, [{"name": "calculator", "params": {"expression": "2 ** 3"}}])
+    assert not router.judge(routed, [{"name": "calculator", "params": {"expression": "2 * 3"}}])
+    assert not router.judge(routed, [{"name": "weather", "params": {"location": "北京"}}])
+
+
+def test_same_params():
+    assert ArithmeticRule().same_params({"expression": "2**3"}, {"expression": "2^3"})
+    assert WeatherRule().same_params({"location": "北京"}, {"location": "北京市"})
+    assert not WeatherRule().same_params({"location": "北京"}, {"location": "上海"})
@@ -0,0 +1,190 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src.models.scheduler import RequestScheduler, SchedulerTimeout, SQLiteTokenBucket, scheduling_context
+
+
+def test_priority_order():
+    scheduler = RequestScheduler(max_concurrency=1)
+    order = []
+
+    async def request(priority, name):
+        with scheduling_context(priority=priority):
+            async with scheduler.aslot():
+                order.append(name)
+
+    async def main():
+        await scheduler.aacquire()
+        tasks = [asyncio.create_task(request(priority, name)) for priority, name in [(5, "low"), (1, "high"), (3, "mid")]]
+        await asyncio.sleep(0.01)
+        await scheduler.arelease()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert order == ["high", "mid", "low"]
+
+
+def test_priority_by_tenant():
+    scheduler = RequestScheduler(priorities={"vip": 1, "batch": 20}, default_priority=10)
+    with scheduling_context(tenant="vip"):
+        assert scheduler.resolve_priority() == 1
+    with scheduling_context(tenant="other", endpoint="batch"):
+        assert scheduler.resolve_priority() == 20
+    with scheduling_context(tenant="vip", priority=0):
+        assert scheduler.resolve_priority() == 0
+    assert scheduler.resolve_priority() == 10
+
+
+def test_max_concurrency():
+    scheduler = RequestScheduler(max_concurrency=2)
+    active = peak = 0
+
+    async def request():
+        nonlocal active, peak
+        async with scheduler.aslot():
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+
+    async def main():
+        await asyncio.gather(*(request() for _ in range(10)))
+
+    asyncio.run(main())
+    assert peak == 2
+    assert scheduler.stats()["in_flight"] == 0
+    assert scheduler.stats()["admitted"] == 10
+
+
+def test_async_coalescing():
+    scheduler = RequestScheduler()
+    calls = 0
+
+    async def upstream():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.02)
+        return "result"
+
+    async def main():
+        return await asyncio.gather(*(scheduler.arun("same", upstream) for _ in range(5)))
+
+    assert asyncio.run(main()) == ["result"] * 5
+    assert calls == 1
+    assert scheduler.stats()["coalesced"] == 4
+
+
+def test_sync_coalescing_shares_errors():
+    scheduler = RequestScheduler()
+    started = threading.Event()
+    calls = 0
+    errors = []
+
+    def upstream():
+        nonlocal calls
+        calls += 1
+        started.set()
+        time.sleep(0.05)
+        raise ValueError("upstream failed")
+
+    def call():
+        try:
+            scheduler.run("key", upstream)
+        except ValueError as e:
+            errors.append(str(e))
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait()
+    followers = [threading.Thread(target=call) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    for thread in [leader, *followers]:
+        thread.join()
+    assert calls == 1
+    assert errors == ["upstream failed"] * 4
+
+
+def test_no_coalescing_without_key():
+    scheduler = RequestScheduler()
+    calls = 0
+
+    async def upstream():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+
+    async def main():
+        await asyncio.gather(*(scheduler.arun(None, upstream) for _ in range(3)))
+
+    asyncio.run(main())
+    assert calls == 3
+
+
+def test_async_queue_timeout():
+    scheduler = RequestScheduler(max_concurrency=1, queue_timeout=0.05)
+
+    async def main():
+        await scheduler.aacquire()
+        with pytest.raises(SchedulerTimeout):
+            await scheduler.aacquire()
+        await scheduler.arelease()
+        # 超时的请求不再占用队列，后来的请求可以立即获得准入
+        await scheduler.aacquire()
+        await scheduler.arelease()
+
+    asyncio.run(main())
+    stats = scheduler.stats()
+    assert stats["timeouts"] == 1
+    assert stats["queued"] == 0
+    assert stats["in_flight"] == 0
+
+
+def test_sync_queue_timeout():
+    scheduler = RequestScheduler(max_concurrency=1, queue_timeout=0.05)
+    scheduler.acquire()
+    with pytest.raises(SchedulerTimeout):
+        scheduler.acquire()
+    scheduler.release()
+    assert scheduler.stats()["timeouts"] == 1
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_rate_limit(backend, tmp_path):
+    bucket = SQLiteTokenBucket(rate=50, capacity=2, path=str(tmp_path / "rate.sqlite")) if backend == "sqlite" else None
+    scheduler = RequestScheduler(max_concurrency=10, rate=50, burst=2, bucket=bucket)
+
+    async def request():
+        async with scheduler.aslot():
+            pass
+
+    async def main():
+        await asyncio.gather(*(request() for _ in range(7)))
+
+    started = time.monotonic()
+    asyncio.run(main())
+    # 前2个请求使用突发容量，其余5个按每秒50个补充令牌
+    assert time.monotonic() - started >= 0.09
+    assert scheduler.stats()["admitted"] == 7
+
+
+def test_concurrency_is_unbounded_by_default(monkeypatch):
+    from src.config import SchedulerConfig
+    from src.models.scheduler import create_request_scheduler
+
+    monkeypatch.delenv("AGENT_MAX_CONCURRENCY", raising=False)
+    scheduler = create_request_scheduler(SchedulerConfig.from_env())
+    assert scheduler.max_concurrency is None
+
+    async def main():
+        for _ in range(100):
+            await scheduler.aacquire()
+
+    asyncio.run(main())
+    assert scheduler.stats()["in_flight"] == 100
+
+    monkeypatch.setenv("AGENT_MAX_CONCURRENCY", "4")
+    assert create_request_scheduler(SchedulerConfig.from_env()).max_concurrency == 4
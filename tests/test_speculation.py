@@ -0,0 +1,61 @@
+import pytest
+from langchain_core.tools import BaseTool
+
+from src.agents.speculation import MATCH, OFF, PRESENTABLE, results_match, speculative_answer
+from src.tools.basic_tools import Calculator
+
+
+class SearchTool(BaseTool):
+    name: str = "search"
+    description: str = "搜索"
+
+    def _run(self, query: str) -> str:
+        return query
+
+
+TOOLS = {"calculator": Calculator(), "search": SearchTool()}
+
+
+def response(action_result, answer="7/2等于3.5"):
+    return (
+        "问题: 7/2等于多少\n思考: 需要计算\n行动: 使用工具: calculator\n参数: expression: 7/2\n"
+        f"行动结果: {action_result}\n回答: {answer}"
+    )
+
+
+def calculator_result(result="计算结果: 3.5"):
+    return [{"tool_name": "calculator", "params": {"expression": "7/2"}, "result": result}]
+
+
+@pytest.mark.parametrize("speculated", ["计算结果: 3.5", "计算结果：3.5。", "  计算结果 : 3.5 "])
+def test_matched(speculated):
+    assert speculative_answer(MATCH, response(speculated), calculator_result(), TOOLS) == ("7/2等于3.5", "matched")
+
+
+@pytest.mark.parametrize("speculated", ["计算结果: 35", "计算结果: 3,5", "计算结果: 3.50", "计算结果: 4"])
+def test_mismatch(speculated):
+    assert speculative_answer(MATCH, response(speculated, "7/2等于35"), calculator_result(), TOOLS) == (None, "mismatch")
+
+
+def test_numbers_are_not_merged_by_whitespace():
+    assert not results_match("结果: 1 2", "结果: 12")
+    assert results_match("结果: 1,000.5", "结果：1,000.5")
+    assert not results_match("结果: 1,000", "结果: 1000")
+
+
+def test_presentable_uses_actual_result():
+    answer, outcome = speculative_answer(PRESENTABLE, response("计算结果: 35"), calculator_result(), TOOLS)
+    assert (answer, outcome) == ("计算结果: 3.5", "presentable")
+
+
+def test_presentable_requires_every_tool_presentable():
+    round_results = calculator_result() + [{"tool_name": "search", "params": {}, "result": "..."}]
+    assert speculative_answer(PRESENTABLE, response("计算结果: 35"), round_results, TOOLS) == (None, "mismatch")
+
+
+def test_no_speculation_and_errors():
+    text = "行动: 使用工具: calculator\n参数: expression: 7/2"
+    assert speculative_answer(MATCH, text, calculator_result(), TOOLS) == (None, "no_speculation")
+    errors = [{"tool_name": "calculator", "params": {}, "error": "boom"}]
+    assert speculative_answer(PRESENTABLE, response("计算结果: 3.5"), errors, TOOLS) == (None, "tool_error")
+    assert speculative_answer(OFF, response("计算结果: 3.5"), calculator_result(), TOOLS) == (None, OFF)
@@ -0,0 +1,53 @@
+import pytest
+
+from src.agents.response_parser import parse_response
+from src.agents.stream_parser import ToolCallStreamParser
+
+RESPONSES = [
+    # 单行键值对参数
+    "问题: 北京天气\n思考: 需要查询天气\n行动: 使用工具: weather\n参数: location: 北京\n行动结果: 晴\n回答: 北京晴",
+    # 跨多行的键值对参数
+    "思考: 查询天气\n行动:\n使用工具: weather\n参数: location: 北京\nunit: c\n行动结果: 晴，20度\n回答: 北京晴，20度",
+    # "参数:"后换行书写，中间有空行
+    "行动: 使用工具: weather\n参数:\n\nlocation: 上海\nunit: f\n回答: 上海多云",
+    # 多行JSON参数
+    '行动: 使用工具: calculator\n参数: {\n  "expression": "1 + 2"\n}\n行动结果: 3\n回答: 3',
+    # 一个行动下的多组工具调用，第一个工具没有参数
+    "行动:\n使用工具: now\n使用工具: weather\n参数: location: 广州, unit: c\n使用工具: calculator\n"
+    "参数: expression: 2 * 3\n行动结果: ...\n回答: 完成",
+    # 没有结束标记，参数一直到文本结尾
+    "行动: 使用工具: weather\n参数: location: 深圳\nunit: c",
+    # 没有工具调用
+    "思考: 直接回答\n回答: 你好",
+]
+
+
+def stream_tool_calls(text, chunk_size):
+    """把文本按chunk_size切块送入增量解析器，返回产出的全部工具调用"""
+    parser = ToolCallStreamParser()
+    calls = []
+    for start in range(0, len(text), chunk_size):
+        calls.extend(parser.feed(text[start:start + chunk_size]))
+    calls.extend(parser.close())
+    return calls
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 1000])
+@pytest.mark.parametrize("text", RESPONSES)
+def test_stream_parser_matches_parse_response(text, chunk_size):
+    assert stream_tool_calls(text, chunk_size) == parse_response(text).tool_calls
+
+
+def test_multiline_params_are_not_emitted_early():
+    parser = ToolCallStreamParser()
+    assert parser.feed("行动: 使用工具: weather\n参数: location: 北京\n") == []
+    assert parser.feed("unit: c\n") == []
+    assert parser.feed("行动结果:") == []
+    assert parser.feed(" 晴\n") == [{"name": "weather", "params": {"location": "北京", "unit": "c"}}]
+    assert parser.done
+
+
+def test_json_params_are_emitted_when_closed():
+    parser = ToolCallStreamParser()
+    assert parser.feed('行动: 使用工具: calculator\n参数: {"expression":\n') == []
+    assert parser.feed('"1 + 2"}\n') == [{"name": "calculator", "params": {"expression": "1 + 2"}}]
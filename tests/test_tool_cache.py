@@ -0,0 +1,28 @@
+import time
+
+from src.tools.cache import MISS, SQLiteToolResultCache, ToolResultCache
+
+
+def test_tool_cache_ttl_and_lru():
+    cache = ToolResultCache(max_entries=2)
+    cache.put("weather", {"location": "北京"}, "晴", ttl=0.01)
+    cache.put("calculator", {"expression": "1+1"}, 2)
+    assert cache.get("weather", {"location": " 北京 "}) == "晴"
+    time.sleep(0.02)
+    assert cache.get("weather", {"location": "北京"}) is MISS
+    cache.put("calculator", {"expression": "2+2"}, 4)
+    cache.put("calculator", {"expression": "3+3"}, 6)
+    assert cache.get("calculator", {"expression": "1+1"}) is MISS
+    assert cache.stats()["hits"] == 1
+
+
+def test_sqlite_tool_cache_shared_between_instances(tmp_path):
+    path = str(tmp_path / "tools.sqlite")
+    first, second = SQLiteToolResultCache(path), SQLiteToolResultCache(path)
+    first.put("weather", {"location": "北京"}, "晴", ttl=60)
+    first.put("weather", {"location": "上海"}, "雨", ttl=-1)
+    assert second.get("weather", {"location": "北京"}) == "晴"
+    assert second.get("weather", {"location": "上海"}) is MISS
+    # 过期的条目在写入时已被删除
+    assert second.invalidate("weather") == 1
+    assert first.get("weather", {"location": "北京"}) is MISS
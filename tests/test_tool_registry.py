@@ -0,0 +1,79 @@
+import textwrap
+
+import pytest
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from src.tools import ToolRegistry, tool_schema
+
+PLUGIN = textwrap.dedent('''
+    from typing import ClassVar, List, Optional, Type, Tuple
+    from pydantic import BaseModel, Field
+    from langchain_core.tools import BaseTool
+
+
+    class StockInput(BaseModel):
+        """股票查询的输入"""
+        symbol: str = Field(description="股票代码")
+        days: int = Field(default=1, description="天数")
+        adjusted: bool = True
+
+
+    class StockTool(BaseTool):
+        name: str = "stock_price"
+        description: str = "查询股票的最新价格"
+        args_schema: Type[BaseModel] = StockInput
+        keywords: ClassVar[Tuple[str, ...]] = ("股票", "股价")
+        cacheable: ClassVar[bool] = True
+        cache_ttl: ClassVar[Optional[float]] = 60
+
+        def _run(self, symbol: str, days: int = 1, adjusted: bool = True) -> str:
+            return f"{symbol}: 10.0"
+
+
+    class TranslateTool(BaseTool):
+        name: str = "translate"
+        description: str = "把文本翻译成指定语言"
+
+        def _run(self, text: str, target: str = "en", run_manager=None) -> str:
+            return text
+
+
+    class BatchTool(BaseTool):
+        name: str = "batch"
+        description: str = "批量处理文本列表"
+
+        def _run(self, items: List[str]) -> str:
+            return ",".join(items)
+''')
+
+
+@pytest.fixture
+def registry(tmp_path):
+    (tmp_path / "plugin.py").write_text(PLUGIN, encoding="utf-8")
+    tool_registry = ToolRegistry()
+    tool_registry.add_plugin_dir(str(tmp_path))
+    return tool_registry
+
+
+def test_schema_is_built_without_loading(registry):
+    stock, translate = registry.get("stock_price"), registry.get("translate")
+    schemas = [tool_schema(stock), tool_schema(translate)]
+    assert not stock.loaded and not translate.loaded
+    assert stock.cacheable and stock.cache_ttl == 60
+    assert not stock.loaded
+    assert schemas == [convert_to_openai_tool(stock.load()), convert_to_openai_tool(translate.load())]
+
+
+def test_schema_falls_back_to_loading(registry):
+    batch = registry.get("batch")
+    assert batch.parameters is None
+    assert tool_schema(batch) == convert_to_openai_tool(batch.load())
+
+
+def test_select_ranks_by_query(registry):
+    assert [tool.name for tool in registry.select("今天的股价", k=2)] == ["stock_price"]
+
+
+def test_select_without_overlap_falls_back_to_first_tools(registry):
+    assert [tool.name for tool in registry.select("你好", k=2)] == ["stock_price", "translate"]
+    assert not any(tool.loaded for tool in registry)
@@ -0,0 +1,50 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.metrics import LLM_SECONDS
+from src.models.transport import DeepSeekTransport
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = json.dumps({"ok": True}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def base_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def connect_count():
+    histogram = LLM_SECONDS._children.get(("connect",))
+    return histogram.snapshot()["count"] if histogram is not None else 0
+
+
+def test_sync_requests_record_connect_phase(base_url):
+    transport = DeepSeekTransport(base_url, max_retries=0)
+    before = connect_count()
+    for _ in range(3):
+        assert transport.post("/chat/completions", {}).json() == {"ok": True}
+    # 三次请求复用同一个连接，只记录一次新建连接
+    assert connect_count() == before + 1
+    assert transport.stats()["connections_opened"] == 1
+    transport.close()